@@ -0,0 +1,868 @@
+import sys
+import numpy as np
+
+"""
+Durre (2010) QC tests for snow depth and SWE, for one station at a time.
+qc_durre_snwd_wre
+qc_durre_snwd_change_wre
+qc_durre_snwd_streak
+obs_rate_category
+qc_durre_snwd_gap
+qc_durre_snwd_tair
+qc_durre_snwd_snfl
+qc_durre_snwd_prcp
+qc_durre_snwd_prcp_ratio
+qc_durre_snwd_tair_spatial
+qc_durre_swe_wre
+qc_durre_swe_change_wre
+qc_durre_swe_streak
+qc_durre_swe_gap
+qc_durre_swe_prcp
+qc_durre_swe_prcp_ratio
+
+These are the reference versions of the tests in qc_durre_batch, which
+evaluates them for a whole hour of reports at once and must give
+identical results; m1_dev/station_qc_db/sandbox/qc_durre_batch_test.py
+checks that it does.
+"""
+
+
+def qc_durre_snwd_wre(value_cm):
+    """
+    Basic integrity checks:
+    Snow depth world record exceedance.
+    """
+    threshold_value = 1146.0
+    if value_cm < 0.0 or value_cm > threshold_value:
+        return True
+    else:
+        return False
+
+
+def qc_durre_snwd_change_wre(snow_depth_value_cm,
+                             prev_sd_value_cm,
+                             prev_sd_qc):
+    """
+    Basic integrity checks:
+    Snow depth increase world record exceedance.
+    """
+
+    threshold_sd_increase_cm = 192.5
+
+    # Mask previous snow depth data that have any QC flags set.
+    prev_sd_value_cm = np.ma.masked_where(prev_sd_qc != 0,
+                                          prev_sd_value_cm)
+
+    num_unmasked_prev_sd = prev_sd_value_cm.count()
+
+    if num_unmasked_prev_sd == 0:
+        # Test is not possible.
+        return None, None
+
+    # Find the minimum observed preceding snow depth value for
+    # comparison with the observation being checked. This snow
+    # depth will be our version of SNWD(-1) in Durre (2010),
+    # Table 1 (world record exceedance check: snow depth increase)
+    ref_ind = np.ma.argmin(prev_sd_value_cm)
+
+    if snow_depth_value_cm - prev_sd_value_cm[ref_ind] > \
+       threshold_sd_increase_cm:
+        return True, ref_ind
+    else:
+        return False, ref_ind
+
+
+def qc_durre_snwd_streak(snow_depth_value_cm,
+                         prev_sd_value_cm,
+                         prev_sd_qc,
+                         streak_value_threshold=None):
+    """
+    Basic integrity checks:
+    Snow depth streak check.
+    """
+    if streak_value_threshold is None:
+        streak_value_threshold = 0.1
+    streak_min_consecutive = 10
+
+    # Mask previous snow depth data that have any QC flags set.
+    prev_sd_value_cm = np.ma.masked_where(prev_sd_qc != 0,
+                                          prev_sd_value_cm)
+
+    # Assemble previous and current data into one time series.
+    station_time_series = np.ma.append(prev_sd_value_cm, snow_depth_value_cm)
+
+    if station_time_series.count() < streak_min_consecutive:
+        return None
+
+    if np.ma.max(station_time_series) <= streak_value_threshold:
+        return None
+    
+    if (np.ma.max(station_time_series) -
+        np.ma.min(station_time_series)) < streak_value_threshold:
+        return True
+    else:
+        return False
+
+
+def obs_rate_category(obs, min_sub_period_proportion=0.5, verbose=False):
+    """
+    Given a list of hourly observations in the form of a numpy masked
+    array, determine the "rate category" that indicates how frequently
+    observations are available, using the following five categories:
+
+    1. sporadic (very few observations)
+    2. quasi-daily (reporting rate >= 1 observation every 4 days)
+    3. daily (reporting rate >= 3 observations every 4 days)
+    4. synoptic (reporting rate >= 6 observations per day)
+    5. hourly (reporting rate >= 18 observations per day)
+
+    A given criteron must be met on average, but also consistently,
+    or the next "lower" criterion is considered.
+    """
+    qa_period_hours = len(obs)
+
+    # ind = np.where(obs.mask == False)
+    # num_reports = len(ind[0])
+    # if num_reports == 0:
+    num_reports = obs.count()
+    if num_reports == 0:
+        return None
+
+    ave_reporting_rate = \
+        float(num_reports) / float(qa_period_hours) * 24.0
+    if verbose:
+        print('average reporting rate: {} obs/day'.format(ave_reporting_rate))
+
+    reporting_rate_threshold = [0.0, 0.25, 0.75, 6.0, 18.0]
+
+    reporting_rate_name = ['sporadic',
+                           'quasi-daily',
+                           'daily',
+                           'synoptic',
+                           'hourly']
+    demoted = False
+    found_a_category = False
+
+    for rc, r0 in enumerate(sorted(reporting_rate_threshold, reverse=True)):
+
+        if ave_reporting_rate < r0:
+            continue
+
+        # if verbose:
+        #     print('checking for rate >= {}'.format(r0))
+
+        # Determine the number of individual sub periods where the criterion
+        # is met.
+        if (r0 > 0.0):
+            qa_sub_period_hours = int(max(24.0 / r0, 24.0))
+        else:
+            qa_sub_period_hours = qa_period_hours
+        num_qa_sub_periods = int(np.floor(qa_period_hours /
+                                             qa_sub_period_hours))
+        num_sub_periods_met = 0
+        for spc in range(num_qa_sub_periods):
+            oc1 = spc * qa_sub_period_hours
+            oc2 = oc1 + qa_sub_period_hours
+            qa_sub_period_obs = obs[oc1:oc2]
+            # The mask is a scalar (nomask) if no values are masked, in
+            # which case each sub-period counts as having one report.
+            qa_sub_period_num_reports = \
+                len(np.where(np.atleast_1d(qa_sub_period_obs.mask ==
+                                           False))[0])
+            qa_sub_period_rate = \
+                float(qa_sub_period_num_reports) / \
+                float(qa_sub_period_hours) * 24.0
+            if (qa_sub_period_rate >= r0):
+                num_sub_periods_met += 1
+        # if verbose:
+        #     print('met criteria for {} of {} sub-periods'.
+        #           format(num_sub_periods_met, num_qa_sub_periods))
+        if num_sub_periods_met < \
+           (min_sub_period_proportion * num_qa_sub_periods):
+            # if verbose:
+            #     print('that is less than {}%; '.
+            #           format(min_sub_period_proportion * 100) + 
+            #           'will check next lower frequency')
+            # print('  no - ' + 
+            #       'met criteria for only {} '.format(num_sub_periods_met) +
+            #       'of {} sub-periods'.format(num_qa_sub_periods))
+            demoted = True
+        else:
+            # if verbose:
+            #     print('that is >= {}% - consistently reports >= {} obs/day'.
+            #           format(min_sub_period_proportion * 100,
+            #                  r0))
+            # print('  yes')
+            found_a_category = True
+            break
+
+    if found_a_category:
+        # print('{} reports, '.format(num_reports) +
+        #       'reporting rate {} '.format(r0) + 
+        #       '({})'.format(reporting_rate_name[len(reporting_rate_name) - 1 - rc]))
+        # print('demoted ', demoted)
+        return len(reporting_rate_name) - 1 - rc
+    else:
+        # print('FAILED')
+        return None
+
+    return None
+
+
+def qc_durre_snwd_gap(snow_depth_value_cm,
+                      prev_sd_value_cm,
+                      prev_sd_qc,
+                      ref_ceiling_cm=None,
+                      ref_default_cm=None,
+                      verbose=None):
+    """
+    Outlier checks:
+    Gap check for snow depth.
+    If ref_ceiling_cm and ref_default_cm are included, then when the default
+    reference value (median_obs) exceeds ref_ceiling_cm, it is replaced by the
+    value in the station_time_series that is nearest to ref_default_cm. The
+    purpose of this option is to override median_obs values that are based on
+    dubious large values of snow depth, which often occur at automated sites.
+    """
+
+    # First value of reporting_rate_threshold needs to be zero!
+    reporting_rate_threshold = [0.0, 0.25, 0.75, 6.0, 18.0]
+
+    gap_threshold_cm = [100.0,
+                        75.0,
+                        60.0,
+                        45.0,
+                        30.0]
+
+    reporting_rate_name = ['sporadic',
+                           'quasi-daily',
+                           'daily',
+                           'synoptic',
+                           'hourly']
+
+    # Mask previous snow depth data that have any QC flags set.
+    prev_sd_value_cm = np.ma.masked_where(prev_sd_qc != 0,
+                                          prev_sd_value_cm)
+
+    # Assemble previous and current data into one time series.
+    # Note that this guarantees that station_time_series will have at least
+    # one unmasked value (the observation being QCed, at the end), even if all
+    # the others are masked.
+    station_time_series = np.ma.append(prev_sd_value_cm, snow_depth_value_cm)
+
+    # Note: add reporting_rate_threshold, gap_threshold_cm,
+    # and reporting_rate_name as INPUTS to obs_rate_category,
+    # perhaps as elements in a dictionary. Currently
+    # reporting_rate_threshold and reporting_rate_name are
+    # independently defined in obs_rate_category and that is
+    # not great.
+    rc = obs_rate_category(station_time_series)
+
+    # TODO: make sure this is sufficient... ideally there would be no way to
+    # get None back from obs_rate_category.
+    if rc is None:
+        if verbose:
+            print('WARNING - no match for observation rate.',
+                  file=sys.stderr)
+        return None
+
+    # Sort observations to simulate a cumulative distribution function.
+    sort_ind = station_time_series.argsort()
+    obs_sorted = station_time_series[sort_ind]
+    median_obs = np.ma.median(station_time_series)
+
+    # Initialize the reference value to the median.
+    ref_obs_init = median_obs
+
+    if ref_ceiling_cm is not None and \
+       ref_default_cm is not None:
+        # Replace ref_obs_init with the time series element nearest in value
+        # to ref_default_cm (typically the climatological median), if
+        # ref_obs_init exceeds the ref_ceiling_cm.
+        if ref_obs_init > ref_ceiling_cm:
+            ind = (np.abs(station_time_series - ref_default_cm)).argmin()
+            ref_obs_init = station_time_series[ind]
+            if verbose:
+                print('INFO: replacing median {} '.format(median_obs) +
+                      'with value {} '.format(ref_obs_init) +
+                      '(observation nearer to climatology) in gap check.')
+
+    # Initialize list of flagged reports.
+    ts_flag_ind = []
+    ref_obs = []
+
+    # Upper gap check.
+
+    # Initialize the reference value.
+    prev_obs = ref_obs_init
+
+    for oc in np.where((obs_sorted.mask == False) &
+                       (obs_sorted >= ref_obs_init))[0]:
+
+        if (obs_sorted[oc] - prev_obs) > gap_threshold_cm[rc]:
+
+            # This and all following observations on this side of obs_sorted
+            # will be flagged, if they fit into the database.
+
+            # Identify location of observation in time series.
+            ts_ind = sort_ind[oc]
+
+            ts_flag_ind.append(ts_ind)
+            ref_obs.append(prev_obs)
+
+        else:
+            prev_obs = obs_sorted[oc]
+
+
+    # Lower gap check.
+
+    # Initialize the reference value.
+    prev_obs = ref_obs_init
+
+    for oc in np.flipud(np.where((obs_sorted.mask == False) &
+                                 (obs_sorted < ref_obs_init))[0]):
+
+        if (prev_obs - obs_sorted[oc]) > gap_threshold_cm[rc]:
+
+            # This and all following observations on this side of obs_sorted
+            # will be flagged, if they fit into the database.
+
+            # Identify location of observation in time series.
+            ts_ind = sort_ind[oc]
+
+            ts_flag_ind.append(ts_ind)
+            ref_obs.append(prev_obs)
+
+        else:
+            prev_obs = obs_sorted[oc]
+
+    return ts_flag_ind, ref_obs
+
+
+def qc_durre_snwd_tair(snow_depth_value_cm,
+                       prev_sd_value_cm,
+                       prev_sd_qc,
+                       prev_at_value_deg_c):
+    """
+    Internal and temporal consistency checks on temperature
+    (Durre 2010, Table 3):
+    Snow-temperature consistency check,
+    variant "SNWD" (for changes in snow depth.)
+    """
+
+    # In Durre (2010), the test is described this way:
+    #
+    # SNWD(0) - SNWD(-1) >= 0 and min[TMIN(-1:1)] >= 7 deg C
+    #
+    # In this adaptation the snow depth difference is between site_snwd_val_cm
+    # and the latest unmasked value in site_prev_snwd_val, and the flag is
+    # returned as True (flagged) if an increase in snow depth between those
+    # adjacent depth reports is accompanied by a minimum observed temperature
+    # (over the same time period) >= 7 degrees Celsius.
+
+    # Mask previous snow depth data that have any QC flags set.
+    prev_sd_value_cm = np.ma.masked_where(prev_sd_qc != 0,
+                                          prev_sd_value_cm)
+
+    # Count unmasked previous snow depth data.
+    num_unmasked_prev_snwd = prev_sd_value_cm.count()
+
+    if num_unmasked_prev_snwd == 0:
+        return None, None
+
+    # Locate the snow depth observation adjacent to the one being QCed.
+    ref_ind = np.max(np.where(prev_sd_value_cm.mask == False))
+
+    # Get all temperatures between the above observation and the one being
+    # QCed.
+    contextual_at_values_deg_c = prev_at_value_deg_c[ref_ind:]
+    if contextual_at_values_deg_c.count() < 2:
+        return None, None
+
+    if snow_depth_value_cm <= prev_sd_value_cm[ref_ind]:
+        return False, ref_ind
+
+    if contextual_at_values_deg_c.min() >= 7.0:
+        return True, ref_ind
+    else:
+        return False, ref_ind
+
+
+def qc_durre_snwd_snfl(site_snwd_val_cm,
+                       site_prev_snwd_val,
+                       prev_sd_qc,
+                       site_snfl_val_cm):
+    """
+    Internal and temporal consistency checks (Durre 2010, Table 3):
+    Snowfall--snow depth consistency check
+    site_snwd_val_cm - snow depth value being QCed
+    site_prev_snwd_val - previous snow depth values (time series)
+    prev_sd_qc - QC flags for previous snow depth values (time series)
+    site_snfl_val_cm - snowfall accumulation
+    """
+
+    # Forgiveness for snow depth change exceeding reported snowfall;
+    # 6.0 cm = 2.36 inches, which will prevent any round-off problems with
+    # 2 inch snowfall reports.
+    snfl_forgiveness_cm = 6.0
+
+    # Mask previous snow depth data that have any QC flags set.
+    site_prev_snwd_val = np.ma.masked_where(prev_sd_qc != 0,
+                                            site_prev_snwd_val)
+
+    # Count unmasked previous snow depth data.
+    num_unmasked_prev_snwd = site_prev_snwd_val.count()
+
+    if num_unmasked_prev_snwd == 0:
+        return None, None
+
+    # Locate the snow depth observation furthest from the one being QCed.
+    ref_ind = np.min(np.where(site_prev_snwd_val.mask == False))
+
+    # print(type(site_snwd_val_cm))
+    # print(type(site_prev_snwd_val[ref_ind]))
+    # print(type(site_snfl_val_cm))
+    if site_snwd_val_cm - site_prev_snwd_val[ref_ind] > \
+       site_snfl_val_cm + snfl_forgiveness_cm:
+        return True, ref_ind
+    else:
+        return False, ref_ind
+
+
+def qc_durre_snwd_prcp(site_snwd_val_cm,
+                       site_prev_snwd_val,
+                       prev_sd_qc,
+                       site_prcp_val_mm):
+    '''
+    Internal and temporal consistency checks (Durre 2010, Table 3):
+    Precipitation--snow depth consistency check; i.e. "SNWD increase with 0
+    PRCP".
+    site_snwd_val_cm - snow depth value being QCed
+    site_prev_snwd_val - previous snow depth values (time series)
+    prev_sd_qc - QC flags for previous snow depth values (time series)
+    site_prcp_val_mm - precipitation accumulation
+    '''
+
+    # In Durre (2010), the test is described this way:
+    #
+    # SNWD(0) - SNWD(-1) >= 100 mm and MAX[PRCP(-1:1)] = 0
+    #
+    # In this adaptation the snow depth difference is between site_snwd_val_cm
+    # and the earliest unmasked value in site_prev_snwd_val, and there is only
+    # one precipitation value: site_prcp_val_mm, which should correspond
+    # roughly to the time period covered by site_prev_snwd_val and
+    # site_snwd_val_cm. Instead of a strict zero threshold for precipitation
+    # this test uses a potentially nonzero prcp_accum_threshold_mm
+
+    snwd_change_threshold_cm = 10.0
+    prcp_accum_threshold_mm = 0.1
+
+    # Mask previous snow depth data that have any QC flags set.
+    site_prev_snwd_val = np.ma.masked_where(prev_sd_qc != 0,
+                                            site_prev_snwd_val)
+
+    # Count unmasked previous snow depth data.
+    num_unmasked_prev_snwd = site_prev_snwd_val.count()
+
+    if num_unmasked_prev_snwd == 0:
+        return None, None
+
+    # Locate the snow depth observation furthest from the one being QCed.
+    ref_ind = np.min(np.where(site_prev_snwd_val.mask == False))
+
+    if site_snwd_val_cm - site_prev_snwd_val[ref_ind] >= \
+       snwd_change_threshold_cm and \
+       site_prcp_val_mm < prcp_accum_threshold_mm:
+        return True, ref_ind
+    else:
+        return False, ref_ind
+
+
+def qc_durre_snwd_prcp_ratio(site_snwd_val_cm,
+                             site_prev_snwd_val_cm,
+                             prev_sd_qc,
+                             site_prcp_val_mm):
+    '''
+    Internal and temporal consistency checks (Durre 2010, Table 3):
+    Precipitation--snow depth consistency check; i.e. "SNWD/PRCP ratio".
+    site_snwd_val_cm - snow depth value being QCed
+    site_prev_snwd_val_cm - previous snow depth values (time series)
+    prev_sd_qc - QC flags for previous snow depth values (time series)
+    site_prcp_val_mm - precipitation accumulation
+    '''
+
+    # In Durre (2010), the test is described this way:
+    # 
+    # SNWD(0) - SNWD(-1) >= 200 mm and 
+    # SNWD(0) - SNWD(-1) >= 100[PRCP(0) + PRCP(-1)] and
+    # SNWD(0) - SNWD(-1) >= 100[PRCP(0) + PRCP(1)] and
+    #
+    # In this adaptation the snow depth difference is between site_snwd_val_cm
+    # and the earliest unmasked value in site_prev_snwd_val_cm, and there is
+    # only one precipitation value: site_prcp_val_mm, which should correspond
+    # roughly to the time period covered by site_prev_snwd_val_cm and
+    # site_snwd_val_cm.
+
+    snwd_change_threshold_cm = 20.0
+    snwd_prcp_ratio_threshold = 100
+
+    # Mask previous snow depth data that have any QC flags set.
+    site_prev_snwd_val_cm = np.ma.masked_where(prev_sd_qc != 0,
+                                               site_prev_snwd_val_cm)
+
+    # Count unmasked previous snow depth data.
+    num_unmasked_prev_snwd = site_prev_snwd_val_cm.count()
+
+    if num_unmasked_prev_snwd == 0:
+        return None, None
+
+    # Locate the snow depth observation furthest from the one being QCed.
+    ref_ind = np.min(np.where(site_prev_snwd_val_cm.mask == False))
+
+    # No flag for zero precipitation; that should be handled by a separate
+    # test.
+    if site_prcp_val_mm == 0.0:
+        return False, ref_ind
+
+    site_snwd_change_cm = site_snwd_val_cm - site_prev_snwd_val_cm[ref_ind]
+    if site_snwd_change_cm >= snwd_change_threshold_cm and \
+       10.0 * site_snwd_change_cm / site_prcp_val_mm >= \
+       snwd_prcp_ratio_threshold:
+        return True, ref_ind
+    else:
+        return False, ref_ind
+
+
+def qc_durre_snwd_tair_spatial(snow_depth_value_cm,
+                               prev_sd_value_cm,
+                               prev_sd_qc,
+                               nhood_tair_deg_c):
+    """
+    Spatial snow-temperature consistency check for changes in snow depth,
+    using neighborhood temperature reports.
+    nhood_tair_deg_c rows represent neighbors, columns represent times.
+    """
+
+    # Determine the number of hours of preceding data.
+    num_prev_hours = prev_sd_value_cm.shape[0]
+
+    # Verify that the air temperature data are consistent in the time
+    # dimension.
+    if nhood_tair_deg_c.shape[1] != num_prev_hours + 1:
+        print('ERROR: snow depth and air temperature data have ' +
+              'inconsistent time dimensions.',
+              file=sys.stderr)
+        sys.exit(1)
+
+    # Mask previous snow depth data that have any QC flags set.
+    prev_sd_value_cm = np.ma.masked_where(prev_sd_qc != 0,
+                                          prev_sd_value_cm)
+
+    # Count unmasked previous snow depth data.
+    num_unmasked_prev_snwd = prev_sd_value_cm.count()
+
+    if num_unmasked_prev_snwd == 0:
+        return None, None
+
+    # Locate the snow depth observation adjacent to the one being QCed.
+    ref_ind = np.max(np.where(prev_sd_value_cm.mask == False))
+
+    # Get all neighboring temperatures between the above observation and the
+    # one being QCed.
+    contextual_nhood_tair_deg_c = nhood_tair_deg_c[ref_ind:]
+
+    # Note that the subsetting above could result in some stations in the
+    # neighborhood providing us with no data, which would effectively reduce
+    # the size of the neighborhood.
+    if contextual_nhood_tair_deg_c.count() < 2:
+        return None, None
+
+    if snow_depth_value_cm <= prev_sd_value_cm[ref_ind]:
+        return False, ref_ind
+
+    if contextual_nhood_tair_deg_c.min() >= 7.0:
+        return True, ref_ind
+    else:
+        return False, ref_ind
+
+
+def qc_durre_swe_wre(value_mm):
+    """
+    Basic integrity checks:
+    swe world record exceedance.
+    Uses the snow depth threshold from Durre (2010), but in mm instead of cm
+    (implicit 10:1 ratio).
+    """
+    threshold_value = 1146.0
+    if value_mm < 0.0 or value_mm > threshold_value:
+        return True
+    else:
+        return False
+
+
+def qc_durre_swe_change_wre(swe_value_mm,
+                            prev_swe_value_mm,
+                            prev_swe_qc):
+    """
+    Basic integrity checks:
+    swe increase world record exceedance.
+    Uses the snow depth threshold from Durre (2010), but in mm instead of cm
+    (implicit 10:1 ratio).
+    """
+
+    threshold_swe_increase_mm = 192.5
+
+    # Mask previous swe data that have any QC flags set.
+    prev_swe_value_mm = np.ma.masked_where(prev_swe_qc != 0,
+                                           prev_swe_value_mm)
+
+    num_unmasked_prev_swe = prev_swe_value_mm.count()
+
+    if num_unmasked_prev_swe == 0:
+        # Test is not possible.
+        return None, None
+
+    # Find the minimum observed preceding swe value for comparison with the
+    # observation being checked.
+    ref_ind = np.ma.argmin(prev_swe_value_mm)
+
+    if swe_value_mm - prev_swe_value_mm[ref_ind] > \
+       threshold_swe_increase_mm:
+        return True, ref_ind
+    else:
+        return False, ref_ind
+
+
+def qc_durre_swe_streak(swe_value_mm,
+                        prev_swe_value_mm,
+                        prev_swe_qc,
+                        streak_value_threshold=None):
+    """
+    Basic integrity checks:
+    swe streak check.
+    """
+    if streak_value_threshold is None:
+        streak_value_threshold = 0.1
+    streak_min_consecutive = 10
+
+    # Mask previous swe data that have any QC flags set.
+    prev_swe_value_mm = np.ma.masked_where(prev_swe_qc != 0,
+                                           prev_swe_value_mm)
+
+    # Assemble previous and current data into one time series.
+    station_time_series = np.ma.append(prev_swe_value_mm, swe_value_mm)
+
+    if station_time_series.count() < streak_min_consecutive:
+        return None
+
+    if np.ma.max(station_time_series) <= streak_value_threshold:
+        return None
+    
+    if (np.ma.max(station_time_series) -
+        np.ma.min(station_time_series)) < streak_value_threshold:
+        return True
+    else:
+        return False
+
+
+def qc_durre_swe_gap(swe_value_mm,
+                     prev_swe_value_mm,
+                     prev_swe_qc,
+                     ref_ceiling_mm=None,
+                     ref_default_mm=None,
+                     verbose=None):
+    """
+    Outlier checks:
+    Gap check for SWE.
+    Uses the same thresholds as qc_durre_snwd_gap, but in mm instead of cm
+    (implicit 10:1 ratio).
+    If ref_ceiling_mm and ref_default_mm are included, then when the default
+    reference value (median_obs) exceeds ref_ceiling_mm, it is replaced by the
+    value in the station_time_series that is nearest to ref_default_mm. The
+    purpose of this option is to override median_obs values that are based on
+    dubious large values of SWE, which often occur at automated sites.
+    """
+
+    # First value of reporting_rate_threshold needs to be zero!
+    reporting_rate_threshold = [0.0, 0.25, 0.75, 6.0, 18.0]
+
+    gap_threshold_mm = [100.0,
+                        75.0,
+                        60.0,
+                        45.0,
+                        30.0]
+
+    reporting_rate_name = ['sporadic',
+                           'quasi-daily',
+                           'daily',
+                           'synoptic',
+                           'hourly']
+
+    # Mask previous SWE data that have any QC flags set.
+    prev_swe_value_mm = np.ma.masked_where(prev_swe_qc != 0,
+                                           prev_swe_value_mm)
+
+    # Assemble previous and current data into one time series.
+    # Note that this guarantees that station_time_series will have at least
+    # one unmasked value (the observation being QCed, at the end), even if all
+    # the others are masked.
+    station_time_series = np.ma.append(prev_swe_value_mm, swe_value_mm)
+
+    # Note: add reporting_rate_threshold, gap_threshold_mm,
+    # and reporting_rate_name as INPUTS to obs_rate_category,
+    rc = obs_rate_category(station_time_series)
+
+    if rc is None:
+        if verbose:
+            print('WARNING - no match for observation rate.',
+                  file=sys.stderr)
+        return None
+
+    # Sort observations to simulate a cumulative distribution function.
+    sort_ind = station_time_series.argsort()
+    obs_sorted = station_time_series[sort_ind]
+    median_obs = np.ma.median(station_time_series)
+
+    # Initialize the reference value to the median.
+    ref_obs_init = median_obs
+
+    if ref_ceiling_mm is not None and \
+       ref_default_mm is not None:
+        # Replace ref_obs_init with the time series element nearest in value
+        # to ref_default_mm (typically the climatological median), if
+        # ref_obs_init exceeds the ref_ceiling_mm.
+        if ref_obs_init > ref_ceiling_mm:
+            ind = (np.abs(station_time_series - ref_default_mm)).argmin()
+            ref_obs_init = station_time_series[ind]
+            if verbose:
+                print('INFO: replacing median {} '.format(median_obs) +
+                      'with value {} '.format(ref_obs_init) +
+                      '(observation nearer to climatology) in gap check.')
+
+    # Initialize list of flagged reports.
+    ts_flag_ind = []
+    ref_obs = []
+
+    # Upper gap check.
+
+    # Initialize the reference value.
+    prev_obs = ref_obs_init
+
+    for oc in np.where((obs_sorted.mask == False) &
+                       (obs_sorted >= ref_obs_init))[0]:
+
+        if (obs_sorted[oc] - prev_obs) > gap_threshold_mm[rc]:
+
+            # This and all following observations on this side of obs_sorted
+            # will be flagged, if they fit into the database.
+
+            # Identify location of observation in time series.
+            ts_ind = sort_ind[oc]
+
+            ts_flag_ind.append(ts_ind)
+            ref_obs.append(prev_obs)
+
+        else:
+            prev_obs = obs_sorted[oc]
+
+
+    # Lower gap check.
+
+    # Initialize the reference value.
+    prev_obs = ref_obs_init
+
+    for oc in np.flipud(np.where((obs_sorted.mask == False) &
+                                 (obs_sorted < ref_obs_init))[0]):
+
+        if (prev_obs - obs_sorted[oc]) > gap_threshold_mm[rc]:
+
+            # This and all following observations on this side of obs_sorted
+            # will be flagged, if they fit into the database.
+
+            # Identify location of observation in time series.
+            ts_ind = sort_ind[oc]
+
+            ts_flag_ind.append(ts_ind)
+            ref_obs.append(prev_obs)
+
+        else:
+            prev_obs = obs_sorted[oc]
+
+    return ts_flag_ind, ref_obs
+
+
+def qc_durre_swe_prcp(site_swe_val_mm,
+                      site_prev_swe_val,
+                      prev_swe_qc,
+                      site_prcp_val_mm):
+    """
+    Precipitation--SWE consistency check; i.e. "SWE increase with 0
+    PRCP".
+    site_swe_val_mm - SWE value being QCed
+    site_prev_swe_val - previous SWE values (time series)
+    prev_swe_qc - QC flags for previous SWE values (time series)
+    site_prcp_val_mm - precipitation accumulation
+    """
+
+    swe_change_threshold_mm = 10.0
+    prcp_accum_threshold_mm = 0.1
+
+    # Mask previous swe data that have any QC flags set.
+    site_prev_swe_val = np.ma.masked_where(prev_swe_qc != 0,
+                                           site_prev_swe_val)
+
+    # Count unmasked previous swe data.
+    num_unmasked_prev_swe = site_prev_swe_val.count()
+
+    if num_unmasked_prev_swe == 0:
+        return None, None
+
+    # Locate the swe observation furthest from the one being QCed.
+    ref_ind = np.min(np.where(site_prev_swe_val.mask == False))
+
+    if site_swe_val_mm - site_prev_swe_val[ref_ind] >= \
+       swe_change_threshold_mm and \
+       site_prcp_val_mm < prcp_accum_threshold_mm:
+        return True, ref_ind
+    else:
+        return False, ref_ind
+
+
+def qc_durre_swe_prcp_ratio(site_swe_val_mm,
+                             site_prev_swe_val_mm,
+                             prev_swe_qc,
+                             site_prcp_val_mm):
+    '''
+    Internal and temporal consistency checks (Durre 2010, Table 3)
+    Precipitation - snow water equivalent ("SWE/PRCP ratio") consistency
+    check, adapted from SNWD/PRCP ratio" test.
+    '''
+
+    swe_change_threshold_mm = 20.0
+    swe_prcp_ratio_threshold = 100
+
+    # Mask previous SWE data that have any QC flags set.
+    site_prev_swe_val_mm = np.ma.masked_where(prev_swe_qc != 0,
+                                              site_prev_swe_val_mm)
+
+    # Count unmasked previous swe data.
+    num_unmasked_prev_swe = site_prev_swe_val_mm.count()
+
+    if num_unmasked_prev_swe == 0:
+        return None, None
+
+    # Locate the SWE observation furthest from the one being QCed.
+    ref_ind = np.min(np.where(site_prev_swe_val_mm.mask == False))
+
+    # No flag for zero precipitation; that should be handled by a separate
+    # test.
+    if site_prcp_val_mm == 0.0:
+        return False, ref_ind
+
+    site_swe_change_mm = site_swe_val_mm - site_prev_swe_val_mm[ref_ind]
+    if site_swe_change_mm >= swe_change_threshold_mm and \
+       site_swe_change_mm / site_prcp_val_mm >= \
+       swe_prcp_ratio_threshold:
+        return True, ref_ind
+    else:
+        return False, ref_ind
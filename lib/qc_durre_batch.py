@@ -0,0 +1,567 @@
+import sys
+import numpy as np
+
+"""
+Durre (2010) QC tests for snow depth and SWE, applied to all stations at
+once.
+take_rows
+test_result
+gap_flag_lists
+obs_rate_category
+qc_durre_snwd_wre
+qc_durre_snwd_change_wre
+qc_durre_snwd_streak
+qc_durre_snwd_gap
+qc_durre_snwd_tair
+qc_durre_snwd_snfl
+qc_durre_snwd_prcp
+qc_durre_snwd_prcp_ratio
+qc_durre_snwd_tair_spatial
+qc_durre_swe_wre
+qc_durre_swe_change_wre
+qc_durre_swe_streak
+qc_durre_swe_gap
+qc_durre_swe_prcp
+qc_durre_swe_prcp_ratio
+
+Each function here evaluates the test of the same name in qc_durre for
+a whole hour of reports. Where the scalar test takes one station's value
+and 1-d history, these take a [station] array of values and [station,
+hour] masked arrays of history (with rows aligned to the values), and
+return flags and reference indices for every station. Results are
+identical to those of the scalar tests, including their handling of
+masked values and ties.
+
+Flags are returned as masked boolean arrays, masked for stations where
+the test is not possible (where the scalar test returns None).
+Reference indices are masked integer arrays, masked likewise.
+"""
+
+# Reporting rates (observations per day) separating the categories of
+# obs_rate_category: sporadic, quasi-daily, daily, synoptic and hourly.
+REPORTING_RATE_THRESHOLD = [0.0, 0.25, 0.75, 6.0, 18.0]
+
+# Gap check thresholds (cm of snow depth, mm of SWE) for each reporting
+# rate category.
+GAP_THRESHOLD = [100.0, 75.0, 60.0, 45.0, 30.0]
+
+
+def take_rows(values, rows):
+    """
+    Select rows of a [station, ...] array, with rows < 0 giving fully
+    masked rows (for stations absent from values).
+    """
+    rows = np.asarray(rows)
+    absent = rows < 0
+    taken = np.ma.asarray(values)[np.where(absent, 0, rows)]
+    if len(taken) == 0:
+        return(np.ma.masked_array(taken, mask=True))
+    mask = np.ma.getmaskarray(taken).copy()
+    mask[absent] = True
+    return(np.ma.masked_array(taken.data, mask=mask))
+
+
+def test_result(flag, ref_ind, row):
+    """
+    Get the result of a batch test for one station as the scalar test
+    returns it: (None, None) if the test was not possible, otherwise a
+    bool flag and an integer reference index.
+    """
+    if flag[row] is np.ma.masked:
+        return(None, None)
+    if ref_ind is None:
+        return(bool(flag[row]), None)
+    return(bool(flag[row]), int(ref_ind[row]))
+
+
+def _mask_flagged(prev_value, prev_qc):
+    """
+    Mask previous values that have any QC flags set.
+    """
+    return(np.ma.masked_where(prev_qc != 0, prev_value))
+
+
+def _value_column(value):
+    """
+    Turn a [station] array of values into a [station, 1] masked array.
+    """
+    return(np.ma.asarray(value).reshape(-1, 1))
+
+
+def _is_true(condition):
+    """
+    Evaluate a masked comparison as the scalar tests do in an "if",
+    where a masked result counts as False.
+    """
+    return(np.ma.filled(condition, False).astype(bool))
+
+
+def _first_unmasked(values):
+    """
+    Index of the first unmasked element of each row, and whether there
+    is one.
+    """
+    reported = ~np.ma.getmaskarray(values)
+    return(np.argmax(reported, axis=1), reported.any(axis=1))
+
+
+def _last_unmasked(values):
+    """
+    Index of the last unmasked element of each row, and whether there is
+    one.
+    """
+    reported = ~np.ma.getmaskarray(values)
+    num_hours = reported.shape[1]
+    return(num_hours - 1 - np.argmax(reported[:, ::-1], axis=1),
+           reported.any(axis=1))
+
+
+def _ref_values(values, ref_ind):
+    """
+    Values at ref_ind in each row.
+    """
+    return(np.ma.getdata(values)[np.arange(values.shape[0]), ref_ind])
+
+
+def _result(flag, possible, ref_ind=None):
+    """
+    Package flags (and reference indices) as masked arrays, masked where
+    a test is not possible.
+    """
+    flag = np.ma.masked_array(flag, mask=~possible)
+    if ref_ind is None:
+        return(flag)
+    return(flag, np.ma.masked_array(ref_ind, mask=~possible))
+
+
+def _wre(value, threshold_value):
+    return(_is_true(value < 0.0) | _is_true(value > threshold_value))
+
+
+def _change_wre(value, prev_value, prev_qc, threshold_increase):
+    prev_value = _mask_flagged(prev_value, prev_qc)
+    possible = prev_value.count(axis=1) > 0
+    ref_ind = np.asarray(np.ma.argmin(prev_value, axis=1))
+    flag = _is_true(value - _ref_values(prev_value, ref_ind) >
+                    threshold_increase)
+    return(_result(flag & possible, possible, ref_ind))
+
+
+def _streak(value, prev_value, prev_qc, streak_value_threshold):
+    if streak_value_threshold is None:
+        streak_value_threshold = 0.1
+    streak_min_consecutive = 10
+
+    prev_value = _mask_flagged(prev_value, prev_qc)
+    time_series = np.ma.concatenate([prev_value, _value_column(value)],
+                                    axis=1)
+    max_value = time_series.max(axis=1)
+    min_value = time_series.min(axis=1)
+    possible = (time_series.count(axis=1) >= streak_min_consecutive) & \
+               ~_is_true(max_value <= streak_value_threshold)
+    flag = _is_true((max_value - min_value) < streak_value_threshold)
+    return(_result(flag & possible, possible))
+
+
+def obs_rate_category(obs, min_sub_period_proportion=0.5):
+    """
+    Determine the reporting rate category (see obs_rate_category in
+    qc_durre) of each row of a [station, hour] masked array. Rows with
+    no observations are masked.
+    """
+    num_stations, qa_period_hours = obs.shape
+    reported = ~np.ma.getmaskarray(obs)
+    num_reports = reported.sum(axis=1)
+    complete = num_reports == qa_period_hours
+    ave_reporting_rate = \
+        num_reports.astype(float) / float(qa_period_hours) * 24.0
+
+    category = np.zeros(num_stations, dtype=int)
+    found = np.zeros(num_stations, dtype=bool)
+    num_categories = len(REPORTING_RATE_THRESHOLD)
+    for rc, r0 in enumerate(sorted(REPORTING_RATE_THRESHOLD, reverse=True)):
+        if r0 > 0.0:
+            qa_sub_period_hours = int(max(24.0 / r0, 24.0))
+        else:
+            qa_sub_period_hours = qa_period_hours
+        num_qa_sub_periods = int(np.floor(qa_period_hours /
+                                          qa_sub_period_hours))
+        sub_period_reports = \
+            reported[:, 0:num_qa_sub_periods * qa_sub_period_hours]. \
+            reshape(num_stations, num_qa_sub_periods, qa_sub_period_hours). \
+            sum(axis=2)
+        # The scalar version counts reports in a sub-period with
+        # np.where(obs.mask == False), which finds a single report when
+        # no element of obs is masked (NumPy reduces its mask to nomask).
+        sub_period_reports[complete] = 1
+        sub_period_rate = sub_period_reports.astype(float) / \
+                          float(qa_sub_period_hours) * 24.0
+        num_sub_periods_met = (sub_period_rate >= r0).sum(axis=1)
+        met = (ave_reporting_rate >= r0) & \
+              ~(num_sub_periods_met <
+                (min_sub_period_proportion * num_qa_sub_periods))
+        new = met & ~found
+        category[new] = num_categories - 1 - rc
+        found = found | met
+
+    return(np.ma.masked_array(category, mask=~(found & (num_reports > 0))))
+
+
+def _scan_gaps(sorted_value, on_side, ref_value, gap_threshold):
+    """
+    Apply one side of the gap check to sorted values (ordered away from
+    ref_value). Values on_side are visited in order; the first to lie
+    more than gap_threshold beyond the last value accepted (initially
+    ref_value) is flagged along with all that follow it. Returns the
+    flags and the reference value for each row.
+    """
+    num_stations, num_hours = sorted_value.shape
+    position = np.broadcast_to(np.arange(num_hours), sorted_value.shape)
+    # Most recent value visited before each position, or ref_value.
+    last_visited = np.maximum.accumulate(np.where(on_side, position, -1),
+                                         axis=1)
+    prev_position = np.full(sorted_value.shape, -1)
+    prev_position[:, 1:] = last_visited[:, :-1]
+    prev_value = np.where(prev_position >= 0,
+                          np.take_along_axis(sorted_value,
+                                             np.maximum(prev_position, 0),
+                                             axis=1),
+                          ref_value[:, np.newaxis])
+    with np.errstate(invalid='ignore'):
+        exceeds = on_side & \
+                  (np.abs(sorted_value - prev_value) > gap_threshold[:,
+                                                                     np.newaxis])
+    any_gap = exceeds.any(axis=1)
+    first_gap = np.where(any_gap, np.argmax(exceeds, axis=1), num_hours)
+    flagged = on_side & (position >= first_gap[:, np.newaxis])
+    side_ref = prev_value[np.arange(num_stations),
+                          np.minimum(first_gap, num_hours - 1)]
+    return(flagged, side_ref)
+
+
+def _gap(value, prev_value, prev_qc, ref_ceiling, ref_default):
+    prev_value = _mask_flagged(prev_value, prev_qc)
+    time_series = np.ma.concatenate([prev_value, _value_column(value)],
+                                    axis=1)
+    num_stations, num_hours = time_series.shape
+
+    rc = obs_rate_category(time_series)
+    possible = ~np.ma.getmaskarray(rc)
+    gap_threshold = np.asarray(GAP_THRESHOLD)[np.ma.filled(rc, 0)]
+
+    sort_ind = time_series.argsort(axis=1)
+    sorted_value = np.take_along_axis(np.ma.getdata(time_series), sort_ind,
+                                      axis=1)
+    sorted_mask = np.take_along_axis(np.ma.getmaskarray(time_series),
+                                     sort_ind,
+                                     axis=1)
+
+    # Initialize the reference value to the median.
+    ref_obs_init = np.ma.median(time_series, axis=1)
+
+    if ref_ceiling is not None and ref_default is not None:
+        # Replace the reference value with the element nearest in value to
+        # ref_default, where the median exceeds ref_ceiling.
+        replace = _is_true(ref_obs_init > ref_ceiling)
+        if np.any(replace):
+            nearest = np.ma.argmin(np.abs(time_series -
+                                          _value_column(ref_default)),
+                                   axis=1)
+            nearest_value = time_series[np.arange(num_stations), nearest]
+            ref_obs_init = np.ma.where(replace, nearest_value, ref_obs_init)
+
+    ref_masked = np.ma.getmaskarray(ref_obs_init)
+    ref_value = np.ma.getdata(ref_obs_init).astype(float)
+
+    with np.errstate(invalid='ignore'):
+        upper = ~sorted_mask & ~ref_masked[:, np.newaxis] & \
+                (sorted_value >= ref_value[:, np.newaxis])
+        lower = ~sorted_mask & ~ref_masked[:, np.newaxis] & \
+                (sorted_value < ref_value[:, np.newaxis])
+
+    upper_flagged, upper_ref = _scan_gaps(sorted_value, upper, ref_value,
+                                          gap_threshold)
+    lower_flagged, lower_ref = _scan_gaps(sorted_value[:, ::-1],
+                                          lower[:, ::-1],
+                                          ref_value,
+                                          gap_threshold)
+    lower_flagged = lower_flagged[:, ::-1]
+
+    upper_flagged[~possible] = False
+    lower_flagged[~possible] = False
+
+    # Flags by time index.
+    flagged = np.zeros([num_stations, num_hours], dtype=bool)
+    np.put_along_axis(flagged, sort_ind, upper_flagged | lower_flagged,
+                      axis=1)
+
+    return({'possible': possible,
+            'flagged': flagged,
+            'sort_ind': sort_ind,
+            'upper_flagged': upper_flagged,
+            'upper_ref': upper_ref,
+            'lower_flagged': lower_flagged,
+            'lower_ref': lower_ref})
+
+
+def gap_flag_lists(gap, row):
+    """
+    Get the result of a batch gap check for one station as the scalar
+    test returns it: lists of the time series indices flagged and the
+    reference value for each (upper gaps first, in ascending order of
+    value, then lower gaps in descending order), or None if the test was
+    not possible.
+    """
+    if not gap['possible'][row]:
+        return(None, None)
+    sort_ind = gap['sort_ind'][row]
+    upper = np.flatnonzero(gap['upper_flagged'][row])
+    lower = np.flatnonzero(gap['lower_flagged'][row])[::-1]
+    ts_flag_ind = list(sort_ind[upper]) + list(sort_ind[lower])
+    ref_obs = [gap['upper_ref'][row]] * len(upper) + \
+              [gap['lower_ref'][row]] * len(lower)
+    return(ts_flag_ind, ref_obs)
+
+
+def _temperature(value, prev_value, prev_qc, context_tair):
+    """
+    Shared logic of the snow-temperature consistency checks. For each
+    station, context_tair is a function of the reference index giving
+    the masked temperatures that must not all be >= 7 deg C.
+    """
+    prev_value = _mask_flagged(prev_value, prev_qc)
+    ref_ind, has_prev = _last_unmasked(prev_value)
+    tair = context_tair(ref_ind)
+    possible = has_prev & (tair.count(axis=1) >= 2)
+    increase = ~_is_true(value <= _ref_values(prev_value, ref_ind))
+    tair_min = np.min(np.ma.filled(tair.astype(float), np.inf), axis=1,
+                      initial=np.inf)
+    flag = increase & (tair_min >= 7.0)
+    return(_result(flag & possible, possible, ref_ind))
+
+
+def _earliest_ref(prev_value, prev_qc):
+    prev_value = _mask_flagged(prev_value, prev_qc)
+    ref_ind, possible = _first_unmasked(prev_value)
+    return(ref_ind, possible, _ref_values(prev_value, ref_ind))
+
+
+def _prcp(value, prev_value, prev_qc, prcp_value, change_threshold,
+          prcp_accum_threshold):
+    ref_ind, possible, ref_value = _earliest_ref(prev_value, prev_qc)
+    flag = _is_true(value - ref_value >= change_threshold) & \
+           _is_true(prcp_value < prcp_accum_threshold)
+    return(_result(flag & possible, possible, ref_ind))
+
+
+def _prcp_ratio(value, prev_value, prev_qc, prcp_value, change_threshold,
+                ratio_threshold, ratio_factor):
+    ref_ind, possible, ref_value = _earliest_ref(prev_value, prev_qc)
+    change = value - ref_value
+    no_prcp = _is_true(prcp_value == 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if ratio_factor is None:
+            ratio = change / prcp_value
+        else:
+            ratio = ratio_factor * change / prcp_value
+    flag = ~no_prcp & _is_true(change >= change_threshold) & \
+           _is_true(ratio >= ratio_threshold)
+    return(_result(flag & possible, possible, ref_ind))
+
+
+def qc_durre_snwd_wre(value_cm):
+    """
+    Snow depth world record exceedance, for a [station] array.
+    """
+    return(_wre(value_cm, 1146.0))
+
+
+def qc_durre_snwd_change_wre(snow_depth_value_cm,
+                             prev_sd_value_cm,
+                             prev_sd_qc):
+    """
+    Snow depth increase world record exceedance. Returns flags and the
+    index of the (minimum) previous value each report is compared with.
+    """
+    return(_change_wre(snow_depth_value_cm, prev_sd_value_cm, prev_sd_qc,
+                       192.5))
+
+
+def qc_durre_snwd_streak(snow_depth_value_cm,
+                         prev_sd_value_cm,
+                         prev_sd_qc,
+                         streak_value_threshold=None):
+    """
+    Snow depth streak check. Returns flags only.
+    """
+    return(_streak(snow_depth_value_cm, prev_sd_value_cm, prev_sd_qc,
+                   streak_value_threshold))
+
+
+def qc_durre_snwd_gap(snow_depth_value_cm,
+                      prev_sd_value_cm,
+                      prev_sd_qc,
+                      ref_ceiling_cm=None,
+                      ref_default_cm=None):
+    """
+    Gap check for snow depth. ref_ceiling_cm and ref_default_cm, if
+    given, are [station] arrays. Returns a dictionary describing the
+    flags for every station; its "flagged" element is a [station, hour]
+    array of flags for the time series formed by the previous values and
+    the report, and gap_flag_lists gives the result for one station in
+    the form of the scalar test.
+    """
+    return(_gap(snow_depth_value_cm, prev_sd_value_cm, prev_sd_qc,
+                ref_ceiling_cm, ref_default_cm))
+
+
+def qc_durre_snwd_tair(snow_depth_value_cm,
+                       prev_sd_value_cm,
+                       prev_sd_qc,
+                       prev_at_value_deg_c):
+    """
+    Snow-temperature consistency check. prev_at_value_deg_c holds each
+    station's air temperatures for the previous hours and the current
+    hour.
+    """
+    num_hours = prev_at_value_deg_c.shape[1]
+
+    def context_tair(ref_ind):
+        return(np.ma.masked_where(np.arange(num_hours)[np.newaxis, :] <
+                                  ref_ind[:, np.newaxis],
+                                  prev_at_value_deg_c))
+
+    return(_temperature(snow_depth_value_cm, prev_sd_value_cm, prev_sd_qc,
+                        context_tair))
+
+
+def qc_durre_snwd_snfl(site_snwd_val_cm,
+                       site_prev_snwd_val,
+                       prev_sd_qc,
+                       site_snfl_val_cm):
+    """
+    Snowfall--snow depth consistency check.
+    """
+    snfl_forgiveness_cm = 6.0
+    ref_ind, possible, ref_value = _earliest_ref(site_prev_snwd_val,
+                                                 prev_sd_qc)
+    flag = _is_true(site_snwd_val_cm - ref_value >
+                    site_snfl_val_cm + snfl_forgiveness_cm)
+    return(_result(flag & possible, possible, ref_ind))
+
+
+def qc_durre_snwd_prcp(site_snwd_val_cm,
+                       site_prev_snwd_val,
+                       prev_sd_qc,
+                       site_prcp_val_mm):
+    """
+    Precipitation--snow depth consistency check ("SNWD increase with 0
+    PRCP").
+    """
+    return(_prcp(site_snwd_val_cm, site_prev_snwd_val, prev_sd_qc,
+                 site_prcp_val_mm, 10.0, 0.1))
+
+
+def qc_durre_snwd_prcp_ratio(site_snwd_val_cm,
+                             site_prev_snwd_val_cm,
+                             prev_sd_qc,
+                             site_prcp_val_mm):
+    """
+    Precipitation--snow depth consistency check ("SNWD/PRCP ratio").
+    """
+    return(_prcp_ratio(site_snwd_val_cm, site_prev_snwd_val_cm, prev_sd_qc,
+                       site_prcp_val_mm, 20.0, 100, 10.0))
+
+
+def qc_durre_snwd_tair_spatial(snow_depth_value_cm,
+                               prev_sd_value_cm,
+                               prev_sd_qc,
+                               nhood_tair_deg_c):
+    """
+    Spatial snow-temperature consistency check. nhood_tair_deg_c is a
+    [station, neighbor, hour] masked array of neighborhood temperatures
+    for the previous hours and the current hour, with unused neighbor
+    slots masked. As in the scalar test, the reference index selects
+    neighbors (not hours) from which temperatures are considered.
+    """
+    num_prev_hours = prev_sd_value_cm.shape[1]
+    if nhood_tair_deg_c.shape[2] != num_prev_hours + 1:
+        print('ERROR: snow depth and air temperature data have ' +
+              'inconsistent time dimensions.',
+              file=sys.stderr)
+        sys.exit(1)
+    num_neighbors = nhood_tair_deg_c.shape[1]
+
+    def context_tair(ref_ind):
+        skipped = np.arange(num_neighbors)[np.newaxis, :] < \
+                  ref_ind[:, np.newaxis]
+        tair = np.ma.masked_where(np.repeat(skipped[:, :, np.newaxis],
+                                            num_prev_hours + 1,
+                                            axis=2),
+                                  nhood_tair_deg_c)
+        return(tair.reshape(tair.shape[0],
+                            num_neighbors * (num_prev_hours + 1)))
+
+    return(_temperature(snow_depth_value_cm, prev_sd_value_cm, prev_sd_qc,
+                        context_tair))
+
+
+def qc_durre_swe_wre(value_mm):
+    """
+    SWE world record exceedance, for a [station] array.
+    """
+    return(_wre(value_mm, 1146.0))
+
+
+def qc_durre_swe_change_wre(swe_value_mm,
+                            prev_swe_value_mm,
+                            prev_swe_qc):
+    """
+    SWE increase world record exceedance.
+    """
+    return(_change_wre(swe_value_mm, prev_swe_value_mm, prev_swe_qc, 192.5))
+
+
+def qc_durre_swe_streak(swe_value_mm,
+                        prev_swe_value_mm,
+                        prev_swe_qc,
+                        streak_value_threshold=None):
+    """
+    SWE streak check. Returns flags only.
+    """
+    return(_streak(swe_value_mm, prev_swe_value_mm, prev_swe_qc,
+                   streak_value_threshold))
+
+
+def qc_durre_swe_gap(swe_value_mm,
+                     prev_swe_value_mm,
+                     prev_swe_qc,
+                     ref_ceiling_mm=None,
+                     ref_default_mm=None):
+    """
+    Gap check for SWE; see qc_durre_snwd_gap.
+    """
+    return(_gap(swe_value_mm, prev_swe_value_mm, prev_swe_qc,
+                ref_ceiling_mm, ref_default_mm))
+
+
+def qc_durre_swe_prcp(site_swe_val_mm,
+                      site_prev_swe_val,
+                      prev_swe_qc,
+                      site_prcp_val_mm):
+    """
+    Precipitation--SWE consistency check ("SWE increase with 0 PRCP").
+    """
+    return(_prcp(site_swe_val_mm, site_prev_swe_val, prev_swe_qc,
+                 site_prcp_val_mm, 10.0, 0.1))
+
+
+def qc_durre_swe_prcp_ratio(site_swe_val_mm,
+                            site_prev_swe_val_mm,
+                            prev_swe_qc,
+                            site_prcp_val_mm):
+    """
+    Precipitation--SWE consistency check ("SWE/PRCP ratio").
+    """
+    return(_prcp_ratio(site_swe_val_mm, site_prev_swe_val_mm, prev_swe_qc,
+                       site_prcp_val_mm, 20.0, 100, None))
@@ -0,0 +1,128 @@
+import numbers
+import numpy as np
+
+"""
+In-memory buffering of [station, time] QC flag variables.
+FlagBuffer
+"""
+
+
+class FlagBuffer(object):
+
+    """
+    Wrapper for a [station, time] QC flag variable in a QC database
+    (e.g., snow_depth_qc or snow_depth_qc_checked) that keeps whole time
+    columns in memory.
+
+    Reading or writing a single element, as in buffer[si, ti], loads
+    column ti of the variable on first use; after that, all reads and
+    bit operations on that column are done in memory. take and set_bits
+    do the same for many elements at once. Modified columns are written
+    back, each in a single write, by flush.
+
+    Any other kind of access (slices, lists of indices, etc.) flushes the
+    buffer and is passed on to the variable itself, so the variable and
+    the buffer never disagree.
+    """
+
+    def __init__(self, variable):
+        self.variable = variable
+        self._columns = {}
+        self._dirty = set()
+
+    def getncattr(self, name):
+        return(self.variable.getncattr(name))
+
+    @property
+    def shape(self):
+        return(self.variable.shape)
+
+    def _element_key(self, key):
+        """
+        Return (si, ti) for keys that select a single element, with ti
+        non-negative, or None for any other key.
+        """
+        if not isinstance(key, tuple) or len(key) != 2:
+            return(None)
+        si, ti = key
+        if not isinstance(si, (numbers.Integral, np.integer)) or \
+           not isinstance(ti, (numbers.Integral, np.integer)):
+            return(None)
+        ti = int(ti)
+        if ti < 0:
+            ti += self.variable.shape[1]
+        return(int(si), ti)
+
+    def _column(self, ti):
+        """
+        Get column ti, reading it from the variable if necessary.
+        """
+        column = self._columns.get(ti)
+        if column is None:
+            column = np.ma.array(self.variable[:, ti], copy=True)
+            self._columns[ti] = column
+        return(column)
+
+    def __getitem__(self, key):
+        element = self._element_key(key)
+        if element is None:
+            self.flush()
+            return(self.variable[key])
+        si, ti = element
+        return(self._column(ti)[si])
+
+    def __setitem__(self, key, value):
+        element = self._element_key(key)
+        if element is None:
+            self.flush()
+            self.variable[key] = value
+            return
+        si, ti = element
+        self._column(ti)[si] = value
+        self._dirty.add(ti)
+
+    def _columns_of(self, si, ti):
+        """
+        Group elements (si[k], ti[k]) by column. Yields each column index
+        with the positions k and station indices si[k] of the elements
+        in it.
+        """
+        si = np.asarray(si, dtype=int).ravel()
+        ti = np.broadcast_to(np.asarray(ti, dtype=int), si.shape).copy()
+        ti[ti < 0] += self.variable.shape[1]
+        for column_ti in np.unique(ti):
+            k = np.flatnonzero(ti == column_ti)
+            yield(int(column_ti), k, si[k])
+
+    def take(self, si, ti):
+        """
+        Return the values at (si[k], ti[k]) for arrays of station
+        indices si and time indices ti (or a single time index ti).
+        """
+        values = np.ma.masked_all(np.size(si), dtype=self.variable.dtype)
+        for column_ti, k, column_si in self._columns_of(si, ti):
+            values[k] = self._column(column_ti)[column_si]
+        return(values)
+
+    def set_bits(self, si, ti, bits):
+        """
+        Turn on bits at (si[k], ti[k]) for arrays of station indices si
+        and time indices ti (or a single time index ti). Elements must
+        be distinct.
+        """
+        for column_ti, k, column_si in self._columns_of(si, ti):
+            column = self._column(column_ti)
+            column[column_si] = column[column_si] | bits
+            self._dirty.add(column_ti)
+
+    def flush(self):
+        """
+        Write modified columns to the variable and empty the buffer.
+        Returns the number of columns written.
+        """
+        num_written = len(self._dirty)
+        for ti in sorted(self._dirty):
+            self.variable[:, ti] = self._columns[ti]
+        self._columns = {}
+        self._dirty = set()
+        return(num_written)
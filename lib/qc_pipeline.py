@@ -0,0 +1,373 @@
+import sys
+import numpy as np
+
+"""
+Declarative QC test pipeline for station observations.
+QCTest
+QCPipeline
+
+A QCTest declares what a test needs (inputs), how far back it looks
+(num_hrs), and a batch evaluation function operating on all reports for
+an hour at once (see qc_durre_batch). A QCPipeline gathers the inputs
+its tests need, runs the tests in order, and applies their results to
+the QC flag and "QC checked" variables of a QC database (FlagBuffer
+objects) in bulk.
+
+Inputs are arrays whose first dimension is aligned with the reports
+being tested. Each comes with a [report] boolean array saying where it
+is available (or None if it always is); a test is only performed for
+reports where all of its inputs are available and where it has not
+already been performed. Windowed inputs have a time dimension of
+[previous hours], of which a test sees only the last num_hrs hours.
+"""
+
+
+class QCTest(object):
+
+    """
+    Declaration of a QC test.
+
+    name            QC test name, as in the qc_test_names attribute of the
+                    QC database
+    evaluate        function taking a dictionary of inputs (for the
+                    reports to test) and returning either
+                    - a masked boolean array of flags, masked where the
+                      test is not possible;
+                    - a tuple of that and a masked array of reference
+                      indices into the window of previous values; or
+                    - (series tests) a dictionary as returned by
+                      qc_durre_batch.qc_durre_snwd_gap, flagging any
+                      elements of the window plus the report itself
+    inputs          names of inputs the test needs
+    num_hrs         number of previous hours the test examines
+    series          whether evaluate returns flags for the whole time
+                    series (previous values and report), as in the gap
+                    check
+    flag_reference  whether to flag the reference value (identified by
+                    the reference index) along with a flagged report
+    after           names of tests that must be performed before this one
+    counter         name under which flags are counted (default name);
+                    tests sharing a counter are counted together
+    """
+
+    def __init__(self,
+                 name,
+                 evaluate,
+                 inputs=(),
+                 num_hrs=0,
+                 series=False,
+                 flag_reference=False,
+                 after=(),
+                 counter=None):
+        self.name = name
+        self.evaluate = evaluate
+        self.inputs = list(inputs)
+        self.num_hrs = num_hrs
+        self.series = series
+        self.flag_reference = flag_reference
+        self.after = list(after)
+        if counter is None:
+            counter = name
+        self.counter = counter
+
+
+class QCPipeline(object):
+
+    """
+    Ordered collection of QCTest objects for one element (e.g., snow
+    depth), with the names of its windowed inputs.
+    """
+
+    def __init__(self, element_name, tests, windowed=('prev', 'prev_qc')):
+        self.element_name = element_name
+        self.windowed = list(windowed)
+        self.tests = self._order(tests)
+
+    @staticmethod
+    def _order(tests):
+        """
+        Order tests so that each comes after those it names in "after",
+        otherwise keeping the order given.
+        """
+        remaining = list(tests)
+        names = [test.name for test in remaining]
+        for test in remaining:
+            for name in test.after:
+                if name not in names:
+                    raise ValueError('test "{}" '.format(test.name) +
+                                     'follows unknown test "{}"'.
+                                     format(name))
+        ordered = []
+        done = set()
+        while remaining:
+            ready = [test for test in remaining
+                     if all(name in done for name in test.after)]
+            if not ready:
+                raise ValueError('circular "after" dependencies among ' +
+                                 'tests {}'.
+                                 format([test.name for test in remaining]))
+            ordered.append(ready[0])
+            done.add(ready[0].name)
+            remaining.remove(ready[0])
+        return(ordered)
+
+    def test(self, name):
+        """
+        Get the test called name.
+        """
+        for test in self.tests:
+            if test.name == name:
+                return(test)
+        raise KeyError(name)
+
+    @property
+    def counters(self):
+        """
+        Names of flag counters, in test order.
+        """
+        counters = []
+        for test in self.tests:
+            if test.counter not in counters:
+                counters.append(test.counter)
+        return(counters)
+
+    def required_inputs(self):
+        """
+        Names of all inputs needed by the tests, in test order.
+        """
+        names = []
+        for test in self.tests:
+            for name in test.inputs:
+                if name not in names:
+                    names.append(name)
+        return(names)
+
+    def gather(self, builders):
+        """
+        Build the inputs needed by the tests, each once. builders maps
+        input names to functions returning the input array and its
+        availability. Returns dictionaries of arrays and of availability.
+        """
+        inputs = {}
+        available = {}
+        for name in self.required_inputs():
+            if name not in builders:
+                raise ValueError('no builder for QC input "{}"'.
+                                 format(name))
+            inputs[name], available[name] = builders[name]()
+        return(inputs, available)
+
+    def _test_inputs(self, test, inputs, rows):
+        """
+        Select the inputs for a test, for the given rows, limiting
+        windowed inputs to the test's window.
+        """
+        test_inputs = {}
+        for name in test.inputs:
+            values = inputs[name]
+            if values is None:
+                test_inputs[name] = None
+                continue
+            if name in self.windowed:
+                values = values[:, values.shape[1] - test.num_hrs:]
+            test_inputs[name] = values[rows]
+        return(test_inputs)
+
+    def evaluate(self, test, inputs, rows, qcdb_ti):
+        """
+        Perform a test for the given rows of the inputs, for reports at
+        time index qcdb_ti. Returns the changes the test makes to the QC
+        database as a tuple of
+        - the rows tested;
+        - the rows and time indices of the values to flag, and the index
+          of each in the test's window (num_hrs for the report itself);
+        - the number of values flagged, for the test's counter;
+        - the rows for which a series test was not possible (which is an
+          error).
+        """
+        result = test.evaluate(self._test_inputs(test, inputs, rows))
+        impossible = rows[:0]
+
+        if test.series:
+            possible = np.asarray(result['possible'])
+            impossible = rows[~possible]
+            tested = rows
+            flag_row, ts_ind = np.nonzero(result['flagged'])
+            flag_row = rows[flag_row]
+            flag_ti = qcdb_ti - test.num_hrs + ts_ind
+        else:
+            if isinstance(result, tuple):
+                flag, ref_ind = result
+            else:
+                flag, ref_ind = result, None
+            possible = ~np.ma.getmaskarray(flag)
+            flag = np.ma.filled(flag, False)
+            tested = rows[possible]
+            flag_row = rows[flag]
+            flag_ti = np.full(len(flag_row), qcdb_ti)
+            ts_ind = np.full(len(flag_row), test.num_hrs)
+            num_test_flagged = len(flag_row)
+            if test.flag_reference and ref_ind is not None:
+                ref_ind = np.ma.getdata(ref_ind)[flag]
+                flag_row = np.concatenate([flag_row, flag_row])
+                ts_ind = np.concatenate([ts_ind, ref_ind])
+                flag_ti = np.concatenate([flag_ti,
+                                          qcdb_ti - test.num_hrs + ref_ind])
+
+        # Values before the start of the database cannot be flagged.
+        in_db = flag_ti >= 0
+        flag_row = flag_row[in_db]
+        flag_ti = flag_ti[in_db]
+        ts_ind = ts_ind[in_db]
+        if test.series:
+            num_test_flagged = len(flag_row)
+
+        return(tested, flag_row, flag_ti, ts_ind, num_test_flagged,
+               impossible)
+
+    def run(self,
+            inputs,
+            available,
+            qcdb_si,
+            qcdb_ti,
+            qc_bit,
+            qcdb_qc_flag,
+            qcdb_qc_chkd,
+            station_id=None,
+            values=None,
+            verbose=None,
+            pool=None):
+        """
+        Perform all tests for the reports at time index qcdb_ti of the QC
+        database, where qcdb_si gives each report's station index.
+        qc_bit maps test names to QC bits. The QC flag and "QC checked"
+        bits of qcdb_qc_flag and qcdb_qc_chkd are updated for every
+        report tested, and for any earlier values flagged along with
+        them.
+
+        If pool (a qc_pool.QCProcessPool) is given, tests are performed
+        by its worker processes, each for a share of the reports, and
+        their results are applied here.
+
+        Returns a dictionary of the number of values flagged for each
+        counter, or None if a test failed.
+        """
+        shared_inputs = None
+        if pool is not None:
+            shared_inputs = pool.share(inputs)
+        try:
+            return(self._run(inputs, available, qcdb_si, qcdb_ti, qc_bit,
+                             qcdb_qc_flag, qcdb_qc_chkd, station_id, values,
+                             verbose, pool, shared_inputs))
+        finally:
+            if shared_inputs is not None:
+                shared_inputs.close()
+
+    def _run(self,
+             inputs,
+             available,
+             qcdb_si,
+             qcdb_ti,
+             qc_bit,
+             qcdb_qc_flag,
+             qcdb_qc_chkd,
+             station_id,
+             values,
+             verbose,
+             pool,
+             shared_inputs):
+        qcdb_si = np.asarray(qcdb_si)
+        num_reports = len(qcdb_si)
+        num_flagged = dict([(counter, 0) for counter in self.counters])
+
+        for test in self.tests:
+
+            bits = 1 << qc_bit[test.name]
+
+            eligible = np.ones(num_reports, dtype=bool)
+            for name in test.inputs:
+                if available.get(name) is not None:
+                    eligible &= available[name]
+
+            checked = np.ma.filled(qcdb_qc_chkd.take(qcdb_si, qcdb_ti) &
+                                   bits != 0,
+                                   False)
+            if verbose:
+                flagged = np.ma.filled(qcdb_qc_flag.take(qcdb_si, qcdb_ti) &
+                                       bits != 0,
+                                       False)
+                for row in np.flatnonzero(eligible & checked):
+                    print('INFO: check "{}" '.format(test.name) +
+                          'already done for site {} '.
+                          format(station_id[row]) +
+                          'value {} ({})'.
+                          format(values[row],
+                                 'flagged' if flagged[row]
+                                 else 'not flagged'))
+
+            rows = np.flatnonzero(eligible & ~checked)
+            if len(rows) == 0:
+                continue
+            if pool is None:
+                delta = self.evaluate(test, inputs, rows, qcdb_ti)
+            else:
+                delta = pool.evaluate(self, test, inputs, shared_inputs,
+                                      rows, qcdb_ti)
+            tested, flag_row, flag_ti, ts_ind, num_test_flagged, \
+                impossible = delta
+
+            if len(impossible) > 0:
+                print('ERROR: {} "{}" check failed '.
+                      format(self.element_name, test.name) +
+                      'for station(s) {}.'.
+                      format(', '.join([str(station_id[row])
+                                        if station_id is not None
+                                        else str(row)
+                                        for row in impossible])),
+                      file=sys.stderr)
+                return(None)
+            num_flagged[test.counter] += num_test_flagged
+
+            # Earlier values flagged here must not have been flagged
+            # before, since tests do not use flagged values.
+            earlier = flag_ti != qcdb_ti
+            already_flagged = \
+                np.ma.filled(qcdb_qc_flag.take(qcdb_si[flag_row[earlier]],
+                                               flag_ti[earlier]) &
+                             bits != 0,
+                             False)
+            if already_flagged.any():
+                print('ERROR: (PROGRAMMING) reference value was ' +
+                      'previously flagged and should not have been ' +
+                      'used in "{}" check.'.format(test.name),
+                      file=sys.stderr)
+                return(None)
+
+            if verbose:
+                for row, ti, ts in zip(flag_row, flag_ti, ts_ind):
+                    if ts == test.num_hrs:
+                        value = values[row]
+                    else:
+                        value = inputs['prev'][row, inputs['prev'].shape[1] -
+                                               test.num_hrs + ts]
+                    print('INFO: flagging {} value {} '.
+                          format(self.element_name, value) +
+                          '{}'.format('' if ti == qcdb_ti else
+                                      '({} hours earlier) '.
+                                      format(qcdb_ti - ti)) +
+                          'at station {} '.format(station_id[row]) +
+                          '("{}").'.format(test.name))
+
+            # Flag values, and mark earlier values flagged here as having
+            # been through this check (even though this is only indirectly
+            # the case).
+            qcdb_qc_flag.set_bits(qcdb_si[flag_row], flag_ti, bits)
+            qcdb_qc_chkd.set_bits(qcdb_si[flag_row[flag_ti != qcdb_ti]],
+                                  flag_ti[flag_ti != qcdb_ti],
+                                  bits)
+
+            # Mark reports as checked, regardless of whether they were
+            # flagged.
+            qcdb_qc_chkd.set_bits(qcdb_si[tested], qcdb_ti, bits)
+
+        return(num_flagged)
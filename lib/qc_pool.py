@@ -0,0 +1,189 @@
+import multiprocessing
+from multiprocessing import resource_tracker
+from multiprocessing import shared_memory
+import numpy as np
+
+"""
+Parallel QC testing in worker processes.
+QCProcessPool
+SharedInputs
+
+A QCProcessPool runs the tests of QCPipeline objects in worker processes,
+each test for all reports of an hour being divided among the workers by
+row (station). The inputs for an hour are copied once into shared memory
+(QCProcessPool.share), from which workers read the rows they are given
+without copying. Workers only evaluate tests; they return the changes to
+flags that result (see QCPipeline.evaluate), which QCPipeline.run merges
+and writes to the QC database, so the database is only ever accessed by
+the parent process.
+
+Workers are forked from the parent, inheriting the pipelines (whose
+tests may be lambdas or other functions that cannot be pickled). The
+pool must therefore be created after its pipelines and, as with any
+fork, preferably before the parent starts other threads.
+"""
+
+# Pipelines by element name, and the inputs most recently attached from
+# shared memory, in worker processes.
+_pipelines = {}
+_attached = {'key': None, 'blocks': [], 'inputs': None}
+
+
+class SharedInputs(object):
+
+    """
+    QC inputs copied into shared memory blocks. descriptors maps input
+    names to ('shared', data block name, mask block name or None, dtype,
+    shape) for arrays, or to ('value', value) for anything else (e.g.,
+    None), which is passed to workers as is.
+    """
+
+    def __init__(self, inputs):
+        self.descriptors = {}
+        self._blocks = []
+        for name, values in inputs.items():
+            if not isinstance(values, np.ndarray) or \
+               values.dtype.hasobject:
+                self.descriptors[name] = ('value', values)
+                continue
+            data_block = self._copy(np.ma.getdata(values))
+            mask_block = None
+            if np.ma.getmask(values) is not np.ma.nomask:
+                mask_block = self._copy(np.ma.getmaskarray(values))
+            self.descriptors[name] = ('shared',
+                                      data_block.name,
+                                      None if mask_block is None
+                                      else mask_block.name,
+                                      values.dtype.str,
+                                      values.shape)
+
+    def _copy(self, array):
+        """
+        Copy array into a new shared memory block.
+        """
+        block = shared_memory.SharedMemory(create=True,
+                                           size=max(array.nbytes, 1))
+        self._blocks.append(block)
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = \
+            array
+        return(block)
+
+    @property
+    def key(self):
+        return(tuple([block.name for block in self._blocks]))
+
+    def close(self):
+        """
+        Release the shared memory blocks. Workers still attached to them
+        keep them until they attach to others.
+        """
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+
+def _attach(key, descriptors):
+    """
+    Get the inputs described by descriptors in a worker, attaching to
+    their shared memory blocks unless the worker already has.
+    """
+    if _attached['key'] == key:
+        return(_attached['inputs'])
+    _attached['inputs'] = None
+    for block in _attached['blocks']:
+        block.close()
+    _attached['key'] = None
+    _attached['blocks'] = []
+
+    blocks = {}
+
+    def view(block_name, shape, dtype):
+        if block_name not in blocks:
+            blocks[block_name] = \
+                shared_memory.SharedMemory(name=block_name)
+        return(np.ndarray(shape, dtype=dtype, buffer=blocks[block_name].buf))
+
+    inputs = {}
+    for name, descriptor in descriptors.items():
+        if descriptor[0] == 'value':
+            inputs[name] = descriptor[1]
+            continue
+        data_name, mask_name, dtype, shape = descriptor[1:]
+        data = view(data_name, shape, np.dtype(dtype))
+        if mask_name is None:
+            inputs[name] = data
+        else:
+            inputs[name] = np.ma.masked_array(data,
+                                              mask=view(mask_name, shape,
+                                                        bool),
+                                              copy=False)
+    _attached['key'] = key
+    _attached['blocks'] = list(blocks.values())
+    _attached['inputs'] = inputs
+    return(inputs)
+
+
+def _evaluate(element_name, test_name, key, descriptors, rows, qcdb_ti):
+    """
+    Perform a test for some rows in a worker.
+    """
+    pipeline = _pipelines[element_name]
+    inputs = _attach(key, descriptors)
+    return(pipeline.evaluate(pipeline.test(test_name), inputs, rows,
+                             qcdb_ti))
+
+
+class QCProcessPool(object):
+
+    """
+    Pool of num_workers processes performing the tests of pipelines (a
+    list of QCPipeline objects with distinct element names). Tests for
+    fewer than min_rows reports are performed in the parent process,
+    where doing so is cheaper than handing them out.
+    """
+
+    def __init__(self, pipelines, num_workers, min_rows=1024):
+        _pipelines.clear()
+        for pipeline in pipelines:
+            _pipelines[pipeline.element_name] = pipeline
+        self.num_workers = num_workers
+        self.min_rows = min_rows
+        # Start the tracker of shared memory blocks before forking, so
+        # that workers share it rather than each starting their own
+        # (which would report blocks they attached to as leaked).
+        resource_tracker.ensure_running()
+        self._pool = multiprocessing.get_context('fork').Pool(num_workers)
+
+    def share(self, inputs):
+        """
+        Copy a dictionary of QC inputs into shared memory for workers.
+        The SharedInputs returned must be closed when no longer needed.
+        """
+        return(SharedInputs(inputs))
+
+    def evaluate(self, pipeline, test, inputs, shared_inputs, rows, qcdb_ti):
+        """
+        Same as pipeline.evaluate(test, inputs, rows, qcdb_ti), with the
+        rows divided among the workers, which read inputs from
+        shared_inputs (as returned by share).
+        """
+        num_shards = min(self.num_workers, len(rows) // self.min_rows)
+        if num_shards <= 1:
+            return(pipeline.evaluate(test, inputs, rows, qcdb_ti))
+        deltas = self._pool.starmap(
+            _evaluate,
+            [(pipeline.element_name, test.name, shared_inputs.key,
+              shared_inputs.descriptors, shard_rows, qcdb_ti)
+             for shard_rows in np.array_split(rows, num_shards)])
+        return(tuple([np.concatenate([delta[field] for delta in deltas])
+                      if field != 4
+                      else sum([delta[field] for delta in deltas])
+                      for field in range(6)]))
+
+    def close(self):
+        """
+        Stop the worker processes.
+        """
+        self._pool.close()
+        self._pool.join()
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+
+"""
+Index mapping station object identifiers to rows of station-ordered data,
+such as the results of wdb0 queries or the station dimension of a QC
+database.
+"""
+
+
+class StationIndex(object):
+
+    """
+    Hash index from station object identifiers to row indices. Lookups
+    accept a single object identifier or any sequence of them; batch
+    lookups return an array of row indices in which -1 indicates an
+    object identifier that is not present.
+    """
+
+    def __init__(self, obj_identifiers=()):
+        self._obj_id = np.asarray(obj_identifiers, dtype=np.int64).ravel()
+        self._index = pd.Index(self._obj_id)
+
+    def __len__(self):
+        return len(self._obj_id)
+
+    def __contains__(self, obj_identifier):
+        return obj_identifier in self._index
+
+    @property
+    def obj_identifiers(self):
+        return self._obj_id
+
+    @property
+    def is_unique(self):
+        return self._index.is_unique
+
+    def duplicates(self):
+        """
+        Return the object identifiers that appear more than once.
+        """
+        return np.unique(self._obj_id[self._index.duplicated()])
+
+    def lookup(self, obj_identifiers):
+        """
+        Return row indices for an array of object identifiers, with -1
+        for those not found.
+        """
+        if not self.is_unique:
+            raise ValueError('station index has duplicate object ' +
+                             'identifiers {}'.format(self.duplicates()))
+        query = np.asarray(obj_identifiers, dtype=np.int64).ravel()
+        return self._index.get_indexer(query)
+
+    def get(self, obj_identifier):
+        """
+        Return the row index for a single object identifier, or None if it
+        is not present.
+        """
+        row = self.lookup([obj_identifier])[0]
+        if row < 0:
+            return None
+        return int(row)
+
+    def append(self, obj_identifiers):
+        """
+        Add object identifiers for rows appended to the data.
+        """
+        new_obj_id = np.asarray(obj_identifiers, dtype=np.int64).ravel()
+        if len(new_obj_id) == 0:
+            return
+        self._obj_id = np.concatenate([self._obj_id, new_obj_id])
+        self._index = pd.Index(self._obj_id)
@@ -1,12 +1,28 @@
-import os
-import psycopg2
+import io
+import sys
+import threading
 import pandas as pd
 import numpy as np
-import pickle as pkl
 import datetime as dt
+import wdb0_pool
+import wdb0_cache
+import wdb0_stations
+import wdb0_buffer
+import wdb0_profile
 
 """
 Functions for reading data from wdb0.
+pivot_obs
+pivot_obs_batches
+make_tiles
+get_fetch_tiles
+set_fetch_tiles
+get_element_obs_arrays
+get_element_obs_probe
+get_obs_station_df
+get_station_table
+get_element_obs_df
+get_cached_obs_df
 get_snow_depth_obs
 get_swe_obs
 get_swe_obs_df
@@ -18,8 +34,634 @@ get_snwd_snfl_obs
 get_snwd_precip_obs
 get_swe_prcp_obs
 get_prv_airtemp_obs
+get_station_metadata
 """
 
+def pivot_obs(df,
+              value_column,
+              no_data_value=-99999.0,
+              begin_datetime=None,
+              num_hours=None):
+
+    """
+    Organize query results into arrays of station metadata and a masked
+    array of observations.
+
+    The DataFrame df must have the columns obj_identifier, station_id,
+    name, lon, lat, elevation, recorded_elevation and date, along with
+    value_column, and its rows must be ordered by obj_identifier and
+    date. A new station begins wherever obj_identifier changes.
+
+    If num_hours is given, observations are placed in a 2-d
+    [station, hour] array whose hour index is measured from
+    begin_datetime. Otherwise a 1-d [station] array is produced and the
+    last value for each station is kept.
+
+    Returns arrays station_obj_id, station_id, station_name,
+    station_lon, station_lat, station_elevation, station_rec_elevation
+    (see wdb0_stations.StationTable) and the masked obs array.
+    Unreported elements of obs are masked and set to no_data_value. As
+    before, an empty result still gives a single, fully masked row.
+    """
+
+    obj_id = df['obj_identifier'].values
+    num_rows = len(obj_id)
+
+    # Identify the first row for each station and assign every row its
+    # station index.
+    new_station = np.ones(num_rows, dtype=bool)
+    if num_rows > 1:
+        new_station[1:] = obj_id[1:] != obj_id[:-1]
+    first_row = np.flatnonzero(new_station)
+    station_ind = np.cumsum(new_station) - 1
+    num_stations = len(first_row)
+
+    station_obj_id = np.asarray(df['obj_identifier'].values[first_row],
+                                dtype=np.int64)
+    station_id = df['station_id'].values[first_row]
+    station_name = df['name'].values[first_row]
+    station_lon = df['lon'].values[first_row]
+    station_lat = df['lat'].values[first_row]
+    station_elevation = df['elevation'].values[first_row]
+    station_rec_elevation = df['recorded_elevation'].values[first_row]
+
+    values = np.asarray(df[value_column].values, dtype=float)
+
+    if num_hours is None:
+
+        # Create a 1-d [station] array.
+        obs = np.ma.masked_array(np.full(max(num_stations, 1),
+                                         no_data_value,
+                                         dtype=float),
+                                 mask=True)
+        obs[station_ind] = values
+
+    else:
+
+        # Hours since begin_datetime for each row.
+        time_ind = (pd.to_datetime(df['date']) -
+                    pd.Timestamp(begin_datetime)) // \
+                   pd.Timedelta(hours=1)
+        time_ind = np.asarray(time_ind, dtype=int)
+
+        if num_rows > 0 and \
+           (time_ind.min() < 0 or time_ind.max() >= num_hours):
+            print('ERROR: observation dates fall outside of the ' +
+                  '{} hours beginning '.format(num_hours) +
+                  '{}.'.format(begin_datetime),
+                  file=sys.stderr)
+            exit(1)
+
+        # Create a 2-d [station, time] array.
+        obs = np.ma.masked_array(np.full([max(num_stations, 1), num_hours],
+                                         no_data_value,
+                                         dtype=float),
+                                 mask=True)
+        obs[station_ind, time_ind] = values
+
+    return(station_obj_id,
+           station_id,
+           station_name,
+           station_lon,
+           station_lat,
+           station_elevation,
+           station_rec_elevation,
+           obs)
+
+
+def pivot_obs_batches(batches,
+                      value_column,
+                      no_data_value=-99999.0,
+                      begin_datetime=None,
+                      num_hours=None):
+
+    """
+    Organize query results arriving in batches as pivot_obs does. Each
+    batch is either a DataFrame as required by pivot_obs or a list of
+    (obj_identifier, date, value) row tuples, which are joined to station
+    metadata locally. DataFrame batches are pivoted as they arrive, so
+    only one is held at a time. Row tuples are kept as three-column
+    DataFrames until all batches have been read, and only then joined
+    and pivoted: batches streamed from the database hold a pooled
+    connection until the last one is read, and reading metadata for new
+    stations needs another, which with several streams at once might
+    never become available. Rows must be ordered by obj_identifier and
+    date across batches; a station split between two batches is joined
+    back together.
+    """
+
+    column_list = ['obj_identifier', 'date', value_column]
+
+    def joined_batches():
+        raw_batches = []
+        for batch in batches:
+            if isinstance(batch, pd.DataFrame):
+                yield batch
+            else:
+                with wdb0_profile.phase('frame'):
+                    raw_batches.append(pd.DataFrame(batch,
+                                                    columns=column_list))
+        if len(raw_batches) == 0:
+            return
+        # Read metadata for all new stations at once.
+        _station_table.lookup(np.concatenate(
+            [raw_batch['obj_identifier'].values
+             for raw_batch in raw_batches]))
+        for raw_batch in raw_batches:
+            with wdb0_profile.phase('frame'):
+                joined_batch = _station_table.join(raw_batch)
+            yield joined_batch
+
+    station_chunks = [[] for i in range(7)]
+    obs_chunks = []
+    last_obj_id = None
+
+    for batch in joined_batches():
+        if len(batch) == 0:
+            continue
+        with wdb0_profile.phase('pivot'):
+            pivoted = pivot_obs(batch,
+                                value_column,
+                                no_data_value=no_data_value,
+                                begin_datetime=begin_datetime,
+                                num_hours=num_hours)
+        batch_station_lists = pivoted[0:7]
+        batch_obs = pivoted[7]
+
+        if batch_station_lists[0][0] == last_obj_id:
+            # Merge the first station into the last station of the previous
+            # batch.
+            prev_obs = obs_chunks[-1]
+            if num_hours is None:
+                if batch_obs[0] is not np.ma.masked:
+                    prev_obs[-1] = batch_obs[0]
+            else:
+                reported = ~np.ma.getmaskarray(batch_obs[0])
+                prev_obs[-1, reported] = batch_obs[0][reported]
+            batch_station_lists = [station_list[1:]
+                                   for station_list in batch_station_lists]
+            batch_obs = batch_obs[1:]
+
+        if len(batch_obs) > 0:
+            for station_chunk, batch_station_list in \
+                zip(station_chunks, batch_station_lists):
+                station_chunk.append(batch_station_list)
+            obs_chunks.append(batch_obs)
+            last_obj_id = batch_station_lists[0][-1]
+
+    if len(obs_chunks) == 0:
+        return(pivot_obs(pd.DataFrame([],
+                                      columns=(wdb0_stations.OBS_COLUMNS[:-1] +
+                                               [value_column])),
+                         value_column,
+                         no_data_value=no_data_value,
+                         begin_datetime=begin_datetime,
+                         num_hours=num_hours))
+
+    with wdb0_profile.phase('pivot'):
+        if len(obs_chunks) == 1:
+            obs = obs_chunks[0]
+        else:
+            obs = np.ma.concatenate(obs_chunks, axis=0)
+            obs_chunks = None
+            obs.data[obs.mask] = no_data_value
+
+        station_arrays = [np.concatenate(station_chunk)
+                          for station_chunk in station_chunks]
+        station_chunks = None
+
+    return(tuple(station_arrays) + (obs,))
+
+
+# Observation tables in the "web_data" database, with factors converting
+# their values to the units returned by the functions here.
+OBS_ELEMENTS = {'snow_depth': ('point.obs_snow_depth', 100.0), # m to cm
+                'swe': ('point.obs_swe', 1000.0), # m to mm
+                'air_temp': ('point.obs_airtemp', None), # deg C
+                'snowfall': ('point.obs_snowfall_raw', 100.0), # m to cm
+                'precip': ('point.obs_precip_raw', 1000.0)} # m to mm
+
+
+# Region [lon_min, lon_max, lat_min, lat_max] across which make_tiles
+# spreads tile edges. The outermost tiles extend beyond it, so that every
+# station falls in exactly one tile.
+TILE_DOMAIN = [-130.0, -60.0, 20.0, 55.0]
+
+# Tiles used by get_element_obs_arrays when none are given.
+_fetch_tiles = None
+
+
+def make_tiles(num_lon_tiles, num_lat_tiles, domain=TILE_DOMAIN):
+    """
+    Divide the globe into num_lon_tiles by num_lat_tiles tiles with edges
+    spaced evenly across domain. Each tile is given as a bounding box
+    [lon_min, lon_max, lat_min, lat_max], with None for edges of the
+    outermost tiles, which are unbounded.
+    """
+    lon_edges = np.linspace(domain[0], domain[1], num_lon_tiles + 1)
+    lat_edges = np.linspace(domain[2], domain[3], num_lat_tiles + 1)
+    lon_edges = [None] + lon_edges[1:-1].tolist() + [None]
+    lat_edges = [None] + lat_edges[1:-1].tolist() + [None]
+    tiles = [[lon_edges[i], lon_edges[i + 1], lat_edges[j], lat_edges[j + 1]]
+             for j in range(num_lat_tiles)
+             for i in range(num_lon_tiles)]
+    return(tiles)
+
+
+def get_fetch_tiles():
+    """
+    Get the tiles used by default to divide bulk observation queries.
+    """
+    return(_fetch_tiles)
+
+
+def set_fetch_tiles(tiles):
+    """
+    Set the tiles (see make_tiles) used by default to divide bulk
+    observation queries, or None to use a single query.
+    """
+    global _fetch_tiles
+    _fetch_tiles = tiles
+
+
+def _tile_sql(tile, include_unlocated=False):
+    """
+    Get a SQL condition selecting observations from stations in a tile.
+    Lower edges are inclusive and upper edges exclusive, as with the
+    bounding_box arguments used elsewhere.
+    """
+    conditions = []
+    for edge, column, operator in [(tile[0], 'coordinates[0]', '>='),
+                                   (tile[1], 'coordinates[0]', '<'),
+                                   (tile[2], 'coordinates[1]', '>='),
+                                   (tile[3], 'coordinates[1]', '<')]:
+        if edge is not None:
+            conditions.append('{} {} {}'.format(column, operator, edge))
+    if len(conditions) == 0:
+        return('')
+    station_sql = ' AND '.join(conditions)
+    if include_unlocated:
+        station_sql = '(' + station_sql + ') OR coordinates IS NULL'
+    return('AND obj_identifier IN ' +
+           '(SELECT obj_identifier FROM point.allstation ' +
+           'WHERE ' + station_sql + ') ')
+
+
+def _copy_obs_arrays(sql_cmd, verbose=None):
+    """
+    Run a query for obj_identifier, date (in seconds since 1970-01-01
+    00:00:00) and value through COPY and decode its results into arrays.
+    """
+
+    if verbose:
+        print('INFO: psql copy command "{}"'.format(sql_cmd))
+
+    csv_bytes = wdb0_pool.copy_csv(sql_cmd)
+
+    if len(csv_bytes) == 0:
+        return({'obj_identifier': np.zeros(0, dtype=np.int64),
+                'date': np.zeros(0, dtype='datetime64[ns]'),
+                'value': np.zeros(0, dtype=float)})
+
+    with wdb0_profile.phase('frame'):
+        df = pd.read_csv(io.BytesIO(csv_bytes),
+                         header=None,
+                         names=['obj_identifier', 'epoch', 'value'],
+                         dtype={'obj_identifier': np.int64,
+                                'epoch': np.int64,
+                                'value': float})
+        csv_bytes = None
+        arrays = {'obj_identifier': df['obj_identifier'].values,
+                  'date': pd.to_datetime(df['epoch'].values, unit='s').values,
+                  'value': df['value'].values}
+
+    return(arrays)
+
+
+def get_element_obs_arrays(element,
+                           begin_datetime,
+                           end_datetime,
+                           duration_hours=None,
+                           tiles=None,
+                           verbose=None):
+
+    """
+    Get all hourly observations of element (a key of OBS_ELEMENTS) from
+    begin_datetime through end_datetime (inclusive) as NumPy arrays,
+    without station metadata. The query is run through COPY and its CSV
+    output decoded directly into columns, avoiding the per-row conversion
+    of ordinary queries. Returns a dictionary of "obj_identifier" (int64),
+    "date" (datetime64) and "value" (float) arrays, ordered by
+    obj_identifier and date.
+
+    If tiles (a list of bounding boxes covering all stations, such as
+    make_tiles returns) is given, or set by set_fetch_tiles, a separate
+    query is run for each tile. Tile queries run concurrently on pooled
+    connections and their results are merged.
+    """
+
+    if tiles is None:
+        tiles = _fetch_tiles
+    if tiles is None:
+        tiles = [[None, None, None, None]]
+
+    table, scale = OBS_ELEMENTS[element]
+    if scale is None:
+        value_expr = 'value'
+    else:
+        value_expr = 'value * {}'.format(scale)
+
+    # Define a SQL statement. Dates are transferred as seconds since
+    # 1970-01-01 00:00:00.
+    sql_cmd = 'SELECT ' + \
+              'obj_identifier, ' + \
+              'EXTRACT(EPOCH FROM date)::bigint, ' + \
+              value_expr + ' ' + \
+              'FROM ' + table + ' ' + \
+              'WHERE date >= \'' + \
+              begin_datetime.strftime('%Y-%m-%d %H:%M:%S') + \
+              '\' ' + \
+              'AND date <= \'' + \
+              end_datetime.strftime('%Y-%m-%d %H:%M:%S') + \
+              '\' ' + \
+              'AND value IS NOT NULL '
+
+    if duration_hours is not None:
+        sql_cmd = sql_cmd + \
+                  'AND duration = {} '.format(duration_hours * 3600)
+
+    # Stations without coordinates go with the first tile.
+    tile_sql_cmds = [sql_cmd +
+                     _tile_sql(tile, include_unlocated=(i == 0)) +
+                     'ORDER BY obj_identifier, date'
+                     for i, tile in enumerate(tiles)]
+
+    if len(tile_sql_cmds) == 1:
+        return(_copy_obs_arrays(tile_sql_cmds[0], verbose=verbose))
+
+    tile_obs = wdb0_pool.run_concurrently(
+        [lambda tile_sql_cmd=tile_sql_cmd:
+         _copy_obs_arrays(tile_sql_cmd, verbose=verbose)
+         for tile_sql_cmd in tile_sql_cmds])
+
+    # Each station falls in a single tile, so ordering the merged results
+    # by obj_identifier (stably) keeps them ordered by date as well.
+    obs = {key: np.concatenate([tile[key] for tile in tile_obs])
+           for key in ['obj_identifier', 'date', 'value']}
+    order = np.argsort(obs['obj_identifier'], kind='stable')
+
+    return({key: obs[key][order] for key in obs})
+
+
+def get_element_obs_probe(element,
+                          begin_datetime,
+                          end_datetime,
+                          duration_hours=None,
+                          verbose=None):
+
+    """
+    Summarize the observations of element (a key of OBS_ELEMENTS) for each
+    hour from begin_datetime through end_datetime (inclusive), as a cheap
+    way to tell whether those hours have changed since they were last
+    read. Returns a DataFrame with wdb0_cache.PROBE_COLUMNS: the date, and
+    the number of observations, sum of object identifiers and sum of
+    values for that hour. Hours with no observations are left out.
+    """
+
+    table, scale = OBS_ELEMENTS[element]
+
+    # Define a SQL statement, run as a prepared statement since it is
+    # repeated for every hour.
+    sql_cmd = 'SELECT ' + \
+              'EXTRACT(EPOCH FROM date)::bigint, ' + \
+              'COUNT(*), ' + \
+              'SUM(obj_identifier), ' + \
+              'SUM(value) ' + \
+              'FROM ' + table + ' ' + \
+              'WHERE date >= $1 ' + \
+              'AND date <= $2 ' + \
+              'AND value IS NOT NULL '
+    params = [begin_datetime, end_datetime]
+    statement_name = 'wdb0_probe_' + element
+
+    if duration_hours is not None:
+        sql_cmd = sql_cmd + 'AND duration = $3 '
+        params.append(duration_hours * 3600)
+        statement_name = statement_name + '_duration'
+
+    sql_cmd = sql_cmd + 'GROUP BY date ORDER BY date;'
+
+    if verbose:
+        print('INFO: psql command "{}" '.format(sql_cmd) +
+              'with parameters {}'.format(params))
+
+    rows = wdb0_pool.fetchall(sql_cmd,
+                              params=params,
+                              statement_name=statement_name)
+
+    df = pd.DataFrame(rows, columns=wdb0_cache.PROBE_COLUMNS)
+    df['date'] = pd.to_datetime(np.asarray(df['date'], dtype=np.int64),
+                                unit='s')
+
+    return(df.astype({'count': float,
+                      'obj_id_sum': float,
+                      'value_sum': float}))
+
+
+def get_obs_station_df(obj_identifiers,
+                       verbose=None):
+
+    """
+    Get the station metadata that accompany observations (the
+    wdb0_stations.STATION_COLUMNS) for a set of stations, in a single query.
+    Results are returned as a DataFrame ordered by obj_identifier.
+    """
+
+    obj_identifiers = sorted(set(int(obj_id) for obj_id in obj_identifiers))
+    if len(obj_identifiers) == 0:
+        return(pd.DataFrame([],
+                            columns=wdb0_stations.STATION_COLUMNS,
+                            dtype=object))
+
+    # Define a SQL statement.
+    sql_cmd = 'SELECT ' + \
+              'obj_identifier, ' + \
+              'TRIM(station_id), ' + \
+              'TRIM(name), ' + \
+              'coordinates[0] AS lon, ' + \
+              'coordinates[1] AS lat, ' + \
+              'elevation, ' + \
+              'recorded_elevation ' + \
+              'FROM point.allstation ' + \
+              'WHERE obj_identifier = ANY($1) ' + \
+              'ORDER BY obj_identifier;'
+
+    if verbose:
+        print('INFO: psql command "{}" '.format(sql_cmd) +
+              'for {} stations'.format(len(obj_identifiers)))
+
+    allstation = wdb0_pool.fetchall(sql_cmd,
+                                    params=[obj_identifiers],
+                                    statement_name='wdb0_obs_stations')
+
+    return(pd.DataFrame(allstation,
+                        columns=wdb0_stations.STATION_COLUMNS,
+                        dtype=object))
+
+
+_station_table = wdb0_stations.StationMetadata(get_obs_station_df)
+
+
+def get_station_table():
+    """
+    Get the shared table of station metadata that is joined to
+    observations.
+    """
+    return(_station_table)
+
+
+def get_element_obs_df(element,
+                       begin_datetime,
+                       end_datetime,
+                       duration_hours=None,
+                       engine='copy',
+                       station_metadata=True,
+                       verbose=None):
+
+    """
+    Get all hourly observations of element (a key of OBS_ELEMENTS) from
+    the "web_data" database on wdb0, from begin_datetime through
+    end_datetime (inclusive). For accumulated elements (snowfall and
+    precip) duration_hours selects the accumulation period.
+    Results are returned as a DataFrame with columns obj_identifier,
+    station_id, name, lon, lat, elevation, recorded_elevation, date and
+    value, ordered by obj_identifier and date. If station_metadata is
+    False, only the obj_identifier, date and value columns are included.
+
+    With engine="copy" observations are extracted in bulk by
+    get_element_obs_arrays. With engine="cursor" an ordinary query is
+    used. Either way station metadata are joined locally, from the
+    table returned by get_station_table.
+    """
+
+    if engine == 'copy':
+
+        df = pd.DataFrame(get_element_obs_arrays(element,
+                                                 begin_datetime,
+                                                 end_datetime,
+                                                 duration_hours=duration_hours,
+                                                 verbose=verbose))
+
+    elif engine == 'cursor':
+
+        table, scale = OBS_ELEMENTS[element]
+        if scale is None:
+            value_expr = 'value'
+        else:
+            value_expr = 'value * {}'.format(scale)
+
+        # Define a SQL statement, run as a prepared statement.
+        sql_cmd = 'SELECT ' + \
+                  'obj_identifier, ' + \
+                  'date, ' + \
+                  value_expr + ' AS value ' + \
+                  'FROM ' + table + ' ' + \
+                  'WHERE date >= $1 ' + \
+                  'AND date <= $2 ' + \
+                  'AND value IS NOT NULL '
+        params = [begin_datetime, end_datetime]
+        statement_name = 'wdb0_obs_' + element
+
+        if duration_hours is not None:
+            sql_cmd = sql_cmd + 'AND duration = $3 '
+            params.append(duration_hours * 3600)
+            statement_name = statement_name + '_duration'
+
+        sql_cmd = sql_cmd + 'ORDER BY obj_identifier, date;'
+
+        if verbose:
+            print('INFO: psql command "{}" '.format(sql_cmd) +
+                  'with parameters {}'.format(params))
+
+        # The result below is just a huge list of tuples.
+        obs = wdb0_pool.fetchall(sql_cmd,
+                                 params=params,
+                                 statement_name=statement_name)
+
+        with wdb0_profile.phase('frame'):
+            df = pd.DataFrame(obs, columns=wdb0_cache.OBS_COLUMNS)
+
+    else:
+
+        print('ERROR: unknown wdb0 extraction engine "{}".'.format(engine),
+              file=sys.stderr)
+        exit(1)
+
+    if not station_metadata:
+        return(df)
+
+    with wdb0_profile.phase('frame'):
+        df = _station_table.join(df)[wdb0_stations.OBS_COLUMNS]
+
+    return(df)
+
+
+def get_cached_obs_df(element,
+                      begin_datetime,
+                      end_datetime,
+                      scratch_dir,
+                      column_list=None,
+                      duration_hours=None,
+                      obj_identifiers=None,
+                      verbose=None):
+
+    """
+    Get hourly observations of element from begin_datetime through
+    end_datetime (inclusive) as get_element_obs_df does, reading them from
+    the cache in scratch_dir where possible and fetching only hours not
+    yet cached, or recent hours found to have changed since they were
+    cached (see wdb0_cache.get_obs_df). If obj_identifiers is given, only
+    observations from those stations are returned. If column_list is
+    given, the DataFrame columns are renamed accordingly.
+    """
+
+    if duration_hours is None:
+        cache_element = element
+    else:
+        cache_element = '{}_{}h'.format(element, duration_hours)
+
+    def fetch(fetch_begin_datetime, fetch_end_datetime):
+        return(get_element_obs_df(element,
+                                  fetch_begin_datetime,
+                                  fetch_end_datetime,
+                                  duration_hours=duration_hours,
+                                  station_metadata=False,
+                                  verbose=verbose))
+
+    def probe(probe_begin_datetime, probe_end_datetime):
+        return(get_element_obs_probe(element,
+                                     probe_begin_datetime,
+                                     probe_end_datetime,
+                                     duration_hours=duration_hours,
+                                     verbose=verbose))
+
+    df = wdb0_cache.get_obs_df(scratch_dir,
+                               cache_element,
+                               begin_datetime,
+                               end_datetime,
+                               fetch,
+                               probe=probe,
+                               obj_identifiers=obj_identifiers,
+                               verbose=verbose)
+    with wdb0_profile.phase('frame'):
+        df = _station_table.join(df)[wdb0_stations.OBS_COLUMNS]
+
+    if column_list is not None:
+        df.columns = column_list
+
+    return(df)
+
+
 def get_snow_depth_obs(begin_datetime,
                        end_datetime,
                        no_data_value=-99999.0,
@@ -41,77 +683,34 @@ def get_snow_depth_obs(begin_datetime,
     2019-01-01 00 to 2019-01-31 23.
     """
 
-    file_name = 'wdb0_obs_snow_depth_' + \
-                begin_datetime.strftime('%Y%m%d%H') + \
-                '_to_' + \
-                end_datetime.strftime('%Y%m%d%H') + \
-                '.pkl'
-
-    if scratch_dir is not None:
-        file_name = os.path.join(scratch_dir, file_name)
-
-    if os.path.isfile(file_name):
-
-        # Retrieve data from pkl file and return.
-        file_obj = open(file_name, 'rb')
-        obs_snow_depth = pkl.load(file_obj)
-        file_obj.close()
-        return(obs_snow_depth)
-
     time_range = end_datetime - begin_datetime
     num_hours = time_range.days * 24 + time_range.seconds // 3600 + 1
     # print('num_hours = {}'.format(num_hours))
 
-    # Open the web database.
-    conn_string = "host='wdb0.dmz.nohrsc.noaa.gov' dbname='web_data'"
-    conn = psycopg2.connect(conn_string)
-    conn.set_client_encoding("utf-8")
-    cursor = conn.cursor()
-
     # Define a SQL statement.
     sql_cmd = 'SELECT ' + \
               'point.allstation.obj_identifier, ' + \
-              'TRIM(point.allstation.station_id), ' + \
-              'TRIM(point.allstation.name), ' + \
-              'point.allstation.coordinates[0] AS lon, ' + \
-              'point.allstation.coordinates[1] AS lat, ' + \
-              'point.allstation.elevation, ' + \
-              'point.allstation.recorded_elevation, ' + \
               'date, ' + \
               'value * 100.0 AS obs_snow_depth_cm ' + \
               'FROM point.allstation, ' + \
               'point.obs_snow_depth ' + \
-              'WHERE date >= \'' + \
-              begin_datetime.strftime('%Y-%m-%d %H:%M:%S') + \
-              '\' ' + \
-              'AND date <= \'' + \
-              end_datetime.strftime('%Y-%m-%d %H:%M:%S') + \
-              '\' ' + \
+              'WHERE date >= %s ' + \
+              'AND date <= %s ' + \
               'AND point.allstation.obj_identifier = ' + \
               'point.obs_snow_depth.obj_identifier ' + \
               'AND value IS NOT NULL '
+    params = [begin_datetime, end_datetime]
 
     if bounding_box is not None:
         sql_cmd = sql_cmd + \
-                  'AND point.allstation.coordinates[0] >= ' + \
-                  '{} '.format(bounding_box[0]) + \
-                  'AND point.allstation.coordinates[0] < ' + \
-                  '{} '.format(bounding_box[1]) + \
-                  'AND point.allstation.coordinates[1] >= ' + \
-                  '{} '.format(bounding_box[2]) + \
-                  'AND point.allstation.coordinates[1] < ' + \
-                  '{} '.format(bounding_box[3])
+                  'AND point.allstation.coordinates[0] >= %s ' + \
+                  'AND point.allstation.coordinates[0] < %s ' + \
+                  'AND point.allstation.coordinates[1] >= %s ' + \
+                  'AND point.allstation.coordinates[1] < %s '
+        params.extend(bounding_box[0:4])
 
     sql_cmd = sql_cmd + 'ORDER BY obj_identifier, date;'
 
-    if verbose:
-        print('INFO: psql command "{}"'.format(sql_cmd))
-
-    cursor.execute(sql_cmd)
-
-    # The result below is just a huge list of tuples.
-    obs_depth = cursor.fetchall()
-
     obs_depth_column_list = ['obj_identifier',
                              'station_id',
                              'name',
@@ -122,85 +721,54 @@ def get_snow_depth_obs(begin_datetime,
                              'date',
                              'obs_snow_depth_cm']
 
-    df = pd.DataFrame(obs_depth, columns=obs_depth_column_list)
-
-    # This section organizes the query results into lists and arrays.
-
-    station_ind = -1
-    current_station_obj_id = -1
-    station_obj_id = []
-    station_id = []
-    station_name = []
-    station_lon = []
-    station_lat = []
-    station_elevation = []
-    station_rec_elevation = []
-    # Create a 2-d [time, station] array.
-    obs = np.ma.empty([1, num_hours], dtype=float)
-    obs[0,:] = no_data_value
-    obs[0,:] = np.ma.masked
-    for ind, row in df.iterrows():
-        if row['obj_identifier'] != current_station_obj_id:
-            station_ind += 1
-            if station_ind > 0:
-                # Just finished all data for previous station.
-                obs = np.ma.append(obs,
-                                   np.ma.empty([1,
-                                                num_hours],
-                                               dtype=float),
-                                   axis=0)
-                obs[station_ind,:] = no_data_value
-                obs[station_ind,:] = np.ma.masked
-            # New station
-            station_obj_id.append(row['obj_identifier'])
-            station_id.append(row['station_id'])
-            station_name.append(row['name'])
-            station_lon.append(row['lon'])
-            station_lat.append(row['lat'])
-            station_elevation.append(row['elevation'])
-            station_rec_elevation.append(row['recorded_elevation'])
-
-            current_station_obj_id = station_obj_id[station_ind]
-
-        # Add the observation to the obs array.
-        time_diff = row['date'] - begin_datetime
-        time_ind = time_diff.days * 24 + time_diff.seconds // 3600
-
-        try:
-            obs[station_ind, time_ind] = row['obs_snow_depth_cm']
-        except:
-            print(num_hours)
-            print(station_ind, time_ind)
-            print(obs)
-            print(obs.shape)
-            print(row)
-            exit(1)
+    if scratch_dir is not None and bounding_box is None:
+
+        # Assemble observations from the cache in scratch_dir.
+        df = get_cached_obs_df('snow_depth',
+                               begin_datetime,
+                               end_datetime,
+                               scratch_dir,
+                               column_list=obs_depth_column_list,
+                               verbose=verbose)
+        batches = [df]
 
-    num_stations = station_ind + 1
+    elif bounding_box is None:
+
+        # Extract observations in bulk.
+        df = get_element_obs_df('snow_depth',
+                                begin_datetime,
+                                end_datetime,
+                                verbose=verbose)
+        df.columns = obs_depth_column_list
+        batches = [df]
+
+    else:
+
+        if verbose:
+            print('INFO: psql command "{}" '.format(sql_cmd) +
+                  'with parameters {}'.format(params))
+
+        # Stream the query results in batches of row tuples.
+        batches = wdb0_pool.fetch_batches(sql_cmd, params=params)
+
+    # Organize the query results into a station table and an array.
+    pivoted = pivot_obs_batches(batches,
+                                'obs_snow_depth_cm',
+                                no_data_value=no_data_value,
+                                begin_datetime=begin_datetime,
+                                num_hours=num_hours)
+    stations = wdb0_stations.StationTable(*pivoted[0:7])
+    obs = pivoted[7]
 
     obs_datetime = [begin_datetime +
                     dt.timedelta(hours=i) for i in range(num_hours)]
 
     # Place results in a dictionary.
-    obs_snow_depth = {'num_stations': num_stations,
-                      'num_hours': num_hours,
-                      'station_obj_id': station_obj_id,
-                      'station_id': station_id,
-                      'station_name': station_name,
-                      'station_lon': station_lon,
-                      'station_lat': station_lat,
-                      'station_elevation': station_elevation,
-                      'station_rec_elevation': station_rec_elevation,
-                      'obs_datetime': obs_datetime,
-                      'values_cm': obs}
-
-    # Create the pkl file if all data fetched is more than 60 days earlier
-    # than the current date/time.
-    lag = dt.datetime.utcnow() - end_datetime
-    if lag > dt.timedelta(days=60):
-        file_obj = open(file_name, 'wb')
-        pkl.dump(obs_snow_depth, file_obj)
-        file_obj.close()
+    obs_snow_depth = wdb0_stations.obs_dict(stations,
+                                            'values_cm',
+                                            obs,
+                                            obs_datetime,
+                                            num_hours=num_hours)
 
     return(obs_snow_depth)
 
@@ -221,76 +789,33 @@ def get_swe_obs(begin_datetime,
     2019-01-01 00 to 2019-01-31 23.
     """
 
-    file_name = 'wdb0_obs_snow_water_equivalent_' + \
-                begin_datetime.strftime('%Y%m%d%H') + \
-                '_to_' + \
-                end_datetime.strftime('%Y%m%d%H') + \
-                '.pkl'
-
-    if scratch_dir is not None:
-        file_name = os.path.join(scratch_dir, file_name)
-
-    if os.path.isfile(file_name):
-
-        # Retrieve data from pkl file and return.
-        file_obj = open(file_name, 'rb')
-        obs_swe = pkl.load(file_obj)
-        file_obj.close()
-        return(obs_swe)
-
     time_range = end_datetime - begin_datetime
     num_hours = time_range.days * 24 + time_range.seconds // 3600 + 1
 
-    # Open the web database.
-    conn_string = "host='wdb0.dmz.nohrsc.noaa.gov' dbname='web_data'"
-    conn = psycopg2.connect(conn_string)
-    conn.set_client_encoding("utf-8")
-    cursor = conn.cursor()
-
     # Define a SQL statement.
     sql_cmd = 'SELECT ' + \
               'point.allstation.obj_identifier, ' + \
-              'TRIM(point.allstation.station_id), ' + \
-              'TRIM(point.allstation.name), ' + \
-              'point.allstation.coordinates[0] AS lon, ' + \
-              'point.allstation.coordinates[1] AS lat, ' + \
-              'point.allstation.elevation, ' + \
-              'point.allstation.recorded_elevation, ' + \
               'date, ' + \
               'value * 1000.0 AS obs_swe_mm ' + \
               'FROM point.allstation, ' + \
               'point.obs_swe ' + \
-              'WHERE date >= \'' + \
-              begin_datetime.strftime('%Y-%m-%d %H:%M:%S') + \
-              '\' ' + \
-              'AND date <= \'' + \
-              end_datetime.strftime('%Y-%m-%d %H:%M:%S') + \
-              '\' ' + \
+              'WHERE date >= %s ' + \
+              'AND date <= %s ' + \
               'AND point.allstation.obj_identifier = ' + \
               'point.obs_swe.obj_identifier ' + \
               'AND value IS NOT NULL '
+    params = [begin_datetime, end_datetime]
 
     if bounding_box is not None:
         sql_cmd = sql_cmd + \
-                  'AND point.allstation.coordinates[0] >= ' + \
-                  '{} '.format(bounding_box[0]) + \
-                  'AND point.allstation.coordinates[0] < ' + \
-                  '{} '.format(bounding_box[1]) + \
-                  'AND point.allstation.coordinates[1] >= ' + \
-                  '{} '.format(bounding_box[2]) + \
-                  'AND point.allstation.coordinates[1] < ' + \
-                  '{} '.format(bounding_box[3])
+                  'AND point.allstation.coordinates[0] >= %s ' + \
+                  'AND point.allstation.coordinates[0] < %s ' + \
+                  'AND point.allstation.coordinates[1] >= %s ' + \
+                  'AND point.allstation.coordinates[1] < %s '
+        params.extend(bounding_box[0:4])
 
     sql_cmd = sql_cmd + 'ORDER BY obj_identifier, date;'
 
-    if verbose:
-        print('INFO: psql command "{}"'.format(sql_cmd))
-
-    cursor.execute(sql_cmd)
-
-    # The result below is just a huge list of tuples.
-    obs_swe = cursor.fetchall()
-
     obs_swe_column_list = ['obj_identifier',
                            'station_id',
                            'name',
@@ -301,75 +826,54 @@ def get_swe_obs(begin_datetime,
                            'date',
                            'obs_swe_mm']
 
-    df = pd.DataFrame(obs_swe, columns=obs_swe_column_list)
-
-    # This section organizes the query results into lists and arrays.
-
-    station_ind = -1
-    current_station_obj_id = -1
-    station_obj_id = []
-    station_id = []
-    station_name = []
-    station_lon = []
-    station_lat = []
-    station_elevation = []
-    station_rec_elevation = []
-    # Create a 2-d [time, station] array.
-    obs = np.ma.empty([1, num_hours], dtype=float)
-    obs[0,:] = no_data_value
-    obs[0,:] = np.ma.masked
-    for ind, row in df.iterrows():
-        if row['obj_identifier'] != current_station_obj_id:
-            station_ind += 1
-            if station_ind > 0:
-                # Just finished all data for previous station.
-                obs = np.ma.append(obs,
-                                   np.ma.empty([1, num_hours],
-                                               dtype=float),
-                                   axis=0)
-                obs[station_ind,:] = no_data_value
-                obs[station_ind,:] = np.ma.masked
-            # New station
-            station_obj_id.append(row['obj_identifier'])
-            station_id.append(row['station_id'])
-            station_name.append(row['name'])
-            station_lon.append(row['lon'])
-            station_lat.append(row['lat'])
-            station_elevation.append(row['elevation'])
-            station_rec_elevation.append(row['recorded_elevation'])
-
-            current_station_obj_id = station_obj_id[station_ind]
-
-        # Add the observation to the obs array.
-        time_diff = row['date'] - begin_datetime
-        time_ind = time_diff.days * 24 + time_diff.seconds // 3600
-        obs[station_ind, time_ind] = row['obs_swe_mm']
-
-    num_stations = station_ind + 1
+    if scratch_dir is not None and bounding_box is None:
+
+        # Assemble observations from the cache in scratch_dir.
+        df = get_cached_obs_df('swe',
+                               begin_datetime,
+                               end_datetime,
+                               scratch_dir,
+                               column_list=obs_swe_column_list,
+                               verbose=verbose)
+        batches = [df]
+
+    elif bounding_box is None:
+
+        # Extract observations in bulk.
+        df = get_element_obs_df('swe',
+                                begin_datetime,
+                                end_datetime,
+                                verbose=verbose)
+        df.columns = obs_swe_column_list
+        batches = [df]
+
+    else:
+
+        if verbose:
+            print('INFO: psql command "{}" '.format(sql_cmd) +
+                  'with parameters {}'.format(params))
+
+        # Stream the query results in batches of row tuples.
+        batches = wdb0_pool.fetch_batches(sql_cmd, params=params)
+
+    # Organize the query results into a station table and an array.
+    pivoted = pivot_obs_batches(batches,
+                                'obs_swe_mm',
+                                no_data_value=no_data_value,
+                                begin_datetime=begin_datetime,
+                                num_hours=num_hours)
+    stations = wdb0_stations.StationTable(*pivoted[0:7])
+    obs = pivoted[7]
 
     obs_datetime = [begin_datetime +
                     dt.timedelta(hours=i) for i in range(num_hours)]
 
     # Place results in a dictionary.
-    obs_swe = {'num_stations': num_stations,
-               'num_hours': num_hours,
-               'station_obj_id': station_obj_id,
-               'station_id': station_id,
-               'station_name': station_name,
-               'station_lon': station_lon,
-               'station_lat': station_lat,
-               'station_elevation': station_elevation,
-               'station_rec_elevation': station_rec_elevation,
-               'obs_datetime': obs_datetime,
-               'values_mm': obs}
-
-    # Create the pkl file if all data fetched is more than 60 days earlier
-    # than the current date/time.
-    lag = dt.datetime.utcnow() - end_datetime
-    if lag > dt.timedelta(days=60):
-        file_obj = open(file_name, 'wb')
-        pkl.dump(obs_swe, file_obj)
-        file_obj.close()
+    obs_swe = wdb0_stations.obs_dict(stations,
+                                     'values_mm',
+                                     obs,
+                                     obs_datetime,
+                                     num_hours=num_hours)
 
     return(obs_swe)
 
@@ -396,76 +900,33 @@ def get_swe_obs_df(begin_datetime,
     2019-01-01 00 to 2019-01-31 23.
     """
 
-    file_name = 'wdb0_obs_snow_water_equivalent_df_' + \
-                begin_datetime.strftime('%Y%m%d%H') + \
-                '_to_' + \
-                end_datetime.strftime('%Y%m%d%H') + \
-                '.pkl'
-
-    if scratch_dir is not None:
-        file_name = os.path.join(scratch_dir, file_name)
-
-    if os.path.isfile(file_name):
-
-        # Retrieve data from pkl file and return.
-        file_obj = open(file_name, 'rb')
-        obs_swe_df = pkl.load(file_obj)
-        file_obj.close()
-        return(obs_swe_df)
-
     time_range = end_datetime - begin_datetime
     num_hours = time_range.days * 24 + time_range.seconds // 3600 + 1
 
-    # Open the web database.
-    conn_string = "host='wdb0.dmz.nohrsc.noaa.gov' dbname='web_data'"
-    conn = psycopg2.connect(conn_string)
-    conn.set_client_encoding("utf-8")
-    cursor = conn.cursor()
-
     # Define a SQL statement.
     sql_cmd = 'SELECT ' + \
               'point.allstation.obj_identifier, ' + \
-              'TRIM(point.allstation.station_id), ' + \
-              'TRIM(point.allstation.name), ' + \
-              'point.allstation.coordinates[0] AS lon, ' + \
-              'point.allstation.coordinates[1] AS lat, ' + \
-              'point.allstation.elevation, ' + \
-              'point.allstation.recorded_elevation, ' + \
               'date, ' + \
               'value * 1000.0 AS obs_swe_mm ' + \
               'FROM point.allstation, ' + \
               'point.obs_swe ' + \
-              'WHERE date >= \'' + \
-              begin_datetime.strftime('%Y-%m-%d %H:%M:%S') + \
-              '\' ' + \
-              'AND date <= \'' + \
-              end_datetime.strftime('%Y-%m-%d %H:%M:%S') + \
-              '\' ' + \
+              'WHERE date >= %s ' + \
+              'AND date <= %s ' + \
               'AND point.allstation.obj_identifier = ' + \
               'point.obs_swe.obj_identifier ' + \
               'AND value IS NOT NULL '
+    params = [begin_datetime, end_datetime]
 
     if bounding_box is not None:
         sql_cmd = sql_cmd + \
-                  'AND point.allstation.coordinates[0] >= ' + \
-                  '{} '.format(bounding_box[0]) + \
-                  'AND point.allstation.coordinates[0] < ' + \
-                  '{} '.format(bounding_box[1]) + \
-                  'AND point.allstation.coordinates[1] >= ' + \
-                  '{} '.format(bounding_box[2]) + \
-                  'AND point.allstation.coordinates[1] < ' + \
-                  '{} '.format(bounding_box[3])
+                  'AND point.allstation.coordinates[0] >= %s ' + \
+                  'AND point.allstation.coordinates[0] < %s ' + \
+                  'AND point.allstation.coordinates[1] >= %s ' + \
+                  'AND point.allstation.coordinates[1] < %s '
+        params.extend(bounding_box[0:4])
 
     sql_cmd = sql_cmd + 'ORDER BY obj_identifier, date;'
 
-    if verbose:
-        print('INFO: psql command "{}"'.format(sql_cmd))
-
-    cursor.execute(sql_cmd)
-
-    # The result below is just a huge list of tuples.
-    obs_swe = cursor.fetchall()
-
     obs_swe_column_list = ['obj_identifier',
                            'station_id',
                            'name',
@@ -476,16 +937,40 @@ def get_swe_obs_df(begin_datetime,
                            'date',
                            'obs_swe_mm']
 
-    obs_swe_df = pd.DataFrame(obs_swe, columns=obs_swe_column_list)
-    conn.close()
+    if scratch_dir is not None and bounding_box is None:
 
-    # Create the pkl file if all data fetched is more than 60 days earlier
-    # than the current date/time.
-    lag = dt.datetime.utcnow() - end_datetime
-    if lag > dt.timedelta(days=60):
-        file_obj = open(file_name, 'wb')
-        pkl.dump(obs_swe_df, file_obj)
-        file_obj.close()
+        # Assemble observations from the cache in scratch_dir.
+        obs_swe_df = get_cached_obs_df('swe',
+                                       begin_datetime,
+                                       end_datetime,
+                                       scratch_dir,
+                                       column_list=obs_swe_column_list,
+                                       verbose=verbose)
+
+    elif bounding_box is None:
+
+        # Extract observations in bulk.
+        obs_swe_df = get_element_obs_df('swe',
+                                        begin_datetime,
+                                        end_datetime,
+                                        verbose=verbose)
+        obs_swe_df.columns = obs_swe_column_list
+
+    else:
+
+        if verbose:
+            print('INFO: psql command "{}" '.format(sql_cmd) +
+                  'with parameters {}'.format(params))
+
+        # The result below is just a huge list of tuples.
+        obs_swe = wdb0_pool.fetchall(sql_cmd, params=params)
+
+        # Join station metadata locally.
+        obs_swe_df = pd.DataFrame(obs_swe,
+                                  columns=['obj_identifier', 'date', 'value'])
+        obs_swe_df = \
+            _station_table.join(obs_swe_df)[wdb0_stations.OBS_COLUMNS]
+        obs_swe_df.columns = obs_swe_column_list
 
     return(obs_swe_df)
 
@@ -509,91 +994,43 @@ def get_prev_snow_depth_obs(target_datetime,
     begin_datetime = target_datetime - dt.timedelta(hours=num_hrs_prev)
     end_datetime = target_datetime - dt.timedelta(hours=1)
 
-    # Only use .pkl files if there is no bounding box.
-    if bounding_box is None:
-
-        file_name = 'wdb0_obs_snow_depth_' + \
-                    '{}_hours_prior_to_'.format(num_hrs_prev) + \
-                    target_datetime.strftime('%Y%m%d%H') + \
-                    '_snow_depth' + \
-                    '.pkl'
-
-        if scratch_dir is not None:
-            file_name = os.path.join(scratch_dir, file_name)
-
-            if os.path.isfile(file_name):
-
-                # Retrieve data from pkl file and return.
-                file_obj = open(file_name, 'rb')
-                obs_snow_depth = pkl.load(file_obj)
-                file_obj.close()
-                return(obs_snow_depth)
-
     time_range = end_datetime - begin_datetime
     num_hours = time_range.days * 24 + time_range.seconds // 3600 + 1
 
-    # Open the web database.
-    conn_string = "host='wdb0.dmz.nohrsc.noaa.gov' dbname='web_data'"
-    conn = psycopg2.connect(conn_string)
-    conn.set_client_encoding("utf-8")
-    cursor = conn.cursor()
-
     # Define a SQL statement.
     sql_cmd = 'SELECT ' + \
               't1.obj_identifier, ' + \
-              'TRIM(t3.station_id), ' + \
-              'TRIM(t3.name), ' + \
-              't3.coordinates[0] AS lon, ' + \
-              't3.coordinates[1] AS lat, ' + \
-              't3.elevation, ' + \
-              't3.recorded_elevation, ' + \
               't2.date, ' + \
               't2.value * 100.0 AS obs_snow_depth_cm ' + \
               'FROM ' + \
               '(' + \
               'SELECT obj_identifier ' + \
               'FROM point.obs_snow_depth ' + \
-              'WHERE date = \'' + \
-              target_datetime.strftime('%Y-%m-%d %H:%M:%S') + \
-              '\' ' + \
+              'WHERE date = %s ' + \
               'AND value IS NOT NULL ' + \
               'GROUP BY obj_identifier' + \
               ') ' + \
               'AS t1, ' + \
               'point.obs_snow_depth AS t2, ' + \
               'point.allstation AS t3 ' + \
-              'WHERE t2.date >= \'' + \
-              begin_datetime.strftime('%Y-%m-%d %H:%M:%S') + \
-              '\' ' + \
-              'AND t2.date <= \'' + \
-              end_datetime.strftime('%Y-%m-%d %H:%M:%S') + \
-              '\' ' + \
+              'WHERE t2.date >= %s ' + \
+              'AND t2.date <= %s ' + \
               'AND t1.obj_identifier = t2.obj_identifier ' + \
               'AND t2.obj_identifier = t3.obj_identifier ' + \
               'AND t3.obj_identifier = t1.obj_identifier ' + \
               'AND t2.value IS NOT NULL '
+    params = [target_datetime, begin_datetime, end_datetime]
 
     if bounding_box is not None:
         sql_cmd = sql_cmd + \
-                  'AND t3.coordinates[0] >= ' + \
-                  '{} '.format(bounding_box[0]) + \
-                  'AND t3.coordinates[0] < ' + \
-                  '{} '.format(bounding_box[1]) + \
-                  'AND t3.coordinates[1] >= ' + \
-                  '{} '.format(bounding_box[2]) + \
-                  'AND t3.coordinates[1] < ' + \
-                  '{} '.format(bounding_box[3])
+                  'AND t3.coordinates[0] >= %s ' + \
+                  'AND t3.coordinates[0] < %s ' + \
+                  'AND t3.coordinates[1] >= %s ' + \
+                  'AND t3.coordinates[1] < %s '
+        params.extend(bounding_box[0:4])
 
     sql_cmd = sql_cmd + 'ORDER BY t1.obj_identifier, t2.date;'
 
-    if verbose:
-        print('INFO: psql command "{}"'.format(sql_cmd))
-
-    cursor.execute(sql_cmd)
-
-    # The result below is just a huge list of tuples.
-    obs_depth = cursor.fetchall()
-
     obs_depth_column_list = ['obj_identifier',
                              'station_id',
                              'name',
@@ -604,88 +1041,50 @@ def get_prev_snow_depth_obs(target_datetime,
                              'date',
                              'obs_snow_depth_cm']
 
-    df = pd.DataFrame(obs_depth, columns=obs_depth_column_list)
-
-    # This section organizes the query results into lists and arrays.
-
-    station_ind = -1
-    current_station_obj_id = -1
-    station_obj_id = []
-    station_id = []
-    station_name = []
-    station_lon = []
-    station_lat = []
-    station_elevation = []
-    station_rec_elevation = []
-    # Create a 2-d [time, station] array.
-    obs = np.ma.empty([1, num_hours], dtype=float)
-    obs[0,:] = no_data_value
-    obs[0,:] = np.ma.masked
-    for ind, row in df.iterrows():
-        if row['obj_identifier'] != current_station_obj_id:
-            station_ind += 1
-            if station_ind > 0:
-                # Just finished all data for previous station.
-                obs = np.ma.append(obs,
-                                   np.ma.empty([1,
-                                                num_hours],
-                                               dtype=float),
-                                   axis=0)
-                obs[station_ind,:] = no_data_value
-                obs[station_ind,:] = np.ma.masked
-            # New station
-            station_obj_id.append(row['obj_identifier'])
-            station_id.append(row['station_id'])
-            station_name.append(row['name'])
-            station_lon.append(row['lon'])
-            station_lat.append(row['lat'])
-            station_elevation.append(row['elevation'])
-            station_rec_elevation.append(row['recorded_elevation'])
-
-            current_station_obj_id = station_obj_id[station_ind]
-
-        # Add the observation to the obs array.
-        time_diff = row['date'] - begin_datetime
-        time_ind = time_diff.days * 24 + time_diff.seconds // 3600
-
-        try:
-            obs[station_ind, time_ind] = row['obs_snow_depth_cm']
-        except:
-            print(num_hours)
-            print(station_ind, time_ind)
-            print(obs)
-            print(obs.shape)
-            print(row)
-            exit(1)
+    if scratch_dir is not None and bounding_box is None:
+
+        # Assemble observations from the cache in scratch_dir.
+        snwd_obj_id = get_cached_obs_df('snow_depth',
+                                        target_datetime,
+                                        target_datetime,
+                                        scratch_dir,
+                                        verbose=verbose)['obj_identifier']
+        df = get_cached_obs_df('snow_depth',
+                               begin_datetime,
+                               end_datetime,
+                               scratch_dir,
+                               column_list=obs_depth_column_list,
+                               obj_identifiers=snwd_obj_id,
+                               verbose=verbose)
+        batches = [df]
 
-    num_stations = station_ind + 1
+    else:
+
+        if verbose:
+            print('INFO: psql command "{}" '.format(sql_cmd) +
+                  'with parameters {}'.format(params))
+
+        # Stream the query results in batches of row tuples.
+        batches = wdb0_pool.fetch_batches(sql_cmd, params=params)
+
+    # Organize the query results into a station table and an array.
+    pivoted = pivot_obs_batches(batches,
+                                'obs_snow_depth_cm',
+                                no_data_value=no_data_value,
+                                begin_datetime=begin_datetime,
+                                num_hours=num_hours)
+    stations = wdb0_stations.StationTable(*pivoted[0:7])
+    obs = pivoted[7]
 
     obs_datetime = [begin_datetime +
                     dt.timedelta(hours=i) for i in range(num_hours)]
 
     # Place results in a dictionary.
-    obs_snow_depth = {'num_stations': num_stations,
-                      'num_hours': num_hours,
-                      'station_obj_id': station_obj_id,
-                      'station_id': station_id,
-                      'station_name': station_name,
-                      'station_lon': station_lon,
-                      'station_lat': station_lat,
-                      'station_elevation': station_elevation,
-                      'station_rec_elevation': station_rec_elevation,
-                      'obs_datetime': obs_datetime,
-                      'values_cm': obs}
-
-    # Create the pkl file if all data fetched is more than 60 days earlier
-    # than the current date/time.
-    lag = dt.datetime.utcnow() - end_datetime
-    if bounding_box is None and \
-       lag > dt.timedelta(days=60):
-        file_obj = open(file_name, 'wb')
-        pkl.dump(obs_snow_depth, file_obj)
-        file_obj.close()
-        if verbose:
-            print('INFO: wrote query results to {}.'.format(file_name))
+    obs_snow_depth = wdb0_stations.obs_dict(stations,
+                                            'values_cm',
+                                            obs,
+                                            obs_datetime,
+                                            num_hours=num_hours)
 
     return(obs_snow_depth)
 
@@ -709,91 +1108,43 @@ def get_prev_swe_obs(target_datetime,
     begin_datetime = target_datetime - dt.timedelta(hours=num_hrs_prev)
     end_datetime = target_datetime - dt.timedelta(hours=1)
 
-    # Only use .pkl files if there is no bounding box.
-    if bounding_box is None:
-
-        file_name = 'wdb0_obs_swe_' + \
-                    '{}_hours_prior_to_'.format(num_hrs_prev) + \
-                    target_datetime.strftime('%Y%m%d%H') + \
-                    '_swe' + \
-                    '.pkl'
-
-        if scratch_dir is not None:
-            file_name = os.path.join(scratch_dir, file_name)
-
-            if os.path.isfile(file_name):
-
-                # Retrieve data from pkl file and return.
-                file_obj = open(file_name, 'rb')
-                obs_swe = pkl.load(file_obj)
-                file_obj.close()
-                return(obs_swe)
-
     time_range = end_datetime - begin_datetime
     num_hours = time_range.days * 24 + time_range.seconds // 3600 + 1
 
-    # Open the web database.
-    conn_string = "host='wdb0.dmz.nohrsc.noaa.gov' dbname='web_data'"
-    conn = psycopg2.connect(conn_string)
-    conn.set_client_encoding("utf-8")
-    cursor = conn.cursor()
-
     # Define a SQL statement.
     sql_cmd = 'SELECT ' + \
               't1.obj_identifier, ' + \
-              'TRIM(t3.station_id), ' + \
-              'TRIM(t3.name), ' + \
-              't3.coordinates[0] AS lon, ' + \
-              't3.coordinates[1] AS lat, ' + \
-              't3.elevation, ' + \
-              't3.recorded_elevation, ' + \
               't2.date, ' + \
               't2.value * 1000.0 AS obs_swe_mm ' +\
               'FROM ' + \
               '(' + \
               'SELECT obj_identifier ' + \
               'FROM point.obs_swe ' + \
-              'WHERE date = \'' + \
-              target_datetime.strftime('%Y-%m-%d %H:%M:%S') + \
-              '\' ' + \
+              'WHERE date = %s ' + \
               'AND value IS NOT NULL ' + \
               'GROUP BY obj_identifier' + \
               ') ' + \
               'AS t1, ' + \
               'point.obs_swe AS t2, ' + \
               'point.allstation AS t3 ' + \
-              'WHERE t2.date >= \'' + \
-              begin_datetime.strftime('%Y-%m-%d %H:%M:%S') + \
-              '\' ' + \
-              'AND t2.date <= \'' + \
-              end_datetime.strftime('%Y-%m-%d %H:%M:%S') + \
-              '\' ' + \
+              'WHERE t2.date >= %s ' + \
+              'AND t2.date <= %s ' + \
               'AND t1.obj_identifier = t2.obj_identifier ' + \
               'AND t2.obj_identifier = t3.obj_identifier ' + \
               'AND t3.obj_identifier = t1.obj_identifier ' + \
               'AND t2.value IS NOT NULL '
+    params = [target_datetime, begin_datetime, end_datetime]
 
     if bounding_box is not None:
         sql_cmd = sql_cmd + \
-                  'AND t3.coordinates[0] >= ' + \
-                  '{} '.format(bounding_box[0]) + \
-                  'AND t3.coordinates[0] < ' + \
-                  '{} '.format(bounding_box[1]) + \
-                  'AND t3.coordinates[1] >= ' + \
-                  '{} '.format(bounding_box[2]) + \
-                  'AND t3.coordinates[1] < ' + \
-                  '{} '.format(bounding_box[3])
+                  'AND t3.coordinates[0] >= %s ' + \
+                  'AND t3.coordinates[0] < %s ' + \
+                  'AND t3.coordinates[1] >= %s ' + \
+                  'AND t3.coordinates[1] < %s '
+        params.extend(bounding_box[0:4])
 
     sql_cmd = sql_cmd + 'ORDER BY t1.obj_identifier, t2.date;'
 
-    if verbose:
-        print('INFO: psql command "{}"'.format(sql_cmd))
-
-    cursor.execute(sql_cmd)
-
-    # The result below is just a huge list of tuples.
-    obs_swe = cursor.fetchall()
-
     obs_swe_column_list = ['obj_identifier',
                            'station_id',
                            'name',
@@ -804,230 +1155,134 @@ def get_prev_swe_obs(target_datetime,
                            'date',
                            'obs_swe_mm']
 
-    df = pd.DataFrame(obs_swe, columns=obs_swe_column_list)
-
-    # This section organizes the query results into lists and arrays.
-
-    station_ind = -1
-    current_station_obj_id = -1
-    station_obj_id = []
-    station_id = []
-    station_name = []
-    station_lon = []
-    station_lat = []
-    station_elevation = []
-    station_rec_elevation = []
-    # Create a 2-d [time, station] array.
-    obs = np.ma.empty([1, num_hours], dtype=float)
-    obs[0,:] = no_data_value
-    obs[0,:] = np.ma.masked
-    for ind, row in df.iterrows():
-        if row['obj_identifier'] != current_station_obj_id:
-            station_ind += 1
-            if station_ind > 0:
-                # Just finished all data for previous station.
-                obs = np.ma.append(obs,
-                                   np.ma.empty([1,
-                                                num_hours],
-                                               dtype=float),
-                                   axis=0)
-                obs[station_ind,:] = no_data_value
-                obs[station_ind,:] = np.ma.masked
-            # New station
-            station_obj_id.append(row['obj_identifier'])
-            station_id.append(row['station_id'])
-            station_name.append(row['name'])
-            station_lon.append(row['lon'])
-            station_lat.append(row['lat'])
-            station_elevation.append(row['elevation'])
-            station_rec_elevation.append(row['recorded_elevation'])
-
-            current_station_obj_id = station_obj_id[station_ind]
-
-        # Add the observation to the obs array.
-        time_diff = row['date'] - begin_datetime
-        time_ind = time_diff.days * 24 + time_diff.seconds // 3600
-
-        # try:
-        obs[station_ind, time_ind] = row['obs_swe_mm']
-        # except:
-        #     print(num_hours)
-        #     print(station_ind, time_ind)
-        #     print(obs)
-        #     print(obs.shape)
-        #     print(row)
-        #     exit(1)
-
-    num_stations = station_ind + 1
+    if scratch_dir is not None and bounding_box is None:
+
+        # Assemble observations from the cache in scratch_dir.
+        swe_obj_id = get_cached_obs_df('swe',
+                                       target_datetime,
+                                       target_datetime,
+                                       scratch_dir,
+                                       verbose=verbose)['obj_identifier']
+        df = get_cached_obs_df('swe',
+                               begin_datetime,
+                               end_datetime,
+                               scratch_dir,
+                               column_list=obs_swe_column_list,
+                               obj_identifiers=swe_obj_id,
+                               verbose=verbose)
+        batches = [df]
+
+    else:
+
+        if verbose:
+            print('INFO: psql command "{}" '.format(sql_cmd) +
+                  'with parameters {}'.format(params))
+
+        # Stream the query results in batches of row tuples.
+        batches = wdb0_pool.fetch_batches(sql_cmd, params=params)
+
+    # Organize the query results into a station table and an array.
+    pivoted = pivot_obs_batches(batches,
+                                'obs_swe_mm',
+                                no_data_value=no_data_value,
+                                begin_datetime=begin_datetime,
+                                num_hours=num_hours)
+    stations = wdb0_stations.StationTable(*pivoted[0:7])
+    obs = pivoted[7]
 
     obs_datetime = [begin_datetime +
                     dt.timedelta(hours=i) for i in range(num_hours)]
 
     # Place results in a dictionary.
-    obs_swe = {'num_stations': num_stations,
-               'num_hours': num_hours,
-               'station_obj_id': station_obj_id,
-               'station_id': station_id,
-               'station_name': station_name,
-               'station_lon': station_lon,
-               'station_lat': station_lat,
-               'station_elevation': station_elevation,
-               'station_rec_elevation': station_rec_elevation,
-               'obs_datetime': obs_datetime,
-               'values_mm': obs}
-
-    # Create the pkl file if all data fetched is more than 60 days earlier
-    # than the current date/time.
-    lag = dt.datetime.utcnow() - end_datetime
-    if bounding_box is None and \
-       lag > dt.timedelta(days=60):
-        file_obj = open(file_name, 'wb')
-        pkl.dump(obs_swe, file_obj)
-        file_obj.close()
-        if verbose:
-            print('INFO: wrote query results to {}.'.format(file_name))
+    obs_swe = wdb0_stations.obs_dict(stations,
+                                     'values_mm',
+                                     obs,
+                                     obs_datetime,
+                                     num_hours=num_hours)
 
     return(obs_swe)
 
 
+# Air temperature observations kept between calls to get_air_temp_obs, by
+# scratch_dir.
+_air_temp_windows = {}
+_air_temp_windows_lock = threading.Lock()
+
+
+def _get_air_temp_window(num_hours, scratch_dir=None, verbose=None):
+    """
+    Get the shared buffer of air temperature observations used by
+    get_air_temp_obs, making sure it holds at least num_hours. The caller
+    must hold _air_temp_windows_lock.
+    """
+    window = _air_temp_windows.get(scratch_dir)
+    if window is None or window.num_hours < num_hours:
+        window = wdb0_buffer.ObsWindowBuffer('air_temp',
+                                             num_hours,
+                                             scratch_dir=scratch_dir,
+                                             verbose=verbose)
+        _air_temp_windows[scratch_dir] = window
+    window.verbose = verbose
+    return(window)
+
+
 def get_air_temp_obs(begin_datetime,
                      end_datetime,
                      no_data_value=-99999.0,
                      bounding_box=None,
                      scratch_dir=None,
                      verbose=None,
-                     prev_obs_air_temp=None):
+                     use_window=True):
 
     """
     Get hourly air temperature observations from the "web_data" database on
     wdb0.
-    """
-
-    # Only use .pkl files if there is no bounding box.
-    if bounding_box is None:
-
-        file_name = 'wdb0_obs_air_temp_' + \
-                    begin_datetime.strftime('%Y%m%d%H') + \
-                    '_to_' + \
-                    end_datetime.strftime('%Y%m%d%H') + \
-                    '.pkl'
-
-        if scratch_dir is not None:
-            file_name = os.path.join(scratch_dir, file_name)
-
-            if os.path.isfile(file_name):
-
-                # Retrieve data from pkl file and return.
-                file_obj = open(file_name, 'rb')
-                obs_air_temp = pkl.load(file_obj)
-                file_obj.close()
-                return(obs_air_temp)
 
+    Unless a bounding_box is given or use_window is False, observations are
+    kept in memory between calls (see wdb0_buffer.ObsWindowBuffer), so a
+    call whose time range overlaps the previous one only fetches the hours
+    not already held, along with recent hours that may have received late
+    reports.
+    """
 
     time_range = end_datetime - begin_datetime
     num_hours = time_range.days * 24 + time_range.seconds // 3600 + 1
-    # print('num_hours = {}'.format(num_hours))
-    obs_datetime = [begin_datetime +
-                    dt.timedelta(hours=i) for i in range(num_hours)]
-
-    if prev_obs_air_temp is not None:
-
-        # Determine whether the prev_obs_air_temp.obs_datetime overlaps with a
-        # portion of either the beginning or the end of obs_datetime.
-        prev_obs_datetime = prev_obs_air_temp['obs_datetime']
-        prev_begin_datetime = prev_obs_datetime[0]
-        prev_end_datetime = prev_obs_datetime[-1]
-
-        dt_in_both = sorted(list(set(prev_obs_datetime) & set(obs_datetime)))
-        # prev_obs_in_obs = [prev_obs_datetime.index(i) for i in dt_in_both]
-
-        # Verify that the list of new datetimes for which we need data is
-        # continguous, which keeps this function simple.
-        # print('obs_datetime:')
-        # print(obs_datetime)
-        # print('dt_in_both:')
-        # print(dt_in_both)
-        obs_dt_from_prev_obs_dt = [obs_datetime.index(i) for i in dt_in_both]
-        print('obs_dt_from_prev_obs_dt:')
-        print(obs_dt_from_prev_obs_dt)
-        if len(obs_dt_from_prev_obs_dt) == 0:
-            prev_obs_air_temp = None
-        else:
-            if (obs_dt_from_prev_obs_dt[0] != 0) and \
-               (obs_dt_from_prev_obs_dt[-1] != (num_hours - 1)):
-                prev_obs_air_temp = None
-
-    if prev_obs_air_temp is not None:
-        # Identify the datetimes for which new data is needed.
-        # print('obs_dt_from_prev_obs_dt:')
-        # print(obs_dt_from_prev_obs_dt)
-        dt_needed = sorted(list(set(obs_datetime) - set(prev_obs_datetime)))
-        # print('dt_needed:')
-        # print(dt_needed)
-        curr_begin_datetime = dt_needed[0]
-        curr_end_datetime = dt_needed[-1]
-        curr_num_hours = len(dt_needed)
-        curr_obs_datetime = [curr_begin_datetime +
-                             dt.timedelta(hours=i)
-                             for i in range(curr_num_hours)]
-        obs_dt_from_curr_obs_dt = [obs_datetime.index(i)
-                                   for i in curr_obs_datetime]
 
-    else:
-        curr_begin_datetime = begin_datetime
-        curr_end_datetime = end_datetime
-        curr_num_hours = num_hours
-        curr_obs_datetime = obs_datetime
+    if use_window and bounding_box is None:
+        with _air_temp_windows_lock:
+            window = _get_air_temp_window(num_hours,
+                                          scratch_dir=scratch_dir,
+                                          verbose=verbose)
+            return(window.get_obs(begin_datetime,
+                                  end_datetime,
+                                  no_data_value))
 
-    # Open the web database.
-    conn_string = "host='wdb0.dmz.nohrsc.noaa.gov' dbname='web_data'"
-    conn = psycopg2.connect(conn_string)
-    conn.set_client_encoding("utf-8")
-    cursor = conn.cursor()
+    obs_datetime = [begin_datetime +
+                    dt.timedelta(hours=i) for i in range(num_hours)]
 
     # Define a SQL statement.
     sql_cmd = 'SELECT ' + \
               'point.allstation.obj_identifier, ' + \
-              'TRIM(point.allstation.station_id), ' + \
-              'TRIM(point.allstation.name), ' + \
-              'point.allstation.coordinates[0] as lon, ' + \
-              'point.allstation.coordinates[1] as lat, ' + \
-              'point.allstation.elevation, ' + \
-              'point.allstation.recorded_elevation, ' + \
               'date, ' + \
               'value AS obs_air_temp_deg_c ' + \
               'FROM point.allstation, point.obs_airtemp ' + \
-              'WHERE date >= \'' + \
-              curr_begin_datetime.strftime('%Y-%m-%d %H:%M:%S') + \
-              '\' ' + \
-              'AND date <= \'' + \
-              curr_end_datetime.strftime('%Y-%m-%d %H:%M:%S') + \
-              '\' ' + \
+              'WHERE date >= %s ' + \
+              'AND date <= %s ' + \
               'AND point.allstation.obj_identifier = ' + \
               'point.obs_airtemp.obj_identifier ' + \
               'AND value IS NOT NULL '
+    params = [begin_datetime, end_datetime]
 
     if bounding_box is not None:
         sql_cmd = sql_cmd + \
-                  'AND point.allstation.coordinates[0] >= ' + \
-                  '{} '.format(bounding_box[0]) + \
-                  'AND point.allstation.coordinates[0] < ' + \
-                  '{} '.format(bounding_box[1]) + \
-                  'AND point.allstation.coordinates[1] >= ' + \
-                  '{} '.format(bounding_box[2]) + \
-                  'AND point.allstation.coordinates[1] < ' + \
-                  '{} '.format(bounding_box[3])
+                  'AND point.allstation.coordinates[0] >= %s ' + \
+                  'AND point.allstation.coordinates[0] < %s ' + \
+                  'AND point.allstation.coordinates[1] >= %s ' + \
+                  'AND point.allstation.coordinates[1] < %s '
+        params.extend(bounding_box[0:4])
 
     sql_cmd = sql_cmd + 'ORDER BY obj_identifier, date;'
 
-    if verbose:
-        print('INFO: psql command "{}"'.format(sql_cmd))
-
-    cursor.execute(sql_cmd)
-
-    # The result below is just a huge list of tuples.
-    fetched_airtemp = cursor.fetchall()
-
     obs_air_temp_column_list = ['obj_identifier',
                                 'station_id',
                                 'name',
@@ -1038,130 +1293,51 @@ def get_air_temp_obs(begin_datetime,
                                 'date',
                                 'obs_air_temp_deg_c']
 
-    df = pd.DataFrame(fetched_airtemp, columns=obs_air_temp_column_list)
-
-    # This section organizes the query results into lists and arrays.
-
-    station_ind = -1
-    current_station_obj_id = -1
-    station_obj_id = []
-    station_id = []
-    station_name = []
-    station_lon = []
-    station_lat = []
-    station_elevation = []
-    station_rec_elevation = []
-    # Create a 2-d [time, station] array.
-    curr_obs = np.ma.empty([1, curr_num_hours], dtype=float)
-    curr_obs[0,:] = no_data_value
-    curr_obs[0,:] = np.ma.masked
-    for ind, row in df.iterrows():
-        if row['obj_identifier'] != current_station_obj_id:
-            station_ind += 1
-            if station_ind > 0:
-                # Just finished all data for previous station.
-                curr_obs = np.ma.append(curr_obs,
-                                   np.ma.empty([1,
-                                                curr_num_hours],
-                                               dtype=float),
-                                   axis=0)
-                curr_obs[station_ind,:] = no_data_value
-                curr_obs[station_ind,:] = np.ma.masked
-            # New station
-            station_obj_id.append(row['obj_identifier'])
-            station_id.append(row['station_id'])
-            station_name.append(row['name'])
-            station_lon.append(row['lon'])
-            station_lat.append(row['lat'])
-            station_elevation.append(row['elevation'])
-            station_rec_elevation.append(row['recorded_elevation'])
-
-            current_station_obj_id = station_obj_id[station_ind]
-
-        # Add the observation to the curr_obs array.
-        time_diff = row['date'] - curr_begin_datetime
-        time_ind = time_diff.days * 24 + time_diff.seconds // 3600
-
-        curr_obs[station_ind, time_ind] = row['obs_air_temp_deg_c']
-
-    curr_num_stations = station_ind + 1
+    if scratch_dir is not None and bounding_box is None:
+
+        # Assemble observations from the cache in scratch_dir.
+        df = get_cached_obs_df('air_temp',
+                               begin_datetime,
+                               end_datetime,
+                               scratch_dir,
+                               column_list=obs_air_temp_column_list,
+                               verbose=verbose)
+        batches = [df]
+
+    elif bounding_box is None:
+
+        # Extract observations in bulk.
+        df = get_element_obs_df('air_temp',
+                                begin_datetime,
+                                end_datetime,
+                                verbose=verbose)
+        df.columns = obs_air_temp_column_list
+        batches = [df]
+
+    else:
 
-    # Place results in a dictionary.
-    print('num_hours: {}'.format(num_hours))
-    print('curr_num_hours: {}'.format(curr_num_hours))
-    obs_air_temp = {'num_stations': curr_num_stations,
-                    'num_hours': curr_num_hours,
-                    'station_obj_id': station_obj_id,
-                    'station_id': station_id,
-                    'station_name': station_name,
-                    'station_lon': station_lon,
-                    'station_lat': station_lat,
-                    'station_elevation': station_elevation,
-                    'station_rec_elevation': station_rec_elevation,
-                    'obs_datetime': curr_obs_datetime,
-                    'values_deg_c': curr_obs}
-
-    # Create the pkl file if all data fetched is more than 60 days earlier
-    # than the current date/time.
-    lag = dt.datetime.utcnow() - end_datetime
-    if bounding_box is None and \
-       lag > dt.timedelta(days=60):
-        file_obj = open(file_name, 'wb')
-        pkl.dump(obs_air_temp, file_obj)
-        file_obj.close()
         if verbose:
-            print('INFO: wrote query results to {}.'.format(file_name))
-
-    if prev_obs_air_temp is not None:
-
-        # Combine prev_obs_air_temp and obs_air_temp.
-        print('# prev stations: {}'.format(prev_obs_air_temp['num_stations']))
-
-        print('# current stations: {}'.format(obs_air_temp['num_stations']))
-        prev_station_obj_id = prev_obs_air_temp['station_obj_id']
-        new_station_obj_id = sorted(list(set(prev_station_obj_id) |
-                                         set(station_obj_id)))
-        print('# combined: {}'.format(len(new_station_obj_id)))
-        # Identify indices of previous and current object identifiers in the
-        # combined list.
-        # Using ".index" stuff is very slow.
-        new_station_from_prev = [new_station_obj_id.index(i)
-                                 for i in prev_station_obj_id]
-        new_station_from_curr = [new_station_obj_id.index(i)
-                                 for i in station_obj_id]
-        # print(len(new_station_from_prev))
-        # print(len(new_station_from_curr))
-        # print(new_station_from_prev[0:50])
-        # print(new_station_from_curr[0:50])
-        new_num_stations = len(new_station_obj_id)
-        prev_obs_in_obs = [prev_obs_datetime.index(i) for i in dt_in_both]
-        prev_obs = prev_obs_air_temp['values_deg_c'][:,prev_obs_in_obs]
-        # print(prev_obs_air_temp['values_deg_c'][:,
-        # print(len(obs_datetime))
-        # print(len(curr_obs_datetime))
-        # print(prev_obs_air_temp['values_deg_c'].shape)
-        # print(prev_obs.shape)
-        # print(curr_obs.shape)
-        # print(prev_obs.shape)
-        # print(len(new_station_from_prev))
-        # print(type(new_station_from_prev))
-        # print(len(obs_dt_from_prev_obs_dt))
-        # print(type(obs_dt_from_prev_obs_dt))
-        print(len(new_station_from_curr))
-        print(obs_dt_from_curr_obs_dt)
-        obs = np.ma.empty([new_num_stations, num_hours], dtype=float)
-        obs[:,:] = no_data_value
-        obs[:,:] = np.ma.masked
-        print(obs.shape)
-        si = 100
-        print(new_station_obj_id[si])
-        print(obs[si,:])
-        obs[np.ix_(new_station_from_prev, obs_dt_from_prev_obs_dt)] = \
-            prev_obs
-        print(obs[si,:])
-        obs[np.ix_(new_station_from_curr, obs_dt_from_curr_obs_dt)] = \
-            curr_obs
-        print(obs[si,:])
+            print('INFO: psql command "{}" '.format(sql_cmd) +
+                  'with parameters {}'.format(params))
+
+        # Stream the query results in batches of row tuples.
+        batches = wdb0_pool.fetch_batches(sql_cmd, params=params)
+
+    # Organize the query results into a station table and an array.
+    pivoted = pivot_obs_batches(batches,
+                                'obs_air_temp_deg_c',
+                                no_data_value=no_data_value,
+                                begin_datetime=begin_datetime,
+                                num_hours=num_hours)
+    stations = wdb0_stations.StationTable(*pivoted[0:7])
+    obs = pivoted[7]
+
+    # Place results in a dictionary.
+    obs_air_temp = wdb0_stations.obs_dict(stations,
+                                          'values_deg_c',
+                                          obs,
+                                          obs_datetime,
+                                          num_hours=num_hours)
 
     return(obs_air_temp)
 
@@ -1185,91 +1361,43 @@ def get_prev_air_temp_obs(target_datetime,
     begin_datetime = target_datetime - dt.timedelta(hours=num_hrs_prev)
     end_datetime = target_datetime - dt.timedelta(hours=1)
 
-    # Only use .pkl files if there is no bounding box.
-    if bounding_box is None:
-
-        file_name = 'wdb0_obs_air_temp_' + \
-                    '{}_hours_prior_to_'.format(num_hrs_prev) + \
-                    target_datetime.strftime('%Y%m%d%H') + \
-                    '_snow_depth' + \
-                    '.pkl'
-
-        if scratch_dir is not None:
-            file_name = os.path.join(scratch_dir, file_name)
-
-            if os.path.isfile(file_name):
-
-                # Retrieve data from pkl file and return.
-                file_obj = open(file_name, 'rb')
-                obs_air_temp = pkl.load(file_obj)
-                file_obj.close()
-                return(obs_air_temp)
-
     time_range = end_datetime - begin_datetime
     num_hours = time_range.days * 24 + time_range.seconds // 3600 + 1
 
-    # Open the web database.
-    conn_string = "host='wdb0.dmz.nohrsc.noaa.gov' dbname='web_data'"
-    conn = psycopg2.connect(conn_string)
-    conn.set_client_encoding("utf-8")
-    cursor = conn.cursor()
-
     # Define a SQL statement.
     sql_cmd = 'SELECT ' + \
               't1.obj_identifier, ' + \
-              'TRIM(t3.station_id), ' + \
-              'TRIM(t3.name), ' + \
-              't3.coordinates[0] AS lon, ' + \
-              't3.coordinates[1] AS lat, ' + \
-              't3.elevation, ' + \
-              't3.recorded_elevation, ' + \
               't2.date, ' + \
               't2.value AS obs_air_temp_deg_c ' + \
               'FROM ' + \
               '(' + \
               'SELECT obj_identifier ' + \
               'FROM point.obs_snow_depth ' + \
-              'WHERE date = \'' + \
-              target_datetime.strftime('%Y-%m-%d %H:%M:%S') + \
-              '\' ' + \
+              'WHERE date = %s ' + \
               'AND value IS NOT NULL ' + \
               'GROUP BY obj_identifier' + \
               ') ' + \
               'AS t1, ' + \
               'point.obs_airtemp AS t2, ' + \
               'point.allstation AS t3 ' + \
-              'WHERE t2.date >= \'' + \
-              begin_datetime.strftime('%Y-%m-%d %H:%M:%S') + \
-              '\' ' + \
-              'AND t2.date <= \'' + \
-              end_datetime.strftime('%Y-%m-%d %H:%M:%S') + \
-              '\' ' + \
+              'WHERE t2.date >= %s ' + \
+              'AND t2.date <= %s ' + \
               'AND t1.obj_identifier = t2.obj_identifier ' + \
               'AND t2.obj_identifier = t3.obj_identifier ' + \
               'AND t3.obj_identifier = t1.obj_identifier ' + \
               'AND t2.value IS NOT NULL '
+    params = [target_datetime, begin_datetime, end_datetime]
 
     if bounding_box is not None:
         sql_cmd = sql_cmd + \
-                  'AND t3.coordinates[0] >= ' + \
-                  '{} '.format(bounding_box[0]) + \
-                  'AND t3.coordinates[0] < ' + \
-                  '{} '.format(bounding_box[1]) + \
-                  'AND t3.coordinates[1] >= ' + \
-                  '{} '.format(bounding_box[2]) + \
-                  'AND t3.coordinates[1] < ' + \
-                  '{} '.format(bounding_box[3])
+                  'AND t3.coordinates[0] >= %s ' + \
+                  'AND t3.coordinates[0] < %s ' + \
+                  'AND t3.coordinates[1] >= %s ' + \
+                  'AND t3.coordinates[1] < %s '
+        params.extend(bounding_box[0:4])
 
     sql_cmd = sql_cmd + 'ORDER BY t1.obj_identifier, t2.date;'
 
-    if verbose:
-        print('INFO: psql command "{}"'.format(sql_cmd))
-
-    cursor.execute(sql_cmd)
-
-    # The result below is just a huge list of tuples.
-    fetched_airtemp = cursor.fetchall()
-
     obs_air_temp_column_list = ['obj_identifier',
                                 'station_id',
                                 'name',
@@ -1280,88 +1408,50 @@ def get_prev_air_temp_obs(target_datetime,
                                 'date',
                                 'obs_air_temp_deg_c']
 
-    df = pd.DataFrame(fetched_airtemp, columns=obs_air_temp_column_list)
-
-    # This section organizes the query results into lists and arrays.
-
-    station_ind = -1
-    current_station_obj_id = -1
-    station_obj_id = []
-    station_id = []
-    station_name = []
-    station_lon = []
-    station_lat = []
-    station_elevation = []
-    station_rec_elevation = []
-    # Create a 2-d [time, station] array.
-    obs = np.ma.empty([1, num_hours], dtype=float)
-    obs[0,:] = no_data_value
-    obs[0,:] = np.ma.masked
-    for ind, row in df.iterrows():
-        if row['obj_identifier'] != current_station_obj_id:
-            station_ind += 1
-            if station_ind > 0:
-                # Just finished all data for previous station.
-                obs = np.ma.append(obs,
-                                   np.ma.empty([1,
-                                                num_hours],
-                                               dtype=float),
-                                   axis=0)
-                obs[station_ind,:] = no_data_value
-                obs[station_ind,:] = np.ma.masked
-            # New station
-            station_obj_id.append(row['obj_identifier'])
-            station_id.append(row['station_id'])
-            station_name.append(row['name'])
-            station_lon.append(row['lon'])
-            station_lat.append(row['lat'])
-            station_elevation.append(row['elevation'])
-            station_rec_elevation.append(row['recorded_elevation'])
-
-            current_station_obj_id = station_obj_id[station_ind]
-
-        # Add the observation to the obs array.
-        time_diff = row['date'] - begin_datetime
-        time_ind = time_diff.days * 24 + time_diff.seconds // 3600
-
-        try:
-            obs[station_ind, time_ind] = row['obs_air_temp_deg_c']
-        except:
-            print(num_hours)
-            print(station_ind, time_ind)
-            print(obs)
-            print(obs.shape)
-            print(row)
-            exit(1)
+    if scratch_dir is not None and bounding_box is None:
+
+        # Assemble observations from the cache in scratch_dir.
+        snwd_obj_id = get_cached_obs_df('snow_depth',
+                                        target_datetime,
+                                        target_datetime,
+                                        scratch_dir,
+                                        verbose=verbose)['obj_identifier']
+        df = get_cached_obs_df('air_temp',
+                               begin_datetime,
+                               end_datetime,
+                               scratch_dir,
+                               column_list=obs_air_temp_column_list,
+                               obj_identifiers=snwd_obj_id,
+                               verbose=verbose)
+        batches = [df]
 
-    num_stations = station_ind + 1
+    else:
+
+        if verbose:
+            print('INFO: psql command "{}" '.format(sql_cmd) +
+                  'with parameters {}'.format(params))
+
+        # Stream the query results in batches of row tuples.
+        batches = wdb0_pool.fetch_batches(sql_cmd, params=params)
+
+    # Organize the query results into a station table and an array.
+    pivoted = pivot_obs_batches(batches,
+                                'obs_air_temp_deg_c',
+                                no_data_value=no_data_value,
+                                begin_datetime=begin_datetime,
+                                num_hours=num_hours)
+    stations = wdb0_stations.StationTable(*pivoted[0:7])
+    obs = pivoted[7]
 
     obs_datetime = [begin_datetime +
                     dt.timedelta(hours=i) for i in range(num_hours)]
 
     # Place results in a dictionary.
-    obs_air_temp = {'num_stations': num_stations,
-                    'num_hours': num_hours,
-                    'station_obj_id': station_obj_id,
-                    'station_id': station_id,
-                    'station_name': station_name,
-                    'station_lon': station_lon,
-                    'station_lat': station_lat,
-                    'station_elevation': station_elevation,
-                    'station_rec_elevation': station_rec_elevation,
-                    'obs_datetime': obs_datetime,
-                    'values_deg_c': obs}
-
-    # Create the pkl file if all data fetched is more than 60 days earlier
-    # than the current date/time.
-    lag = dt.datetime.utcnow() - end_datetime
-    if bounding_box is None and \
-       lag > dt.timedelta(days=60):
-        file_obj = open(file_name, 'wb')
-        pkl.dump(obs_air_temp, file_obj)
-        file_obj.close()
-        if verbose:
-            print('INFO: wrote query results to {}.'.format(file_name))
+    obs_air_temp = wdb0_stations.obs_dict(stations,
+                                          'values_deg_c',
+                                          obs,
+                                          obs_datetime,
+                                          num_hours=num_hours)
 
     return(obs_air_temp)
 
@@ -1383,86 +1473,40 @@ def get_snwd_snfl_obs(target_datetime,
     others.
     """
 
-    # Only use .pkl files if there is no bounding box.
-    if bounding_box is None:
-
-        file_name = 'wdb0_obs_snowfall_' + \
-                    '{}_hours_ending_'.format(duration_hours) + \
-                    target_datetime.strftime('%Y%m%d%H') + \
-                    '_snow_depth' + \
-                    '.pkl'
-
-        if scratch_dir is not None:
-            file_name = os.path.join(scratch_dir, file_name)
-
-            if os.path.isfile(file_name):
-
-                # Retrieve data from pkl file and return.
-                file_obj = open(file_name, 'rb')
-                obs_snowfall = pkl.load(file_obj)
-                file_obj.close()
-                return(obs_snowfall)
-
-    # Open the web database.
-    conn_string = "host='wdb0.dmz.nohrsc.noaa.gov' dbname='web_data'"
-    conn = psycopg2.connect(conn_string)
-    conn.set_client_encoding("utf-8")
-    cursor = conn.cursor()
-
     # Define a SQL statement.
     sql_cmd = 'SELECT ' + \
               't1.obj_identifier, ' + \
-              'TRIM(t3.station_id), ' + \
-              'TRIM(t3.name), ' + \
-              't3.coordinates[0] AS lon, ' + \
-              't3.coordinates[1] AS lat, ' + \
-              't3.elevation, ' + \
-              't3.recorded_elevation, ' + \
               't2.date, ' + \
               't2.value * 100.0 AS obs_snowfall_cm ' + \
               'FROM ' + \
               '(' + \
               'SELECT obj_identifier ' + \
               'FROM point.obs_snow_depth ' + \
-              'WHERE date = \'' + \
-              target_datetime.strftime('%Y-%m-%d %H:%M:%S') + \
-              '\' ' + \
+              'WHERE date = %s ' + \
               'AND value IS NOT NULL ' + \
               'GROUP BY obj_identifier' + \
               ') ' + \
               'AS t1, ' + \
               'point.obs_snowfall_raw AS t2, ' + \
               'point.allstation AS t3 ' + \
-              'WHERE t2.date = \'' + \
-              target_datetime.strftime('%Y-%m-%d %H:%M:%S') + \
-              '\' ' + \
-              'AND t2.duration = {} '.format(duration_hours * 3600) + \
+              'WHERE t2.date = %s ' + \
+              'AND t2.duration = %s ' + \
               'AND t1.obj_identifier = t2.obj_identifier ' + \
               'AND t2.obj_identifier = t3.obj_identifier ' + \
               'AND t3.obj_identifier = t1.obj_identifier ' + \
               'AND t2.value IS NOT NULL '
+    params = [target_datetime, target_datetime, duration_hours * 3600]
 
     if bounding_box is not None:
         sql_cmd = sql_cmd + \
-                  'AND t3.coordinates[0] >= ' + \
-                  '{} '.format(bounding_box[0]) + \
-                  'AND t3.coordinates[0] < ' + \
-                  '{} '.format(bounding_box[1]) + \
-                  'AND t3.coordinates[1] >= ' + \
-                  '{} '.format(bounding_box[2]) + \
-                  'AND t3.coordinates[1] < ' + \
-                  '{} '.format(bounding_box[3])
+                  'AND t3.coordinates[0] >= %s ' + \
+                  'AND t3.coordinates[0] < %s ' + \
+                  'AND t3.coordinates[1] >= %s ' + \
+                  'AND t3.coordinates[1] < %s '
+        params.extend(bounding_box[0:4])
 
     sql_cmd = sql_cmd + 'ORDER BY t1.obj_identifier, t2.date;'
 
-    if verbose:
-        print('INFO: psql command "{}"'.format(sql_cmd))
-
-    cursor.execute(sql_cmd)
-
-    # The result below is just a huge list of tuples.
-    obs_snowfall = cursor.fetchall()
-
     obs_snowfall_column_list = ['obj_identifier',
                                 'station_id',
                                 'name',
@@ -1473,85 +1517,45 @@ def get_snwd_snfl_obs(target_datetime,
                                 'date',
                                 'obs_snowfall_cm']
 
-    df = pd.DataFrame(obs_snowfall, columns=obs_snowfall_column_list)
-
-    # This section organizes the query results into lists and arrays.
-
-    station_ind = -1
-    current_station_obj_id = -1
-    station_obj_id = []
-    station_id = []
-    station_name = []
-    station_lon = []
-    station_lat = []
-    station_elevation = []
-    station_rec_elevation = []
-    # Create a 2-d [time, station] array.
-    # GF - 2nd dim used to be num_hours
-    obs = np.ma.empty([1], dtype=float)
-    obs[0] = no_data_value
-    obs[0] = np.ma.masked
-    # print(len(df))
-    for ind, row in df.iterrows():
-        if row['obj_identifier'] != current_station_obj_id:
-            station_ind += 1
-            if station_ind > 0:
-                # Just finished all data for previous station.
-                # GF - 2nd dim used to be num_hours
-                obs = np.ma.append(obs,
-                                   np.ma.empty([1],
-                                               dtype=float),
-                                   axis=0)
-                obs[station_ind] = no_data_value
-                obs[station_ind] = np.ma.masked
-            # New station
-            station_obj_id.append(row['obj_identifier'])
-            station_id.append(row['station_id'])
-            station_name.append(row['name'])
-            station_lon.append(row['lon'])
-            station_lat.append(row['lat'])
-            station_elevation.append(row['elevation'])
-            station_rec_elevation.append(row['recorded_elevation'])
-
-            current_station_obj_id = station_obj_id[station_ind]
-
-        # print(type(row['obj_identifier']))
-        # if row['obj_identifier'] == 11929:
-        #     print(row)
-        #     print(row['obs_snowfall_cm'])
-
-        try:
-            obs[station_ind] = row['obs_snowfall_cm']
-        except:
-            print(obs)
-            print(obs.shape)
-            print(row)
-            exit(1)
+    if scratch_dir is not None and bounding_box is None:
+
+        # Assemble observations from the cache in scratch_dir.
+        snwd_obj_id = get_cached_obs_df('snow_depth',
+                                        target_datetime,
+                                        target_datetime,
+                                        scratch_dir,
+                                        verbose=verbose)['obj_identifier']
+        df = get_cached_obs_df('snowfall',
+                               target_datetime,
+                               target_datetime,
+                               scratch_dir,
+                               column_list=obs_snowfall_column_list,
+                               duration_hours=duration_hours,
+                               obj_identifiers=snwd_obj_id,
+                               verbose=verbose)
+        batches = [df]
 
-    num_stations = station_ind + 1
+    else:
 
-    # Place results in a dictionary.
-    obs_snowfall = {'num_stations': num_stations,
-                    'station_obj_id': station_obj_id,
-                    'station_id': station_id,
-                    'station_name': station_name,
-                    'station_lon': station_lon,
-                    'station_lat': station_lat,
-                    'station_elevation': station_elevation,
-                    'station_rec_elevation': station_rec_elevation,
-                    'obs_datetime': target_datetime,
-                    'values_cm': obs}
-
-    # Create the pkl file if all data fetched is more than 60 days earlier
-    # than the current date/time.
-    lag = dt.datetime.utcnow() - target_datetime
-    if bounding_box is None and \
-       lag > dt.timedelta(days=60):
-        file_obj = open(file_name, 'wb')
-        pkl.dump(obs_snowfall, file_obj)
-        file_obj.close()
         if verbose:
-            print('INFO: wrote query results to {}.'.format(file_name))
+            print('INFO: psql command "{}" '.format(sql_cmd) +
+                  'with parameters {}'.format(params))
+
+        # Stream the query results in batches of row tuples.
+        batches = wdb0_pool.fetch_batches(sql_cmd, params=params)
+
+    # Organize the query results into a station table and an array.
+    pivoted = pivot_obs_batches(batches,
+                                'obs_snowfall_cm',
+                                no_data_value=no_data_value)
+    stations = wdb0_stations.StationTable(*pivoted[0:7])
+    obs = pivoted[7]
+
+    # Place results in a dictionary.
+    obs_snowfall = wdb0_stations.obs_dict(stations,
+                                          'values_cm',
+                                          obs,
+                                          target_datetime)
 
     return(obs_snowfall)
 
@@ -1573,86 +1577,40 @@ def get_snwd_prcp_obs(target_datetime,
     ignore all others.
     """
 
-    # Only use .pkl files if there is no bounding box.
-    if bounding_box is None:
-
-        file_name = 'wdb0_obs_precipitation_' + \
-                    '{}_hours_ending_'.format(duration_hours) + \
-                    target_datetime.strftime('%Y%m%d%H') + \
-                    '_snow_depth' + \
-                    '.pkl'
-
-        if scratch_dir is not None:
-            file_name = os.path.join(scratch_dir, file_name)
-
-            if os.path.isfile(file_name):
-
-                # Retrieve data from pkl file and return.
-                file_obj = open(file_name, 'rb')
-                obs_precip = pkl.load(file_obj)
-                file_obj.close()
-                return(obs_precip)
-
-    # Open the web database.
-    conn_string = "host='wdb0.dmz.nohrsc.noaa.gov' dbname='web_data'"
-    conn = psycopg2.connect(conn_string)
-    conn.set_client_encoding("utf-8")
-    cursor = conn.cursor()
-
     # Define a SQL statement.
     sql_cmd = 'SELECT ' + \
               't1.obj_identifier, ' + \
-              'TRIM(t3.station_id), ' + \
-              'TRIM(t3.name), ' + \
-              't3.coordinates[0] AS lon, ' + \
-              't3.coordinates[1] AS lat, ' + \
-              't3.elevation, ' + \
-              't3.recorded_elevation, ' + \
               't2.date, ' + \
               't2.value * 1000.0 AS obs_precip_mm ' + \
               'FROM ' + \
               '(' + \
               'SELECT obj_identifier ' + \
               'FROM point.obs_snow_depth ' + \
-              'WHERE date = \'' + \
-              target_datetime.strftime('%Y-%m-%d %H:%M:%S') + \
-              '\' ' + \
+              'WHERE date = %s ' + \
               'AND value IS NOT NULL ' + \
               'GROUP BY obj_identifier' + \
               ') ' + \
               'AS t1, ' + \
               'point.obs_precip_raw AS t2, ' + \
               'point.allstation AS t3 ' + \
-              'WHERE t2.date = \'' + \
-              target_datetime.strftime('%Y-%m-%d %H:%M:%S') + \
-              '\' ' + \
-              'AND t2.duration = {} '.format(duration_hours * 3600) + \
+              'WHERE t2.date = %s ' + \
+              'AND t2.duration = %s ' + \
               'AND t1.obj_identifier = t2.obj_identifier ' + \
               'AND t2.obj_identifier = t3.obj_identifier ' + \
               'AND t3.obj_identifier = t1.obj_identifier ' + \
               'AND t2.value IS NOT NULL '
+    params = [target_datetime, target_datetime, duration_hours * 3600]
 
     if bounding_box is not None:
         sql_cmd = sql_cmd + \
-                  'AND t3.coordinates[0] >= ' + \
-                  '{} '.format(bounding_box[0]) + \
-                  'AND t3.coordinates[0] < ' + \
-                  '{} '.format(bounding_box[1]) + \
-                  'AND t3.coordinates[1] >= ' + \
-                  '{} '.format(bounding_box[2]) + \
-                  'AND t3.coordinates[1] < ' + \
-                  '{} '.format(bounding_box[3])
+                  'AND t3.coordinates[0] >= %s ' + \
+                  'AND t3.coordinates[0] < %s ' + \
+                  'AND t3.coordinates[1] >= %s ' + \
+                  'AND t3.coordinates[1] < %s '
+        params.extend(bounding_box[0:4])
 
     sql_cmd = sql_cmd + 'ORDER BY t1.obj_identifier, t2.date;'
 
-    if verbose:
-        print('INFO: psql command "{}"'.format(sql_cmd))
-
-    cursor.execute(sql_cmd)
-
-    # The result below is just a huge list of tuples.
-    obs_precip = cursor.fetchall()
-
     obs_precip_column_list = ['obj_identifier',
                               'station_id',
                               'name',
@@ -1663,81 +1621,46 @@ def get_snwd_prcp_obs(target_datetime,
                               'date',
                               'obs_precip_mm']
 
-    df = pd.DataFrame(obs_precip, columns=obs_precip_column_list)
-
-    # This section organizes the query results into lists and arrays.
-
-    station_ind = -1
-    current_station_obj_id = -1
-    station_obj_id = []
-    station_id = []
-    station_name = []
-    station_lon = []
-    station_lat = []
-    station_elevation = []
-    station_rec_elevation = []
-    # Create a 2-d [time, station] array.
-    # GF - 2nd dim used to be num_hours
-    obs = np.ma.empty([1], dtype=float)
-    obs[0] = no_data_value
-    obs[0] = np.ma.masked
-    # print(len(df))
-    for ind, row in df.iterrows():
-        if row['obj_identifier'] != current_station_obj_id:
-            station_ind += 1
-            if station_ind > 0:
-                # Just finished all data for previous station.
-                # GF - 2nd dim used to be num_hours
-                obs = np.ma.append(obs,
-                                   np.ma.empty([1],
-                                               dtype=float),
-                                   axis=0)
-                obs[station_ind] = no_data_value
-                obs[station_ind] = np.ma.masked
-            # New station
-            station_obj_id.append(row['obj_identifier'])
-            station_id.append(row['station_id'])
-            station_name.append(row['name'])
-            station_lon.append(row['lon'])
-            station_lat.append(row['lat'])
-            station_elevation.append(row['elevation'])
-            station_rec_elevation.append(row['recorded_elevation'])
-
-            current_station_obj_id = station_obj_id[station_ind]
-
-        try:
-            obs[station_ind] = row['obs_precip_mm']
-        except:
-            print(obs)
-            print(obs.shape)
-            print(row)
-            exit(1)
+    if scratch_dir is not None and bounding_box is None:
+
+        # Assemble observations from the cache in scratch_dir.
+        snwd_obj_id = get_cached_obs_df('snow_depth',
+                                        target_datetime,
+                                        target_datetime,
+                                        scratch_dir,
+                                        verbose=verbose)['obj_identifier']
+        df = get_cached_obs_df('precip',
+                               target_datetime,
+                               target_datetime,
+                               scratch_dir,
+                               column_list=obs_precip_column_list,
+                               duration_hours=duration_hours,
+                               obj_identifiers=snwd_obj_id,
+                               verbose=verbose)
+        batches = [df]
 
-    num_stations = station_ind + 1
+    else:
+
+        if verbose:
+            print('INFO: psql command "{}" '.format(sql_cmd) +
+                  'with parameters {}'.format(params))
+
+        # Stream the query results in batches of row tuples.
+        batches = wdb0_pool.fetch_batches(sql_cmd, params=params)
+
+    # Organize the query results into a station table and an array.
+    pivoted = pivot_obs_batches(batches,
+                                'obs_precip_mm',
+                                no_data_value=no_data_value)
+    stations = wdb0_stations.StationTable(*pivoted[0:7])
+    obs = pivoted[7]
     # print(len(obs))
 
     # Place results in a dictionary.
-    obs_precip = {'num_stations': num_stations,
-                  'station_obj_id': station_obj_id,
-                  'station_id': station_id,
-                  'station_name': station_name,
-                  'station_lon': station_lon,
-                  'station_lat': station_lat,
-                  'station_elevation': station_elevation,
-                  'station_rec_elevation': station_rec_elevation,
-                  'obs_datetime': target_datetime,
-                  'values_mm': obs}
-
-    # Create the pkl file if all data fetched is more than 60 days earlier
-    # than the current date/time.
-    lag = dt.datetime.utcnow() - target_datetime
-    if bounding_box is None and \
-       lag > dt.timedelta(days=60):
-        file_obj = open(file_name, 'wb')
-        pkl.dump(obs_precip, file_obj)
-        file_obj.close()
-        if verbose:
-            print('INFO: wrote query results to {}.'.format(file_name))
+    obs_precip = wdb0_stations.obs_dict(stations,
+                                        'values_mm',
+                                        obs,
+                                        target_datetime)
 
     return(obs_precip)
 
@@ -1759,86 +1682,40 @@ def get_swe_prcp_obs(target_datetime,
     and to ignore all others.
     """
 
-    # Only use .pkl files if there is no bounding box.
-    if bounding_box is None:
-
-        file_name = 'wdb0_obs_precipitation_' + \
-                    '{}_hours_ending_'.format(duration_hours) + \
-                    target_datetime.strftime('%Y%m%d%H') + \
-                    '_swe' + \
-                    '.pkl'
-
-        if scratch_dir is not None:
-            file_name = os.path.join(scratch_dir, file_name)
-
-            if os.path.isfile(file_name):
-
-                # Retrieve data from pkl file and return.
-                file_obj = open(file_name, 'rb')
-                obs_precip = pkl.load(file_obj)
-                file_obj.close()
-                return(obs_precip)
-
-    # Open the web database.
-    conn_string = "host='wdb0.dmz.nohrsc.noaa.gov' dbname='web_data'"
-    conn = psycopg2.connect(conn_string)
-    conn.set_client_encoding("utf-8")
-    cursor = conn.cursor()
-
     # Define a SQL statement.
     sql_cmd = 'SELECT ' + \
               't1.obj_identifier, ' + \
-              'TRIM(t3.station_id), ' + \
-              'TRIM(t3.name), ' + \
-              't3.coordinates[0] AS lon, ' + \
-              't3.coordinates[1] AS lat, ' + \
-              't3.elevation, ' + \
-              't3.recorded_elevation, ' + \
               't2.date, ' + \
               't2.value * 1000.0 AS obs_precip_mm ' + \
               'FROM ' + \
               '(' + \
               'SELECT obj_identifier ' + \
               'FROM point.obs_swe ' + \
-              'WHERE date = \'' + \
-              target_datetime.strftime('%Y-%m-%d %H:%M:%S') + \
-              '\' ' + \
+              'WHERE date = %s ' + \
               'AND value IS NOT NULL ' + \
               'GROUP BY obj_identifier' + \
               ') ' + \
               'AS t1, ' + \
               'point.obs_precip_raw AS t2, ' + \
               'point.allstation AS t3 ' + \
-              'WHERE t2.date = \'' + \
-              target_datetime.strftime('%Y-%m-%d %H:%M:%S') + \
-              '\' ' + \
-              'AND t2.duration = {} '.format(duration_hours * 3600) + \
+              'WHERE t2.date = %s ' + \
+              'AND t2.duration = %s ' + \
               'AND t1.obj_identifier = t2.obj_identifier ' + \
               'AND t2.obj_identifier = t3.obj_identifier ' + \
               'AND t3.obj_identifier = t1.obj_identifier ' + \
               'AND t2.value IS NOT NULL '
+    params = [target_datetime, target_datetime, duration_hours * 3600]
 
     if bounding_box is not None:
         sql_cmd = sql_cmd + \
-                  'AND t3.coordinates[0] >= ' + \
-                  '{} '.format(bounding_box[0]) + \
-                  'AND t3.coordinates[0] < ' + \
-                  '{} '.format(bounding_box[1]) + \
-                  'AND t3.coordinates[1] >= ' + \
-                  '{} '.format(bounding_box[2]) + \
-                  'AND t3.coordinates[1] < ' + \
-                  '{} '.format(bounding_box[3])
+                  'AND t3.coordinates[0] >= %s ' + \
+                  'AND t3.coordinates[0] < %s ' + \
+                  'AND t3.coordinates[1] >= %s ' + \
+                  'AND t3.coordinates[1] < %s '
+        params.extend(bounding_box[0:4])
 
     sql_cmd = sql_cmd + 'ORDER BY t1.obj_identifier, t2.date;'
 
-    if verbose:
-        print('INFO: psql command "{}"'.format(sql_cmd))
-
-    cursor.execute(sql_cmd)
-
-    # The result below is just a huge list of tuples.
-    obs_precip = cursor.fetchall()
-
     obs_precip_column_list = ['obj_identifier',
                               'station_id',
                               'name',
@@ -1849,82 +1726,46 @@ def get_swe_prcp_obs(target_datetime,
                               'date',
                               'obs_precip_mm']
 
-    df = pd.DataFrame(obs_precip, columns=obs_precip_column_list)
-
-    # This section organizes the query results into lists and arrays.
-
-    station_ind = -1
-    current_station_obj_id = -1
-    station_obj_id = []
-    station_id = []
-    station_name = []
-    station_lon = []
-    station_lat = []
-    station_elevation = []
-    station_rec_elevation = []
-    # Create a 2-d [time, station] array.
-    # GF - 2nd dim used to be num_hours
-    obs = np.ma.empty([1], dtype=float)
-    obs[0] = no_data_value
-    obs[0] = np.ma.masked
-    # print(len(df))
-    for ind, row in df.iterrows():
-        if row['obj_identifier'] != current_station_obj_id:
-            station_ind += 1
-            if station_ind > 0:
-                # Just finished all data for previous station.
-                # GF - 2nd dim used to be num_hours
-                obs = np.ma.append(obs,
-                                   np.ma.empty([1],
-                                               dtype=float),
-                                   axis=0)
-                obs[station_ind] = no_data_value
-                obs[station_ind] = np.ma.masked
-            # New station
-            station_obj_id.append(row['obj_identifier'])
-            station_id.append(row['station_id'])
-            station_name.append(row['name'])
-            station_lon.append(row['lon'])
-            station_lat.append(row['lat'])
-            station_elevation.append(row['elevation'])
-            station_rec_elevation.append(row['recorded_elevation'])
-
-            current_station_obj_id = station_obj_id[station_ind]
-
-        # try:
-        obs[station_ind] = row['obs_precip_mm']
-        # except:
-            
-        #     print(obs)
-        #     print(obs.shape)
-        #     print(row)
-        #     exit(1)
-
-    num_stations = station_ind + 1
+    if scratch_dir is not None and bounding_box is None:
+
+        # Assemble observations from the cache in scratch_dir.
+        swe_obj_id = get_cached_obs_df('swe',
+                                       target_datetime,
+                                       target_datetime,
+                                       scratch_dir,
+                                       verbose=verbose)['obj_identifier']
+        df = get_cached_obs_df('precip',
+                               target_datetime,
+                               target_datetime,
+                               scratch_dir,
+                               column_list=obs_precip_column_list,
+                               duration_hours=duration_hours,
+                               obj_identifiers=swe_obj_id,
+                               verbose=verbose)
+        batches = [df]
+
+    else:
+
+        if verbose:
+            print('INFO: psql command "{}" '.format(sql_cmd) +
+                  'with parameters {}'.format(params))
+
+        # Stream the query results in batches of row tuples.
+        batches = wdb0_pool.fetch_batches(sql_cmd, params=params)
+
+    # Organize the query results into a station table and an array.
+    pivoted = pivot_obs_batches(batches,
+                                'obs_precip_mm',
+                                no_data_value=no_data_value)
+    stations = wdb0_stations.StationTable(*pivoted[0:7])
+    obs = pivoted[7]
     # print(len(obs))
 
     # Place results in a dictionary.
-    obs_precip = {'num_stations': num_stations,
-                  'station_obj_id': station_obj_id,
-                  'station_id': station_id,
-                  'station_name': station_name,
-                  'station_lon': station_lon,
-                  'station_lat': station_lat,
-                  'station_elevation': station_elevation,
-                  'station_rec_elevation': station_rec_elevation,
-                  'obs_datetime': target_datetime,
-                  'values_mm': obs}
-
-    # Create the pkl file if all data fetched is more than 60 days earlier
-    # than the current date/time.
-    lag = dt.datetime.utcnow() - target_datetime
-    if bounding_box is None and \
-       lag > dt.timedelta(days=60):
-        file_obj = open(file_name, 'wb')
-        pkl.dump(obs_precip, file_obj)
-        file_obj.close()
-        if verbose:
-            print('INFO: wrote query results to {}.'.format(file_name))
+    obs_precip = wdb0_stations.obs_dict(stations,
+                                        'values_mm',
+                                        obs,
+                                        target_datetime)
 
     return(obs_precip)
 
@@ -1944,77 +1785,33 @@ def  get_prv_air_temp_obs(target_datetime,
     begin_datetime = target_datetime - dt.timedelta(hours=num_hours_prev)
     end_datetime = target_datetime - dt.timedelta(hours=1)
 
-    # Only use .pkl files if there is no bounding box.
-    if bounding_box is None:
-
-        file_name = 'wdb0_obs_air_temp_' + \
-                    '{}_to_'.format(begin_datetime.strftime('%Y%m%d%H')) + \
-                    '{}.pkl'.format(end_datetime.strftime('%Y%m%d%H'))
-
-        if scratch_dir is not None:
-            file_name = os.path.join(scratch_dir, file_name)
-
-            if os.path.isfile(file_name):
-
-                # Retrieve data from pkl file and return.
-                file_obj = open(file_name, 'rb')
-                obs_air_temp = pkl.load(file_obj)
-                file_obj.close()
-                return(obs_air_temp)
-
     time_range = end_datetime - begin_datetime
     num_hours = time_range.days * 24 + time_range.seconds // 3600 + 1
 
-    # Open the web database.
-    conn_string = "host='wdb0.dmz.nohrsc.noaa.gov' dbname='web_data'"
-    conn = psycopg2.connect(conn_string)
-    conn.set_client_encoding("utf-8")
-    cursor = conn.cursor()
-
     # Define a SQL statement.
     sql_cmd = 'SELECT ' + \
               't3.obj_identifier, ' + \
-              'TRIM(t3.station_id), ' + \
-              'TRIM(t3.name), ' + \
-              't3.coordinates[0] AS lon, ' + \
-              't3.coordinates[1] AS lat, ' + \
-              't3.elevation, ' + \
-              't3.recorded_elevation, ' + \
               't2.date, ' + \
               't2.value AS obs_air_temp_deg_c ' + \
               'FROM ' + \
               'point.obs_airtemp AS t2, ' + \
               'point.allstation AS t3 ' + \
-              'WHERE t2.date >= \'' + \
-              begin_datetime.strftime('%Y-%m-%d %H:%M:%S') + \
-              '\' ' + \
-              'AND t2.date <= \'' + \
-              end_datetime.strftime('%Y-%m-%d %H:%M:%S') + \
-              '\' ' + \
+              'WHERE t2.date >= %s ' + \
+              'AND t2.date <= %s ' + \
               'AND t2.obj_identifier = t3.obj_identifier ' + \
               'AND t2.value IS NOT NULL '
+    params = [begin_datetime, end_datetime]
 
     if bounding_box is not None:
         sql_cmd = sql_cmd + \
-                  'AND t3.coordinates[0] >= ' + \
-                  '{} '.format(bounding_box[0]) + \
-                  'AND t3.coordinates[0] < ' + \
-                  '{} '.format(bounding_box[1]) + \
-                  'AND t3.coordinates[1] >= ' + \
-                  '{} '.format(bounding_box[2]) + \
-                  'AND t3.coordinates[1] < ' + \
-                  '{} '.format(bounding_box[3])
+                  'AND t3.coordinates[0] >= %s ' + \
+                  'AND t3.coordinates[0] < %s ' + \
+                  'AND t3.coordinates[1] >= %s ' + \
+                  'AND t3.coordinates[1] < %s '
+        params.extend(bounding_box[0:4])
 
     sql_cmd = sql_cmd + 'ORDER BY t3.obj_identifier, t2.date;'
 
-    if verbose:
-        print('INFO: psql command "{}"'.format(sql_cmd))
-
-    cursor.execute(sql_cmd)
-
-    # The result below is just a huge list of tuples.
-    fetched_airtemp = cursor.fetchall()
-
     obs_air_temp_column_list = ['obj_identifier',
                                 'station_id',
                                 'name',
@@ -2025,79 +1822,82 @@ def  get_prv_air_temp_obs(target_datetime,
                                 'date',
                                 'obs_air_temp_deg_c']
 
-    df = pd.DataFrame(fetched_airtemp, columns=obs_air_temp_column_list)
-
-    # This section organizes the query results into lists and arrays.
-
-    station_ind = -1
-    current_station_obj_id = -1
-    station_obj_id = []
-    station_id = []
-    station_name = []
-    station_lon = []
-    station_lat = []
-    station_elevation = []
-    station_rec_elevation = []
-    # Create a 2-d [time, station] array.
-    obs = np.ma.empty([1, num_hours], dtype=float)
-    obs[0,:] = no_data_value
-    obs[0,:] = np.ma.masked
-    for ind, row in df.iterrows():
-        if row['obj_identifier'] != current_station_obj_id:
-            station_ind += 1
-            if station_ind > 0:
-                # Just finished all data for previous station.
-                obs = np.ma.append(obs,
-                                   np.ma.empty([1,
-                                                num_hours],
-                                               dtype=float),
-                                   axis=0)
-                obs[station_ind,:] = no_data_value
-                obs[station_ind,:] = np.ma.masked
-            # New station
-            station_obj_id.append(row['obj_identifier'])
-            station_id.append(row['station_id'])
-            station_name.append(row['name'])
-            station_lon.append(row['lon'])
-            station_lat.append(row['lat'])
-            station_elevation.append(row['elevation'])
-            station_rec_elevation.append(row['recorded_elevation'])
-
-            current_station_obj_id = station_obj_id[station_ind]
-
-        # Add the observation to the obs array.
-        time_diff = row['date'] - begin_datetime
-        time_ind = time_diff.days * 24 + time_diff.seconds // 3600
-
-        obs[station_ind, time_ind] = row['obs_air_temp_deg_c']
-
-    num_stations = station_ind + 1
+    if scratch_dir is not None and bounding_box is None:
+
+        # Assemble observations from the cache in scratch_dir.
+        df = get_cached_obs_df('air_temp',
+                               begin_datetime,
+                               end_datetime,
+                               scratch_dir,
+                               column_list=obs_air_temp_column_list,
+                               verbose=verbose)
+        batches = [df]
+
+    else:
+
+        if verbose:
+            print('INFO: psql command "{}" '.format(sql_cmd) +
+                  'with parameters {}'.format(params))
+
+        # Stream the query results in batches of row tuples.
+        batches = wdb0_pool.fetch_batches(sql_cmd, params=params)
+
+    # Organize the query results into a station table and an array.
+    pivoted = pivot_obs_batches(batches,
+                                'obs_air_temp_deg_c',
+                                no_data_value=no_data_value,
+                                begin_datetime=begin_datetime,
+                                num_hours=num_hours)
+    stations = wdb0_stations.StationTable(*pivoted[0:7])
+    obs = pivoted[7]
 
     obs_datetime = [begin_datetime +
                     dt.timedelta(hours=i) for i in range(num_hours)]
 
     # Place results in a dictionary.
-    obs_air_temp = {'num_stations': num_stations,
-                    'num_hours': num_hours,
-                    'station_obj_id': station_obj_id,
-                    'station_id': station_id,
-                    'station_name': station_name,
-                    'station_lon': station_lon,
-                    'station_lat': station_lat,
-                    'station_elevation': station_elevation,
-                    'station_rec_elevation': station_rec_elevation,
-                    'obs_datetime': obs_datetime,
-                    'values_deg_c': obs}
-
-    # Create the pkl file if all data fetched is more than 60 days earlier
-    # than the current date/time.
-    lag = dt.datetime.utcnow() - end_datetime
-    if bounding_box is None and \
-       lag > dt.timedelta(days=60):
-        file_obj = open(file_name, 'wb')
-        pkl.dump(obs_air_temp, file_obj)
-        file_obj.close()
-        if verbose:
-            print('INFO: wrote query results to {}.'.format(file_name))
+    obs_air_temp = wdb0_stations.obs_dict(stations,
+                                          'values_deg_c',
+                                          obs,
+                                          obs_datetime,
+                                          num_hours=num_hours)
 
     return(obs_air_temp)
+
+
+def get_station_metadata(obj_identifiers,
+                         column_list,
+                         verbose=None):
+
+    """
+    Get metadata for a set of stations from the "point.allstation" table
+    of the "web_data" database on wdb0, in a single query. The columns
+    selected are given by column_list, which must include
+    "obj_identifier". Results are returned as a DataFrame with one row
+    per station, ordered by obj_identifier. Values are kept as returned
+    by the database (e.g., datetimes are not converted).
+    """
+
+    if 'obj_identifier' not in column_list:
+        print('ERROR: column_list must include "obj_identifier".',
+              file=sys.stderr)
+        return None
+
+    obj_identifiers = sorted(set(int(obj_id) for obj_id in obj_identifiers))
+    if len(obj_identifiers) == 0:
+        return(pd.DataFrame([], columns=column_list, dtype=object))
+
+    # Define a SQL statement.
+    sql_cmd = 'SELECT ' + ', '.join(column_list) + ' ' + \
+              'FROM point.allstation ' + \
+              'WHERE obj_identifier = ANY($1) ' + \
+              'ORDER BY obj_identifier;'
+
+    if verbose:
+        print('INFO: psql command "{}" '.format(sql_cmd) +
+              'for {} stations'.format(len(obj_identifiers)))
+
+    allstation = wdb0_pool.fetchall(sql_cmd,
+                                    params=[obj_identifiers],
+                                    statement_name='wdb0_station_metadata')
+
+    return(pd.DataFrame(allstation, columns=column_list, dtype=object))
@@ -0,0 +1,250 @@
+import datetime as dt
+import numpy as np
+
+import wdb0
+import wdb0_stations
+from station_index import StationIndex
+
+"""
+ObsWindowBuffer
+
+Rolling in-memory buffers of hourly wdb0 observations, for processes that
+step through time one hour at a time and need a long window of preceding
+observations at each step.
+"""
+
+# Dictionary keys used by wdb0 for values of each element.
+VALUE_KEYS = {'snow_depth': 'values_cm',
+              'swe': 'values_mm',
+              'air_temp': 'values_deg_c'}
+
+# Hours fetched before they are late_report_window old may still receive
+# late reports, and are fetched again once they are recheck_interval old.
+DEFAULT_LATE_REPORT_WINDOW = dt.timedelta(hours=6)
+DEFAULT_RECHECK_INTERVAL = dt.timedelta(minutes=10)
+
+
+class ObsWindowBuffer(object):
+
+    """
+    Hold the most recent num_hours hours of observations of one element in
+    a [station, hour] array whose hour axis is used as a ring. Moving the
+    window forward by one hour fetches only the newest hour and overwrites
+    the oldest, so the cost of each step does not depend on the window
+    length.
+
+    Stations are added as they appear and dropped once they have no
+    observations in the window. Hours that were fetched when they were
+    less than late_report_window old are fetched again when the window is
+    moved, at most once every recheck_interval, until a fetch occurs after
+    the late report window has passed.
+
+    If scratch_dir is given, hours are read through the wdb0 cache.
+    """
+
+    def __init__(self,
+                 element,
+                 num_hours,
+                 scratch_dir=None,
+                 late_report_window=DEFAULT_LATE_REPORT_WINDOW,
+                 recheck_interval=DEFAULT_RECHECK_INTERVAL,
+                 verbose=None):
+        self.element = element
+        self.num_hours = num_hours
+        self.scratch_dir = scratch_dir
+        self.late_report_window = late_report_window
+        self.recheck_interval = recheck_interval
+        self.verbose = verbose
+        self._values = np.full([0, num_hours], np.nan)
+        self._slot_datetime = [None] * num_hours
+        self._slot_fetched = [None] * num_hours
+        self._index = StationIndex()
+        self._stations = wdb0_stations.StationTable()
+
+    def _slot(self, hour_datetime):
+        hours = (hour_datetime - dt.datetime(1970, 1, 1)) // \
+                dt.timedelta(hours=1)
+        return hours % self.num_hours
+
+    def _is_current(self, hour_datetime, now):
+        """
+        Determine whether the buffer holds hour_datetime and it need not
+        be fetched again for late reports.
+        """
+        slot = self._slot(hour_datetime)
+        if self._slot_datetime[slot] != hour_datetime:
+            return False
+        fetched = self._slot_fetched[slot]
+        if fetched - hour_datetime >= self.late_report_window:
+            return True
+        return now - fetched < self.recheck_interval
+
+    def _fetch(self, begin_datetime, end_datetime):
+        if self.verbose:
+            print('INFO: adding {} hours '.format(self.element) +
+                  '{} through {} '.format(begin_datetime, end_datetime) +
+                  'to buffer.')
+        if self.scratch_dir is not None:
+            return(wdb0.get_cached_obs_df(self.element,
+                                          begin_datetime,
+                                          end_datetime,
+                                          self.scratch_dir,
+                                          verbose=self.verbose))
+        return(wdb0.get_element_obs_df(self.element,
+                                       begin_datetime,
+                                       end_datetime,
+                                       verbose=self.verbose))
+
+    def _add_stations(self, df):
+        """
+        Add rows for stations in df not yet in the buffer, and update
+        station metadata.
+        """
+        stations = wdb0_stations.StationTable.from_df(
+            df.drop_duplicates('obj_identifier', keep='last'))
+        row = self._index.lookup(stations.obj_id)
+        is_new = row < 0
+        num_new = np.count_nonzero(is_new)
+        if num_new > 0:
+            self._values = np.concatenate(
+                [self._values, np.full([num_new, self.num_hours], np.nan)],
+                axis=0)
+            self._stations = wdb0_stations.StationTable.concatenate(
+                [self._stations, stations.take(np.flatnonzero(is_new))])
+            row[is_new] = np.arange(len(self._index),
+                                    len(self._index) + num_new)
+            self._index.append(stations.obj_id[is_new])
+        self._stations.update(row, stations)
+
+    def _drop_empty_stations(self):
+        """
+        Remove stations with no observations in the buffer.
+        """
+        has_obs = np.any(~np.isnan(self._values), axis=1)
+        if np.count_nonzero(~has_obs) < max(1000, len(has_obs) // 2):
+            return
+        keep = np.flatnonzero(has_obs)
+        self._values = self._values[keep, :]
+        self._index = StationIndex(self._index.obj_identifiers[keep])
+        self._stations = self._stations.take(keep)
+
+    def update(self, end_datetime):
+        """
+        Move the window so that it ends at (and includes) end_datetime,
+        fetching any hours not already held.
+        """
+
+        window = [end_datetime - dt.timedelta(hours=i)
+                  for i in range(self.num_hours - 1, -1, -1)]
+        now = dt.datetime.utcnow()
+        missing = [not self._is_current(hour_datetime, now)
+                   for hour_datetime in window]
+
+        # Fetch contiguous ranges of missing hours.
+        i = 0
+        while i < self.num_hours:
+            if not missing[i]:
+                i += 1
+                continue
+            j = i
+            while j + 1 < self.num_hours and missing[j + 1]:
+                j += 1
+            fetched = dt.datetime.utcnow()
+            df = self._fetch(window[i], window[j])
+            for hour_datetime in window[i:j + 1]:
+                slot = self._slot(hour_datetime)
+                self._values[:, slot] = np.nan
+                self._slot_datetime[slot] = hour_datetime
+                self._slot_fetched[slot] = fetched
+            self._add_stations(df)
+            row = self._index.lookup(df['obj_identifier'].values)
+            hours = np.asarray(df['date'], dtype='datetime64[h]'). \
+                astype(np.int64)
+            slot = hours % self.num_hours
+            self._values[row, slot] = np.asarray(df['value'], dtype=float)
+            i = j + 1
+
+        self._drop_empty_stations()
+
+    def _obs_dict(self, rows, hour_datetime, no_data_value):
+        """
+        Gather observations for the given buffer rows and hours into the
+        dictionary form used by wdb0, ordering stations by object
+        identifier.
+        """
+
+        rows = rows[np.argsort(self._index.obj_identifiers[rows],
+                               kind='mergesort')]
+        values = self._values[:, [self._slot(h) for h in hour_datetime]]
+        values = values[rows, :]
+
+        num_stations = len(rows)
+        if num_stations == 0:
+            # As wdb0 does, return a single, fully masked row.
+            values = np.full([1, len(hour_datetime)], np.nan)
+        obs = np.ma.masked_invalid(values)
+        obs.data[obs.mask] = no_data_value
+
+        return(wdb0_stations.obs_dict(self._stations.take(rows),
+                                      VALUE_KEYS[self.element],
+                                      obs,
+                                      hour_datetime,
+                                      num_hours=len(hour_datetime)))
+
+    def get_obs(self,
+                begin_datetime,
+                end_datetime,
+                no_data_value=-99999.0):
+        """
+        Get observations from begin_datetime through end_datetime for all
+        stations reporting in that time, in the form returned by
+        wdb0.get_snow_depth_obs and similar functions. The window is first
+        moved to end at end_datetime.
+        """
+
+        time_range = end_datetime - begin_datetime
+        num_hours = time_range.days * 24 + time_range.seconds // 3600 + 1
+        if num_hours > self.num_hours:
+            raise ValueError('buffer holds {} hours; '.
+                             format(self.num_hours) +
+                             '{} needed'.format(num_hours))
+
+        self.update(end_datetime)
+
+        hour_datetime = [begin_datetime + dt.timedelta(hours=i)
+                         for i in range(num_hours)]
+        values = self._values[:, [self._slot(h) for h in hour_datetime]]
+        rows = np.flatnonzero(np.any(~np.isnan(values), axis=1))
+
+        return(self._obs_dict(rows, hour_datetime, no_data_value))
+
+    def get_prev_obs(self,
+                     target_datetime,
+                     num_hrs_prev,
+                     no_data_value=-99999.0):
+        """
+        Get observations for the num_hrs_prev hours preceding
+        target_datetime, for stations reporting at target_datetime, in the
+        form returned by wdb0.get_prev_snow_depth_obs and similar
+        functions. The window is first moved to end at target_datetime.
+        """
+
+        if num_hrs_prev + 1 > self.num_hours:
+            raise ValueError('buffer holds {} hours; '.
+                             format(self.num_hours) +
+                             '{} needed'.format(num_hrs_prev + 1))
+
+        self.update(target_datetime)
+
+        begin_datetime = target_datetime - dt.timedelta(hours=num_hrs_prev)
+        prev_datetime = [begin_datetime + dt.timedelta(hours=i)
+                         for i in range(num_hrs_prev)]
+        values = self._values[:, [self._slot(h) for h in prev_datetime]]
+
+        # Limit results to stations reporting at target_datetime and
+        # reporting at least once in the preceding hours.
+        reporting = ~np.isnan(self._values[:, self._slot(target_datetime)])
+        rows = np.flatnonzero(reporting &
+                              np.any(~np.isnan(values), axis=1))
+
+        return(self._obs_dict(rows, prev_datetime, no_data_value))
@@ -0,0 +1,363 @@
+import os
+import sys
+import threading
+import datetime as dt
+import numpy as np
+import pandas as pd
+import wdb0_profile
+
+"""
+Columnar on-disk cache of hourly observations read from wdb0.
+partition_path
+read_partition
+write_partition
+get_obs_df
+
+Observations of each element are stored in one partition file per day,
+holding the obj_identifier, hour and value columns of every observation
+for that day and a record of which hours of the day have been fetched.
+Station metadata are not stored here; wdb0 joins them to observations
+locally (see wdb0_stations). Windows of any length are assembled from
+partitions, and only hours not already in the cache are read from the
+database.
+
+Recent hours are cached too. Each partition records when each of its hours
+was fetched along with a cheap summary of that hour in the database, and
+hours that may still receive observations are read again only when that
+summary changes.
+
+Partitions are written as uncompressed .npz files (NumPy arrays only, no
+pickled objects) to temporary names and moved into place, so concurrent
+readers never see a partial file.
+"""
+
+# Columns of the observation DataFrames handled here.
+OBS_COLUMNS = ['obj_identifier', 'date', 'value']
+
+# Columns of the hourly summaries used to revalidate cached hours.
+PROBE_COLUMNS = ['date', 'count', 'obj_id_sum', 'value_sum']
+
+# Hours that were this old when they were fetched are assumed not to
+# change. More recent hours are revalidated when they are read, at most
+# once every revalidate_interval.
+DEFAULT_SETTLE_AGE = dt.timedelta(days=60)
+DEFAULT_REVALIDATE_INTERVAL = dt.timedelta(minutes=10)
+
+# Partitions read recently are kept in memory, keyed by path and checked
+# against the file modification time.
+_MAX_MEMO_PARTITIONS = 64
+_partition_memo = {}
+_partition_memo_lock = threading.Lock()
+
+_EPOCH = dt.datetime(1970, 1, 1)
+
+
+def partition_path(cache_dir, element, day):
+    """
+    Get the path of the partition holding observations of element for the
+    day containing the datetime day.
+    """
+    return os.path.join(cache_dir,
+                        'wdb0_cache',
+                        element,
+                        'wdb0_{}_{}.npz'.format(element,
+                                                day.strftime('%Y%m%d')))
+
+
+def _empty_partition():
+    return({'fetched': np.zeros(24, dtype=bool),
+            'fetched_at': np.zeros(24, dtype=float),
+            'probe': np.full([24, len(PROBE_COLUMNS) - 1], np.nan),
+            'obj_identifier': np.zeros(0, dtype=np.int64),
+            'hour': np.zeros(0, dtype=np.int8),
+            'value': np.zeros(0, dtype=float)})
+
+
+def read_partition(cache_dir, element, day):
+    """
+    Read the partition for element and the day containing the datetime
+    day. Returns a dictionary of arrays; if there is no partition (or it
+    cannot be read) the result is empty and no hours are marked as
+    fetched.
+
+    Along with the observations, each partition records for every hour
+    whether it has been fetched, when (fetched_at, in seconds since
+    1970-01-01 00 UTC), and the database summary of that hour (probe, as
+    returned by the probe function given to get_obs_df) at that time.
+    """
+
+    path = partition_path(cache_dir, element, day)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return(_empty_partition())
+
+    with _partition_memo_lock:
+        memo = _partition_memo.get(path)
+    if memo is not None and memo[0] == mtime:
+        return(memo[1])
+
+    try:
+        with wdb0_profile.phase('cache_read'), \
+             np.load(path, allow_pickle=False) as npz:
+            # Station metadata held by older partitions are ignored.
+            part = {key: npz[key] for key in _empty_partition()
+                    if key in npz}
+    except Exception as e:
+        print('WARNING: ignoring unreadable cache file {} ({}).'.
+              format(path, e),
+              file=sys.stderr)
+        return(_empty_partition())
+
+    # Older partitions only held hours past DEFAULT_SETTLE_AGE, and have
+    # no freshness information.
+    if 'fetched_at' not in part:
+        part['fetched_at'] = np.where(part['fetched'], np.inf, 0.0)
+    if 'probe' not in part:
+        part['probe'] = _empty_partition()['probe']
+
+    with _partition_memo_lock:
+        if len(_partition_memo) >= _MAX_MEMO_PARTITIONS:
+            _partition_memo.pop(next(iter(_partition_memo)))
+        _partition_memo[path] = (mtime, part)
+
+    return(part)
+
+
+def write_partition(cache_dir, element, day, part):
+    """
+    Write the partition for element and the day containing the datetime
+    day.
+    """
+
+    path = partition_path(cache_dir, element, day)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = '{}.{}.{}.tmp'.format(path,
+                                      os.getpid(),
+                                      threading.get_ident())
+    with wdb0_profile.phase('cache_write'):
+        with open(temp_path, 'wb') as file_obj:
+            np.savez(file_obj, **part)
+        os.replace(temp_path, path)
+    with _partition_memo_lock:
+        _partition_memo.pop(path, None)
+
+
+def _merge_partition(part, day_begin, fetched_hours, obs_df):
+    """
+    Merge observations fetched for the hours (of the day beginning at
+    day_begin) flagged in fetched_hours into a partition.
+    """
+
+    obs_hour = np.asarray((pd.to_datetime(obs_df['date']) -
+                           pd.Timestamp(day_begin)) //
+                          pd.Timedelta(hours=1),
+                          dtype=np.int8)
+
+    # Drop anything already held for the fetched hours.
+    keep = ~fetched_hours[part['hour']]
+    obj_id = np.concatenate([part['obj_identifier'][keep],
+                             np.asarray(obs_df['obj_identifier'],
+                                        dtype=np.int64)])
+    hour = np.concatenate([part['hour'][keep], obs_hour])
+    value = np.concatenate([part['value'][keep],
+                            np.asarray(obs_df['value'], dtype=float)])
+    order = np.lexsort((hour, obj_id))
+
+    new_part = {'fetched': part['fetched'] | fetched_hours,
+                'obj_identifier': obj_id[order],
+                'hour': hour[order],
+                'value': value[order]}
+
+    return(new_part)
+
+
+def _partition_obs_df(part, day_begin, hour_mask):
+    """
+    Get the observations of a partition for the hours flagged in
+    hour_mask as a DataFrame with OBS_COLUMNS.
+    """
+
+    keep = hour_mask[part['hour']]
+    df = pd.DataFrame({'obj_identifier': part['obj_identifier'][keep],
+                       'date': np.datetime64(day_begin, 'ns') +
+                               part['hour'][keep].astype('timedelta64[h]'),
+                       'value': part['value'][keep]})
+    return(df)
+
+
+def _hour_ranges(hour_mask):
+    """
+    Get the (first, last) indices of each run of True values in
+    hour_mask.
+    """
+    ranges = []
+    run_start = None
+    for h, flagged in enumerate(np.append(hour_mask, False)):
+        if flagged and run_start is None:
+            run_start = h
+        if not flagged and run_start is not None:
+            ranges.append((run_start, h - 1))
+            run_start = None
+    return(ranges)
+
+
+def _probe_hours(probe, begin_datetime, num_hours):
+    """
+    Get the summaries from probe for num_hours hours beginning at
+    begin_datetime, as a [hour, summary] array. Hours with no
+    observations are summarized as zeros.
+    """
+    probe_df = probe(begin_datetime,
+                     begin_datetime + dt.timedelta(hours=num_hours - 1))
+    summary = np.zeros([num_hours, len(PROBE_COLUMNS) - 1])
+    hour = np.asarray((pd.to_datetime(probe_df['date']) -
+                       pd.Timestamp(begin_datetime)) //
+                      pd.Timedelta(hours=1), dtype=int)
+    summary[hour, :] = np.asarray(probe_df[PROBE_COLUMNS[1:]], dtype=float)
+    return(summary)
+
+
+def get_obs_df(cache_dir,
+               element,
+               begin_datetime,
+               end_datetime,
+               fetch,
+               probe=None,
+               obj_identifiers=None,
+               settle_age=DEFAULT_SETTLE_AGE,
+               revalidate_interval=DEFAULT_REVALIDATE_INTERVAL,
+               verbose=None):
+
+    """
+    Get hourly observations of element from begin_datetime through
+    end_datetime (inclusive), as a DataFrame with OBS_COLUMNS ordered by
+    obj_identifier and date.
+
+    Hours found in the cache are read from it. Missing hours are gathered
+    into contiguous ranges and read using fetch(begin, end), which must
+    return a DataFrame with (at least) OBS_COLUMNS covering all stations
+    for hours begin through end, and added to the cache.
+
+    Hours fetched before they were settle_age old may still change. Once
+    revalidate_interval has passed since they were fetched or last
+    checked, they are checked using probe(begin, end), which must return a
+    DataFrame with PROBE_COLUMNS summarizing each hour from begin through
+    end, and fetched again only if their summary has changed. Without a
+    probe, such hours are simply fetched again.
+
+    If obj_identifiers is given, only observations from those stations are
+    returned.
+    """
+
+    begin_datetime = pd.Timestamp(begin_datetime).to_pydatetime()
+    end_datetime = pd.Timestamp(end_datetime).to_pydatetime()
+    first_day = begin_datetime.replace(hour=0, minute=0, second=0,
+                                       microsecond=0)
+    num_days = (end_datetime - first_day).days + 1
+    days = [first_day + dt.timedelta(days=i) for i in range(num_days)]
+
+    # Flag the hours of all days covered by the window.
+    hour_datetime = np.array([first_day + dt.timedelta(hours=h)
+                              for h in range(num_days * 24)])
+    hour_epoch = np.array([(h - _EPOCH).total_seconds()
+                           for h in hour_datetime])
+    window = (hour_datetime >= begin_datetime) & \
+             (hour_datetime <= end_datetime)
+
+    parts = [read_partition(cache_dir, element, day) for day in days]
+    fetched = np.concatenate([part['fetched'] for part in parts])
+    fetched_at = np.concatenate([part['fetched_at'] for part in parts])
+    summary = np.concatenate([part['probe'] for part in parts])
+    changed = np.zeros(num_days * 24, dtype=bool)
+
+    # Revalidate cached hours that may have changed.
+    now = (dt.datetime.utcnow() - _EPOCH).total_seconds()
+    unsettled = fetched_at - hour_epoch < settle_age.total_seconds()
+    due = window & fetched & unsettled & \
+          (now - fetched_at >= revalidate_interval.total_seconds())
+    stale = np.zeros(num_days * 24, dtype=bool)
+    for i, j in _hour_ranges(due):
+        if probe is None:
+            stale[i:j + 1] = True
+            continue
+        if verbose:
+            print('INFO: checking cached {} '.format(element) +
+                  'for {} through {}.'.format(hour_datetime[i],
+                                               hour_datetime[j]))
+        current = _probe_hours(probe, hour_datetime[i], j - i + 1)
+        same = np.all(np.isclose(current, summary[i:j + 1],
+                                 rtol=1.0e-9, atol=0.0),
+                      axis=1)
+        stale[i:j + 1] = ~same
+        fetched_at[i:j + 1][same] = now
+        changed[i:j + 1] = True
+
+    # Fetch missing and changed hours, and add them to the cache.
+    missing = window & (~fetched | stale)
+    fetch_dfs = {}
+    for i, j in _hour_ranges(missing):
+        fetch_begin = hour_datetime[i]
+        fetch_end = hour_datetime[j]
+        fetch_time = (dt.datetime.utcnow() - _EPOCH).total_seconds()
+        # Summarize recent hours before fetching them, so that any change
+        # made during the fetch is caught next time.
+        if probe is not None and \
+           np.any(fetch_time - hour_epoch[i:j + 1] <
+                  settle_age.total_seconds()):
+            summary[i:j + 1] = _probe_hours(probe, fetch_begin, j - i + 1)
+        else:
+            summary[i:j + 1] = np.nan
+        if verbose:
+            print('INFO: fetching {} '.format(element) +
+                  'for {} through {}.'.format(fetch_begin, fetch_end))
+        fetched_df = fetch(fetch_begin, fetch_end)
+        fetched_hour = np.asarray((pd.to_datetime(fetched_df['date']) -
+                                   pd.Timestamp(first_day)) //
+                                  pd.Timedelta(hours=1), dtype=int)
+        for d in range(i // 24, j // 24 + 1):
+            in_day = (fetched_hour >= d * 24) & (fetched_hour < d * 24 + 24)
+            fetch_dfs.setdefault(d, []).append(fetched_df[in_day])
+        fetched[i:j + 1] = True
+        fetched_at[i:j + 1] = fetch_time
+        changed[i:j + 1] = True
+
+    for d, day in enumerate(days):
+        hours = slice(d * 24, d * 24 + 24)
+        if not np.any(changed[hours]):
+            continue
+        part = parts[d]
+        if d in fetch_dfs:
+            part = _merge_partition(part,
+                                    day,
+                                    missing[hours],
+                                    pd.concat(fetch_dfs[d],
+                                              ignore_index=True))
+        else:
+            part = dict(part)
+        part['fetched'] = fetched[hours]
+        part['fetched_at'] = fetched_at[hours]
+        part['probe'] = summary[hours]
+        parts[d] = part
+        write_partition(cache_dir, element, day, part)
+
+    # Assemble the window from the partitions.
+    obs_dfs = []
+    for d, day in enumerate(days):
+        hour_mask = window[d * 24:d * 24 + 24]
+        if np.any(hour_mask):
+            obs_dfs.append(_partition_obs_df(parts[d], day, hour_mask))
+
+    if len(obs_dfs) == 0:
+        return(pd.DataFrame([], columns=OBS_COLUMNS))
+
+    obs_df = pd.concat(obs_dfs, ignore_index=True)
+    if obj_identifiers is not None:
+        obs_df = obs_df[np.isin(obs_df['obj_identifier'].values,
+                                np.asarray(obj_identifiers,
+                                           dtype=np.int64))]
+
+    obs_df = obs_df.sort_values(['obj_identifier', 'date'],
+                                kind='mergesort')
+
+    return(obs_df[OBS_COLUMNS].reset_index(drop=True))
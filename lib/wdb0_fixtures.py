@@ -0,0 +1,388 @@
+import io
+import sys
+import datetime as dt
+import numpy as np
+import pandas as pd
+import wdb0_pool
+
+"""
+Synthetic stand-in for the observation tables of the "web_data" database
+on wdb0, for running and benchmarking code off-site.
+ALLSTATION_COLUMNS
+OBS_TABLES
+NETWORKS
+FixtureGenerator
+create_tables
+create_indexes
+load_fixtures
+
+A FixtureGenerator produces a reproducible set of stations and hourly
+observations from a seed. Observations are generated independently for
+each element and hour, so any period may be regenerated (or loaded in
+pieces) without generating what comes before it. load_fixtures writes
+them into a PostgreSQL database using the same schema and units as wdb0
+(meters and degrees C); wdb0 functions are then pointed at it with the
+WDB0_DSN environment variable or wdb0_pool.set_dsn.
+"""
+
+# Columns of point.allstation, with their types.
+ALLSTATION_COLUMNS = [('obj_identifier', 'integer PRIMARY KEY'),
+                      ('station_id', 'character(16)'),
+                      ('name', 'character varying(64)'),
+                      ('source', 'text'),
+                      ('station_type', 'text'),
+                      ('coordinates', 'point'),
+                      ('elevation', 'integer'),
+                      ('recorded_elevation', 'integer'),
+                      ('details', 'text'),
+                      ('vendor', 'text'),
+                      ('vendor_date', 'timestamp without time zone'),
+                      ('use', 'boolean'),
+                      ('start_date', 'timestamp without time zone'),
+                      ('stop_date', 'timestamp without time zone'),
+                      ('added_date', 'timestamp without time zone')]
+
+# Observation table for each element, and whether it has a duration
+# (accumulation period, in seconds) column.
+OBS_TABLES = {'snow_depth': ('point.obs_snow_depth', False),
+              'swe': ('point.obs_swe', False),
+              'air_temp': ('point.obs_airtemp', False),
+              'snowfall': ('point.obs_snowfall_raw', True),
+              'precip': ('point.obs_precip_raw', True)}
+
+# Station networks: source, station type, share of stations, hours
+# between reports, hour (UTC) of a report, and elements reported.
+# Accumulations (snowfall, precip) cover the hours between reports.
+NETWORKS = [('SNOTEL', 'SNOTEL', 0.05, 1, 0,
+             ['snow_depth', 'swe', 'air_temp', 'precip']),
+            ('ASOS', 'ASOS', 0.10, 1, 0,
+             ['snow_depth', 'air_temp', 'precip']),
+            ('MADIS', 'MESONET', 0.15, 1, 0,
+             ['snow_depth', 'air_temp']),
+            ('COOP', 'COOP', 0.25, 24, 12,
+             ['snow_depth', 'swe', 'air_temp', 'snowfall', 'precip']),
+            ('CoCoRaHS', 'CoCoRaHS', 0.45, 24, 12,
+             ['snow_depth', 'swe', 'snowfall', 'precip'])]
+
+# Region [lon_min, lon_max, lat_min, lat_max] in which stations are
+# placed.
+FIXTURE_DOMAIN = [-125.0, -67.0, 25.0, 49.0]
+
+# Probability that a station reports when it is scheduled to.
+REPORT_PROBABILITY = 0.95
+
+# Size of the gross errors added to a fraction of observations, in the
+# units of each table.
+OUTLIER_SIZE = {'snow_depth': 2.0,
+                'swe': 0.5,
+                'air_temp': 40.0,
+                'snowfall': 1.0,
+                'precip': 0.2}
+
+# Value used by wdb0 for missing start and stop dates.
+NO_DATE = dt.datetime(1900, 1, 1)
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class FixtureGenerator(object):
+
+    """
+    Reproducible synthetic stations and observations. The same seed and
+    num_stations always give the same stations and, for any hour, the
+    same observations. A fraction outlier_fraction of observations carry
+    gross errors for QC to find.
+    """
+
+    def __init__(self,
+                 num_stations,
+                 seed=0,
+                 first_obj_identifier=1000000,
+                 outlier_fraction=0.001):
+        self.num_stations = num_stations
+        self.seed = seed
+        self.outlier_fraction = outlier_fraction
+
+        rng = np.random.default_rng([seed, num_stations])
+
+        shares = np.array([network[2] for network in NETWORKS])
+        self._network = rng.choice(len(NETWORKS),
+                                   size=num_stations,
+                                   p=shares / shares.sum())
+
+        lon = rng.uniform(FIXTURE_DOMAIN[0], FIXTURE_DOMAIN[1], num_stations)
+        lat = rng.uniform(FIXTURE_DOMAIN[2], FIXTURE_DOMAIN[3], num_stations)
+        # Mountains in the west, hills in the east.
+        elevation = 2500.0 * np.exp(-((lon + 112.0) / 7.0) ** 2) + \
+                    600.0 * np.exp(-((lon + 80.0) / 3.0) ** 2) + \
+                    rng.gamma(2.0, 150.0, num_stations)
+        elevation = np.round(elevation).astype(int)
+        recorded_elevation = elevation + \
+            np.round(rng.normal(0.0, 10.0, num_stations)).astype(int)
+
+        self._lon = lon
+        self._lat = lat
+        self._elevation_km = elevation / 1000.0
+        # Typical peak snow depth (m), and offsets giving each station its
+        # own weather.
+        self._snowiness = np.maximum(0.03 * (lat - 37.0) +
+                                     0.3 * self._elevation_km, 0.0) * \
+            rng.lognormal(0.0, 0.3, num_stations)
+        self._temp_offset = rng.normal(0.0, 1.5, num_stations)
+        self._phase = rng.uniform(0.0, 2.0 * np.pi, num_stations)
+
+        obj_identifier = first_obj_identifier + np.arange(num_stations)
+        source = np.array([network[0] for network in NETWORKS])[self._network]
+        added_date = dt.datetime(2000, 1, 1) + \
+            pd.to_timedelta(rng.integers(0, 20 * 365, num_stations),
+                            unit='D')
+        use = rng.random(num_stations) < 0.98
+
+        self.stations = pd.DataFrame(
+            {'obj_identifier': obj_identifier,
+             'station_id': ['{}{:06d}'.format(src[0:2].upper(), i)
+                            for i, src in enumerate(source)],
+             'name': ['Synthetic {} station {}'.format(src, i)
+                      for i, src in enumerate(source)],
+             'source': source,
+             'station_type':
+                 np.array([network[1] for network in NETWORKS])[self._network],
+             'coordinates': ['({:.5f},{:.5f})'.format(x, y)
+                             for x, y in zip(lon, lat)],
+             'elevation': elevation,
+             'recorded_elevation': recorded_elevation,
+             'details': '',
+             'vendor': 'synthetic',
+             'vendor_date': added_date,
+             'use': use,
+             'start_date': NO_DATE,
+             'stop_date': NO_DATE,
+             'added_date': added_date},
+            columns=[column[0] for column in ALLSTATION_COLUMNS])
+
+        # Stations scheduled to report each element at each hour of the
+        # day.
+        self._schedule = {}
+        for element in OBS_TABLES.keys():
+            for hour in range(24):
+                in_network = [i for i, network in enumerate(NETWORKS)
+                              if element in network[5] and
+                              (hour - network[4]) % network[3] == 0]
+                self._schedule[element, hour] = \
+                    np.where(np.isin(self._network, in_network) & use)[0]
+
+    def _rng(self, element, obs_datetime):
+        epoch_hour = int((obs_datetime - dt.datetime(1970, 1, 1)).
+                         total_seconds()) // 3600
+        element_num = sorted(OBS_TABLES.keys()).index(element)
+        return(np.random.default_rng([self.seed,
+                                      self.num_stations,
+                                      element_num,
+                                      epoch_hour]))
+
+    def _air_temp(self, ind, obs_datetime, winter):
+        local_hour = obs_datetime.hour + self._lon[ind] / 15.0
+        lat = self._lat[ind]
+        return(24.0 - 0.75 * (lat - 25.0) -
+               6.5 * self._elevation_km[ind] -
+               (6.0 + 0.45 * (lat - 25.0)) * winter +
+               5.0 * np.sin(2.0 * np.pi * (local_hour - 9.0) / 24.0) +
+               self._temp_offset[ind])
+
+    def hour_obs(self, element, obs_datetime):
+        """
+        Generate the observations of element (a key of OBS_TABLES) for
+        a single hour, as a DataFrame with the columns of its table,
+        ordered by obj_identifier.
+        """
+        rng = self._rng(element, obs_datetime)
+        ind = self._schedule[element, obs_datetime.hour]
+        ind = ind[rng.random(len(ind)) < REPORT_PROBABILITY]
+        n = len(ind)
+
+        day = obs_datetime.timetuple().tm_yday + obs_datetime.hour / 24.0
+        # 1 in late January, -1 in late July.
+        winter = np.cos(2.0 * np.pi * (day - 20.0) / 365.25)
+        snow_season = np.clip((winter - 0.1) / 0.9, 0.0, 1.0)
+
+        if element == 'air_temp':
+            value = self._air_temp(ind, obs_datetime, winter) + \
+                rng.normal(0.0, 1.5, n)
+        elif element in ('snow_depth', 'swe'):
+            # Smooth seasonal cycle with storms passing every ~11 days.
+            value = self._snowiness[ind] * snow_season ** 0.7 * \
+                (1.0 + 0.25 * np.sin(2.0 * np.pi * day / 11.0 +
+                                     self._phase[ind]))
+            value = np.maximum(value + rng.normal(0.0, 0.005, n), 0.0)
+            if element == 'swe':
+                value = value * (0.2 + 0.15 * (1.0 - snow_season))
+        else:
+            duration_hours = np.array([network[3]
+                                       for network in NETWORKS])[
+                                           self._network[ind]]
+            fraction = duration_hours / 24.0
+            if element == 'snowfall':
+                cold = self._air_temp(ind, obs_datetime, winter) < 1.5
+                falls = cold & (rng.random(n) < 0.25 * fraction)
+                amount = rng.gamma(0.9, 0.02 + 0.1 * self._snowiness[ind])
+            else:
+                falls = rng.random(n) < 0.08 * duration_hours ** 0.5
+                amount = rng.gamma(0.7, 0.004 * duration_hours ** 0.6)
+            value = np.where(falls, amount * fraction ** 0.5, 0.0)
+
+        outliers = rng.random(n) < self.outlier_fraction
+        if np.any(outliers):
+            shift = OUTLIER_SIZE[element]
+            if element == 'air_temp':
+                shift = shift * rng.choice([-1.0, 1.0], size=n)
+            value = np.where(outliers, value + shift, value)
+
+        df = pd.DataFrame({'obj_identifier':
+                               self.stations['obj_identifier'].values[ind],
+                           'date': obs_datetime,
+                           'value': np.round(value, 4)})
+        if OBS_TABLES[element][1]:
+            df['duration'] = duration_hours * 3600
+        return(df)
+
+    def obs(self, element, begin_datetime, end_datetime):
+        """
+        Generate the observations of element from begin_datetime through
+        end_datetime (inclusive), ordered by date and obj_identifier.
+        """
+        num_hours = int((end_datetime - begin_datetime).
+                        total_seconds()) // 3600 + 1
+        frames = [self.hour_obs(element,
+                                begin_datetime + dt.timedelta(hours=i))
+                  for i in range(num_hours)]
+        return(pd.concat(frames, ignore_index=True))
+
+
+def create_tables(conn, drop_existing=False):
+    """
+    Create the "point" schema, point.allstation and the observation
+    tables through an open database connection, optionally dropping
+    them first. Indexes are left to create_indexes, so that they need not
+    be updated while tables are loaded.
+    """
+    cursor = conn.cursor()
+    cursor.execute('CREATE SCHEMA IF NOT EXISTS point;')
+    tables = [('point.allstation', ALLSTATION_COLUMNS)]
+    for table, has_duration in OBS_TABLES.values():
+        columns = [('obj_identifier', 'integer NOT NULL'),
+                   ('date', 'timestamp without time zone NOT NULL'),
+                   ('value', 'real')]
+        if has_duration:
+            columns.append(('duration', 'integer'))
+        tables.append((table, columns))
+    for table, columns in tables:
+        if drop_existing:
+            cursor.execute('DROP TABLE IF EXISTS ' + table + ';')
+        cursor.execute('CREATE TABLE IF NOT EXISTS ' + table + ' (' +
+                       ', '.join([name + ' ' + column_type
+                                  for name, column_type in columns]) +
+                       ');')
+    cursor.close()
+    conn.commit()
+
+
+def create_indexes(conn):
+    """
+    Create the indexes used by wdb0 queries on the observation tables,
+    and update planner statistics.
+    """
+    cursor = conn.cursor()
+    for table, has_duration in OBS_TABLES.values():
+        name = table.split('.')[1]
+        cursor.execute('CREATE INDEX IF NOT EXISTS ' + name + '_date ' +
+                       'ON ' + table + ' (date);')
+        cursor.execute('CREATE INDEX IF NOT EXISTS ' + name + '_obj_date ' +
+                       'ON ' + table + ' (obj_identifier, date);')
+    cursor.close()
+    conn.commit()
+    conn.autocommit = True
+    cursor = conn.cursor()
+    cursor.execute('ANALYZE;')
+    cursor.close()
+    conn.autocommit = False
+
+
+def _copy_df(cursor, df, table):
+    """
+    Load a DataFrame into a table using COPY.
+    """
+    buf = io.StringIO()
+    df.to_csv(buf,
+              header=False,
+              index=False,
+              date_format=TIMESTAMP_FORMAT)
+    buf.seek(0)
+    cursor.copy_expert('COPY ' + table + ' (' + ', '.join(df.columns) + ') ' +
+                       'FROM STDIN WITH (FORMAT csv)',
+                       buf)
+
+
+def load_fixtures(generator,
+                  begin_datetime,
+                  end_datetime,
+                  elements=None,
+                  dsn=None,
+                  drop_existing=False,
+                  verbose=None):
+    """
+    Load the stations and the observations from begin_datetime through
+    end_datetime of a FixtureGenerator into the database at dsn (by
+    default, the one used by wdb0_pool). Observations are loaded a day
+    at a time and each day is committed, so an interrupted load leaves
+    complete days behind. Stations are loaded only if point.allstation
+    is empty.
+    """
+    if elements is None:
+        elements = list(OBS_TABLES.keys())
+    for element in elements:
+        if element not in OBS_TABLES:
+            print('ERROR: unsupported element "{}".'.format(element),
+                  file=sys.stderr)
+            return None
+
+    if dsn is None:
+        dsn = wdb0_pool.get_dsn()
+    pool = wdb0_pool.ConnectionPool(dsn, max_connections=1)
+
+    num_rows = 0
+    with pool.connection() as conn:
+        create_tables(conn, drop_existing=drop_existing)
+
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM point.allstation;')
+        if cursor.fetchone()[0] == 0:
+            _copy_df(cursor, generator.stations, 'point.allstation')
+            conn.commit()
+            if verbose:
+                print('INFO: loaded {} stations.'.
+                      format(len(generator.stations)))
+
+        day_begin = begin_datetime
+        while day_begin <= end_datetime:
+            day_end = min(day_begin + dt.timedelta(hours=23), end_datetime)
+            t1 = dt.datetime.utcnow()
+            day_rows = 0
+            for element in elements:
+                df = generator.obs(element, day_begin, day_end)
+                _copy_df(cursor, df, OBS_TABLES[element][0])
+                day_rows += len(df)
+            conn.commit()
+            num_rows += day_rows
+            if verbose:
+                print('INFO: loaded {} observations '.format(day_rows) +
+                      'for {} through {} '.format(day_begin, day_end) +
+                      'in {} seconds.'.
+                      format((dt.datetime.utcnow() - t1).total_seconds()))
+            day_begin = day_end + dt.timedelta(hours=1)
+        cursor.close()
+
+        create_indexes(conn)
+
+    pool.close_all()
+
+    return(num_rows)
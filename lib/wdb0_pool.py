@@ -0,0 +1,410 @@
+import io
+import os
+import sys
+import time
+import threading
+import itertools
+import contextlib
+import concurrent.futures
+import psycopg2
+import wdb0_profile
+
+"""
+Connection pool for the "web_data" database on wdb0.
+get_dsn
+set_dsn
+get_pool
+connection
+fetchall
+fetch_batches
+copy_csv
+run_concurrently
+close_all
+
+Connections are opened lazily, checked before they are reused, and
+replaced if the server has dropped them. Queries run repeatedly may be
+given a statement name, in which case they are prepared once on each
+connection and then executed with bound parameters, so the server parses
+and plans them only once. The DSN defaults to the
+operational wdb0 server and may be overridden with the WDB0_DSN
+environment variable or with set_dsn.
+"""
+
+DEFAULT_DSN = "host='wdb0.dmz.nohrsc.noaa.gov' dbname='web_data'"
+
+# Number of rows per batch when streaming query results.
+DEFAULT_BATCH_SIZE = 50000
+
+# Errors indicating that a connection is no longer usable.
+CONNECTION_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+# SQLSTATE for a reference to a prepared statement that does not exist.
+INVALID_STATEMENT_NAME = '26000'
+
+
+class ConnectionPool(object):
+
+    """
+    A bounded, thread-safe pool of connections to a single database.
+    No connection is opened until one is requested. Idle connections
+    that have not been used for health_check_seconds are tested with a
+    trivial query before they are handed out.
+    """
+
+    def __init__(self,
+                 dsn,
+                 max_connections=4,
+                 health_check_seconds=60.0):
+        self.dsn = dsn
+        self.max_connections = max_connections
+        self.health_check_seconds = health_check_seconds
+        self._idle = []
+        self._num_open = 0
+        self._cond = threading.Condition()
+        self._cursor_numbers = itertools.count(1)
+        # Statements prepared on each open connection, by id(connection).
+        self._prepared = {}
+
+    def _connect(self):
+        with wdb0_profile.phase('connect'):
+            conn = psycopg2.connect(self.dsn)
+        conn.set_client_encoding("utf-8")
+        return conn
+
+    def _is_healthy(self, conn, idle_since):
+        if conn.closed:
+            return False
+        if time.time() - idle_since < self.health_check_seconds:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1;')
+            cursor.fetchall()
+            cursor.close()
+            conn.rollback()
+        except CONNECTION_ERRORS:
+            return False
+        return True
+
+    def get(self):
+        """
+        Get a connection from the pool, opening one if necessary. Blocks
+        while max_connections connections are in use.
+        """
+        with self._cond:
+            while not self._idle and self._num_open >= self.max_connections:
+                self._cond.wait()
+            if self._idle:
+                conn, idle_since = self._idle.pop()
+            else:
+                conn, idle_since = None, None
+                self._num_open += 1
+
+        if conn is not None and not self._is_healthy(conn, idle_since):
+            self._forget(conn)
+            _close_quietly(conn)
+            conn = None
+        if conn is None:
+            try:
+                conn = self._connect()
+            except:
+                with self._cond:
+                    self._num_open -= 1
+                    self._cond.notify()
+                raise
+        return conn
+
+    def put(self, conn, discard=False):
+        """
+        Return a connection to the pool. Discarded (or closed)
+        connections are closed and a later get will open a new one.
+        """
+        if not discard and not conn.closed:
+            try:
+                # End any open transaction so the connection is not left
+                # idle in transaction.
+                conn.rollback()
+            except CONNECTION_ERRORS:
+                discard = True
+        with self._cond:
+            if discard or conn.closed:
+                self._forget(conn)
+                _close_quietly(conn)
+                self._num_open -= 1
+            else:
+                self._idle.append((conn, time.time()))
+            self._cond.notify()
+
+    def _forget(self, conn):
+        """
+        Forget the statements prepared on a connection being closed.
+        """
+        self._prepared.pop(id(conn), None)
+
+    def _execute_prepared(self, conn, cursor, statement_name, sql_cmd,
+                          params):
+        """
+        Execute sql_cmd, whose parameters are written $1, $2, ..., as the
+        prepared statement statement_name, preparing it on this connection
+        first if necessary.
+        """
+        prepared = self._prepared.setdefault(id(conn), {})
+        if prepared.get(statement_name) != sql_cmd:
+            if statement_name in prepared:
+                cursor.execute('DEALLOCATE ' + statement_name)
+                del prepared[statement_name]
+            cursor.execute('PREPARE ' + statement_name + ' AS ' +
+                           sql_cmd.strip().rstrip(';'))
+            prepared[statement_name] = sql_cmd
+        if params is None or len(params) == 0:
+            cursor.execute('EXECUTE ' + statement_name)
+        else:
+            cursor.execute('EXECUTE ' + statement_name + ' (' +
+                           ', '.join(['%s'] * len(params)) + ')',
+                           params)
+
+    def _execute(self, conn, cursor, sql_cmd, params, statement_name):
+        """
+        Execute sql_cmd on cursor, as a prepared statement if
+        statement_name is given (see fetchall).
+        """
+        if statement_name is None:
+            cursor.execute(sql_cmd, params)
+            return
+        try:
+            self._execute_prepared(conn, cursor, statement_name, sql_cmd,
+                                   params)
+        except psycopg2.Error as e:
+            if getattr(e, 'pgcode', None) != INVALID_STATEMENT_NAME:
+                raise
+            # The server no longer has the statement; prepare it again.
+            conn.rollback()
+            self._forget(conn)
+            self._execute_prepared(conn, cursor, statement_name, sql_cmd,
+                                   params)
+
+    @contextlib.contextmanager
+    def connection(self):
+        """
+        Context manager yielding a pooled connection. A connection that
+        fails with a connection error is discarded rather than returned
+        to the pool.
+        """
+        conn = self.get()
+        try:
+            yield conn
+        except CONNECTION_ERRORS:
+            self.put(conn, discard=True)
+            raise
+        except:
+            self.put(conn)
+            raise
+        else:
+            self.put(conn)
+
+    def fetchall(self, sql_cmd, params=None, retries=1,
+                 statement_name=None):
+        """
+        Execute a query and return all rows as a list of tuples. If the
+        connection fails the query is retried (up to retries times) on a
+        new connection.
+
+        If statement_name is given, the query is run as a prepared
+        statement of that name. Its parameters are then written $1, $2,
+        ... in sql_cmd, and params must be a sequence.
+        """
+        while True:
+            try:
+                with self.connection() as conn:
+                    cursor = conn.cursor()
+                    with wdb0_profile.phase('execute'):
+                        self._execute(conn, cursor, sql_cmd, params,
+                                      statement_name)
+                    with wdb0_profile.phase('fetch'):
+                        rows = cursor.fetchall()
+                    cursor.close()
+                return(rows)
+            except CONNECTION_ERRORS as e:
+                if retries <= 0:
+                    raise
+                retries -= 1
+                print('WARNING: lost connection to database ({}); '.
+                      format(str(e).strip()) +
+                      'reconnecting.',
+                      file=sys.stderr)
+
+    def fetch_batches(self,
+                      sql_cmd,
+                      params=None,
+                      batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Execute a query on a named (server-side) cursor and yield its
+        rows in lists of up to batch_size tuples, so that the full result
+        is never held in memory. The connection is kept until the last
+        batch has been read (or the generator is closed). Unlike fetchall,
+        a query that fails partway through is not retried.
+        """
+        with self.connection() as conn:
+            # Server-side cursors need names unique within a connection.
+            cursor_name = 'wdb0_stream_{}'.format(next(self._cursor_numbers))
+            cursor = conn.cursor(name=cursor_name)
+            cursor.itersize = batch_size
+            try:
+                with wdb0_profile.phase('execute'):
+                    cursor.execute(sql_cmd, params)
+                while True:
+                    with wdb0_profile.phase('fetch'):
+                        rows = cursor.fetchmany(batch_size)
+                    if len(rows) == 0:
+                        break
+                    yield rows
+            finally:
+                if not conn.closed:
+                    cursor.close()
+
+    def copy_csv(self, sql_cmd, retries=1):
+        """
+        Run a query through COPY ... TO STDOUT and return its results as
+        CSV-formatted bytes, bypassing the conversion of each row to a
+        tuple of Python objects. Retried like fetchall.
+        """
+        copy_cmd = 'COPY (' + sql_cmd.strip().rstrip(';') + ') ' + \
+                   'TO STDOUT WITH (FORMAT csv)'
+        while True:
+            try:
+                with self.connection() as conn:
+                    cursor = conn.cursor()
+                    buf = io.BytesIO()
+                    with wdb0_profile.phase('fetch'):
+                        cursor.copy_expert(copy_cmd, buf)
+                    cursor.close()
+                return(buf.getvalue())
+            except CONNECTION_ERRORS as e:
+                if retries <= 0:
+                    raise
+                retries -= 1
+                print('WARNING: lost connection to database ({}); '.
+                      format(str(e).strip()) +
+                      'reconnecting.',
+                      file=sys.stderr)
+
+    def close_all(self):
+        """
+        Close all idle connections.
+        """
+        with self._cond:
+            while self._idle:
+                conn, idle_since = self._idle.pop()
+                self._forget(conn)
+                _close_quietly(conn)
+                self._num_open -= 1
+            self._cond.notify_all()
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except psycopg2.Error:
+        pass
+
+
+_dsn = os.environ.get('WDB0_DSN', DEFAULT_DSN)
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_dsn():
+    """
+    Get the DSN used for new wdb0 connections.
+    """
+    return(_dsn)
+
+
+def set_dsn(dsn):
+    """
+    Set the DSN used for new wdb0 connections. Any idle connections to
+    a previously configured database are closed.
+    """
+    global _dsn, _pool
+    with _pool_lock:
+        if dsn == _dsn:
+            return
+        _dsn = dsn
+        old_pool = _pool
+        _pool = None
+    if old_pool is not None:
+        old_pool.close_all()
+
+
+def get_pool():
+    """
+    Get the shared wdb0 connection pool, creating it on first use.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(_dsn)
+        return(_pool)
+
+
+def connection():
+    """
+    Context manager yielding a connection from the shared pool.
+    """
+    return(get_pool().connection())
+
+
+def fetchall(sql_cmd, params=None, statement_name=None):
+    """
+    Execute a query (as a prepared statement, if statement_name is given)
+    using the shared pool and return all rows.
+    """
+    return(get_pool().fetchall(sql_cmd,
+                               params=params,
+                               statement_name=statement_name))
+
+
+def fetch_batches(sql_cmd, params=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Execute a query using the shared pool and yield its rows in batches.
+    """
+    return(get_pool().fetch_batches(sql_cmd,
+                                    params=params,
+                                    batch_size=batch_size))
+
+
+def copy_csv(sql_cmd):
+    """
+    Run a query through COPY using the shared pool and return CSV bytes.
+    """
+    return(get_pool().copy_csv(sql_cmd))
+
+
+def run_concurrently(functions, max_workers=None):
+    """
+    Call each of a list of functions (taking no arguments) in its own
+    thread and return their results in the same order. Intended for
+    independent queries, which overlap their waits on the database. By
+    default at most as many run at once as the shared pool has
+    connections. If any function raises an exception, it is raised here
+    once all have finished.
+    """
+    if max_workers is None:
+        max_workers = get_pool().max_connections
+    if len(functions) <= 1 or max_workers <= 1:
+        return([function() for function in functions])
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) \
+            as executor:
+        futures = [executor.submit(function) for function in functions]
+        concurrent.futures.wait(futures)
+    return([future.result() for future in futures])
+
+
+def close_all():
+    """
+    Close idle connections in the shared pool.
+    """
+    with _pool_lock:
+        pool = _pool
+    if pool is not None:
+        pool.close_all()
@@ -0,0 +1,75 @@
+import time
+import threading
+import contextlib
+
+"""
+Phase timing for wdb0 queries.
+PHASES
+phase
+PhaseRecorder
+
+Code in wdb0, wdb0_pool and wdb0_cache marks the work it does with
+phase(name). Nothing is measured unless a PhaseRecorder is active, in
+which case the time spent in each phase is added to every active
+recorder. Phases running at once in several threads (as with tiled
+queries) are each counted in full, so phase totals can exceed elapsed
+time.
+"""
+
+# Phases, in the order in which a query usually passes through them:
+# opening a database connection, executing a statement, transferring
+# rows (including COPY, which does both), building DataFrames and
+# arrays from them, pivoting into [station, hour] arrays, and reading and
+# writing the on-disk cache.
+PHASES = ['connect',
+          'execute',
+          'fetch',
+          'frame',
+          'pivot',
+          'cache_read',
+          'cache_write']
+
+_recorders = []
+_recorders_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def phase(name):
+    """
+    Context manager timing the work it encloses as phase name.
+    """
+    if not _recorders:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _recorders_lock:
+            for recorder in _recorders:
+                recorder.seconds[name] = \
+                    recorder.seconds.get(name, 0.0) + elapsed
+                recorder.counts[name] = recorder.counts.get(name, 0) + 1
+
+
+class PhaseRecorder(object):
+
+    """
+    Context manager collecting the total seconds spent in, and number of
+    entries to, each phase while it is active.
+    """
+
+    def __init__(self):
+        self.seconds = {}
+        self.counts = {}
+
+    def __enter__(self):
+        with _recorders_lock:
+            _recorders.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        with _recorders_lock:
+            _recorders.remove(self)
+        return False
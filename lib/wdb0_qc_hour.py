@@ -0,0 +1,294 @@
+import datetime as dt
+import queue
+import sys
+import threading
+import numpy as np
+
+import wdb0
+import wdb0_pool
+import wdb0_buffer
+import wdb0_stations
+from station_index import StationIndex
+
+"""
+QCHourFetcher
+QCHourPrefetcher
+
+Gather all wdb0 observations needed to QC snow depth and SWE for one hour,
+as a "QC hour bundle" whose elements share a single station index, and
+prepare bundles for upcoming hours in the background.
+"""
+
+
+class QCHourFetcher(object):
+
+    """
+    Fetch the observations used by snow depth and SWE QC for successive
+    hours. Snow depth, SWE and air temperature are held in rolling buffers
+    (see wdb0_buffer), so current and preceding hours come from a single
+    fetch per element per hour, and one precipitation fetch serves both
+    the snow depth and SWE tests. The fetches for each hour are
+    independent and run concurrently, at most max_workers at a time
+    (by default, the size of the wdb0 connection pool).
+
+    The get method returns a dictionary holding the following, each in the
+    form returned by the corresponding wdb0 function:
+        snwd       all snow depth reports (get_snow_depth_obs)
+        prev_snwd  preceding snow depth (get_prev_snow_depth_obs)
+        snfl       snowfall at snow depth stations (get_snwd_snfl_obs)
+        snwd_prcp  precipitation at snow depth stations (get_snwd_prcp_obs)
+        prev_tair  preceding and current air temperature (get_air_temp_obs)
+        swe        all SWE reports (get_swe_obs)
+        prev_swe   preceding SWE (get_prev_swe_obs)
+        swe_prcp   precipitation at SWE stations (get_swe_prcp_obs)
+    along with
+        station_index  a StationIndex of every station in the bundle
+        rows           for each of the keys above, the station_index row
+                       of each of its stations
+        snwd_si        for each of prev_snwd, snfl, snwd_prcp and
+                       prev_tair, the index of each snwd station in its
+                       data, or -1 if absent
+        swe_si         the same for prev_swe and swe_prcp relative to swe
+    """
+
+    def __init__(self,
+                 num_hrs_prev_snwd,
+                 num_hrs_prev_swe,
+                 num_hrs_prev_tair,
+                 num_hrs_snowfall,
+                 num_hrs_prcp,
+                 scratch_dir=None,
+                 max_workers=None,
+                 verbose=None):
+        self.num_hrs_prev_snwd = num_hrs_prev_snwd
+        self.num_hrs_prev_swe = num_hrs_prev_swe
+        self.num_hrs_prev_tair = num_hrs_prev_tair
+        self.num_hrs_snowfall = num_hrs_snowfall
+        self.num_hrs_prcp = num_hrs_prcp
+        self.scratch_dir = scratch_dir
+        self.max_workers = max_workers
+        self.verbose = verbose
+        self.snwd_buffer = \
+            wdb0_buffer.ObsWindowBuffer('snow_depth',
+                                        num_hrs_prev_snwd + 1,
+                                        scratch_dir=scratch_dir,
+                                        verbose=verbose)
+        self.swe_buffer = \
+            wdb0_buffer.ObsWindowBuffer('swe',
+                                        num_hrs_prev_swe + 1,
+                                        scratch_dir=scratch_dir,
+                                        verbose=verbose)
+        self.tair_buffer = \
+            wdb0_buffer.ObsWindowBuffer('air_temp',
+                                        num_hrs_prev_tair + 1,
+                                        scratch_dir=scratch_dir,
+                                        verbose=verbose)
+
+    def _fetch_accum(self, element, obs_datetime, duration_hours):
+        """
+        Get accumulated (snowfall or precipitation) observations of the
+        given duration ending at obs_datetime, for all stations.
+        """
+        if self.scratch_dir is not None:
+            return(wdb0.get_cached_obs_df(element,
+                                          obs_datetime,
+                                          obs_datetime,
+                                          self.scratch_dir,
+                                          duration_hours=duration_hours,
+                                          verbose=self.verbose))
+        return(wdb0.get_element_obs_df(element,
+                                       obs_datetime,
+                                       obs_datetime,
+                                       duration_hours=duration_hours,
+                                       verbose=self.verbose))
+
+    def get(self, obs_datetime, no_data_value=-99999.0):
+        """
+        Get the QC hour bundle for obs_datetime.
+        """
+
+        # Fetch the new data for every element at once. After this the
+        # buffers hold all hours needed.
+        snfl_df, prcp_df = wdb0_pool.run_concurrently(
+            [lambda: self._fetch_accum('snowfall',
+                                       obs_datetime,
+                                       self.num_hrs_snowfall),
+             lambda: self._fetch_accum('precip',
+                                       obs_datetime,
+                                       self.num_hrs_prcp),
+             lambda: self.snwd_buffer.update(obs_datetime),
+             lambda: self.swe_buffer.update(obs_datetime),
+             lambda: self.tair_buffer.update(obs_datetime)],
+            max_workers=self.max_workers)[0:2]
+
+        bundle = {}
+        bundle['snwd'] = self.snwd_buffer.get_obs(obs_datetime,
+                                                  obs_datetime,
+                                                  no_data_value)
+        bundle['prev_snwd'] = \
+            self.snwd_buffer.get_prev_obs(obs_datetime,
+                                          self.num_hrs_prev_snwd,
+                                          no_data_value)
+        bundle['swe'] = self.swe_buffer.get_obs(obs_datetime,
+                                                obs_datetime,
+                                                no_data_value)
+        bundle['prev_swe'] = \
+            self.swe_buffer.get_prev_obs(obs_datetime,
+                                         self.num_hrs_prev_swe,
+                                         no_data_value)
+        tair_begin_datetime = \
+            obs_datetime - dt.timedelta(hours=self.num_hrs_prev_tair)
+        bundle['prev_tair'] = self.tair_buffer.get_obs(tair_begin_datetime,
+                                                       obs_datetime,
+                                                       no_data_value)
+
+        # Snowfall and precipitation, limited to stations reporting snow
+        # depth or SWE.
+        for key, df, reporters, value_key in \
+            [('snfl', snfl_df, 'snwd', 'values_cm'),
+             ('snwd_prcp', prcp_df, 'snwd', 'values_mm'),
+             ('swe_prcp', prcp_df, 'swe', 'values_mm')]:
+            df = df[np.isin(df['obj_identifier'].values,
+                            bundle[reporters]['station_obj_id'])]
+            pivoted = wdb0.pivot_obs(df.reset_index(drop=True),
+                                     'value',
+                                     no_data_value=no_data_value)
+            bundle[key] = \
+                wdb0_stations.obs_dict(
+                    wdb0_stations.StationTable(*pivoted[0:7]),
+                    value_key,
+                    pivoted[7],
+                    obs_datetime)
+
+        # Place all stations on a shared index.
+        keys = ['snwd', 'prev_snwd', 'snfl', 'snwd_prcp', 'prev_tair',
+                'swe', 'prev_swe', 'swe_prcp']
+        all_obj_id = np.unique(np.concatenate(
+            [bundle[key]['station_obj_id'] for key in keys]))
+        station_index = StationIndex(all_obj_id)
+        rows = {key: station_index.lookup(bundle[key]['station_obj_id'])
+                for key in keys}
+        bundle['station_index'] = station_index
+        bundle['rows'] = rows
+
+        def align(from_key, to_key):
+            to_si = np.full(len(station_index), -1, dtype=int)
+            to_si[rows[to_key]] = np.arange(len(rows[to_key]))
+            return(to_si[rows[from_key]])
+
+        bundle['snwd_si'] = {key: align('snwd', key)
+                             for key in ['prev_snwd', 'snfl', 'snwd_prcp',
+                                         'prev_tair']}
+        bundle['swe_si'] = {key: align('swe', key)
+                            for key in ['prev_swe', 'swe_prcp']}
+
+        return(bundle)
+
+
+class QCHourPrefetcher(object):
+
+    """
+    Iterate over (obs_datetime, bundle) for a sequence of hours, where
+    bundle = get_bundle(obs_datetime) (e.g., QCHourFetcher.get, perhaps
+    with additional data added). A background thread prepares bundles for
+    up to depth hours ahead of the one being used, so that fetching data
+    for later hours overlaps with processing of the current hour. Once
+    depth bundles are waiting, the thread blocks until one is taken, which
+    bounds the memory used. With depth=0 bundles are prepared on demand in
+    the calling thread.
+
+    Hours are always prepared in order, by one thread, so get_bundle may
+    keep state from one hour to the next. An exception raised by
+    get_bundle is raised again by the iterator at the hour it occurred.
+    Call close (or use the prefetcher in a "with" statement) to stop the
+    thread if iteration ends early.
+    """
+
+    def __init__(self,
+                 get_bundle,
+                 obs_datetimes,
+                 depth=2,
+                 verbose=None):
+        if depth < 0:
+            raise ValueError('prefetch depth must be nonnegative')
+        self.get_bundle = get_bundle
+        self.obs_datetimes = list(obs_datetimes)
+        self.depth = depth
+        self.verbose = verbose
+        self._queue = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _put(self, item):
+        """
+        Put an item on the queue, waiting for room unless stopped. Return
+        False if stopped.
+        """
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self):
+        for obs_datetime in self.obs_datetimes:
+            if self._stop.is_set():
+                return
+            try:
+                bundle = self.get_bundle(obs_datetime)
+            except BaseException as exc:
+                self._put((obs_datetime, None, exc))
+                return
+            if self.verbose:
+                print('INFO: prefetched data for {}.'.format(obs_datetime))
+            if not self._put((obs_datetime, bundle, None)):
+                return
+
+    def __iter__(self):
+        if self.depth == 0:
+            for obs_datetime in self.obs_datetimes:
+                yield obs_datetime, self.get_bundle(obs_datetime)
+            return
+
+        self._stop.clear()
+        self._queue = queue.Queue(maxsize=self.depth)
+        self._thread = threading.Thread(target=self._produce,
+                                        name='qc_hour_prefetch',
+                                        daemon=True)
+        self._thread.start()
+        try:
+            for _ in self.obs_datetimes:
+                obs_datetime, bundle, exc = self._queue.get()
+                if exc is not None:
+                    print('ERROR: failed to gather data for {}.'.
+                          format(obs_datetime),
+                          file=sys.stderr)
+                    raise exc
+                yield obs_datetime, bundle
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Stop the background thread, discarding any bundles not yet used.
+        """
+        if self._thread is None:
+            return
+        self._stop.set()
+        # Unblock a producer waiting for room in the queue.
+        while self._thread.is_alive():
+            try:
+                self._queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        self._thread.join()
+        self._thread = None
+        self._queue = None
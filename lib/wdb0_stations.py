@@ -0,0 +1,310 @@
+import datetime as dt
+import sys
+import threading
+import numpy as np
+import pandas as pd
+
+from station_index import StationIndex
+
+"""
+StationMetadata
+StationTable
+obs_dict
+
+Locally cached copy of the station metadata that accompany wdb0
+observations, so that observation queries need only return
+obj_identifier, date and value and can be joined to station metadata
+here instead of in the database, and the compact station tables returned
+with observations.
+"""
+
+# Columns of station metadata and of observations joined to them.
+STATION_COLUMNS = ['obj_identifier',
+                   'station_id',
+                   'name',
+                   'lon',
+                   'lat',
+                   'elevation',
+                   'recorded_elevation']
+OBS_COLUMNS = STATION_COLUMNS + ['date', 'value']
+
+DEFAULT_REFRESH_INTERVAL = dt.timedelta(hours=24)
+
+
+def _intern_all(values):
+    """
+    Get an object array of values with strings interned.
+    """
+    return(np.array([sys.intern(value) if isinstance(value, str) else value
+                     for value in values],
+                    dtype=object))
+
+
+def _object_array(values):
+    if isinstance(values, np.ndarray) and values.dtype == object:
+        return(values)
+    array = np.empty(len(values), dtype=object)
+    array[:] = list(values)
+    return(array)
+
+
+class StationMetadata(object):
+
+    """
+    Table of station metadata indexed by object identifier. Stations are
+    read using fetch(obj_identifiers), which must return a DataFrame with
+    STATION_COLUMNS, the first time they are needed. Once the table is
+    older than refresh_interval, all stations are read again. The version
+    attribute increases whenever the contents of the table change.
+    """
+
+    def __init__(self,
+                 fetch,
+                 refresh_interval=DEFAULT_REFRESH_INTERVAL):
+        self._fetch = fetch
+        self.refresh_interval = refresh_interval
+        self.version = 0
+        self._df = pd.DataFrame([], columns=STATION_COLUMNS)
+        self._index = StationIndex()
+        self._absent = set()
+        self._refreshed = dt.datetime.utcnow()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._index)
+
+    def _set_table(self, df):
+        df = df.astype({'obj_identifier': np.int64}). \
+            sort_values('obj_identifier', kind='mergesort'). \
+            reset_index(drop=True)[STATION_COLUMNS]
+        # Intern strings, so that every observation of a station shares
+        # them.
+        for column in ['station_id', 'name']:
+            df[column] = pd.Series(_intern_all(df[column].values),
+                                   dtype=object)
+        if df.equals(self._df):
+            return
+        self._df = df
+        self._index = StationIndex(df['obj_identifier'].values)
+        self.version += 1
+
+    def refresh(self):
+        """
+        Read all stations in the table again.
+        """
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self):
+        self._refreshed = dt.datetime.utcnow()
+        self._absent = set()
+        if len(self._index) == 0:
+            return
+        self._set_table(self._fetch(self._index.obj_identifiers))
+
+    def _add(self, obj_identifiers):
+        """
+        Read stations not yet in the table.
+        """
+        obj_identifiers = np.unique(np.asarray(obj_identifiers,
+                                               dtype=np.int64))
+        is_new = self._index.lookup(obj_identifiers) < 0
+        new_obj_id = [obj_id for obj_id in obj_identifiers[is_new]
+                      if obj_id not in self._absent]
+        if len(new_obj_id) == 0:
+            return
+        df = self._fetch(new_obj_id)
+        self._absent.update(set(new_obj_id) -
+                            set(np.asarray(df['obj_identifier'],
+                                           dtype=np.int64).tolist()))
+        if len(df) > 0:
+            self._set_table(pd.concat([self._df, df], ignore_index=True))
+
+    def lookup(self, obj_identifiers):
+        """
+        Return rows of the table for an array of object identifiers, with
+        -1 for stations that do not exist. Stations not yet in the table
+        are read first, and the whole table is refreshed if it is due.
+        """
+        with self._lock:
+            if dt.datetime.utcnow() - self._refreshed > \
+               self.refresh_interval:
+                self._refresh()
+            self._add(obj_identifiers)
+            return(self._index.lookup(obj_identifiers), self._df)
+
+    def get(self, obj_identifiers):
+        """
+        Get metadata for a set of stations as a DataFrame with
+        STATION_COLUMNS, in the order given. Stations that do not exist
+        are left out.
+        """
+        rows, df = self.lookup(obj_identifiers)
+        return(df.iloc[rows[rows >= 0]].reset_index(drop=True))
+
+    def join(self, obs_df):
+        """
+        Add station metadata to a DataFrame of observations having an
+        obj_identifier column, keeping its row order. As with a database
+        join, observations from stations that do not exist are dropped.
+        """
+        rows, df = self.lookup(obs_df['obj_identifier'].values)
+        found = rows >= 0
+        rows = rows[found]
+        joined_df = obs_df[found].reset_index(drop=True)
+        for column in STATION_COLUMNS[1:]:
+            joined_df[column] = pd.Series(df[column].values[rows],
+                                          dtype=df[column].dtype)
+        return(joined_df)
+
+
+class StationTable(object):
+
+    """
+    Metadata for a list of stations, held in arrays: obj_id (int64),
+    station_id and name (objects; strings taken from StationMetadata are
+    interned), elevation and recorded_elevation (float, NaN where
+    missing), and lon and lat, which are (contiguous) views of a single
+    [2, station] coordinates array. Stations are found by object
+    identifier through a hash index built on first use.
+    """
+
+    __slots__ = ('obj_id',
+                 'station_id',
+                 'name',
+                 'coordinates',
+                 'elevation',
+                 'recorded_elevation',
+                 '_index')
+
+    def __init__(self,
+                 obj_id=(),
+                 station_id=(),
+                 name=(),
+                 lon=(),
+                 lat=(),
+                 elevation=(),
+                 recorded_elevation=()):
+        self.obj_id = np.asarray(obj_id, dtype=np.int64)
+        num_stations = len(self.obj_id)
+        self.station_id = _object_array(station_id)
+        self.name = _object_array(name)
+        self.coordinates = np.empty([2, num_stations], dtype=float)
+        self.coordinates[0, :] = np.asarray(lon, dtype=float)
+        self.coordinates[1, :] = np.asarray(lat, dtype=float)
+        self.elevation = np.asarray(elevation, dtype=float)
+        self.recorded_elevation = np.asarray(recorded_elevation,
+                                             dtype=float)
+        self._index = None
+
+    @classmethod
+    def from_df(cls, df):
+        """
+        Create a table from a DataFrame with STATION_COLUMNS.
+        """
+        return(cls(df['obj_identifier'].values,
+                   df['station_id'].values,
+                   df['name'].values,
+                   df['lon'].values,
+                   df['lat'].values,
+                   df['elevation'].values,
+                   df['recorded_elevation'].values))
+
+    def __len__(self):
+        return len(self.obj_id)
+
+    @property
+    def lon(self):
+        return self.coordinates[0]
+
+    @property
+    def lat(self):
+        return self.coordinates[1]
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = StationIndex(self.obj_id)
+        return self._index
+
+    def lookup(self, obj_identifiers):
+        """
+        Return rows for an array of object identifiers, with -1 for those
+        not in the table.
+        """
+        return(self.index.lookup(obj_identifiers))
+
+    def get(self, obj_identifier):
+        """
+        Return the row for a single object identifier, or None if it is
+        not in the table.
+        """
+        return(self.index.get(obj_identifier))
+
+    @classmethod
+    def concatenate(cls, tables):
+        """
+        Join a list of tables end to end.
+        """
+        table = cls.__new__(cls)
+        for column in ['obj_id', 'station_id', 'name', 'elevation',
+                       'recorded_elevation']:
+            setattr(table, column,
+                    np.concatenate([getattr(t, column) for t in tables]))
+        table.coordinates = np.concatenate([t.coordinates for t in tables],
+                                           axis=1)
+        table._index = None
+        return(table)
+
+    def update(self, rows, other):
+        """
+        Replace the metadata in the given rows with those of the stations
+        in another table, which must have the same object identifiers.
+        """
+        self.station_id[rows] = other.station_id
+        self.name[rows] = other.name
+        self.coordinates[:, rows] = other.coordinates
+        self.elevation[rows] = other.elevation
+        self.recorded_elevation[rows] = other.recorded_elevation
+
+    def take(self, rows):
+        """
+        Get a table of the stations in the given rows.
+        """
+        table = self.__class__.__new__(self.__class__)
+        table.obj_id = self.obj_id[rows]
+        table.station_id = self.station_id[rows]
+        table.name = self.name[rows]
+        table.coordinates = self.coordinates[:, rows]
+        table.elevation = self.elevation[rows]
+        table.recorded_elevation = self.recorded_elevation[rows]
+        table._index = None
+        return(table)
+
+
+def obs_dict(stations,
+             value_key,
+             values,
+             obs_datetime,
+             num_hours=None):
+    """
+    Place a StationTable and the observations for its stations in the
+    dictionary form returned by the wdb0 functions. Station metadata are
+    given both as the table itself ("stations") and as its arrays under
+    the keys used by those functions. The num_hours key is included only
+    if num_hours is given.
+    """
+    result = {'num_stations': len(stations)}
+    if num_hours is not None:
+        result['num_hours'] = num_hours
+    result.update({'stations': stations,
+                   'station_obj_id': stations.obj_id,
+                   'station_id': stations.station_id,
+                   'station_name': stations.name,
+                   'station_lon': stations.lon,
+                   'station_lat': stations.lat,
+                   'station_elevation': stations.elevation,
+                   'station_rec_elevation': stations.recorded_elevation,
+                   'obs_datetime': obs_datetime,
+                   value_key: values})
+    return(result)
@@ -0,0 +1,492 @@
+#!/usr/bin/python3
+
+"""
+Update a QC database for a long period (e.g., reprocessing a season) by
+dividing the hours to update into blocks that are quality controlled at
+the same time, each by update_station_qc_db.py working on its own
+scratch copy of the database.
+
+QC tests for an hour depend on the QC flags of preceding hours, so each
+block after the first starts with a lead-in: hours before the block that
+are quality controlled again to rebuild that history. Flags for the
+lead-in hours themselves are discarded. After all blocks are done, their
+flags are combined (by bitwise OR, in block order) into the database:
+- all flags for the hours in each block, and
+- flags set on earlier hours (within the longest QC test window) by
+  tests for hours in the block, found by comparison with the scratch
+  copy as it was at the end of the lead-in.
+Stations added by any block are added to the database.
+"""
+
+import argparse
+import concurrent.futures
+import datetime as dt
+from netCDF4 import Dataset, num2date
+import numpy as np
+import os
+import shutil
+import subprocess
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'lib'))
+from station_index import StationIndex
+
+# QC flag variables combined from blocks.
+qc_var_names = ['snow_depth_qc',
+                'snow_depth_qc_checked',
+                'swe_qc',
+                'swe_qc_checked']
+
+# Longest window of previous hours examined by QC tests (the streak and
+# gap checks in update_station_qc_db.py), which is how far back before
+# an hour the tests for it can flag values.
+max_lookback_hours = 15 * 24
+
+# Number of hours of QC flags combined at a time.
+merge_chunk_hours = 24
+
+
+def parse_args():
+    """
+    Parse command line arguments.
+    """
+    help_message = 'Update a QC database for a long period by quality ' + \
+                   'controlling blocks of hours concurrently.'
+    parser = argparse.ArgumentParser(description=help_message)
+    parser.add_argument('database_path',
+                        type=str,
+                        metavar='database',
+                        help='QC database file (full path)')
+    parser.add_argument('-f', '--finish_date',
+                        type=str,
+                        metavar='finish date YYYYMMDDHH',
+                        nargs='?',
+                        help='Last hour (UTC) to update, in YYYYMMDDHH ' +
+                             'format; default is the end of the database. ' +
+                             'Hours later than the current time less ' +
+                             'min_days_latency are never updated.')
+    parser.add_argument('-m', '--min_days_latency',
+                        type=int,
+                        metavar='# of days',
+                        nargs='?',
+                        default=0,
+                        help='Set the minimum days of latency for ' +
+                             'updates, as for update_station_qc_db.py; ' +
+                             'default=0.')
+    parser.add_argument('-b', '--block_days',
+                        type=int,
+                        metavar='# of days',
+                        nargs='?',
+                        default=30,
+                        help='Set the number of days in each block; ' +
+                             'default=30.')
+    parser.add_argument('-l', '--lead_in_hours',
+                        type=int,
+                        metavar='# of hours',
+                        nargs='?',
+                        default=max_lookback_hours,
+                        help='Set the number of hours quality controlled ' +
+                             'again before each block; ' +
+                             'default={}.'.format(max_lookback_hours))
+    parser.add_argument('-n', '--num_workers',
+                        type=int,
+                        metavar='# of blocks',
+                        nargs='?',
+                        default=4,
+                        help='Set the number of blocks processed at ' +
+                             'once, each using a full copy of the ' +
+                             'database; default=4.')
+    parser.add_argument('-c', '--check_climatology',
+                        action='store_true',
+                        help='Enhance QC tests using SNODAS climatology.')
+    parser.add_argument('-p', '--pkl_dir',
+                        type=str,
+                        metavar='dir',
+                        nargs='?',
+                        help='Set directory for the cache of ' +
+                             'observations read from the observational ' +
+                             'database.')
+    parser.add_argument('-d', '--wdb0_dsn',
+                        type=str,
+                        metavar='dsn',
+                        nargs='?',
+                        help='Set the connection string for the ' +
+                             'observational database.')
+    parser.add_argument('-v', '--verbose',
+                        action='store_true',
+                        help='Provide verbose output.')
+
+    args = parser.parse_args()
+
+    if args.finish_date is not None:
+        try:
+            args.finish_datetime = dt.datetime.strptime(args.finish_date,
+                                                        '%Y%m%d%H')
+        except:
+            print('ERROR: Invalid finish date "{}".'.
+                  format(args.finish_date),
+                  file=sys.stderr)
+            sys.exit(1)
+    else:
+        args.finish_datetime = None
+
+    if args.min_days_latency < 0:
+        print('ERROR: --min_days_latency argument must be nonnegative.',
+              file=sys.stderr)
+        sys.exit(1)
+
+    if args.block_days <= 0:
+        print('ERROR: --block_days argument must be positive.',
+              file=sys.stderr)
+        sys.exit(1)
+
+    if args.lead_in_hours < 0:
+        print('ERROR: --lead_in_hours argument must be nonnegative.',
+              file=sys.stderr)
+        sys.exit(1)
+
+    if args.num_workers <= 0:
+        print('ERROR: --num_workers argument must be positive.',
+              file=sys.stderr)
+        sys.exit(1)
+
+    return args
+
+
+def get_station_vars(qcdb):
+    """
+    Get the station variables of a QC database (those along the station
+    dimension having an "allstation_column_name" attribute) and the
+    station object identifier variable among them.
+    """
+    qcdb_station_vars = \
+        [var for var in
+         qcdb.get_variables_by_attributes(allstation_column_name=
+                                          lambda v: v is not None)
+         if var.dimensions == ('station',)]
+    qcdb_obj_id_var = None
+    for qcdb_station_var in qcdb_station_vars:
+        if qcdb_station_var.getncattr('allstation_column_name') == \
+           'obj_identifier':
+            qcdb_obj_id_var = qcdb_station_var
+    return qcdb_station_vars, qcdb_obj_id_var
+
+
+def make_blocks(update_time_ind, block_hours, lead_in_hours):
+    """
+    Divide time indices to update into blocks of block_hours. Returns a
+    list of (first index, last index, number of lead-in hours) for the
+    blocks. Lead-in hours do not extend before the first index to
+    update, so the first block has none.
+    """
+    blocks = []
+    for first in range(0, len(update_time_ind), block_hours):
+        last = min(first + block_hours, len(update_time_ind)) - 1
+        blocks.append((int(update_time_ind[first]),
+                       int(update_time_ind[last]),
+                       min(lead_in_hours, first)))
+    return blocks
+
+
+def get_last_ti_updated(database_path, qcdb_datetime):
+    """
+    Get the time index of the "last_datetime_updated" attribute of a QC
+    database, given the datetimes of its time dimension, or -1 if it is
+    before the first of them.
+    """
+    qcdb = Dataset(database_path, 'r')
+    last_dt_updated_str = qcdb.getncattr('last_datetime_updated')
+    qcdb.close()
+    last_datetime_updated = \
+        dt.datetime.strptime(last_dt_updated_str, '%Y-%m-%d %H:%M:%S UTC')
+    updated_ind = np.flatnonzero(qcdb_datetime <= last_datetime_updated)
+    if len(updated_ind) == 0:
+        return -1
+    return int(updated_ind[-1])
+
+
+def run_block(command, log_path):
+    """
+    Run update_station_qc_db.py for a block, writing its output to
+    log_path. Returns the exit status.
+    """
+    with open(log_path, 'w') as log_file:
+        return subprocess.run(command,
+                              stdout=log_file,
+                              stderr=subprocess.STDOUT).returncode
+
+
+def merge_block(qcdb,
+                qcdb_index,
+                qcdb_station_vars,
+                block_path,
+                lead_in_path,
+                first_ti,
+                last_ti,
+                verbose=False):
+    """
+    Combine QC flags from the QC database copy at block_path, which was
+    updated for time indices first_ti through last_ti, into qcdb. If
+    lead_in_path is not None, it is the same copy as it was before
+    first_ti was updated, and flags set on earlier hours are only
+    combined if they are not in it. Stations not yet in qcdb are
+    appended. Returns the number of stations added.
+    """
+    block_qcdb = Dataset(block_path, 'r')
+    block_station_vars, block_obj_id_var = get_station_vars(block_qcdb)
+    block_obj_id = block_obj_id_var[:]
+
+    # Append new stations, copying their metadata from the block.
+    qcdb_si = qcdb_index.lookup(block_obj_id)
+    new_block_si = np.flatnonzero(qcdb_si < 0)
+    num_new = len(new_block_si)
+    if num_new > 0:
+        qcdb_num_stations = qcdb.dimensions['station'].size
+        new_si = slice(qcdb_num_stations, qcdb_num_stations + num_new)
+        block_vars = dict([(var.name, var) for var in block_station_vars])
+        for qcdb_station_var in qcdb_station_vars:
+            qcdb_station_var[new_si] = \
+                block_vars[qcdb_station_var.name][new_block_si]
+        for qc_var_name in qc_var_names:
+            qcdb.variables[qc_var_name][new_si, :] = 0
+        qcdb_index.append(block_obj_id[new_block_si])
+        qcdb_si = qcdb_index.lookup(block_obj_id)
+        if verbose:
+            print('INFO: added {} stations from {}.'.
+                  format(num_new, block_path))
+
+    lead_in_qcdb = None
+    if lead_in_path is not None:
+        lead_in_qcdb = Dataset(lead_in_path, 'r')
+
+    for qc_var_name in qc_var_names:
+        qcdb_var = qcdb.variables[qc_var_name]
+        block_var = block_qcdb.variables[qc_var_name]
+        for ti in range(max(first_ti - max_lookback_hours, 0),
+                        last_ti + 1,
+                        merge_chunk_hours):
+            time_slice = slice(ti, min(ti + merge_chunk_hours, last_ti + 1))
+            flags = np.ma.filled(block_var[:, time_slice], 0)
+            if lead_in_qcdb is not None and ti < first_ti:
+                # Drop flags the lead-in hours set before the block.
+                lead_in_flags = \
+                    np.ma.filled(lead_in_qcdb.variables[qc_var_name]
+                                 [:, time_slice], 0)
+                before = np.arange(time_slice.start,
+                                   time_slice.stop) < first_ti
+                flags[:lead_in_flags.shape[0], before] &= \
+                    ~lead_in_flags[:, before]
+            qcdb_flags = np.ma.filled(qcdb_var[:, time_slice], 0)
+            qcdb_flags[qcdb_si, :] |= flags
+            qcdb_var[:, time_slice] = qcdb_flags
+
+    if lead_in_qcdb is not None:
+        lead_in_qcdb.close()
+    block_qcdb.close()
+
+    return num_new
+
+
+def main():
+    """
+    Update a QC database for a long period in concurrent blocks.
+    """
+
+    args = parse_args()
+
+    if not os.path.exists(args.database_path):
+        print('ERROR: {} not found.'.format(args.database_path),
+              file=sys.stderr)
+        sys.exit(1)
+
+    # Select hours to update: those after the "last_datetime_updated"
+    # attribute, through the finish date, and no later than the current
+    # time less min_days_latency (the latest hour for which
+    # update_station_qc_db.py would be run for a block).
+    try:
+        qcdb = Dataset(args.database_path, 'r')
+    except:
+        print('ERROR: Failed to open QC database {}.'.
+              format(args.database_path),
+              file=sys.stderr)
+        sys.exit(1)
+    qcdb_var_time = qcdb.variables['time']
+    qcdb_var_time_units = qcdb_var_time.getncattr('units')
+    qcdb_datetime = num2date(qcdb_var_time[:],
+                             units=qcdb_var_time_units,
+                             only_use_cftime_datetimes=False)
+    last_dt_updated_str = qcdb.getncattr('last_datetime_updated')
+    qcdb.close()
+    qcdb_last_datetime_updated = \
+        dt.datetime.strptime(last_dt_updated_str, '%Y-%m-%d %H:%M:%S UTC')
+
+    current_update_datetime = dt.datetime.utcnow()
+    is_update_time = (qcdb_datetime > qcdb_last_datetime_updated) & \
+                     (qcdb_datetime <=
+                      current_update_datetime -
+                      dt.timedelta(days=args.min_days_latency))
+    if args.finish_datetime is not None:
+        is_update_time &= qcdb_datetime <= args.finish_datetime
+    update_time_ind = np.flatnonzero(is_update_time)
+    if len(update_time_ind) == 0:
+        if args.verbose:
+            print('INFO: no dates to update in {}.'.
+                  format(args.database_path))
+        sys.exit(0)
+
+    blocks = make_blocks(update_time_ind,
+                         args.block_days * 24,
+                         args.lead_in_hours)
+    if args.verbose:
+        print('INFO: updating {} hours '.format(len(update_time_ind)) +
+              'in {} blocks.'.format(len(blocks)))
+
+    # Make a scratch copy of the database for each block, set to start
+    # updating at the beginning of its lead-in.
+    update_script = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 'update_station_qc_db.py')
+    block_paths = []
+    commands = []
+    for block_ind, (first_ti, last_ti, lead_in_hours) in enumerate(blocks):
+        block_path = args.database_path + '.block{:03d}'.format(block_ind)
+        try:
+            shutil.copy(args.database_path, block_path)
+        except:
+            print('ERROR: Failed to copy {} '.format(args.database_path) +
+                  'to {}.'.format(block_path),
+                  file=sys.stderr)
+            sys.exit(1)
+        if first_ti - lead_in_hours > update_time_ind[0]:
+            block_qcdb = Dataset(block_path, 'r+')
+            block_qcdb.setncattr_string(
+                'last_datetime_updated',
+                qcdb_datetime[first_ti - lead_in_hours - 1].
+                strftime('%Y-%m-%d %H:%M:%S UTC'))
+            block_qcdb.close()
+        command = [sys.executable, update_script, block_path,
+                   '-x', str(lead_in_hours + last_ti - first_ti + 1)]
+        if lead_in_hours > 0:
+            command += ['-l', str(lead_in_hours)]
+        if args.check_climatology:
+            command += ['-c']
+        if args.pkl_dir is not None:
+            command += ['-p', args.pkl_dir]
+        if args.wdb0_dsn is not None:
+            command += ['-d', args.wdb0_dsn]
+        if args.verbose:
+            command += ['-v']
+        block_paths.append(block_path)
+        commands.append(command)
+
+    # Update all blocks.
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=args.num_workers) as executor:
+        futures = [executor.submit(run_block, command, block_path + '.log')
+                   for command, block_path in zip(commands, block_paths)]
+        for block_ind, future in enumerate(futures):
+            first_ti, last_ti, lead_in_hours = blocks[block_ind]
+            if args.verbose:
+                print('INFO: block {} '.format(block_ind) +
+                      '({} through {}) '.
+                      format(qcdb_datetime[first_ti], qcdb_datetime[last_ti]) +
+                      'finished with status {}.'.format(future.result()))
+    failed = [block_ind for block_ind, future in enumerate(futures)
+              if future.result() != 0]
+    if failed:
+        for block_ind in failed:
+            print('ERROR: update failed for block {}; see {}.'.
+                  format(block_ind, block_paths[block_ind] + '.log'),
+                  file=sys.stderr)
+        sys.exit(1)
+
+    # Combine the blocks in a temporary copy of the database.
+    temp_database_path = args.database_path + '.' + \
+        dt.datetime.utcnow().strftime('%Y%m%d%H%M%S') + \
+        '.{}'.format(os.getpid())
+    try:
+        shutil.copy(args.database_path, temp_database_path)
+    except:
+        print('ERROR: Failed to make temporary copy of ' +
+              '{} as {}.'.format(args.database_path, temp_database_path),
+              file=sys.stderr)
+        sys.exit(1)
+    qcdb = Dataset(temp_database_path, 'r+')
+    qcdb_station_vars, qcdb_obj_id_var = get_station_vars(qcdb)
+    qcdb_index = StationIndex(qcdb_obj_id_var[:])
+
+    # Combine blocks in order for as long as they were fully updated, so
+    # that the database is updated through the last hour actually
+    # processed, with no hours skipped.
+    num_stations_added = 0
+    last_merged_ti = None
+    for block_ind, (first_ti, last_ti, lead_in_hours) in enumerate(blocks):
+        block_path = block_paths[block_ind]
+        lead_in_path = None
+        if lead_in_hours > 0:
+            lead_in_path = block_path + '.lead_in'
+            if not os.path.exists(lead_in_path):
+                print('WARNING: {} not found; '.format(lead_in_path) +
+                      'block {} and later blocks '.format(block_ind) +
+                      'were not combined.',
+                      file=sys.stderr)
+                break
+        block_last_ti = min(get_last_ti_updated(block_path, qcdb_datetime),
+                            last_ti)
+        if block_last_ti < first_ti:
+            print('WARNING: {} was not updated; '.format(block_path) +
+                  'block {} and later blocks '.format(block_ind) +
+                  'were not combined.',
+                  file=sys.stderr)
+            break
+        if args.verbose:
+            print('INFO: combining QC flags from {}.'.format(block_path))
+        num_stations_added += merge_block(qcdb,
+                                          qcdb_index,
+                                          qcdb_station_vars,
+                                          block_path,
+                                          lead_in_path,
+                                          first_ti,
+                                          block_last_ti,
+                                          verbose=args.verbose)
+        last_merged_ti = block_last_ti
+        if block_last_ti < last_ti:
+            print('WARNING: {} was only updated '.format(block_path) +
+                  'through {}; later blocks were not combined.'.
+                  format(qcdb_datetime[block_last_ti]),
+                  file=sys.stderr)
+            break
+
+    if last_merged_ti is None:
+        print('ERROR: no blocks were updated.', file=sys.stderr)
+        qcdb.close()
+        os.remove(temp_database_path)
+        sys.exit(1)
+
+    qcdb.setncattr_string('last_datetime_updated',
+                          qcdb_datetime[last_merged_ti].
+                          strftime('%Y-%m-%d %H:%M:%S UTC'))
+    qcdb.close()
+
+    try:
+        shutil.move(temp_database_path, args.database_path)
+    except:
+        print('ERROR: Failed to replace {} '.format(args.database_path) +
+              'with temporary copy {}.'.format(temp_database_path),
+              file=sys.stderr)
+        sys.exit(1)
+
+    for block_path in block_paths:
+        for path in [block_path, block_path + '.log',
+                     block_path + '.lead_in']:
+            if os.path.exists(path):
+                os.remove(path)
+
+    if args.verbose:
+        print('INFO: added {} stations.'.format(num_stations_added))
+        print('INFO: database updated to {}.'.
+              format(qcdb_datetime[last_merged_ti].
+                     strftime('%Y-%m-%d %H:%M:%S UTC')))
+
+
+if __name__ == '__main__':
+    main()
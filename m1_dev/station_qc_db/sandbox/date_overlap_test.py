@@ -68,14 +68,14 @@ print(new_data_begin_datetime)
 print(new_data_end_datetime)
 print('--')
 
-# Get new temperatures - leave out "scratch_dir=pkl_dir" so the function has
-# to do the work.
+# Get new temperatures. Only the hour not covered by the previous call is
+# fetched.
 t1 = dt.datetime.utcnow()
 wdb_new_tair = \
     wdb0.get_air_temp_obs(begin_datetime,
                           end_datetime,
-                          verbose=True,
-                          prev_obs_air_temp=wdb_prior_tair)
+                          scratch_dir=pkl_dir,
+                          verbose=True)
 t2 = dt.datetime.utcnow()
 elapsed_time = t2 - t1
 print('INFO: query ran in {} seconds.'.
@@ -0,0 +1,189 @@
+#!/usr/bin/python3
+
+import sys
+import os
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..',
+                             'lib'))
+import qc_durre
+import qc_durre_batch
+
+"""
+Check that the batch QC tests in qc_durre_batch give the same results as
+the scalar tests in qc_durre, station by station, for random masked
+histories of reports. Seeds for the random number generator may be given
+on the command line (default 0 1 2 3). Exits with status 1 if any results
+differ.
+"""
+
+num_stations = 1000
+
+# History length (hours), rounding of values and scale of values for
+# hourly snow depth (cm), a 15-day history, and small SWE-like values.
+history_cases = [(24, 2.54, 20.0), (360, 1.0, 30.0), (24, 0.1, 3.0)]
+
+num_checked = {}
+num_mismatched = {}
+
+
+def compare(name, batch_result, scalar_result):
+    """
+    Count a comparison of results, printing the first few mismatches.
+    """
+    num_checked[name] = num_checked.get(name, 0) + 1
+    if batch_result == scalar_result:
+        return
+    num_mismatched[name] = num_mismatched.get(name, 0) + 1
+    if num_mismatched[name] <= 3:
+        print('MISMATCH: {}: batch {}, scalar {}'.
+              format(name, batch_result, scalar_result))
+
+
+def random_reports(rng, history_hours, quantum, scale):
+    """
+    Generate values, masked histories and QC flags for num_stations
+    stations, with a mix of reporting rates, occasional spikes and a few
+    negative values.
+    """
+    rate = rng.choice([0.02, 0.1, 0.5, 0.95, 1.0], size=num_stations)
+    prev = np.round(rng.gamma(1.0, scale, (num_stations, history_hours)) /
+                    quantum) * quantum
+    spike = rng.random((num_stations, history_hours)) < 0.02
+    prev[spike] += rng.uniform(50.0, 400.0, spike.sum())
+    prev = np.ma.masked_array(
+        prev,
+        mask=rng.random((num_stations, history_hours)) > rate[:, np.newaxis])
+    prev_qc = np.ma.masked_array(
+        np.where(rng.random((num_stations, history_hours)) < 0.1,
+                 rng.integers(1, 8, (num_stations, history_hours)), 0),
+        mask=rng.random((num_stations, history_hours)) < 0.01)
+    value = np.round(rng.gamma(1.0, scale, num_stations) / quantum) * quantum
+    value[rng.random(num_stations) < 0.05] += 300.0
+    value[rng.random(num_stations) < 0.02] *= -1.0
+    return(value, prev, prev_qc)
+
+
+if len(sys.argv) > 1:
+    seeds = [int(arg) for arg in sys.argv[1:]]
+else:
+    seeds = [0, 1, 2, 3]
+
+for seed in seeds:
+
+    rng = np.random.default_rng(seed)
+
+    for history_hours, quantum, scale in history_cases:
+
+        value, prev, prev_qc = random_reports(rng, history_hours,
+                                              quantum, scale)
+
+        prcp = np.round(rng.gamma(0.5, 3.0, num_stations), 1)
+        prcp[rng.random(num_stations) < 0.3] = 0.0
+        snfl = np.round(rng.gamma(0.5, 5.0, num_stations), 1)
+        tair = np.ma.masked_array(
+            rng.normal(5.0, 6.0, (num_stations, history_hours + 1)),
+            mask=rng.random((num_stations, history_hours + 1)) < 0.4)
+        num_neighbors = rng.integers(0, 7, num_stations)
+        neighbor_tair = np.ma.masked_array(
+            rng.normal(6.0, 5.0, (num_stations, 6, history_hours + 1)),
+            mask=rng.random((num_stations, 6, history_hours + 1)) < 0.3)
+        for i in range(num_stations):
+            neighbor_tair.mask[i, num_neighbors[i]:, :] = True
+        clim_ceiling = rng.uniform(0.0, 80.0, num_stations)
+        clim_delta = rng.uniform(0.0, 40.0, num_stations)
+
+        for element in ['snwd', 'swe']:
+
+            test_name = 'qc_durre_{}_wre'.format(element)
+            flag = getattr(qc_durre_batch, test_name)(value)
+            for i in range(num_stations):
+                compare(test_name, bool(flag[i]),
+                        getattr(qc_durre, test_name)(value[i]))
+
+            for test_suffix in ['change_wre', 'prcp', 'prcp_ratio']:
+                test_name = 'qc_durre_{}_{}'.format(element, test_suffix)
+                args = [value, prev, prev_qc]
+                if test_suffix != 'change_wre':
+                    args.append(prcp)
+                flag, ref_ind = getattr(qc_durre_batch, test_name)(*args)
+                for i in range(num_stations):
+                    compare(test_name,
+                            qc_durre_batch.test_result(flag, ref_ind, i),
+                            getattr(qc_durre, test_name)(
+                                *[arg[i] for arg in args]))
+
+            test_name = 'qc_durre_{}_streak'.format(element)
+            flag = getattr(qc_durre_batch, test_name)(value, prev, prev_qc)
+            for i in range(num_stations):
+                compare(test_name,
+                        None if flag[i] is np.ma.masked else bool(flag[i]),
+                        getattr(qc_durre, test_name)(value[i], prev[i],
+                                                     prev_qc[i]))
+
+            test_name = 'qc_durre_{}_gap'.format(element)
+            for args in [[value, prev, prev_qc],
+                         [value, prev, prev_qc, clim_ceiling, clim_delta]]:
+                gap = getattr(qc_durre_batch, test_name)(*args)
+                for i in range(num_stations):
+                    batch_result = qc_durre_batch.gap_flag_lists(gap, i)
+                    scalar_result = getattr(qc_durre, test_name)(
+                        *[arg[i] for arg in args])
+                    if scalar_result is None:
+                        scalar_result = (None, None)
+                    compare(test_name,
+                            (batch_result[0],
+                             None if batch_result[1] is None
+                             else [float(v) for v in batch_result[1]]),
+                            (scalar_result[0],
+                             None if scalar_result[1] is None
+                             else [float(v) for v in scalar_result[1]]))
+                    if scalar_result[0] is not None:
+                        flagged = np.zeros(history_hours + 1, dtype=bool)
+                        flagged[scalar_result[0]] = True
+                        compare(test_name + ' (flagged)',
+                                gap['flagged'][i].tolist(),
+                                flagged.tolist())
+
+        for test_name, extra in [('qc_durre_snwd_snfl', snfl),
+                                 ('qc_durre_snwd_tair', tair)]:
+            flag, ref_ind = getattr(qc_durre_batch, test_name)(value, prev,
+                                                               prev_qc,
+                                                               extra)
+            for i in range(num_stations):
+                compare(test_name,
+                        qc_durre_batch.test_result(flag, ref_ind, i),
+                        getattr(qc_durre, test_name)(value[i], prev[i],
+                                                     prev_qc[i], extra[i]))
+
+        # The scalar spatial test is only given stations with neighbors.
+        test_name = 'qc_durre_snwd_tair_spatial'
+        flag, ref_ind = qc_durre_batch.qc_durre_snwd_tair_spatial(
+            value, prev, prev_qc, neighbor_tair)
+        for i in range(num_stations):
+            if num_neighbors[i] == 0:
+                continue
+            compare(test_name,
+                    qc_durre_batch.test_result(flag, ref_ind, i),
+                    qc_durre.qc_durre_snwd_tair_spatial(
+                        value[i], prev[i], prev_qc[i],
+                        neighbor_tair[i, :num_neighbors[i]]))
+
+        test_name = 'obs_rate_category'
+        category = qc_durre_batch.obs_rate_category(
+            np.ma.concatenate([prev, value[:, np.newaxis]], axis=1))
+        for i in range(num_stations):
+            compare(test_name,
+                    None if category[i] is np.ma.masked
+                    else int(category[i]),
+                    qc_durre.obs_rate_category(np.ma.append(prev[i],
+                                                            value[i])))
+
+for test_name in sorted(num_checked):
+    print('{:32s} {:8d} checked {:6d} mismatched'.
+          format(test_name, num_checked[test_name],
+                 num_mismatched.get(test_name, 0)))
+
+if len(num_mismatched) > 0:
+    print('ERROR: batch and scalar results differ.', file=sys.stderr)
+    sys.exit(1)
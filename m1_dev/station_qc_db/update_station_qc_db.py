@@ -6,7 +6,6 @@ from netCDF4 import Dataset, num2date, date2num
 import datetime as dt
 import numpy as np
 import sys
-import psycopg2
 import pandas as pd
 import time
 import shutil
@@ -21,6 +20,13 @@ import snodas_clim
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'lib'))
 import wdb0
+import wdb0_pool
+import wdb0_qc_hour
+import qc_durre_batch
+import qc_pipeline
+import qc_pool
+from station_index import StationIndex
+from qc_flag_buffer import FlagBuffer
 
 def find_nearest_neighbors(lat1,
                            lon1,
@@ -255,6 +261,24 @@ def dist_crude_euclidian(lat1, lon1, lat2, lon2):
     return distance
 
 
+def neighborhood_values(values, nhood_ind, min_neighbors):
+    """
+    Arrange values for the neighbors of each location (as identified by
+    find_nearest_neighbors) in a [location, neighbor, ...] masked array,
+    in which unused neighbor slots are masked. Also returns whether each
+    location has at least min_neighbors neighbors.
+    """
+    num_neighbors = np.array([len(ind) for ind in nhood_ind], dtype=int)
+    max_neighbors = max(num_neighbors, default=0)
+    nhood_rows = np.full([len(nhood_ind), max_neighbors], -1)
+    for si, ind in enumerate(nhood_ind):
+        nhood_rows[si, 0:len(ind)] = ind
+    nhood_values = \
+        qc_durre_batch.take_rows(values, nhood_rows.ravel()). \
+        reshape((len(nhood_ind), max_neighbors) + values.shape[1:])
+    return(nhood_values, num_neighbors >= min_neighbors)
+
+
 def station_qc_db_copy(database_path,
                        verbose=None):
     """
@@ -349,35 +373,31 @@ def update_qc_db_metadata(qcdb,
     qcdb_min_obj_id = qcdb_obj_id_var[:].min()
     qcdb_max_obj_id = qcdb_obj_id_var[:].max()
 
-    # Open the web database.
-    conn_string = "host='wdb0.dmz.nohrsc.noaa.gov' dbname='web_data'"
-    conn = psycopg2.connect(conn_string)
-    conn.set_client_encoding("utf-8")
-    cursor = conn.cursor()
-
     sql_cmd = "SELECT " + wdb_col_list_str + " " + \
               "FROM point.allstation " + \
-              "WHERE coordinates[0]" \
-              " >= {} ".format(qcdb_min_lon - 0.01) + \
-              "AND coordinates[0]" + \
-              " <= {} ".format(qcdb_max_lon + 0.01) + \
-              "AND coordinates[1]" + \
-              " >= {} ".format(qcdb_min_lat - 0.01) + \
-              "AND coordinates[1]" + \
-              " <= {} ".format(qcdb_max_lat + 0.01) + \
-              "AND obj_identifier >= {} ".format(qcdb_min_obj_id) + \
-              "AND obj_identifier <= {} ".format(qcdb_max_obj_id) + \
+              "WHERE coordinates[0] >= %s " + \
+              "AND coordinates[0] <= %s " + \
+              "AND coordinates[1] >= %s " + \
+              "AND coordinates[1] <= %s " + \
+              "AND obj_identifier >= %s " + \
+              "AND obj_identifier <= %s " + \
               "ORDER BY obj_identifier;"
+    params = [float(qcdb_min_lon) - 0.01,
+              float(qcdb_max_lon) + 0.01,
+              float(qcdb_min_lat) - 0.01,
+              float(qcdb_max_lat) + 0.01,
+              int(qcdb_min_obj_id),
+              int(qcdb_max_obj_id)]
     if verbose:
-        print('INFO: psql command "{}"'.format(sql_cmd))
+        print('INFO: psql command "{}" '.format(sql_cmd) +
+              'with parameters {}'.format(params))
 
     # Set this_station_update_datetime to the current system time.
     # This should be done just before reading the allstation table.
     this_station_update_datetime = dt.datetime.utcnow()
 
-    cursor.execute(sql_cmd)
     # allstation is just a huge list of tuples.
-    allstation = cursor.fetchall()
+    allstation = wdb0_pool.fetchall(sql_cmd, params=params)
     #print(len(allstation))
     wdb_df = pd.DataFrame(allstation, columns=wdb_col_list)
 
@@ -390,11 +410,12 @@ def update_qc_db_metadata(qcdb,
     # variables we pulled from the database file.
 
     # Find common elements.
-    qcdb_sort_ind = np.argsort(qcdb_obj_id_var[:])
-    wdb_in_qcdb = np.isin(wdb_df['obj_identifier'].values, qcdb_obj_id_var[:])
+    qcdb_obj_id = qcdb_obj_id_var[:]
+    qcdb_sort_ind = np.argsort(qcdb_obj_id)
+    wdb_in_qcdb = np.isin(wdb_df['obj_identifier'].values, qcdb_obj_id)
     wdb_df_rows_to_read = np.nonzero(wdb_in_qcdb)[0]
     # Below must match.
-    if len(wdb_df_rows_to_read) != len(qcdb_obj_id_var[:]):
+    if len(wdb_df_rows_to_read) != len(qcdb_obj_id):
         print('ERROR: programming (station count mismatch)',
               file=sys.stderr)
         qcdb.close()
@@ -427,7 +448,7 @@ def update_qc_db_metadata(qcdb,
         # Get this row of the wdb dataframe.
         wdb_row = wdb_df.iloc[wdb_row_ind,:]
         # print(wdb_row['obj_identifier'], qcdb_obj_id_var[:][qcdb_ind])
-        this_obj_id = qcdb_obj_id_var[:][qcdb_ind]
+        this_obj_id = qcdb_obj_id[qcdb_ind]
         if wdb_row['obj_identifier'] != this_obj_id:
             print('')
             print(wdb_row['obj_identifier'], this_obj_id)
@@ -479,842 +500,119 @@ def update_qc_db_metadata(qcdb,
     return None
 
 
-def qc_durre_snwd_wre(value_cm):
-    """
-    Basic integrity checks:
-    Snow depth world record exceedance.
-    """
-    threshold_value = 1146.0
-    if value_cm < 0.0 or value_cm > threshold_value:
-        return True
-    else:
-        return False
-
-
-def qc_durre_snwd_change_wre(snow_depth_value_cm,
-                             prev_sd_value_cm,
-                             prev_sd_qc):
-    """
-    Basic integrity checks:
-    Snow depth increase world record exceedance.
-    """
-
-    threshold_sd_increase_cm = 192.5
-
-    # Mask previous snow depth data that have any QC flags set.
-    prev_sd_value_cm = np.ma.masked_where(prev_sd_qc != 0,
-                                          prev_sd_value_cm)
-
-    num_unmasked_prev_sd = prev_sd_value_cm.count()
-
-    if num_unmasked_prev_sd == 0:
-        # Test is not possible.
-        return None, None
-
-    # Find the minimum observed preceding snow depth value for
-    # comparison with the observation being checked. This snow
-    # depth will be our version of SNWD(-1) in Durre (2010),
-    # Table 1 (world record exceedance check: snow depth increase)
-    ref_ind = np.ma.argmin(prev_sd_value_cm)
-
-    if snow_depth_value_cm - prev_sd_value_cm[ref_ind] > \
-       threshold_sd_increase_cm:
-        return True, ref_ind
-    else:
-        return False, ref_ind
-
-
-def qc_durre_snwd_streak(snow_depth_value_cm,
-                         prev_sd_value_cm,
-                         prev_sd_qc,
-                         streak_value_threshold=None):
-    """
-    Basic integrity checks:
-    Snow depth streak check.
-    """
-    if streak_value_threshold is None:
-        streak_value_threshold = 0.1
-    streak_min_consecutive = 10
-
-    # Mask previous snow depth data that have any QC flags set.
-    prev_sd_value_cm = np.ma.masked_where(prev_sd_qc != 0,
-                                          prev_sd_value_cm)
-
-    # Assemble previous and current data into one time series.
-    station_time_series = np.ma.append(prev_sd_value_cm, snow_depth_value_cm)
-
-    if station_time_series.count() < streak_min_consecutive:
-        return None
-
-    if np.ma.max(station_time_series) <= streak_value_threshold:
-        return None
-    
-    if (np.ma.max(station_time_series) -
-        np.ma.min(station_time_series)) < streak_value_threshold:
-        return True
-    else:
-        return False
-
-
-def obs_rate_category(obs, min_sub_period_proportion=0.5, verbose=False):
-    """
-    Given a list of hourly observations in the form of a numpy masked
-    array, determine the "rate category" that indicates how frequently
-    observations are available, using the following five categories:
-
-    1. sporadic (very few observations)
-    2. quasi-daily (reporting rate >= 1 observation every 4 days)
-    3. daily (reporting rate >= 3 observations every 4 days)
-    4. synoptic (reporting rate >= 6 observations per day)
-    5. hourly (reporting rate >= 18 observations per day)
-
-    A given criteron must be met on average, but also consistently,
-    or the next "lower" criterion is considered.
-    """
-    qa_period_hours = len(obs)
-
-    # ind = np.where(obs.mask == False)
-    # num_reports = len(ind[0])
-    # if num_reports == 0:
-    num_reports = obs.count()
-    if num_reports == 0:
-        return None
-
-    ave_reporting_rate = \
-        np.float(num_reports) / np.float(qa_period_hours) * 24.0
-    if verbose:
-        print('average reporting rate: {} obs/day'.format(ave_reporting_rate))
-
-    reporting_rate_threshold = [0.0, 0.25, 0.75, 6.0, 18.0]
-
-    reporting_rate_name = ['sporadic',
-                           'quasi-daily',
-                           'daily',
-                           'synoptic',
-                           'hourly']
-    demoted = False
-    found_a_category = False
-
-    for rc, r0 in enumerate(sorted(reporting_rate_threshold, reverse=True)):
-
-        if ave_reporting_rate < r0:
-            continue
-
-        # if verbose:
-        #     print('checking for rate >= {}'.format(r0))
-
-        # Determine the number of individual sub periods where the criterion
-        # is met.
-        if (r0 > 0.0):
-            qa_sub_period_hours = int(max(24.0 / r0, 24.0))
-        else:
-            qa_sub_period_hours = qa_period_hours
-        num_qa_sub_periods = np.int(np.floor(qa_period_hours /
-                                             qa_sub_period_hours))
-        num_sub_periods_met = 0
-        for spc in range(num_qa_sub_periods):
-            oc1 = spc * qa_sub_period_hours
-            oc2 = oc1 + qa_sub_period_hours
-            qa_sub_period_obs = obs[oc1:oc2]
-            qa_sub_period_num_reports = \
-                len(np.where(qa_sub_period_obs.mask == False)[0])
-            qa_sub_period_rate = \
-                np.float(qa_sub_period_num_reports) / \
-                np.float(qa_sub_period_hours) * 24.0
-            if (qa_sub_period_rate >= r0):
-                num_sub_periods_met += 1
-        # if verbose:
-        #     print('met criteria for {} of {} sub-periods'.
-        #           format(num_sub_periods_met, num_qa_sub_periods))
-        if num_sub_periods_met < \
-           (min_sub_period_proportion * num_qa_sub_periods):
-            # if verbose:
-            #     print('that is less than {}%; '.
-            #           format(min_sub_period_proportion * 100) + 
-            #           'will check next lower frequency')
-            # print('  no - ' + 
-            #       'met criteria for only {} '.format(num_sub_periods_met) +
-            #       'of {} sub-periods'.format(num_qa_sub_periods))
-            demoted = True
-        else:
-            # if verbose:
-            #     print('that is >= {}% - consistently reports >= {} obs/day'.
-            #           format(min_sub_period_proportion * 100,
-            #                  r0))
-            # print('  yes')
-            found_a_category = True
-            break
-
-    if found_a_category:
-        # print('{} reports, '.format(num_reports) +
-        #       'reporting rate {} '.format(r0) + 
-        #       '({})'.format(reporting_rate_name[len(reporting_rate_name) - 1 - rc]))
-        # print('demoted ', demoted)
-        return len(reporting_rate_name) - 1 - rc
-    else:
-        # print('FAILED')
-        return None
-
-    return None
-
-
-def qc_durre_snwd_gap(snow_depth_value_cm,
-                      prev_sd_value_cm,
-                      prev_sd_qc,
-                      ref_ceiling_cm=None,
-                      ref_default_cm=None,
-                      verbose=None):
+def add_new_stations(qcdb,
+                     obj_identifiers,
+                     qcdb_index,
+                     qcdb_station_vars,
+                     wdb_col_list,
+                     qcdb_qc_vars,
+                     verbose=False):
     """
-    Outlier checks:
-    Gap check for snow depth.
-    If ref_ceiling_cm and ref_default_cm are included, then when the default
-    reference value (median_obs) exceeds ref_ceiling_cm, it is replaced by the
-    value in the station_time_series that is nearest to ref_default_cm. The
-    purpose of this option is to override median_obs values that are based on
-    dubious large values of snow depth, which often occur at automated sites.
+    Append stations whose object identifiers are not yet in the QC
+    database. Metadata for all new stations are read from the webdb
+    allstation table in a single query and written to the station
+    variables in one operation per variable, and QC variables for the new
+    stations are initialized to zero. The new stations are appended to
+    qcdb_index. Returns the number of stations added.
     """
 
-    # First value of reporting_rate_threshold needs to be zero!
-    reporting_rate_threshold = [0.0, 0.25, 0.75, 6.0, 18.0]
-
-    gap_threshold_cm = [100.0,
-                        75.0,
-                        60.0,
-                        45.0,
-                        30.0]
-
-    reporting_rate_name = ['sporadic',
-                           'quasi-daily',
-                           'daily',
-                           'synoptic',
-                           'hourly']
-
-    # Mask previous snow depth data that have any QC flags set.
-    prev_sd_value_cm = np.ma.masked_where(prev_sd_qc != 0,
-                                          prev_sd_value_cm)
-
-    # Assemble previous and current data into one time series.
-    # Note that this guarantees that station_time_series will have at least
-    # one unmasked value (the observation being QCed, at the end), even if all
-    # the others are masked.
-    station_time_series = np.ma.append(prev_sd_value_cm, snow_depth_value_cm)
-
-    # Note: add reporting_rate_threshold, gap_threshold_cm,
-    # and reporting_rate_name as INPUTS to obs_rate_category,
-    # perhaps as elements in a dictionary. Currently
-    # reporting_rate_threshold and reporting_rate_name are
-    # independently defined in obs_rate_category and that is
-    # not great.
-    rc = obs_rate_category(station_time_series)
-
-    # TODO: make sure this is sufficient... ideally there would be no way to
-    # get None back from obs_rate_category.
-    if rc is None:
-        if verbose:
-            print('WARNING - no match for observation rate.',
-                  file=sys.stderr)
-        return None
-
-    # Sort observations to simulate a cumulative distribution function.
-    sort_ind = station_time_series.argsort()
-    obs_sorted = station_time_series[sort_ind]
-    median_obs = np.ma.median(station_time_series)
-
-    # Initialize the reference value to the median.
-    ref_obs_init = median_obs
+    qcdb_num_stations = qcdb.dimensions['station'].size
 
-    if ref_ceiling_cm is not None and \
-       ref_default_cm is not None:
-        # Replace ref_obs_init with the time series element nearest in value
-        # to ref_default_cm (typically the climatological median), if
-        # ref_obs_init exceeds the ref_ceiling_cm.
-        if ref_obs_init > ref_ceiling_cm:
-            ind = (np.abs(station_time_series - ref_default_cm)).argmin()
-            ref_obs_init = station_time_series[ind]
-            if verbose:
-                print('INFO: replacing median {} '.format(median_obs) +
-                      'with value {} '.format(ref_obs_init) +
-                      '(observation nearer to climatology) in gap check.')
+    obj_identifiers = np.asarray(obj_identifiers, dtype=np.int64)
+    is_new = qcdb_index.lookup(obj_identifiers) < 0
+    new_obj_id = np.unique(obj_identifiers[is_new])
+    num_new = len(new_obj_id)
+    if num_new == 0:
+        return 0
 
-    # Initialize list of flagged reports.
-    ts_flag_ind = []
-    ref_obs = []
-
-    # Upper gap check.
-
-    # Initialize the reference value.
-    prev_obs = ref_obs_init
-
-    for oc in np.where((obs_sorted.mask == False) &
-                       (obs_sorted >= ref_obs_init))[0]:
-
-        if (obs_sorted[oc] - prev_obs) > gap_threshold_cm[rc]:
-
-            # This and all following observations on this side of obs_sorted
-            # will be flagged, if they fit into the database.
-
-            # Identify location of observation in time series.
-            ts_ind = sort_ind[oc]
-
-            ts_flag_ind.append(ts_ind)
-            ref_obs.append(prev_obs)
-
-        else:
-            prev_obs = obs_sorted[oc]
-
-
-    # Lower gap check.
-
-    # Initialize the reference value.
-    prev_obs = ref_obs_init
-
-    for oc in np.flipud(np.where((obs_sorted.mask == False) &
-                                 (obs_sorted < ref_obs_init))[0]):
-
-        if (prev_obs - obs_sorted[oc]) > gap_threshold_cm[rc]:
-
-            # This and all following observations on this side of obs_sorted
-            # will be flagged, if they fit into the database.
-
-            # Identify location of observation in time series.
-            ts_ind = sort_ind[oc]
-
-            ts_flag_ind.append(ts_ind)
-            ref_obs.append(prev_obs)
-
-        else:
-            prev_obs = obs_sorted[oc]
-
-    return ts_flag_ind, ref_obs
-
-
-def qc_durre_snwd_tair(snow_depth_value_cm,
-                       prev_sd_value_cm,
-                       prev_sd_qc,
-                       prev_at_value_deg_c):
-    """
-    Internal and temporal consistency checks on temperature
-    (Durre 2010, Table 3):
-    Snow-temperature consistency check,
-    variant "SNWD" (for changes in snow depth.)
-    """
-
-    # In Durre (2010), the test is described this way:
-    #
-    # SNWD(0) - SNWD(-1) >= 0 and min[TMIN(-1:1)] >= 7 deg C
-    #
-    # In this adaptation the snow depth difference is between site_snwd_val_cm
-    # and the latest unmasked value in site_prev_snwd_val, and the flag is
-    # returned as True (flagged) if an increase in snow depth between those
-    # adjacent depth reports is accompanied by a minimum observed temperature
-    # (over the same time period) >= 7 degrees Celsius.
-
-    # Mask previous snow depth data that have any QC flags set.
-    prev_sd_value_cm = np.ma.masked_where(prev_sd_qc != 0,
-                                          prev_sd_value_cm)
-
-    # Count unmasked previous snow depth data.
-    num_unmasked_prev_snwd = prev_sd_value_cm.count()
-
-    if num_unmasked_prev_snwd == 0:
-        return None, None
-
-    # Locate the snow depth observation adjacent to the one being QCed.
-    ref_ind = np.max(np.where(prev_sd_value_cm.mask == False))
-
-    # Get all temperatures between the above observation and the one being
-    # QCed.
-    contextual_at_values_deg_c = prev_at_value_deg_c[ref_ind:]
-    if contextual_at_values_deg_c.count() < 2:
-        return None, None
-
-    if snow_depth_value_cm <= prev_sd_value_cm[ref_ind]:
-        return False, ref_ind
-
-    if contextual_at_values_deg_c.min() >= 7.0:
-        return True, ref_ind
-    else:
-        return False, ref_ind
-
-
-def qc_durre_snwd_snfl(site_snwd_val_cm,
-                       site_prev_snwd_val,
-                       prev_sd_qc,
-                       site_snfl_val_cm):
-    """
-    Internal and temporal consistency checks (Durre 2010, Table 3):
-    Snowfall--snow depth consistency check
-    site_snwd_val_cm - snow depth value being QCed
-    site_prev_snwd_val - previous snow depth values (time series)
-    prev_sd_qc - QC flags for previous snow depth values (time series)
-    site_snfl_val_cm - snowfall accumulation
-    """
-
-    # Forgiveness for snow depth change exceeding reported snowfall;
-    # 6.0 cm = 2.36 inches, which will prevent any round-off problems with
-    # 2 inch snowfall reports.
-    snfl_forgiveness_cm = 6.0
-
-    # Mask previous snow depth data that have any QC flags set.
-    site_prev_snwd_val = np.ma.masked_where(prev_sd_qc != 0,
-                                            site_prev_snwd_val)
-
-    # Count unmasked previous snow depth data.
-    num_unmasked_prev_snwd = site_prev_snwd_val.count()
-
-    if num_unmasked_prev_snwd == 0:
-        return None, None
-
-    # Locate the snow depth observation furthest from the one being QCed.
-    ref_ind = np.min(np.where(site_prev_snwd_val.mask == False))
-
-    # print(type(site_snwd_val_cm))
-    # print(type(site_prev_snwd_val[ref_ind]))
-    # print(type(site_snfl_val_cm))
-    if site_snwd_val_cm - site_prev_snwd_val[ref_ind] > \
-       site_snfl_val_cm + snfl_forgiveness_cm:
-        return True, ref_ind
-    else:
-        return False, ref_ind
-
-
-def qc_durre_snwd_prcp(site_snwd_val_cm,
-                       site_prev_snwd_val,
-                       prev_sd_qc,
-                       site_prcp_val_mm):
-    '''
-    Internal and temporal consistency checks (Durre 2010, Table 3):
-    Precipitation--snow depth consistency check; i.e. "SNWD increase with 0
-    PRCP".
-    site_snwd_val_cm - snow depth value being QCed
-    site_prev_snwd_val - previous snow depth values (time series)
-    prev_sd_qc - QC flags for previous snow depth values (time series)
-    site_prcp_val_mm - precipitation accumulation
-    '''
-
-    # In Durre (2010), the test is described this way:
-    #
-    # SNWD(0) - SNWD(-1) >= 100 mm and MAX[PRCP(-1:1)] = 0
-    #
-    # In this adaptation the snow depth difference is between site_snwd_val_cm
-    # and the earliest unmasked value in site_prev_snwd_val, and there is only
-    # one precipitation value: site_prcp_val_mm, which should correspond
-    # roughly to the time period covered by site_prev_snwd_val and
-    # site_snwd_val_cm. Instead of a strict zero threshold for precipitation
-    # this test uses a potentially nonzero prcp_accum_threshold_mm
-
-    snwd_change_threshold_cm = 10.0
-    prcp_accum_threshold_mm = 0.1
-
-    # Mask previous snow depth data that have any QC flags set.
-    site_prev_snwd_val = np.ma.masked_where(prev_sd_qc != 0,
-                                            site_prev_snwd_val)
-
-    # Count unmasked previous snow depth data.
-    num_unmasked_prev_snwd = site_prev_snwd_val.count()
-
-    if num_unmasked_prev_snwd == 0:
-        return None, None
-
-    # Locate the snow depth observation furthest from the one being QCed.
-    ref_ind = np.min(np.where(site_prev_snwd_val.mask == False))
-
-    if site_snwd_val_cm - site_prev_snwd_val[ref_ind] >= \
-       snwd_change_threshold_cm and \
-       site_prcp_val_mm < prcp_accum_threshold_mm:
-        return True, ref_ind
-    else:
-        return False, ref_ind
-
-
-def qc_durre_snwd_prcp_ratio(site_snwd_val_cm,
-                             site_prev_snwd_val_cm,
-                             prev_sd_qc,
-                             site_prcp_val_mm):
-    '''
-    Internal and temporal consistency checks (Durre 2010, Table 3):
-    Precipitation--snow depth consistency check; i.e. "SNWD/PRCP ratio".
-    site_snwd_val_cm - snow depth value being QCed
-    site_prev_snwd_val_cm - previous snow depth values (time series)
-    prev_sd_qc - QC flags for previous snow depth values (time series)
-    site_prcp_val_mm - precipitation accumulation
-    '''
-
-    # In Durre (2010), the test is described this way:
-    # 
-    # SNWD(0) - SNWD(-1) >= 200 mm and 
-    # SNWD(0) - SNWD(-1) >= 100[PRCP(0) + PRCP(-1)] and
-    # SNWD(0) - SNWD(-1) >= 100[PRCP(0) + PRCP(1)] and
-    #
-    # In this adaptation the snow depth difference is between site_snwd_val_cm
-    # and the earliest unmasked value in site_prev_snwd_val_cm, and there is
-    # only one precipitation value: site_prcp_val_mm, which should correspond
-    # roughly to the time period covered by site_prev_snwd_val_cm and
-    # site_snwd_val_cm.
-
-    snwd_change_threshold_cm = 20.0
-    snwd_prcp_ratio_threshold = 100
-
-    # Mask previous snow depth data that have any QC flags set.
-    site_prev_snwd_val_cm = np.ma.masked_where(prev_sd_qc != 0,
-                                               site_prev_snwd_val_cm)
-
-    # Count unmasked previous snow depth data.
-    num_unmasked_prev_snwd = site_prev_snwd_val_cm.count()
-
-    if num_unmasked_prev_snwd == 0:
-        return None, None
-
-    # Locate the snow depth observation furthest from the one being QCed.
-    ref_ind = np.min(np.where(site_prev_snwd_val_cm.mask == False))
-
-    # No flag for zero precipitation; that should be handled by a separate
-    # test.
-    if site_prcp_val_mm == 0.0:
-        return False, ref_ind
-
-    site_snwd_change_cm = site_snwd_val_cm - site_prev_snwd_val_cm[ref_ind]
-    if site_snwd_change_cm >= snwd_change_threshold_cm and \
-       10.0 * site_snwd_change_cm / site_prcp_val_mm >= \
-       snwd_prcp_ratio_threshold:
-        return True, ref_ind
-    else:
-        return False, ref_ind
-
-
-def qc_durre_snwd_tair_spatial(snow_depth_value_cm,
-                               prev_sd_value_cm,
-                               prev_sd_qc,
-                               nhood_tair_deg_c):
-    """
-    Spatial snow-temperature consistency check for changes in snow depth,
-    using neighborhood temperature reports.
-    nhood_tair_deg_c rows represent neighbors, columns represent times.
-    """
-
-    # Determine the number of hours of preceding data.
-    num_prev_hours = prev_sd_value_cm.shape[0]
-
-    # Verify that the air temperature data are consistent in the time
-    # dimension.
-    if nhood_tair_deg_c.shape[1] != num_prev_hours + 1:
-        print('ERROR: snow depth and air temperature data have ' +
-              'inconsistent time dimensions.',
+    wdb_df = wdb0.get_station_metadata(new_obj_id, wdb_col_list)
+    if wdb_df is None:
+        qcdb.close()
+        sys.exit(1)
+    if wdb_df.shape[0] != num_new or \
+       not np.array_equal(wdb_df['obj_identifier'].values, new_obj_id):
+        print('ERROR: found {} matches in SQL statement '.
+              format(wdb_df.shape[0]) +
+              'for {} new station object IDs; '.format(num_new) +
+              'expecting one each.',
               file=sys.stderr)
+        qcdb.close()
         sys.exit(1)
 
-    # Mask previous snow depth data that have any QC flags set.
-    prev_sd_value_cm = np.ma.masked_where(prev_sd_qc != 0,
-                                          prev_sd_value_cm)
-
-    # Count unmasked previous snow depth data.
-    num_unmasked_prev_snwd = prev_sd_value_cm.count()
-
-    if num_unmasked_prev_snwd == 0:
-        return None, None
-
-    # Locate the snow depth observation adjacent to the one being QCed.
-    ref_ind = np.max(np.where(prev_sd_value_cm.mask == False))
-
-    # Get all neighboring temperatures between the above observation and the
-    # one being QCed.
-    contextual_nhood_tair_deg_c = nhood_tair_deg_c[ref_ind:]
-
-    # Note that the subsetting above could result in some stations in the
-    # neighborhood providing us with no data, which would effectively reduce
-    # the size of the neighborhood.
-    if contextual_nhood_tair_deg_c.count() < 2:
-        return None, None
-
-    if snow_depth_value_cm <= prev_sd_value_cm[ref_ind]:
-        return False, ref_ind
-
-    if contextual_nhood_tair_deg_c.min() >= 7.0:
-        return True, ref_ind
-    else:
-        return False, ref_ind
-
-
-def qc_durre_swe_wre(value_mm):
-    """
-    Basic integrity checks:
-    swe world record exceedance.
-    Uses the snow depth threshold from Durre (2010), but in mm instead of cm
-    (implicit 10:1 ratio).
-    """
-    threshold_value = 1146.0
-    if value_mm < 0.0 or value_mm > threshold_value:
-        return True
-    else:
-        return False
-
-
-def qc_durre_swe_change_wre(swe_value_mm,
-                            prev_swe_value_mm,
-                            prev_swe_qc):
-    """
-    Basic integrity checks:
-    swe increase world record exceedance.
-    Uses the snow depth threshold from Durre (2010), but in mm instead of cm
-    (implicit 10:1 ratio).
-    """
-
-    threshold_swe_increase_mm = 192.5
-
-    # Mask previous swe data that have any QC flags set.
-    prev_swe_value_mm = np.ma.masked_where(prev_swe_qc != 0,
-                                           prev_swe_value_mm)
-
-    num_unmasked_prev_swe = prev_swe_value_mm.count()
-
-    if num_unmasked_prev_swe == 0:
-        # Test is not possible.
-        return None, None
-
-    # Find the minimum observed preceding swe value for comparison with the
-    # observation being checked.
-    ref_ind = np.ma.argmin(prev_swe_value_mm)
-
-    if swe_value_mm - prev_swe_value_mm[ref_ind] > \
-       threshold_swe_increase_mm:
-        return True, ref_ind
-    else:
-        return False, ref_ind
-
-
-def qc_durre_swe_streak(swe_value_mm,
-                        prev_swe_value_mm,
-                        prev_swe_qc,
-                        streak_value_threshold=None):
-    """
-    Basic integrity checks:
-    swe streak check.
-    """
-    if streak_value_threshold is None:
-        streak_value_threshold = 0.1
-    streak_min_consecutive = 10
-
-    # Mask previous swe data that have any QC flags set.
-    prev_swe_value_mm = np.ma.masked_where(prev_swe_qc != 0,
-                                           prev_swe_value_mm)
-
-    # Assemble previous and current data into one time series.
-    station_time_series = np.ma.append(prev_swe_value_mm, swe_value_mm)
-
-    if station_time_series.count() < streak_min_consecutive:
-        return None
-
-    if np.ma.max(station_time_series) <= streak_value_threshold:
-        return None
-    
-    if (np.ma.max(station_time_series) -
-        np.ma.min(station_time_series)) < streak_value_threshold:
-        return True
-    else:
-        return False
-
-
-def qc_durre_swe_gap(swe_value_mm,
-                     prev_swe_value_mm,
-                     prev_swe_qc,
-                     ref_ceiling_mm=None,
-                     ref_default_mm=None,
-                     verbose=None):
-    """
-    Outlier checks:
-    Gap check for SWE.
-    Uses the same thresholds as qc_durre_snwd_gap, but in mm instead of cm
-    (implicit 10:1 ratio).
-    If ref_ceiling_mm and ref_default_mm are included, then when the default
-    reference value (median_obs) exceeds ref_ceiling_mm, it is replaced by the
-    value in the station_time_series that is nearest to ref_default_mm. The
-    purpose of this option is to override median_obs values that are based on
-    dubious large values of SWE, which often occur at automated sites.
-    """
-
-    # First value of reporting_rate_threshold needs to be zero!
-    reporting_rate_threshold = [0.0, 0.25, 0.75, 6.0, 18.0]
-
-    gap_threshold_mm = [100.0,
-                        75.0,
-                        60.0,
-                        45.0,
-                        30.0]
-
-    reporting_rate_name = ['sporadic',
-                           'quasi-daily',
-                           'daily',
-                           'synoptic',
-                           'hourly']
-
-    # Mask previous SWE data that have any QC flags set.
-    prev_swe_value_mm = np.ma.masked_where(prev_swe_qc != 0,
-                                           prev_swe_value_mm)
-
-    # Assemble previous and current data into one time series.
-    # Note that this guarantees that station_time_series will have at least
-    # one unmasked value (the observation being QCed, at the end), even if all
-    # the others are masked.
-    station_time_series = np.ma.append(prev_swe_value_mm, swe_value_mm)
-
-    # Note: add reporting_rate_threshold, gap_threshold_mm,
-    # and reporting_rate_name as INPUTS to obs_rate_category,
-    rc = obs_rate_category(station_time_series)
-
-    if rc is None:
-        if verbose:
-            print('WARNING - no match for observation rate.',
-                  file=sys.stderr)
-        return None
-
-    # Sort observations to simulate a cumulative distribution function.
-    sort_ind = station_time_series.argsort()
-    obs_sorted = station_time_series[sort_ind]
-    median_obs = np.ma.median(station_time_series)
-
-    # Initialize the reference value to the median.
-    ref_obs_init = median_obs
-
-    if ref_ceiling_mm is not None and \
-       ref_default_mm is not None:
-        # Replace ref_obs_init with the time series element nearest in value
-        # to ref_default_mm (typically the climatological median), if
-        # ref_obs_init exceeds the ref_ceiling_mm.
-        if ref_obs_init > ref_ceiling_mm:
-            ind = (np.abs(station_time_series - ref_default_mm)).argmin()
-            ref_obs_init = station_time_series[ind]
-            if verbose:
-                print('INFO: replacing median {} '.format(median_obs) +
-                      'with value {} '.format(ref_obs_init) +
-                      '(observation nearer to climatology) in gap check.')
-
-    # Initialize list of flagged reports.
-    ts_flag_ind = []
-    ref_obs = []
-
-    # Upper gap check.
-
-    # Initialize the reference value.
-    prev_obs = ref_obs_init
-
-    for oc in np.where((obs_sorted.mask == False) &
-                       (obs_sorted >= ref_obs_init))[0]:
-
-        if (obs_sorted[oc] - prev_obs) > gap_threshold_mm[rc]:
-
-            # This and all following observations on this side of obs_sorted
-            # will be flagged, if they fit into the database.
-
-            # Identify location of observation in time series.
-            ts_ind = sort_ind[oc]
-
-            ts_flag_ind.append(ts_ind)
-            ref_obs.append(prev_obs)
-
+    if verbose:
+        for station_id in wdb_df['station_id'].values:
+            print('INFO: adding station "{}".'.format(station_id.strip()))
+
+    # Append metadata. THIS ADDS num_new TO THE STATION DIMENSION.
+    new_si = slice(qcdb_num_stations, qcdb_num_stations + num_new)
+    for ind, qcdb_station_var in enumerate(qcdb_station_vars):
+        wdb_values = wdb_df[wdb_col_list[ind]].values
+        if qcdb_station_var.dtype is str:
+            column_data = np.empty(num_new, dtype=object)
+            for new_ind, wdb_value in enumerate(wdb_values):
+                if isinstance(wdb_value, dt.datetime):
+                    # Format as "YYYY-MM-DD HH:MM:SS"
+                    wdb_value = wdb_value.strftime('%Y-%m-%d %H:%M:%S')
+                elif isinstance(wdb_value, str):
+                    wdb_value = wdb_value.strip()
+                column_data[new_ind] = wdb_value
         else:
-            prev_obs = obs_sorted[oc]
-
-
-    # Lower gap check.
-
-    # Initialize the reference value.
-    prev_obs = ref_obs_init
-
-    for oc in np.flipud(np.where((obs_sorted.mask == False) &
-                                 (obs_sorted < ref_obs_init))[0]):
-
-        if (prev_obs - obs_sorted[oc]) > gap_threshold_mm[rc]:
-
-            # This and all following observations on this side of obs_sorted
-            # will be flagged, if they fit into the database.
+            if len(wdb_values) > 0 and \
+               isinstance(wdb_values[0], dt.datetime):
+                print('ERROR: NetCDF variable {} '.
+                      format(qcdb_station_var.name) +
+                      'must be of "str" type.',
+                      file=sys.stderr)
+                qcdb.close()
+                sys.exit(1)
+            column_data = np.asarray(wdb_values,
+                                     dtype=qcdb_station_var.dtype)
+        qcdb_station_var[new_si] = column_data
 
-            # Identify location of observation in time series.
-            ts_ind = sort_ind[oc]
+    # Initialize QC variables to 0 for the new stations.
+    for qcdb_qc_var in qcdb_qc_vars:
+        qcdb_qc_var[new_si, :] = 0
 
-            ts_flag_ind.append(ts_ind)
-            ref_obs.append(prev_obs)
+    qcdb_index.append(new_obj_id)
 
-        else:
-            prev_obs = obs_sorted[oc]
+    return num_new
 
-    return ts_flag_ind, ref_obs
 
-
-def qc_durre_swe_prcp(site_swe_val_mm,
-                      site_prev_swe_val,
-                      prev_swe_qc,
-                      site_prcp_val_mm):
+def get_qc_test_bits(qcdb_qc_flag, qcdb_qc_chkd):
     """
-    Precipitation--SWE consistency check; i.e. "SWE increase with 0
-    PRCP".
-    site_swe_val_mm - SWE value being QCed
-    site_prev_swe_val - previous SWE values (time series)
-    prev_swe_qc - QC flags for previous SWE values (time series)
-    site_prcp_val_mm - precipitation accumulation
+    Read the qc_test_names and qc_test_bits attributes of a QC flag
+    variable and the corresponding "QC checked" variable, and return a
+    dictionary mapping each QC test name to its bit. Returns None if the
+    two variables do not agree.
     """
+    qc_test_names = list(qcdb_qc_flag.getncattr('qc_test_names'))
+    qc_test_bits = [int(bit)
+                    for bit in qcdb_qc_flag.getncattr('qc_test_bits')]
+    qcc_test_names = list(qcdb_qc_chkd.getncattr('qc_test_names'))
+    qcc_test_bits = [int(bit)
+                     for bit in qcdb_qc_chkd.getncattr('qc_test_bits')]
+
+    if qcc_test_names != qc_test_names or \
+       len(qc_test_bits) != len(qc_test_names):
+        print('ERROR: inconsistent qc_test_names data in QC database.',
+              file=sys.stderr)
+        return(None)
+    if qcc_test_bits != qc_test_bits:
+        print('ERROR: inconsistent qc_test_bits data in QC database.',
+              file=sys.stderr)
+        return(None)
 
-    swe_change_threshold_mm = 10.0
-    prcp_accum_threshold_mm = 0.1
-
-    # Mask previous swe data that have any QC flags set.
-    site_prev_swe_val = np.ma.masked_where(prev_swe_qc != 0,
-                                           site_prev_swe_val)
-
-    # Count unmasked previous swe data.
-    num_unmasked_prev_swe = site_prev_swe_val.count()
-
-    if num_unmasked_prev_swe == 0:
-        return None, None
-
-    # Locate the swe observation furthest from the one being QCed.
-    ref_ind = np.min(np.where(site_prev_swe_val.mask == False))
-
-    if site_swe_val_mm - site_prev_swe_val[ref_ind] >= \
-       swe_change_threshold_mm and \
-       site_prcp_val_mm < prcp_accum_threshold_mm:
-        return True, ref_ind
-    else:
-        return False, ref_ind
-
-
-def qc_durre_swe_prcp_ratio(site_swe_val_mm,
-                             site_prev_swe_val_mm,
-                             prev_swe_qc,
-                             site_prcp_val_mm):
-    '''
-    Internal and temporal consistency checks (Durre 2010, Table 3)
-    Precipitation - snow water equivalent ("SWE/PRCP ratio") consistency
-    check, adapted from SNWD/PRCP ratio" test.
-    '''
-
-    swe_change_threshold_mm = 20.0
-    swe_prcp_ratio_threshold = 100
-
-    # Mask previous SWE data that have any QC flags set.
-    site_prev_swe_val_mm = np.ma.masked_where(prev_swe_qc != 0,
-                                              site_prev_swe_val_mm)
-
-    # Count unmasked previous swe data.
-    num_unmasked_prev_swe = site_prev_swe_val_mm.count()
-
-    if num_unmasked_prev_swe == 0:
-        return None, None
-
-    # Locate the SWE observation furthest from the one being QCed.
-    ref_ind = np.min(np.where(site_prev_swe_val_mm.mask == False))
+    qc_bit = {}
+    for qc_test_name, bit in zip(qc_test_names, qc_test_bits):
+        if qc_test_name not in qc_bit:
+            qc_bit[qc_test_name] = bit
 
-    # No flag for zero precipitation; that should be handled by a separate
-    # test.
-    if site_prcp_val_mm == 0.0:
-        return False, ref_ind
+    # Databases created before 2020-05-01 use "depth_precip_ratio" for
+    # the "precip_ratio" test.
+    if 'precip_ratio' not in qc_bit and 'depth_precip_ratio' in qc_bit:
+        qc_bit['precip_ratio'] = qc_bit['depth_precip_ratio']
 
-    site_swe_change_mm = site_swe_val_mm - site_prev_swe_val_mm[ref_ind]
-    if site_swe_change_mm >= swe_change_threshold_mm and \
-       site_swe_change_mm / site_prcp_val_mm >= \
-       swe_prcp_ratio_threshold:
-        return True, ref_ind
-    else:
-        return False, ref_ind
+    return(qc_bit)
 
 
 def parse_args():
@@ -1364,9 +662,57 @@ def parse_args():
                         metavar='dir',
                         nargs='?',
                         default=default_pkl_dir,
-                        help='Set directory for reading and writing .pkl ' + \
-                             'files generated by observational database ' + \
-                             'queries; default={}.'.format(default_pkl_dir))
+                        help='Set directory for the cache of ' + \
+                             'observations read from the observational ' + \
+                             'database; default={}.'.format(default_pkl_dir))
+    parser.add_argument('-d', '--wdb0_dsn',
+                        type=str,
+                        metavar='dsn',
+                        nargs='?',
+                        default=wdb0_pool.get_dsn(),
+                        help='Set the connection string for the ' + \
+                             'observational database; ' + \
+                             'default="{}".'.format(wdb0_pool.get_dsn()))
+    parser.add_argument('-t', '--fetch_tiles',
+                        type=str,
+                        metavar='LONxLAT',
+                        nargs='?',
+                        help='Divide queries of the observational ' +
+                             'database into LON by LAT longitude/' +
+                             'latitude tiles (e.g., "4x2"), which are ' +
+                             'run in parallel.')
+    parser.add_argument('-f', '--prefetch_hours',
+                        type=int,
+                        metavar='# of hours',
+                        nargs='?',
+                        default=2,
+                        help='Set the number of hours ahead of the one ' +
+                             'being quality controlled for which ' +
+                             'observations are gathered in the ' +
+                             'background; 0 disables this; default=2.')
+    parser.add_argument('-w', '--qc_workers',
+                        type=int,
+                        metavar='# of processes',
+                        nargs='?',
+                        default=0,
+                        help='Divide QC tests for each hour among this ' +
+                             'many worker processes; 0 performs them ' +
+                             'in this process; default=0.')
+    parser.add_argument('-l', '--lead_in_hours',
+                        type=int,
+                        metavar='# of hours',
+                        nargs='?',
+                        help='Commit updates after this many hours, and ' +
+                             'keep a copy of the QC database as it is ' +
+                             'then, named as the database with ' +
+                             '".lead_in" appended (used by ' +
+                             'backfill_station_qc_db.py).')
+    parser.add_argument('--debug_station',
+                        type=str,
+                        metavar='station ID',
+                        nargs='?',
+                        help='Print the QC flag and "QC checked" values ' +
+                             'of this station for each hour updated.')
     parser.add_argument('-v', '--verbose',
                         action='store_true',
                         help='Provide verbose output.')
@@ -1384,6 +730,34 @@ def parse_args():
                   format=sys.stderr)
             sys.exit(1)
 
+    if args.fetch_tiles is not None:
+        try:
+            num_lon_tiles, num_lat_tiles = \
+                [int(n) for n in args.fetch_tiles.lower().split('x')]
+        except ValueError:
+            num_lon_tiles, num_lat_tiles = 0, 0
+        if num_lon_tiles <= 0 or num_lat_tiles <= 0:
+            print('ERROR: --fetch_tiles argument must have the form ' +
+                  'LONxLAT, with both positive.',
+                  file=sys.stderr)
+            sys.exit(1)
+        args.fetch_tiles = [num_lon_tiles, num_lat_tiles]
+
+    if args.prefetch_hours < 0:
+        print('ERROR: --prefetch_hours argument must be nonnegative.',
+              file=sys.stderr)
+        sys.exit(1)
+
+    if args.qc_workers < 0:
+        print('ERROR: --qc_workers argument must be nonnegative.',
+              file=sys.stderr)
+        sys.exit(1)
+
+    if args.lead_in_hours is not None and args.lead_in_hours <= 0:
+        print('ERROR: --lead_in_hours argument must be positive.',
+              file=sys.stderr)
+        sys.exit(1)
+
     if args.pkl_dir is not None:
         if not os.path.isdir(args.pkl_dir):
             raise FileNotFoundError(errno.ENOENT,
@@ -1410,10 +784,14 @@ def main():
               file=sys.stderr)
         exit(1)
 
+    wdb0_pool.set_dsn(args.wdb0_dsn)
+    if args.fetch_tiles is not None:
+        wdb0.set_fetch_tiles(wdb0.make_tiles(*args.fetch_tiles))
+
     # Set configuration parameters.
 
     # Temporary file storage for observations read from the web database
-    # (intended for .pkl files generated by wdb0.py).
+    # (used by wdb0.py for its cache of observations).
     # pkl_dir = '/net/scratch/nwm_snow_da/wdb0_pkl'
     # print(pkl_dir)
     # print(args.pkl_dir)
@@ -1508,11 +886,22 @@ def main():
         sd_clim_dir = '/net/lfs0data5/SNODAS_climatology/snow_depth'
         swe_clim_dir = '/net/lfs0data5/SNODAS_climatology/swe'
 
-    qcdb_snwd_qc_flag = qcdb.variables['snow_depth_qc']
-    qcdb_snwd_qc_chkd = qcdb.variables['snow_depth_qc_checked']
+    # QC flags are read and modified one element at a time, which is very
+    # slow when done directly on these (compressed, chunked) variables.
+    # The QC loop works instead on FlagBuffer copies of the time columns it
+    # touches, which are written back once per hour.
+    qcdb_snwd_qc_flag = FlagBuffer(qcdb.variables['snow_depth_qc'])
+    qcdb_snwd_qc_chkd = FlagBuffer(qcdb.variables['snow_depth_qc_checked'])
+
+    qcdb_swe_qc_flag = FlagBuffer(qcdb.variables['swe_qc'])
+    qcdb_swe_qc_chkd = FlagBuffer(qcdb.variables['swe_qc_checked'])
 
-    qcdb_swe_qc_flag = qcdb.variables['swe_qc']
-    qcdb_swe_qc_chkd = qcdb.variables['swe_qc_checked']
+    # Map QC test names to bits for snow depth and SWE QC flags.
+    snwd_qc_bit = get_qc_test_bits(qcdb_snwd_qc_flag, qcdb_snwd_qc_chkd)
+    swe_qc_bit = get_qc_test_bits(qcdb_swe_qc_flag, qcdb_swe_qc_chkd)
+    if snwd_qc_bit is None or swe_qc_bit is None:
+        qcdb.close()
+        sys.exit(1)
 
     # Read the "last_station_update_datetime" attribute.
     try:
@@ -1689,6 +1078,21 @@ def main():
     #     qcdb.close()
     #     exit(1)
 
+    # Index QC database stations by object identifier. The names of station
+    # variables are kept so they can be located again whenever the QC
+    # database is reopened.
+    qcdb_index = StationIndex(qcdb_obj_id_var[:])
+    if not qcdb_index.is_unique:
+        print('ERROR: Database file {} '.format(temp_database_path) +
+              'has duplicate station object IDs {}.'.
+              format(qcdb_index.duplicates()),
+              file=sys.stderr)
+        qcdb.close()
+        exit(1)
+    qcdb_station_var_names = [qcdb_station_var.name
+                              for qcdb_station_var in qcdb_station_vars]
+    qcdb_obj_id_var_name = qcdb_obj_id_var.name
+
     # Set parameters.
     num_hrs_wre = 24
     num_hrs_streak = 15 * 24
@@ -1699,6 +1103,70 @@ def main():
 
     streak_value_threshold = 0.1
 
+    # Previous snow depth data is needed for multiple tests.
+    # - World record increase exceedance check uses 24 hours.
+    # - Streak check uses 15 days.
+    # - Gap check uses 15 days.
+    # - Temperature consistency checks use 24 hours.
+    # - Snowfall consistency check uses 24 hours.
+    # - Precipitation consistency checks use 24 hours.
+    num_hrs_prev_snwd = max(num_hrs_wre,
+                            num_hrs_streak,
+                            num_hrs_gap,
+                            num_hrs_prev_tair,
+                            num_hrs_snowfall,
+                            num_hrs_prcp)
+
+    # Previous SWE data is needed for multiple tests.
+    # - World record increase exceedance check uses 24 hours.
+    # - Streak check uses 15 days.
+    # - Gap check uses 15 days.
+    # - Precipitation consistency checks use 24 hours.
+    num_hrs_prev_swe = max(num_hrs_wre,
+                           num_hrs_streak,
+                           num_hrs_gap,
+                           # num_hrs_prev_tair,
+                           # num_hrs_snowfall,
+                           num_hrs_prcp)
+
+    # Gathers the observations needed for each hour, keeping preceding
+    # hours in memory so that each hour only the newest data are fetched.
+    wdb_qc_hour = wdb0_qc_hour.QCHourFetcher(num_hrs_prev_snwd,
+                                             num_hrs_prev_swe,
+                                             num_hrs_prev_tair,
+                                             num_hrs_snowfall,
+                                             num_hrs_prcp,
+                                             scratch_dir=args.pkl_dir,
+                                             verbose=args.verbose)
+
+    def get_qc_hour(obs_datetime):
+        """
+        Get the observations for one hour from wdb_qc_hour, along with
+        SNODAS climatology at the snow depth and SWE stations if requested.
+        """
+        t1 = dt.datetime.utcnow()
+        bundle = wdb_qc_hour.get(obs_datetime)
+        if args.check_climatology:
+            for key, clim_dir, element in \
+                [('snwd', sd_clim_dir, 'snow_depth'),
+                 ('swe', swe_clim_dir, 'swe')]:
+                bundle[key + '_clim'] = \
+                    {metric: snodas_clim.at_loc(clim_dir,
+                                                obs_datetime,
+                                                bundle[key]['station_lon'],
+                                                bundle[key]['station_lat'],
+                                                element=element,
+                                                metric=metric,
+                                                sampling='neighbor')
+                     for metric in ['median', 'max', 'iqr']}
+        t2 = dt.datetime.utcnow()
+        elapsed_time = t2 - t1
+        if args.verbose:
+            print('INFO: observations for {} '.format(obs_datetime) +
+                  'gathered in {} seconds.'.
+                  format(elapsed_time.total_seconds()))
+        return bundle
+
     # Switch for flagging low values in tests involving snow depth change.
     flag_sd_change_wre_low_value = False
     flag_sd_change_tair_low_value = False # Affects spatial test as well.
@@ -1710,24 +1178,142 @@ def main():
     flag_swe_change_prcp_low_value = False
 
     # Debugging.
-    debug_station_id = None
-    debug_station_id = 'UTSCI_MADIS'
+    # Station for which QC results are printed for each hour, if any.
+    debug_station_id = args.debug_station
+
+    # QC tests, in the order in which they are performed. Each names the
+    # inputs it needs (built for each hour below), the number of previous
+    # hours it examines, and whether the earlier value a report is compared
+    # with is flagged along with it.
+    snwd_qc_pipeline = qc_pipeline.QCPipeline('snow depth', [
+        qc_pipeline.QCTest(
+            'world_record_exceedance',
+            lambda qc_in: qc_durre_batch.qc_durre_snwd_wre(qc_in['value']),
+            inputs=['value']),
+        qc_pipeline.QCTest(
+            'world_record_increase_exceedance',
+            lambda qc_in: qc_durre_batch.qc_durre_snwd_change_wre(
+                qc_in['value'], qc_in['prev'], qc_in['prev_qc']),
+            inputs=['value', 'prev', 'prev_qc'],
+            num_hrs=num_hrs_wre,
+            flag_reference=flag_sd_change_wre_low_value),
+        qc_pipeline.QCTest(
+            'streak',
+            lambda qc_in: qc_durre_batch.qc_durre_snwd_streak(
+                qc_in['value'], qc_in['prev'], qc_in['prev_qc']),
+            inputs=['value', 'prev', 'prev_qc'],
+            num_hrs=num_hrs_streak),
+        qc_pipeline.QCTest(
+            'gap',
+            lambda qc_in: qc_durre_batch.qc_durre_snwd_gap(
+                qc_in['value'], qc_in['prev'], qc_in['prev_qc'],
+                ref_ceiling_cm=qc_in['ref_ceiling'],
+                ref_default_cm=qc_in['ref_default']),
+            inputs=['value', 'prev', 'prev_qc',
+                    'ref_ceiling', 'ref_default'],
+            num_hrs=num_hrs_gap,
+            series=True),
+        qc_pipeline.QCTest(
+            'temperature_consistency',
+            lambda qc_in: qc_durre_batch.qc_durre_snwd_tair(
+                qc_in['value'], qc_in['prev'], qc_in['prev_qc'],
+                qc_in['tair']),
+            inputs=['value', 'prev', 'prev_qc', 'tair'],
+            num_hrs=num_hrs_prev_tair,
+            flag_reference=flag_sd_change_tair_low_value),
+        qc_pipeline.QCTest(
+            'snowfall_consistency',
+            lambda qc_in: qc_durre_batch.qc_durre_snwd_snfl(
+                qc_in['value'], qc_in['prev'], qc_in['prev_qc'],
+                qc_in['snfl']),
+            inputs=['value', 'prev', 'prev_qc', 'snfl'],
+            num_hrs=num_hrs_snowfall,
+            flag_reference=flag_sd_change_snfl_low_value),
+        qc_pipeline.QCTest(
+            'precip_consistency',
+            lambda qc_in: qc_durre_batch.qc_durre_snwd_prcp(
+                qc_in['value'], qc_in['prev'], qc_in['prev_qc'],
+                qc_in['prcp']),
+            inputs=['value', 'prev', 'prev_qc', 'prcp'],
+            num_hrs=num_hrs_prcp,
+            flag_reference=flag_sd_change_prcp_low_value),
+        qc_pipeline.QCTest(
+            'precip_ratio',
+            lambda qc_in: qc_durre_batch.qc_durre_snwd_prcp_ratio(
+                qc_in['value'], qc_in['prev'], qc_in['prev_qc'],
+                qc_in['prcp']),
+            inputs=['value', 'prev', 'prev_qc', 'prcp'],
+            num_hrs=num_hrs_prcp,
+            flag_reference=flag_sd_change_prcp_low_value,
+            counter='precip_consistency'),
+        qc_pipeline.QCTest(
+            'spatial_temperature_consistency',
+            lambda qc_in: qc_durre_batch.qc_durre_snwd_tair_spatial(
+                qc_in['value'], qc_in['prev'], qc_in['prev_qc'],
+                qc_in['nhood_tair']),
+            inputs=['value', 'prev', 'prev_qc', 'nhood_tair'],
+            num_hrs=num_hrs_prev_tair,
+            flag_reference=flag_sd_change_tair_low_value)])
+
+    swe_qc_pipeline = qc_pipeline.QCPipeline('SWE', [
+        qc_pipeline.QCTest(
+            'world_record_exceedance',
+            lambda qc_in: qc_durre_batch.qc_durre_swe_wre(qc_in['value']),
+            inputs=['value']),
+        qc_pipeline.QCTest(
+            'world_record_increase_exceedance',
+            lambda qc_in: qc_durre_batch.qc_durre_swe_change_wre(
+                qc_in['value'], qc_in['prev'], qc_in['prev_qc']),
+            inputs=['value', 'prev', 'prev_qc'],
+            num_hrs=num_hrs_wre,
+            flag_reference=flag_swe_change_wre_low_value),
+        qc_pipeline.QCTest(
+            'streak',
+            lambda qc_in: qc_durre_batch.qc_durre_swe_streak(
+                qc_in['value'], qc_in['prev'], qc_in['prev_qc']),
+            inputs=['value', 'prev', 'prev_qc'],
+            num_hrs=num_hrs_streak),
+        qc_pipeline.QCTest(
+            'gap',
+            lambda qc_in: qc_durre_batch.qc_durre_swe_gap(
+                qc_in['value'], qc_in['prev'], qc_in['prev_qc'],
+                ref_ceiling_mm=qc_in['ref_ceiling'],
+                ref_default_mm=qc_in['ref_default']),
+            inputs=['value', 'prev', 'prev_qc',
+                    'ref_ceiling', 'ref_default'],
+            num_hrs=num_hrs_gap,
+            series=True),
+        qc_pipeline.QCTest(
+            'precip_consistency',
+            lambda qc_in: qc_durre_batch.qc_durre_swe_prcp(
+                qc_in['value'], qc_in['prev'], qc_in['prev_qc'],
+                qc_in['prcp']),
+            inputs=['value', 'prev', 'prev_qc', 'prcp'],
+            num_hrs=num_hrs_prcp,
+            flag_reference=flag_swe_change_prcp_low_value),
+        qc_pipeline.QCTest(
+            'precip_ratio',
+            lambda qc_in: qc_durre_batch.qc_durre_swe_prcp_ratio(
+                qc_in['value'], qc_in['prev'], qc_in['prev_qc'],
+                qc_in['prcp']),
+            inputs=['value', 'prev', 'prev_qc', 'prcp'],
+            num_hrs=num_hrs_prcp,
+            flag_reference=flag_swe_change_prcp_low_value,
+            counter='precip_consistency')])
+
+    # Worker processes for QC tests are started before any background
+    # threads (i.e., for prefetching), since they are forked.
+    qc_workers = None
+    if args.qc_workers > 0:
+        qc_workers = qc_pool.QCProcessPool([snwd_qc_pipeline,
+                                            swe_qc_pipeline],
+                                           args.qc_workers)
 
     num_stations_added = 0
-    num_flagged_sd_wr = 0
-    num_flagged_sd_change_wr = 0
-    num_flagged_sd_streak = 0
-    num_flagged_sd_gap = 0
-    num_flagged_sd_at_cons = 0
-    num_flagged_sd_sf_cons = 0
-    num_flagged_sd_pr_cons = 0
-    num_flagged_sd_at_spatial_cons = 0
-
-    num_flagged_swe_wr = 0
-    num_flagged_swe_change_wr = 0
-    num_flagged_swe_streak = 0
-    num_flagged_swe_gap = 0
-    num_flagged_swe_pr_cons = 0
+    num_flagged_snwd = dict([(counter, 0)
+                             for counter in snwd_qc_pipeline.counters])
+    num_flagged_swe = dict([(counter, 0)
+                            for counter in swe_qc_pipeline.counters])
 
     num_hrs_updated = 0
     qcdb_num_stations_start = 0
@@ -1736,11 +1322,22 @@ def main():
     # Loop over all times to update. #
     ##################################
 
-    for qcdb_ti in qcdb_update_time_ind:
-        obs_datetime_num = qcdb_var_time[qcdb_ti]
-        obs_datetime = num2date(obs_datetime_num,
-                                units=qcdb_var_time_units,
-                                only_use_cftime_datetimes=False)
+    # Data for upcoming hours are gathered in the background while QC runs
+    # for the current hour.
+    if args.max_update_hours is not None:
+        qcdb_update_time_ind = \
+            qcdb_update_time_ind[0:args.max_update_hours]
+    update_datetimes = [num2date(qcdb_var_time[qcdb_ti],
+                                 units=qcdb_var_time_units,
+                                 only_use_cftime_datetimes=False)
+                        for qcdb_ti in qcdb_update_time_ind]
+    wdb_prefetch = wdb0_qc_hour.QCHourPrefetcher(get_qc_hour,
+                                                 update_datetimes,
+                                                 depth=args.prefetch_hours,
+                                                 verbose=args.verbose)
+
+    for qcdb_ti, (obs_datetime, wdb_hour) in \
+        zip(qcdb_update_time_ind, wdb_prefetch):
         if args.verbose:
             print('INFO: updating data for {}'.format(obs_datetime))
 
@@ -1752,88 +1349,54 @@ def main():
         #######################
 
 
-        # Get snow depth and other observations used for snow depth QC.
-
+        # Snow depth, SWE and other observations used for QC are in
+        # wdb_hour, as a bundle sharing one station index.
 
         # Get all snow depth data for this datetime.
-        t1 = dt.datetime.utcnow()
-        wdb_snwd = wdb0.get_snow_depth_obs(obs_datetime,
-                                           obs_datetime,
-                                           scratch_dir=args.pkl_dir,
-                                           verbose=args.verbose)
-        t2 = dt.datetime.utcnow()
-        elapsed_time = t2 - t1
+        wdb_snwd = wdb_hour['snwd']
         if args.verbose:
             print('INFO: found {} snow depth reports.'.
                   format(wdb_snwd['num_stations']))
-            print('INFO: query ran in {} seconds.'.
-                  format(elapsed_time.total_seconds()))
 
-        # Previous snow depth data is needed for multiple tests.
-        # - World record increase exceedance check uses 24 hours.
-        # - Streak check uses 15 days.
-        # - Gap check uses 15 days.
-        # - Temperature consistency checks use 24 hours.
-        # - Snowfall consistency check uses 24 hours.
-        # - Precipitation consistency checks use 24 hours.
-        num_hrs_prev_snwd = max(num_hrs_wre,
-                                num_hrs_streak,
-                                num_hrs_gap,
-                                num_hrs_prev_tair,
-                                num_hrs_snowfall,
-                                num_hrs_prcp)
+        # Add any new stations reporting snow depth to the QC database.
+        num_new = add_new_stations(qcdb,
+                                   wdb_snwd['station_obj_id'],
+                                   qcdb_index,
+                                   qcdb_station_vars,
+                                   wdb_col_list,
+                                   [qcdb_snwd_qc_chkd,
+                                    qcdb_snwd_qc_flag,
+                                    qcdb_swe_qc_chkd,
+                                    qcdb_swe_qc_flag],
+                                   verbose=(args.verbose and
+                                            qcdb_num_stations_start > 0))
+        if num_new > 0:
+            qcdb_num_stations += num_new
+            num_stations_added += num_new
+            num_stations_added_this_time += num_new
+            if qcdb_num_stations_start and args.verbose:
+                print('INFO: QC database now includes {} stations.'.
+                      format(qcdb_num_stations))
 
         if args.check_climatology:
 
-            # Get SNODAS snow depth climatology data for the current time.
-            wdb_snwd_clim_med_mm = \
-                snodas_clim.at_loc(sd_clim_dir,
-                                   obs_datetime,
-                                   wdb_snwd['station_lon'],
-                                   wdb_snwd['station_lat'],
-                                   element='snow_depth',
-                                   metric='median',
-                                   sampling='neighbor')
-            wdb_snwd_clim_max_mm = \
-                snodas_clim.at_loc(sd_clim_dir,
-                                   obs_datetime,
-                                   wdb_snwd['station_lon'],
-                                   wdb_snwd['station_lat'],
-                                   element='snow_depth',
-                                   metric='max',
-                                   sampling='neighbor')
-            wdb_snwd_clim_iqr_mm = \
-                snodas_clim.at_loc(sd_clim_dir,
-                                   obs_datetime,
-                                   wdb_snwd['station_lon'],
-                                   wdb_snwd['station_lat'],
-                                   element='snow_depth',
-                                   metric='iqr',
-                                   sampling='neighbor')
+            # SNODAS snow depth climatology data for the current time.
+            wdb_snwd_clim_med_mm = wdb_hour['snwd_clim']['median']
+            wdb_snwd_clim_max_mm = wdb_hour['snwd_clim']['max']
+            wdb_snwd_clim_iqr_mm = wdb_hour['snwd_clim']['iqr']
 
 
         # Get previous num_hrs_prev_snwd hours of snow depth data.
-        t1 = dt.datetime.utcnow()
-        wdb_prev_snwd = \
-            wdb0.get_prev_snow_depth_obs(obs_datetime,
-                                         num_hrs_prev_snwd,
-                                         scratch_dir=args.pkl_dir,
-                                         verbose=args.verbose)
-        t2 = dt.datetime.utcnow()
-        elapsed_time = t2 - t1
-
+        wdb_prev_snwd = wdb_hour['prev_snwd']
         if args.verbose:
             print('INFO: found {} '.
                   format(wdb_prev_snwd['values_cm'].count()) +
                   'preceding snow depth reports ' +
                   'from {} stations.'.format(wdb_prev_snwd['num_stations']))
-            print('INFO: query ran in {} seconds.'.
-                  format(elapsed_time.total_seconds()))
 
-        # Extract previous snow depth values and station object identifiers,
-        # for convenience (shorter variable names).
+        # Extract previous snow depth values, for convenience (shorter
+        # variable names).
         wdb_prev_snwd_val_cm = wdb_prev_snwd['values_cm']
-        wdb_prev_snwd_obj_id = wdb_prev_snwd['station_obj_id']
 
         # Get previous num_hrs_prev_snwd hours of snow depth QC data.
         t1 = obs_datetime - dt.timedelta(hours=num_hrs_prev_snwd)
@@ -1879,79 +1442,39 @@ def main():
 
 
         # Get snowfall data associated with snow depth observations.
-        t1 = dt.datetime.utcnow()
-        wdb_snfl = \
-            wdb0.get_snwd_snfl_obs(obs_datetime,
-                                   num_hrs_snowfall,
-                                   scratch_dir=args.pkl_dir,
-                                   verbose=args.verbose)
-        t2 = dt.datetime.utcnow()
-        elapsed_time = t2 - t1
+        wdb_snfl = wdb_hour['snfl']
         if args.verbose:
             print('INFO: found {} snowfall reports.'.
                   format(wdb_snfl['num_stations']))
-            print('INFO: query ran in {} seconds.'.
-                  format(elapsed_time.total_seconds()))
 
-        # Extract snowfall values and station object identifiers, for
-        # convenience (shorter variable names).
+        # Extract snowfall values, for convenience (shorter variable
+        # names).
         wdb_snfl_val_cm = wdb_snfl['values_cm']
-        wdb_snfl_obj_id = wdb_snfl['station_obj_id']
 
 
         # Get precipitation data associated with snow depth observations.
-        t1 = dt.datetime.utcnow()
-        wdb_snwd_prcp = \
-            wdb0.get_snwd_prcp_obs(obs_datetime,
-                                   num_hrs_prcp,
-                                   scratch_dir=args.pkl_dir,
-                                   verbose=args.verbose)
-        t2 = dt.datetime.utcnow()
-        elapsed_time = t2 - t1
+        wdb_snwd_prcp = wdb_hour['snwd_prcp']
         if args.verbose:
             print('INFO: found {} precipitation reports.'.
                   format(wdb_snwd_prcp['num_stations']))
-            print('INFO: query ran in {} seconds.'.
-                  format(elapsed_time.total_seconds()))
 
-        # Extract precipitation values and station object identifiers, for
-        # convenience (shorter variable names).
+        # Extract precipitation values, for convenience (shorter variable
+        # names).
         wdb_snwd_prcp_val_mm = wdb_snwd_prcp['values_mm']
-        wdb_snwd_prcp_obj_id = wdb_snwd_prcp['station_obj_id']
 
         # Get air temperature observations. These are needed for snow depth
         # reporters (for the snow-temperature consistency check) and for other
         # sites as well (for the spatial snow-temperature consistency check).
-        current_datetime = dt.datetime.utcnow()
-        # TODO:
-        # If wdb_prev_tair exists already, and
-        #    wdb_prev_tair_datetime is less than 15 minutes in the past
-        #    then
-        # use the prev_obs_air_temp=wdb_prev_tair keyword in the call to
-        # wdb0.get_air_temp_obs
-        wdb_prev_tair = \
-            wdb0.get_air_temp_obs(obs_datetime -
-                                  dt.timedelta(hours=num_hrs_prev_tair),
-                                  obs_datetime,
-                                  scratch_dir=args.pkl_dir,
-                                  verbose=args.verbose)
-        wdb_prev_tair_datetime = dt.datetime.utcnow()
-        wdb_prev_tair_datetimes = \
-            [wdb_prev_tair_datetime] * (num_hrs_prev_tair + 1)
-        elapsed_time = wdb_prev_tair_datetime - current_datetime
-
+        wdb_prev_tair = wdb_hour['prev_tair']
         if args.verbose:
             print('INFO: found {} '.
                   format(wdb_prev_tair['values_deg_c'].count()) +
                   'preceding air temperature reports ' +
                   'from {} stations.'.format(wdb_prev_tair['num_stations']))
-            print('INFO: query ran in {} seconds.'.
-                  format(elapsed_time.total_seconds()))
 
-        # Extract previous air temperature values and station object
-        # identifiers, for convenience (shorter variable names).
+        # Extract previous air temperature values, for convenience
+        # (shorter variable names).
         wdb_prev_tair_val = wdb_prev_tair['values_deg_c']
-        wdb_prev_tair_obj_id = wdb_prev_tair['station_obj_id']
 
         # Find neighboring indices from wdb_prev_tair for each snow depth
         # observation in wdb_snwd.
@@ -1968,1543 +1491,96 @@ def main():
                                    max_tair_neighbors,
                                    verbose=args.verbose)
 
-        # Initialize counters for the current time.
-        # num_stations_added_this_time = 0
-        num_flagged_sd_wr_this_time = 0
-        num_flagged_sd_change_wr_this_time = 0
-        num_flagged_sd_streak_this_time = 0
-        num_flagged_sd_gap_this_time = 0
-        num_flagged_sd_at_cons_this_time = 0
-        num_flagged_sd_sf_cons_this_time = 0
-        num_flagged_sd_pr_cons_this_time = 0
-        num_flagged_sd_at_spatial_cons_this_time = 0
-
         # Rename wdb_snwd values for convenience.
         wdb_snwd_obj_id = wdb_snwd['station_obj_id']
         wdb_snwd_station_id = wdb_snwd['station_id']
         wdb_snwd_val_cm = wdb_snwd['values_cm'][:,0]
 
-        if args.verbose:
-            print('Performing snow depth QC for {}'.format(obs_datetime))
-
-        ####################################################
-        # Loop over all reports for the current date/time. #
-        ####################################################
-
-        for wdb_snwd_si in range(0, wdb_snwd['num_stations']):
-
-            # Extract values of wdb_snwd values for this station.
-            site_snwd_obj_id = wdb_snwd_obj_id[wdb_snwd_si]
-            site_snwd_station_id = wdb_snwd_station_id[wdb_snwd_si]
-            site_snwd_val_cm = wdb_snwd_val_cm[wdb_snwd_si]
-
-            if args.check_climatology:
-                site_snwd_clim_med_mm = wdb_snwd_clim_med_mm[wdb_snwd_si]
-                site_snwd_clim_max_mm = wdb_snwd_clim_max_mm[wdb_snwd_si]
-                site_snwd_clim_iqr_mm = wdb_snwd_clim_iqr_mm[wdb_snwd_si]
-
-            # Locate station index in QC database.
-            qcdb_si = np.where(qcdb_obj_id_var[:] == site_snwd_obj_id)
-
-            debug_this_station = False
-            if debug_station_id is not None and \
-               site_snwd_station_id == debug_station_id:
-                debug_this_station = True
-
-            if len(qcdb_si[0]) == 0:
-
-                # New station - get its metadata.
-
-                # Open the web database.
-                conn_string = "host='wdb0.dmz.nohrsc.noaa.gov' " + \
-                              "dbname='web_data'"
-                conn = psycopg2.connect(conn_string)
-                conn.set_client_encoding("utf-8")
-                cursor = conn.cursor()
-
-                # Read metadata for the current station.
-                sql_cmd = "SELECT " + wdb_col_list_str + " " + \
-                          "FROM point.allstation " + \
-                          "WHERE obj_identifier = {};". \
-                          format(site_snwd_obj_id)
-                cursor.execute(sql_cmd)
-                wdb_station_meta = cursor.fetchall()
-                cursor.close()
-                conn.close()
-                if len(wdb_station_meta) != 1:
-                    print('ERROR: found {} matches in SQL statement ' +
-                          'for station object ID {}; expecting 1.'.
-                          format(len(wdb_station_meta), site_snwd_obj_id),
-                          file=sys.stderr)
-                    qcdb.close()
-                    exit(1)
-                wdb_station_meta = wdb_station_meta[0]
-
-                # For all station variables append or confirm/update data.
-                for ind, qcdb_station_var in enumerate(qcdb_station_vars):
-                    allstation_column_name = wdb_col_list[ind]
-
-                    if isinstance(wdb_station_meta[ind], dt.datetime):
-                        # Format as "YYYY-MM-DD HH:MM:SS"
-                        if not qcdb_station_var.dtype is np.str:
-                            print('ERROR: NetCDF variable {}'.
-                                  format(qcdb_station_var.name) +
-                                  'must be of "str" type.',
-                                  file=sys.stderr)
-                            qcdb.close()
-                            exit(1)
-                        wdb_allstation_column_data = \
-                            wdb_station_meta[ind].strftime('%Y-%m-%d %H:%M:%S')
-                    else:
-                        wdb_allstation_column_data = wdb_station_meta[ind]
-                        if isinstance(wdb_allstation_column_data, str):
-                            wdb_allstation_column_data = \
-                                wdb_allstation_column_data.strip()
-
-                    if allstation_column_name == 'station_id':
-                        if len(qcdb_si[0]) == 0:
-                            # This is a new station.
-                            if qcdb_num_stations_start > 0 and args.verbose:
-                                print('INFO: adding station "{}".'.
-                                      format(wdb_allstation_column_data))
-
-                    if len(qcdb_si[0]) == 0:
-                        # Station (si) object ID not in QC database.
-                        # Append. THIS ADDS 1 TO THE STATION DIMENSION.
-                        # if ind == 0:
-                        #     print(qcdb.dimensions['station'].size)
-                        qcdb_station_var[qcdb_num_stations] = \
-                            wdb_allstation_column_data
-                        # if ind == 0:
-                        #     print(qcdb.dimensions['station'].size)
-
-                # Metadata was appended above. Now QC data needs to
-                # be appended as well.
-                qcdb_si = qcdb_num_stations
-                qcdb_station_is_new = True
-                qcdb_num_stations += 1
-                num_stations_added += 1
-                num_stations_added_this_time += 1
-                if qcdb_num_stations_start and args.verbose:
-                    print('INFO: QC database now includes {} stations.'.
-                          format(qcdb_num_stations))
-                # Initialize qc variables to 0 for this (new) station.
-                qcdb_snwd_qc_chkd[qcdb_si,:] = 0
-                qcdb_snwd_qc_flag[qcdb_si,:] = 0
-                qcdb_swe_qc_chkd[qcdb_si,:] = 0
-                qcdb_swe_qc_flag[qcdb_si,:] = 0
-
-                # Add artificial qc data to qcdb_prev_snwd_qc_flag for
-                # the new station.
-                # ??? Should we also generate/expand ???
-                # ??? qcdb_prev_swe_qc_flag here     ???
-                #     Pretty sure we do not need to.
-                new_row = np.ma.masked_array(np.array([[0] *
-                                                       num_hrs_prev_snwd]))
-                if qcdb_prev_snwd_qc_flag.shape[0] == 0:
-                    qcdb_prev_snwd_qc_flag = new_row
-                else:
-                    qcdb_prev_snwd_qc_flag = \
-                        np.ma.concatenate([qcdb_prev_snwd_qc_flag, new_row],
-                                          axis=0)
-                new_row = None
-
-            else:                  
-
-                qcdb_si = qcdb_si[0][0]
-                qcdb_station_is_new = False
-
-            ########################################################
-            # Locate station index relative to all data needed for #
-            # performing QC tests.                                 #
-            ########################################################
-
-            # Locate station index in previous snow depth data.
-            # TODO: fix this brute force method. Maybe try the index method
-            # with a try/except arrangement.
-            wdb_prev_snwd_si = []
-            for ind, val in enumerate(wdb_prev_snwd_obj_id):
-                if val == site_snwd_obj_id:
-                    wdb_prev_snwd_si.append(ind)
-
-            if len(wdb_prev_snwd_si) != 0:
-                # The object ID for this station was found in the
-                # preceding snow depth data.
-                if len(wdb_prev_snwd_si) > 1:
-                    print('ERROR: multiple matches for station ' +
-                          'object ID {} '.format(site_snwd_obj_id) +
-                          'in preceding snow depth data.',
-                          file=sys.stderr)
-                    qcdb.close()
-                    exit(1)
-                wdb_prev_snwd_si = wdb_prev_snwd_si[0]
-            else:
-                wdb_prev_snwd_si = None
-
-            # Locate station index in previous air temperature data.
-            wdb_prev_tair_si = []
-            for ind, val in enumerate(wdb_prev_tair_obj_id):
-                if val == site_snwd_obj_id:
-                    wdb_prev_tair_si.append(ind)
-
-            if len(wdb_prev_tair_si) != 0:
-                # The object ID for this station was found in the
-                # previous + current air temperature data.
-                if len(wdb_prev_tair_si) > 1:
-                    print('ERROR: multiple matches for station ' +
-                          'object ID {} '.format(site_snwd_obj_id) +
-                          'in previous + current air temperature data.',
-                          file=sys.stderr)
-                    qcdb.close()
-                    exit(1)
-                wdb_prev_tair_si = wdb_prev_tair_si[0]
-            else:
-                wdb_prev_tair_si = None
-
-            # Locate station index in snowfall data.
-            wdb_snfl_si = []
-            for ind, val in enumerate(wdb_snfl_obj_id):
-                if val == site_snwd_obj_id:
-                    wdb_snfl_si.append(ind)
-
-            if len(wdb_snfl_si) != 0:
-                # The object ID for this station was found in the snowfall
-                # data.
-                if len(wdb_snfl_si) > 1:
-                    print('ERROR: multiple matches for station ' +
-                          'object ID {} '.format(site_snwd_obj_id) +
-                          'in snowfall data.',
-                          file=sys.stderr)
-                    qcdb.close()
-                    exit(1)
-                wdb_snfl_si = wdb_snfl_si[0]
-            else:
-                wdb_snfl_si = None
-
-            # Locate station index in precipitation data.
-            wdb_snwd_prcp_si = []
-            for ind, val in enumerate(wdb_snwd_prcp_obj_id):
-                if val == site_snwd_obj_id:
-                    wdb_snwd_prcp_si.append(ind)
-
-            if len(wdb_snwd_prcp_si) != 0:
-                # The object ID for this station was found in the
-                # precipitation data.
-                if len(wdb_snwd_prcp_si) > 1:
-                    print('ERROR: multiple matches for station ' +
-                          'object ID {} '.format(site_prcp_obj_id) +
-                          'in precipitation data.',
-                          file=sys.stderr)
-                    qcdb.close()
-                    exit(1)
-                wdb_snwd_prcp_si = wdb_snwd_prcp_si[0]
-            else:
-                wdb_snwd_prcp_si = None
-
-
-            ################################################
-            # Perform QC tests on the current observation. #
-            ################################################
-
-            # Get QC test names and bits for the QC flag and the "QC checked"
-            # flag.
-            snwd_qc_test_names = qcdb_snwd_qc_flag. \
-                                 getncattr('qc_test_names')
-            snwd_qc_test_bits = qcdb_snwd_qc_flag. \
-                                getncattr('qc_test_bits')
-            snwdc_qc_test_names = qcdb_snwd_qc_chkd. \
-                                  getncattr('qc_test_names')
-            snwdc_qc_test_bits = qcdb_snwd_qc_chkd. \
-                                 getncattr('qc_test_bits')
-
-
-            #########################################################
-            # Perform the snow depth world record exceedance check. #
-            #########################################################
-            
-            # Identify the QC bit for the test.
-            qc_test_name = 'world_record_exceedance'
-            ind = snwd_qc_test_names.index(qc_test_name)
-            qc_bit = snwd_qc_test_bits[ind]
-            if snwdc_qc_test_names[ind] != qc_test_name:
-                print('ERROR: inconsistent qc_test_names data in ' +
-                      'QC database.',
-                      file=sys.stderr)
-                qcdb.close()
-                exit(1)
-            if snwdc_qc_test_bits[ind] != snwd_qc_test_bits[ind]:
-                print('ERROR: inconsistent qc_test_bits data in ' +
-                      'QC database.',
-                      file=sys.stderr)
-                qcdb.close()
-                exit(1)
-
-            # print(qcdb_si,
-            #       qcdb_ti,
-            #       type(qcdb_snwd_qc_chkd[qcdb_si, qcdb_ti]),
-            #       qcdb_snwd_qc_chkd[qcdb_si, qcdb_ti])
-            if not qcdb_snwd_qc_chkd[qcdb_si, qcdb_ti] & (1 << qc_bit):
-
-                if qc_durre_snwd_wre(site_snwd_val_cm):
-                    # Value has been flagged.
-                    if args.verbose:
-                        print('INFO: flagging snow depth value {} '.
-                              format(site_snwd_val_cm) +
-                              'at station {} '.format(site_snwd_station_id) +
-                              '({}) '.format(site_snwd_obj_id) +
-                              '("{}").'.format(qc_test_name))
-
-                    # Turn on the QC bit for this test.
-                    qcdb_snwd_qc_flag[qcdb_si, qcdb_ti] = \
-                        qcdb_snwd_qc_flag[qcdb_si, qcdb_ti] \
-                        | (1 << qc_bit)
-
-                    num_flagged_sd_wr_this_time += 1
-                    num_flagged_sd_wr += 1
-
-                # Turn on the QC checked bit for this test, regardless of
-                # whether the observation was flagged.
-                qcdb_snwd_qc_chkd[qcdb_si, qcdb_ti] = \
-                    qcdb_snwd_qc_chkd[qcdb_si, qcdb_ti] \
-                    | (1 << qc_bit)
-
-            ############################################################
-            # Perform world record exceedance check for change in snow #
-            # depth.                                                   #
-            ############################################################
-
-            qc_test_name = 'world_record_increase_exceedance'
-            if debug_this_station:
-                print('***** Debugging snwd "{}" test for value {} at {} ({}).'.
-                      format(qc_test_name,
-                             site_snwd_val_cm,
-                             site_snwd_station_id,
-                             site_snwd_obj_id))
-
-            if wdb_prev_snwd_si is not None:
-
-                # Preceding snow depth data is available, making this test
-                # possible. 
-
-                # Identify the QC bit for the test.
-                ind = snwd_qc_test_names.index(qc_test_name)
-                qc_bit = snwd_qc_test_bits[ind]
-                if snwdc_qc_test_names[ind] != qc_test_name:
-                    print('ERROR: inconsistent qc_test_names data in ' +
-                          'QC database.',
-                          file=sys.stderr)
-                    qcdb.close()
-                    exit(1)
-                if snwdc_qc_test_bits[ind] != snwd_qc_test_bits[ind]:
-                    print('ERROR: inconsistent qc_test_bits data in ' +
-                          'QC database.',
-                          file=sys.stderr)
-                    qcdb.close()
-                    exit(1)
-
-                if debug_this_station:
-                    print('***** have previous data.')
-
-                if not qcdb_snwd_qc_chkd[qcdb_si, qcdb_ti] & (1 << qc_bit):
-
-                    # Test has not been performed for this observation.
-
-                    # Note that there are three indices for locating this
-                    # station:
-                    # 1. wdb_snwd_si    = the station index in
-                    #                     wdb_snwd_val_cm
-                    # 2. qcdb_si        = the station index in the QC database
-                    #                     which is covered by these arrays:
-                    #                     qcdb_prev_snwd_qc_flag
-                    #                     qcdb_snwd_qc_chkd
-                    #                     qcdb_snwd_qc_flag
-                    # 3. wdb_prev_snwd_si = the station index in
-                    #                     prev_sd and wdb_prev_snwd_obj_id
-
-                    prev_snwd_ti = num_hrs_prev_snwd - num_hrs_wre
-
-                    site_prev_snwd_val_cm = \
-                        wdb_prev_snwd_val_cm[wdb_prev_snwd_si, prev_snwd_ti:]
-
-                    site_prev_snwd_qc = \
-                        qcdb_prev_snwd_qc_flag[qcdb_si, prev_snwd_ti:]
-
-                    flag, ref_ind = \
-                        qc_durre_snwd_change_wre(site_snwd_val_cm,
-                                                 site_prev_snwd_val_cm,
-                                                 site_prev_snwd_qc)
-
-                    if debug_this_station:
-                        print('***** values: {} {}'.
-                              format(site_prev_snwd_val_cm, site_snwd_val_cm))
-                        print('***** flag: {}'.format(flag))
-
-                    if flag:
-
-                        if args.verbose:
-                            print('INFO: flagging snow depth change ' + 
-                                  '{} '.
-                                  format(site_prev_snwd_val_cm[ref_ind]) +
-                                  'to {} '.format(site_snwd_val_cm) +
-                                  'at station {} '.
-                                  format(site_snwd_station_id) +
-                                  '({}) '.format(site_snwd_obj_id) +
-                                  '("{}").'.format(qc_test_name))
-
-                        # Turn on the QC bit for this test.
-                        qcdb_snwd_qc_flag[qcdb_si, qcdb_ti] = \
-                            qcdb_snwd_qc_flag[qcdb_si, qcdb_ti] | (1 << qc_bit)
-
-                        if flag_sd_change_wre_low_value:
-
-                            # Flag previous (low) value as well if that time
-                            # fits into the database.
-                            ref_ind_db = qcdb_ti - num_hrs_wre + ref_ind
-                            if ref_ind_db >= 0:
-                                ref_datetime = \
-                                    num2date(qcdb_var_time[0] + ref_ind_db,
-                                             units=qcdb_var_time_units,
-                                             only_use_cftime_datetimes=False)
-                                if args.verbose:
-                                    print('INFO: also flagging low-valued ' +
-                                          'observation {} at {}.'.
-                                          format(site_prev_snwd_val_cm[ref_ind],
-                                                 ref_datetime))
-                                # First make sure the previous value is
-                                # not flagged.
-                                if qcdb_snwd_qc_flag[qcdb_si, ref_ind_db] & \
-                                   (1 << qc_bit) != 0:
-                                    print('ERROR: (PROGRAMMING) ' +
-                                          'reference value was ' +
-                                          'previously flagged and ' +
-                                          'should not have been used.',
-                                          file=sys.stderr)
-                                    qcdb.close()
-                                    sys.exit(1)
-                                # Flag the previous value.
-                                qcdb_snwd_qc_flag[qcdb_si, ref_ind_db] = \
-                                    qcdb_snwd_qc_flag[qcdb_si,ref_ind_db] | \
-                                    (1 << qc_bit)
-                                # Identify the previous value as having been
-                                # through this check, even though this is
-                                # only indirectly the case. Most likely it has
-                                # already been tested, and passed, but now is
-                                # associated with the later problematic report.
-                                qcdb_snwd_qc_chkd[qcdb_si, ref_ind_db] = \
-                                    qcdb_snwd_qc_chkd[qcdb_si, ref_ind_db] | \
-                                    (1 << qc_bit)
-
-                        # Increment flagged-value counters.
-                        num_flagged_sd_change_wr_this_time += 1
-                        num_flagged_sd_change_wr += 1
-
-                    if flag is not None:
-
-                        # Turn on the QC checked bit for this test, regardless
-                        # of whether the observation was flagged.
-                        qcdb_snwd_qc_chkd[qcdb_si, qcdb_ti] = \
-                            qcdb_snwd_qc_chkd[qcdb_si, qcdb_ti] | (1 << qc_bit)
-
-                else:
-
-                    if debug_this_station:
-                        print('***** snow depth increase WRE test done')
-
-                    # Test has already been performed.
-                    flag_value = qcdb_snwd_qc_flag[qcdb_si, qcdb_ti] & \
-                                 (1 << qc_bit)
-                    if flag_value == 0:
-                        flag_str = 'not flagged'
-                    else:
-                        flag_str = 'flagged'
-                    if args.verbose:
-                        print('INFO: check "{}" '.format(qc_test_name) +
-                              'already done for site {} ({}) '.
-                              format(site_snwd_station_id,
-                                     site_snwd_obj_id) +
-                              'value {} ({})'.
-                              format(site_snwd_val_cm, flag_str))
-
-            ########################################
-            # Perform streak check for snow depth. #
-            ########################################
-
-            qc_test_name = 'streak'
-            if wdb_prev_snwd_si is not None:
-
-                # Preceding snow depth data is available, making this test
-                # possible.
-
-                # Identify the QC bit for the test.
-                ind = snwd_qc_test_names.index(qc_test_name)
-                qc_bit = snwd_qc_test_bits[ind]
-                if snwdc_qc_test_names[ind] != qc_test_name:
-                    print('ERROR: inconsistent qc_test_names data in ' +
-                          'QC database.',
-                          file=sys.stderr)
-                    qcdb.close()
-                    exit(1)
-                if snwdc_qc_test_bits[ind] != snwd_qc_test_bits[ind]:
-                    print('ERROR: inconsistent qc_test_bits data in ' +
-                          'QC database.',
-                          file=sys.stderr)
-                    qcdb.close()
-                    exit(1)
-
-                if not qcdb_snwd_qc_chkd[qcdb_si, qcdb_ti] & (1 << qc_bit):
-
-                    # Test has not been performed for this observation.
-
-                    prev_snwd_ti = num_hrs_prev_snwd - num_hrs_streak
-
-                    site_prev_snwd_val_cm = \
-                        wdb_prev_snwd_val_cm[wdb_prev_snwd_si, prev_snwd_ti:]
-
-                    site_prev_snwd_qc = \
-                        qcdb_prev_snwd_qc_flag[qcdb_si, prev_snwd_ti:]
-
-                    flag = qc_durre_snwd_streak(site_snwd_val_cm,
-                                                site_prev_snwd_val_cm,
-                                                site_prev_snwd_qc)
-
-                    if flag:
-
-                        if args.verbose:
-                            print('INFO: flagging snow depth data ' +
-                                  'for "{}" check '.format(qc_test_name) +
-                                  'at station {} '.format(site_snwd_station_id) +
-                                  '({}).'.format(site_snwd_obj_id))
-
-                        # Turn on the QC bit for this test.
-                        qcdb_snwd_qc_flag[qcdb_si, qcdb_ti] = \
-                            qcdb_snwd_qc_flag[qcdb_si, qcdb_ti] | (1 << qc_bit)
-
-                        # TODO:
-                        # Flag previous values as well?
-
-                        num_flagged_sd_streak_this_time += 1
-                        num_flagged_sd_streak += 1
-
-                    if flag is not None:
-
-                        # Turn on the QC checked bit for this test, regardless
-                        # of whether the observation was flagged.
-                        qcdb_snwd_qc_chkd[qcdb_si, qcdb_ti] = \
-                            qcdb_snwd_qc_chkd[qcdb_si, qcdb_ti] | (1 << qc_bit)
-
-                else:
-
-                    # Test has already been performed.
-                    flag_value = qcdb_snwd_qc_flag[qcdb_si, qcdb_ti] & \
-                                 (1 << qc_bit)
-                    if flag_value == 0:
-                        flag_str = 'not flagged'
-                    else:
-                        flag_str = 'flagged'
-                    if args.verbose:
-                        print('INFO: check "{}" '.format(qc_test_name) +
-                              'already done for site {} ({}) '.
-                              format(site_snwd_station_id,
-                                     site_snwd_obj_id) +
-                              'value {} ({})'.
-                              format(site_snwd_val_cm, flag_str))
-
-            #####################################
-            # Perform gap check for snow depth. #
-            #####################################
-
-            qc_test_name = 'gap'
-            if debug_this_station:
-                print('***** Debugging snwd "{}" test for value {} at {} ({}).'.
-                      format(qc_test_name,
-                             site_snwd_val_cm,
-                             site_snwd_station_id,
-                             site_snwd_obj_id))
-            if wdb_prev_snwd_si is not None:
-
-                # Preceding snow depth data is available, making this test
-                # possible.
-
-                # Identify the QC bit for the test.
-                ind = snwd_qc_test_names.index(qc_test_name)
-                qc_bit = snwd_qc_test_bits[ind]
-                if snwdc_qc_test_names[ind] != qc_test_name:
-                    print('ERROR: inconsistent qc_test_names data in ' +
-                          'QC database.',
-                          file=sys.stderr)
-                    qcdb.close()
-                    exit(1)
-                if snwdc_qc_test_bits[ind] != snwd_qc_test_bits[ind]:
-                    print('ERROR: inconsistent qc_test_bits data in ' +
-                          'QC database.',
-                          file=sys.stderr)
-                    qcdb.close()
-                    exit(1)
-
-                if not qcdb_snwd_qc_chkd[qcdb_si, qcdb_ti] & (1 << qc_bit):
-
-                    # Test has not been performed for this observation.
-
-                    prev_snwd_ti = num_hrs_prev_snwd - num_hrs_gap
-
-                    site_prev_snwd_val_cm = \
-                        wdb_prev_snwd_val_cm[wdb_prev_snwd_si, prev_snwd_ti:]
-
-                    site_prev_snwd_qc = \
-                        qcdb_prev_snwd_qc_flag[qcdb_si, prev_snwd_ti:]
-
-                    station_time_series = \
-                        np.ma.append(site_prev_snwd_val_cm, site_snwd_val_cm)
-
-                    if args.check_climatology:
-
-                        snwd_ref_ceiling_cm = (site_snwd_clim_max_mm + \
-                                               site_snwd_clim_iqr_mm) * 0.1
-
-                        snwd_ref_default_cm = site_snwd_clim_med_mm * 0.1
-
-                        ts_flag_ind, ref_obs = \
-                            qc_durre_snwd_gap(site_snwd_val_cm,
-                                              site_prev_snwd_val_cm,
-                                              site_prev_snwd_qc,
-                                              ref_ceiling_cm=
-                                              snwd_ref_ceiling_cm,
-                                              ref_default_cm=
-                                              snwd_ref_default_cm,
-                                              verbose=args.verbose)
-
-                    else:
-
-                        ts_flag_ind, ref_obs = \
-                            qc_durre_snwd_gap(site_snwd_val_cm,
-                                              site_prev_snwd_val_cm,
-                                              site_prev_snwd_qc,
-                                              verbose=args.verbose)
-
-                    if ts_flag_ind is None:
-                        print('ERROR: snow depth gap check failed ' +
-                              'for station {} '.format(site_snwd_station_id) +
-                              '({}).'.format(site_snwd_obj_id))
-                        qcdb.close()
-                        sys.exit(1)
-
-                    for ind, ts_ind in enumerate(ts_flag_ind):
-
-                        # Identify time index of observation in database.
-                        ts_ind_db = qcdb_ti - num_hrs_gap + ts_ind
-
-                        if debug_this_station:
-                            flagged_obs_datetime = \
-                                num2date(qcdb_var_time[0] + ts_ind_db,
-                                         units=qcdb_var_time_units,
-                                         only_use_cftime_datetimes=False)
-                            print('***** snow depth gap test flags {} '.
-                                  format(station_time_series[ts_ind]) +
-                                  'at {}, '.format(flagged_obs_datetime) +
-                                  'reference {}'.format(ref_obs[ind]))
-                            if ts_ind_db < 0:
-                                print('***** (does not fit in QC database)')
-                            else:
-                                print('***** (fits in QC database)')
-
-                        if ts_ind_db >= 0:
-
-                            # Observation fits in time frame of database.
-                            flagged_obs_datetime = \
-                                num2date(qcdb_var_time[0] + ts_ind_db,
-                                         units=qcdb_var_time_units,
-                                         only_use_cftime_datetimes=False)
-
-                            if args.verbose:
-                                print('INFO: flagging snow depth data ' +
-                                      'for "gap" check ' +
-                                      'at station {} '.
-                                      format(site_snwd_station_id) +
-                                      '({}), '.
-                                      format(site_snwd_obj_id) +
-                                      'value {}, '.
-                                      format(station_time_series[ts_ind]) +
-                                      'time {}.'.
-                                      format(flagged_obs_datetime))
-
-                            # Make sure the value is not flagged.
-                            if qcdb_snwd_qc_flag[qcdb_si, ts_ind_db] & \
-                               (1 << qc_bit) != 0:
-                                print('ERROR: (PROGRAMMING) ' +
-                                      'reference value was ' +
-                                      'previously flagged and should ' +
-                                      'not have been used.',
-                                      file=sys.stderr)
-                                qcdb.close()
-                                sys.exit(1)
-
-                            if debug_this_station and \
-                               ts_ind_db != qcdb_ti:
-                                print('***** this is a "previous" value:')
-                                print('***** qc_chkd = {}'.
-                                      format(qcdb_snwd_qc_chkd[qcdb_si,
-                                                               ts_ind_db] &
-                                             (1 << qc_bit)))
-                                print('***** qc_flag = {}'.
-                                      format(qcdb_snwd_qc_flag[qcdb_si,
-                                                               ts_ind_db] &
-                                             (1 << qc_bit)))
-
-                            # Turn on the QC bit for this value.
-                            qcdb_snwd_qc_flag[qcdb_si, ts_ind_db] = \
-                                qcdb_snwd_qc_flag[qcdb_si,ts_ind_db] | \
-                                (1 << qc_bit)
-
-                            # Identify the previous value as having been
-                            # through this check, even though this is
-                            # only indirectly the case. Most likely it has
-                            # already been tested, and passed, but in the
-                            # current context it is being flagged.
-                            # if debug_this_station:
-                            #     print('***** qc_checked future-before: ' +
-                            #           '{}, {}'.
-                            #           format(ts_ind_db,
-                            #                  qcdb_snwd_qc_chkd[qcdb_si,
-                            #                                    ts_ind_db] & \
-                            #                  (1 << qc_bit)))
-                            qcdb_snwd_qc_chkd[qcdb_si, ts_ind_db] = \
-                                qcdb_snwd_qc_chkd[qcdb_si, ts_ind_db] \
-                                | (1 << qc_bit)
-                            # if debug_this_station:
-                            #     print('***** qc_checked future-after: {}'.
-                            #           format(qcdb_snwd_qc_chkd[qcdb_si,
-                            #                                    ts_ind_db] & \
-                            #                  (1 << qc_bit)))
-
-                            num_flagged_sd_gap_this_time += 1
-                            num_flagged_sd_gap += 1
-
-                    # Turn on the QC checked bit for this test, regardless of
-                    # whether the observation was flagged.
-                    # if debug_this_station:
-                    #     print('***** qc_checked before: {}, {}'.
-                    #           format(qcdb_ti,
-                    #                  qcdb_snwd_qc_chkd[qcdb_si, qcdb_ti] & \
-                    #                  (1 << qc_bit)))
-                    qcdb_snwd_qc_chkd[qcdb_si, qcdb_ti] = \
-                        qcdb_snwd_qc_chkd[qcdb_si, qcdb_ti] \
-                        | (1 << qc_bit)
-                    # if debug_this_station:
-                    #     print('***** qc_checked after: {}'.
-                    #           format(qcdb_snwd_qc_chkd[qcdb_si, qcdb_ti] & \
-                    #                  (1 << qc_bit)))
-
-                else:
-
-                    # Test has already been performed.
-                    flag_value = qcdb_snwd_qc_flag[qcdb_si, qcdb_ti] \
-                             & (1 << qc_bit)
-                    if flag_value == 0:
-                        flag_str = 'not flagged'
-                    else:
-                        flag_str = 'flagged'
-                    if args.verbose:
-                        print('INFO: check "{}" '.format(qc_test_name) +
-                              'already done for site {} ({}) '.
-                              format(site_snwd_station_id,
-                                     site_snwd_obj_id) +
-                              'value {} ({})'.
-                              format(site_snwd_val_cm, flag_str))
-
-            ###############################################
-            # Perform snow-temperature consistency check. #
-            ###############################################
-
-            qc_test_name = 'temperature_consistency'
-            if (wdb_prev_snwd_si is not None) and \
-               (wdb_prev_tair_si is not None):
-
-                # Preceding snow depth data and air temperature data is
-                # available for this station, making this test possible.
-
-                # Identify the QC bit for the test.
-                ind = snwd_qc_test_names.index(qc_test_name)
-                qc_bit = snwd_qc_test_bits[ind]
-                if snwdc_qc_test_names[ind] != qc_test_name:
-                    print('ERROR: inconsistent qc_test_names data in ' +
-                          'QC database.',
-                          file=sys.stderr)
-                    qcdb.close()
-                    exit(1)
-                if snwdc_qc_test_bits[ind] != snwd_qc_test_bits[ind]:
-                    print('ERROR: inconsistent qc_test_bits data in ' +
-                          'QC database.',
-                          file=sys.stderr)
-                    qcdb.close()
-                    exit(1)
-
-                if not qcdb_snwd_qc_chkd[qcdb_si, qcdb_ti] & (1 << qc_bit):
-
-                    # Test has not been performed for this observation.
-
-                    # Note that there are four indices for locating this
-                    # station:
-                    # 1. wdb_snwd_si    = the station index in
-                    #                     wdb_snwd
-                    # 2. qcdb_si        = the station index in the QC database
-                    #                     which includes
-                    #                     qcdb_snwd_qc_chkd *
-                    #                     qcdb_snwd_qc_flag *
-                    # 3. wdb_prev_snwd_si = the station index in
-                    #                     prev_sd and wdb_prev_snwd_obj_id
-                    # 4. wdb_prev_tair_si = the station index in
-                    #                       wdb_prev_tair
-
-                    prev_snwd_ti = num_hrs_prev_snwd - num_hrs_prev_tair
-
-                    site_prev_snwd_val_cm = \
-                        wdb_prev_snwd_val_cm[wdb_prev_snwd_si, prev_snwd_ti:]
-
-                    # Programming check.
-                    if len(site_prev_snwd_val_cm) != num_hrs_prev_tair:
-                        print('ERROR: (programming) previous snow depth ' +
-                              'time index is incorrect.',
-                              file=sys.stderr)
-                        qcdb.close()
-                        exit(1)
-
-                    # Programming check on station indices in different
-                    # variables.
-                    if (qcdb_obj_id_var[qcdb_si] != site_snwd_obj_id or
-                        wdb_prev_snwd_obj_id[wdb_prev_snwd_si] != \
-                        site_snwd_obj_id):
-                        print('ERROR: (programming) object ID mismatch ' +
-                              'in "{}" check.'.format(qc_test_name),
-                              file=sys.stderr)
-                        qcdb.close()
-                        exit(1)
-
-                    site_prev_snwd_qc = \
-                        qcdb_prev_snwd_qc_flag[qcdb_si, prev_snwd_ti:]
-
-                    # Programming check.
-                    if len(site_prev_snwd_qc) != num_hrs_prev_tair:
-                        print('ERROR: (programming) previous snow depth ' +
-                              'QC time index is incorrect.',
-                              file=sys.stderr)
-                        qcdb.close()
-                        exit(1)
-
-                    site_prev_tair_val_deg_c = \
-                        wdb_prev_tair_val[wdb_prev_tair_si,:]
-
-                    # Programming check.
-                    if len(site_prev_tair_val_deg_c) != num_hrs_prev_tair + 1:
-                        print('ERROR: (programming) previous air ' +
-                              'temperature time index is incorrect.',
-                              file=sys.stderr)
-                        print(len(site_prev_tair_val_deg_c))
-                        print(num_hrs_prev_tair + 1)
-                        qcdb.close()
-                        exit(1)
-
-                    flag, ref_ind = \
-                        qc_durre_snwd_tair(site_snwd_val_cm,
-                                           site_prev_snwd_val_cm,
-                                           site_prev_snwd_qc,
-                                           site_prev_tair_val_deg_c)
-
-                    if flag:
-
-                        if args.verbose:
-                            print('INFO: flagging snow depth change ' +
-                                  '{} '.
-                                  format(site_prev_snwd_val_cm[ref_ind]) +
-                                  'to {} '.format(site_snwd_val_cm) +
-                                  'at station {} '.
-                                  format(site_snwd_station_id) +
-                                  '({}) '.format(site_snwd_obj_id) +
-                                  '("{}").'.format(qc_test_name))
-
-                        # Turn on the QC bit for this test.
-                        qcdb_snwd_qc_flag[qcdb_si, qcdb_ti] = \
-                            qcdb_snwd_qc_flag[qcdb_si, qcdb_ti] | (1 << qc_bit)
-
-                        if flag_sd_change_tair_low_value:
-
-                            # Flag previous value as well if that time fits
-                            # into the database.
-                            ref_ind_db = qcdb_ti - num_hrs_prev_tair + ref_ind
-                            if ref_ind_db >= 0:
-                                ref_datetime = \
-                                    num2date(qcdb_var_time[0] + ref_ind_db,
-                                             units=qcdb_var_time_units,
-                                             only_use_cftime_datetimes=False)
-                                if args.verbose:
-                                    print('INFO: also flagging ' +
-                                          'observation {} at {}.'.
-                                          format(site_prev_snwd_val_cm[ref_ind],
-                                                 ref_datetime))
-                                # First make sure the previous value is not
-                                # flagged.
-                                if qcdb_snwd_qc_flag[qcdb_si, ref_ind_db] & \
-                                   (1 << qc_bit) != 0:
-                                    print('ERROR: (PROGRAMMING) ' +
-                                          'reference value was ' +
-                                          'previously flagged and should ' +
-                                          'not have been used.',
-                                          file=sys.stderr)
-                                    qcdb.close()
-                                    sys.exit(1)
-                                # Flag the previous value.
-                                qcdb_snwd_qc_flag[qcdb_si, ref_ind_db] = \
-                                    qcdb_snwd_qc_flag[qcdb_si,ref_ind_db] | \
-                                    (1 << qc_bit)
-                                # Identify the previous value as having been
-                                # through this check, even though this is
-                                # only indirectly the case. Most likely it has
-                                # already been tested, and passed, but now is
-                                # associated with the later problematic report.
-                                qcdb_snwd_qc_chkd[qcdb_si, ref_ind_db] = \
-                                    qcdb_snwd_qc_chkd[qcdb_si, ref_ind_db] \
-                                    | (1 << qc_bit)
-
-                        # Increment flagged-value counters.
-                        num_flagged_sd_at_cons_this_time += 1
-                        num_flagged_sd_at_cons += 1
-
-                    if flag is not None:
-
-                        # Turn on the QC checked bit for this test, regardless
-                        # of whether the observation was flagged.
-                        qcdb_snwd_qc_chkd[qcdb_si, qcdb_ti] = \
-                            qcdb_snwd_qc_chkd[qcdb_si, qcdb_ti] | (1 << qc_bit)
-
-                else:
-
-                    # Test has already been performed.
-                    flag_value = qcdb_snwd_qc_flag[qcdb_si, qcdb_ti] & \
-                                 (1 << qc_bit)
-                    if flag_value == 0:
-                        flag_str = 'not flagged'
-                    else:
-                        flag_str = 'flagged'
-                    if args.verbose:
-                        print('INFO: check "{}" '.format(qc_test_name) +
-                              'already done for site {} ({}) '.
-                              format(site_snwd_station_id,
-                                     site_snwd_obj_id) +
-                              'value {} ({})'.
-                              format(site_snwd_val_cm, flag_str))
-
-            ##################################################
-            # Perform snowfall-snow depth consistency check. #
-            ##################################################
-
-            qc_test_name = 'snowfall_consistency'
-
-            if wdb_snfl_si is not None and \
-               wdb_prev_snwd_si is not None:
-
-                # Previous snow depth data is available, making this test
-                # possible.
-
-                # Identify the QC bit for the test.
-                ind = snwd_qc_test_names.index(qc_test_name)
-                qc_bit = snwd_qc_test_bits[ind]
-                if snwdc_qc_test_names[ind] != qc_test_name:
-                    print('ERROR: inconsistent qc_test_names data in ' +
-                          'QC database.',
-                          file=sys.stderr)
-                    qcdb.close()
-                    exit(1)
-                if snwdc_qc_test_bits[ind] != snwd_qc_test_bits[ind]:
-                    print('ERROR: inconsistent qc_test_bits data in ' +
-                          'QC database.',
-                          file=sys.stderr)
-                    qcdb.close()
-                    exit(1)
-
-                if not qcdb_snwd_qc_chkd[qcdb_si, qcdb_ti] & (1 << qc_bit):
-
-                    # Test has not been performed for this observation.
-
-                    # Indices for locating this station:
-                    # 1. wdb_snwd_si    = the station index in
-                    #                     wdb_snwd_val_cm
-                    # 2. qcdb_si        = the station index in the QC database
-                    #                     which is covered by these arrays:
-                    #                     qcdb_prev_snwd_qc_flag
-                    #                     qcdb_snwd_qc_chkd
-                    #                     qcdb_snwd_qc_flag
-                    # 3. wdb_prev_snwd_si = the station index in
-                    #                     prev_sd and wdb_prev_snwd_obj_id
-                    # 4. wdb_snfl_si    = the station index in snfl and
-                    #                     snfl_obj_id
-
-                    prev_snwd_ti = num_hrs_prev_snwd - num_hrs_snowfall
-
-                    site_prev_snwd_val_cm = \
-                        wdb_prev_snwd_val_cm[wdb_prev_snwd_si, prev_snwd_ti:]
-
-                    site_prev_snwd_qc = \
-                        qcdb_prev_snwd_qc_flag[qcdb_si, prev_snwd_ti:]
-
-                    site_snfl_val_cm = wdb_snfl_val_cm[wdb_snfl_si]
-
-                    flag, ref_ind = \
-                        qc_durre_snwd_snfl(site_snwd_val_cm,
-                                           site_prev_snwd_val_cm,
-                                           site_prev_snwd_qc,
-                                           site_snfl_val_cm)
-
-                    if flag:
- 
-                        # print('***** station: {} ({})'.
-                        #       format(site_snwd_station_id, site_snwd_obj_id))
-                        # print('***** prev snwd: {}'.format(site_prev_snwd_val_cm))
-                        # print('***** snwd: {}'.format(site_snwd_val_cm))
-                        # print('***** snfl: {}'.format(site_snfl_val_cm))
-                        # print('***** diff: {}'.format(site_snwd_val_cm - site_prev_snwd_val_cm[ref_ind]))
-                        # print('***** inconsistency: {}'.
-                        #       format(site_snwd_val_cm -
-                        #              site_prev_snwd_val_cm[ref_ind] -
-                        #              site_snfl_val_cm))
-                        # print('***** flag: {} {}'.format(flag, ref_ind))
-                        # xxx = input()
-
-                        if args.verbose:
-                            print('INFO: flagging snow depth change ' +
-                                  '{} '.
-                                  format(site_prev_snwd_val_cm[ref_ind]) +
-                                  'to {} '.format(site_snwd_val_cm) +
-                                  'at station {} '.
-                                  format(site_snwd_station_id) +
-                                  '({}) '.format(site_snwd_obj_id) +
-                                  '("{}").'.format(qc_test_name))
-
-                        # Turn on the QC bit for this test.
-                        qcdb_snwd_qc_flag[qcdb_si, qcdb_ti] = \
-                            qcdb_snwd_qc_flag[qcdb_si, qcdb_ti] | (1 << qc_bit)
-
-                        if flag_sd_change_snfl_low_value:
-
-                            # Flag previous value as well if that time fits
-                            # into the database.
-                            ref_ind_db = qcdb_ti - num_hrs_prev_tair + ref_ind
-                            if ref_ind_db >= 0:
-                                ref_datetime = \
-                                    num2date(qcdb_var_time[0] + ref_ind_db,
-                                             units=qcdb_var_time_units,
-                                             only_use_cftime_datetimes=False)
-                                if args.verbose:
-                                    print('INFO: also flagging ' +
-                                          'observation {} at {}.'.
-                                          format(site_prev_snwd_val_cm[ref_ind],
-                                                 ref_datetime))
-                                # First make sure the previous value is not
-                                # flagged.
-                                if qcdb_snwd_qc_flag[qcdb_si, ref_ind_db] & \
-                                   (1 << qc_bit) != 0:
-                                    print('ERROR: (PROGRAMMING) ' +
-                                          'reference value was ' +
-                                          'previously flagged and should ' +
-                                          'not have been used.',
-                                          file=sys.stderr)
-                                    qcdb.close()
-                                    sys.exit(1)
-                                # Flag the previous value.
-                                qcdb_snwd_qc_flag[qcdb_si, ref_ind_db] = \
-                                    qcdb_snwd_qc_flag[qcdb_si,ref_ind_db] | \
-                                    (1 << qc_bit)
-                                # Identify the previous value as having been
-                                # through this check, even though this is
-                                # only indirectly the case. Most likely it has
-                                # already been tested, and passed, but now is
-                                # associated with the later problematic report.
-                                qcdb_snwd_qc_chkd[qcdb_si, ref_ind_db] = \
-                                    qcdb_snwd_qc_chkd[qcdb_si, ref_ind_db] \
-                                    | (1 << qc_bit)
-
-                        num_flagged_sd_sf_cons_this_time += 1
-                        num_flagged_sd_sf_cons += 1
-
-                    if flag is not None:
-
-                        # Turn on the QC checked bit for this test, regardless
-                        # of whether the observation was flagged.
-                        qcdb_snwd_qc_chkd[qcdb_si, qcdb_ti] = \
-                            qcdb_snwd_qc_chkd[qcdb_si, qcdb_ti] | (1 << qc_bit)
-
-                else:
-
-                    # Test has already been performed.
-                    flag_value = qcdb_snwd_qc_flag[qcdb_si, qcdb_ti] & \
-                                 (1 << qc_bit)
-                    if flag_value == 0:
-                        flag_str = 'not flagged'
-                    else:
-                        flag_str = 'flagged'
-                    if args.verbose:
-                        print('INFO: check "{}" '.format(qc_test_name) +
-                              'already done for site {} ({}) '.
-                              format(site_snwd_station_id,
-                                     site_snwd_obj_id) +
-                              'value {} ({})'.
-                              format(site_snwd_val_cm, flag_str))
-
-            #######################################################
-            # Perform precipitation-snow depth consistency check. #
-            #######################################################
-
-            # This is an adaptation of the test described in Durre (2010)
-            # Table 3 (internal and temporal consistency checks) as
-            # "SNWD increase with 0 PRCP".
-
-            qc_test_name = 'precip_consistency'
-
-            if wdb_snwd_prcp_si is not None and \
-               wdb_prev_snwd_si is not None:
-
-                # Previous snow depth data is available, making this test
-                # possible.
-
-                # Identify the QC bit for the test.
-                ind = snwd_qc_test_names.index(qc_test_name)
-                qc_bit = snwd_qc_test_bits[ind]
-                if snwdc_qc_test_names[ind] != qc_test_name:
-                    print('ERROR: inconsistent qc_test_names data in ' +
-                          'QC database.',
-                          file=sys.stderr)
-                    qcdb.close()
-                    exit(1)
-                if snwdc_qc_test_bits[ind] != snwd_qc_test_bits[ind]:
-                    print('ERROR: inconsistent qc_test_bits data in ' +
-                          'QC database.',
-                          file=sys.stderr)
-                    qcdb.close()
-                    exit(1)
-
-                if not qcdb_snwd_qc_chkd[qcdb_si, qcdb_ti] & (1 << qc_bit):
-
-                    # Test has not been performed for this observation.
-
-                    # Indices for locating this station:
-                    # 1. wdb_snwd_si      = the station index in
-                    #                       wdb_snwd_val_cm
-                    # 2. qcdb_si          = the station index in the QC
-                    #                       database which is covered by these
-                    #                       arrays:
-                    #                       qcdb_prev_snwd_qc_flag
-                    #                       qcdb_snwd_qc_chkd
-                    #                       qcdb_snwd_qc_flag
-                    # 3. wdb_prev_snwd_si = the station index in
-                    #                       prev_sd and wdb_prev_snwd_obj_id
-                    # 4. wdb_snwd_prcp_si = the station index in
-                    #                       wdb_snwd_prcp_val_mm
-
-                    prev_snwd_ti = num_hrs_prev_snwd - num_hrs_prcp
-
-                    site_prev_snwd_val_cm = \
-                        wdb_prev_snwd_val_cm[wdb_prev_snwd_si, prev_snwd_ti:]
-
-                    site_prev_snwd_qc = \
-                        qcdb_prev_snwd_qc_flag[qcdb_si, prev_snwd_ti:]
-
-                    site_prcp_val_mm = wdb_snwd_prcp_val_mm[wdb_snwd_prcp_si]
-                    if not np.isscalar(site_prcp_val_mm):
-                        print('---')
-                        print(type(wdb_snwd_prcp_val_mm))
-                        print(type(site_prcp_val_mm))
-                        print(type(wdb_snwd_prcp_si))
-                        qcdb.close()
-                        sys.exit(1)
-
-                    flag, ref_ind = \
-                        qc_durre_snwd_prcp(site_snwd_val_cm,
-                                           site_prev_snwd_val_cm,
-                                           site_prev_snwd_qc,
-                                           site_prcp_val_mm)
-
-                    if flag:
-
-                        if args.verbose:
-                            print('INFO: flagging snow depth change ' +
-                                  '{} '.
-                                  format(site_prev_snwd_val_cm[ref_ind]) +
-                                  'to {} '.format(site_snwd_val_cm) +
-                                  'at station {} '.
-                                  format(site_snwd_station_id) +
-                                  '({}) '.format(site_snwd_obj_id) +
-                                  '("{}").'.format(qc_test_name))
-
-                        # Turn on the QC bit for this test.
-                        qcdb_snwd_qc_flag[qcdb_si, qcdb_ti] = \
-                            qcdb_snwd_qc_flag[qcdb_si, qcdb_ti] | (1 << qc_bit)
-
-                        if flag_sd_change_prcp_low_value:
-
-                            # Flag previous value as well if that time fits
-                            # into the database.
-                            ref_ind_db = qcdb_ti - num_hrs_prev_snwd + ref_ind
-                            if ref_ind_db >= 0:
-                                ref_datetime = \
-                                    num2date(qcdb_var_time[0] + ref_ind_db,
-                                             units=qcdb_var_time_units,
-                                             only_use_cftime_datetimes=False)
-                                if args.verbose:
-                                    print('INFO: also flagging ' +
-                                          'observation {} at {}.'.
-                                          format(site_prev_snwd_val_cm[ref_ind],
-                                                 ref_datetime))
-                                # First make sure the previous value is not
-                                # flagged.
-                                if qcdb_snwd_qc_flag[qcdb_si, ref_ind_db] & \
-                                   (1 << qc_bit) != 0:
-                                    print('ERROR: (PROGRAMMING) ' +
-                                          'reference value was ' +
-                                          'previously flagged and should ' +
-                                          'not have been used.',
-                                          file=sys.stderr)
-                                    qcdb.close()
-                                    sys.exit(1)
-                                # Flag the previous value.
-                                qcdb_snwd_qc_flag[qcdb_si, ref_ind_db] = \
-                                    qcdb_snwd_qc_flag[qcdb_si,ref_ind_db] | \
-                                    (1 << qc_bit)
-                                # Identify the previous value as having been
-                                # through this check, even though this is
-                                # only indirectly the case. Most likely it has
-                                # already been tested, and passed, but now is
-                                # associated with the later problematic report.
-                                qcdb_snwd_qc_chkd[qcdb_si, ref_ind_db] = \
-                                    qcdb_snwd_qc_chkd[qcdb_si, ref_ind_db] \
-                                    | (1 << qc_bit)
-
-                        num_flagged_sd_pr_cons_this_time += 1
-                        num_flagged_sd_pr_cons += 1
-
-                    if flag is not None:
-
-                        # Turn on the QC checked bit for this test, regardless
-                        # of whether the observation was flagged.
-                        qcdb_snwd_qc_chkd[qcdb_si, qcdb_ti] = \
-                            qcdb_snwd_qc_chkd[qcdb_si, qcdb_ti] | (1 << qc_bit)
-
-                else:
-
-                    # Test has already been performed.
-                    flag_value = qcdb_snwd_qc_flag[qcdb_si, qcdb_ti] & \
-                                 (1 << qc_bit)
-                    if flag_value == 0:
-                        flag_str = 'not flagged'
-                    else:
-                        flag_str = 'flagged'
-                    if args.verbose:
-                        print('INFO: check "{}" '.format(qc_test_name) +
-                              'already done for site {} ({}) '.
-                              format(site_snwd_station_id,
-                                     site_snwd_obj_id) +
-                              'value {} ({})'.
-                              format(site_snwd_val_cm, flag_str))
-
-            #############################################################
-            # Perform precipitation-snow depth ratio consistency check. #
-            #############################################################
-
-            # This is an adaptation of the test described in Durre (2010)
-            # Table 3 (internal and temporal consistency checks) as
-            # "SNWD/PRCP ratio".
-
-            qc_test_name = 'precip_ratio'
-
-            if wdb_snwd_prcp_si is not None and \
-               wdb_prev_snwd_si is not None:
+        # Locate all snow depth reporting stations in the QC database and in
+        # the data needed for performing QC tests.
+        qcdb_si_all = qcdb_index.lookup(wdb_snwd_obj_id)
+        if np.any(qcdb_si_all < 0):
+            # New stations were added above.
+            print('ERROR: (programming) station object ID(s) ' +
+                  '{} not found in QC database.'.
+                  format(np.asarray(wdb_snwd_obj_id)[qcdb_si_all < 0]),
+                  file=sys.stderr)
+            qcdb.close()
+            exit(1)
+        wdb_prev_snwd_si_all = wdb_hour['snwd_si']['prev_snwd']
+        wdb_prev_tair_si_all = wdb_hour['snwd_si']['prev_tair']
+        wdb_snfl_si_all = wdb_hour['snwd_si']['snfl']
+        wdb_snwd_prcp_si_all = wdb_hour['snwd_si']['snwd_prcp']
 
-                # Previous snow depth data is available, making this test
-                # possible.
+        if args.check_climatology:
+            snwd_ref_ceiling_cm = (wdb_snwd_clim_max_mm +
+                                   wdb_snwd_clim_iqr_mm) * 0.1
+            snwd_ref_default_cm = wdb_snwd_clim_med_mm * 0.1
+        else:
+            snwd_ref_ceiling_cm = None
+            snwd_ref_default_cm = None
+
+        # Inputs for snow depth QC tests, with rows aligned with
+        # wdb_snwd_val_cm, and where they are available. Rows are fully
+        # masked for stations lacking data.
+        snwd_qc_builders = {
+            'value': lambda: (wdb_snwd_val_cm, None),
+            'prev': lambda: (qc_durre_batch.take_rows(wdb_prev_snwd_val_cm,
+                                                      wdb_prev_snwd_si_all),
+                             wdb_prev_snwd_si_all >= 0),
+            'prev_qc': lambda: (qc_durre_batch.take_rows(
+                                    qcdb_prev_snwd_qc_flag, qcdb_si_all),
+                                None),
+            'tair': lambda: (qc_durre_batch.take_rows(wdb_prev_tair_val,
+                                                      wdb_prev_tair_si_all),
+                             wdb_prev_tair_si_all >= 0),
+            'nhood_tair': lambda: neighborhood_values(wdb_prev_tair_val,
+                                                      nhood_ind,
+                                                      min_tair_neighbors),
+            'snfl': lambda: (qc_durre_batch.take_rows(wdb_snfl_val_cm,
+                                                      wdb_snfl_si_all),
+                             wdb_snfl_si_all >= 0),
+            'prcp': lambda: (qc_durre_batch.take_rows(wdb_snwd_prcp_val_mm,
+                                                      wdb_snwd_prcp_si_all),
+                             wdb_snwd_prcp_si_all >= 0),
+            'ref_ceiling': lambda: (snwd_ref_ceiling_cm, None),
+            'ref_default': lambda: (snwd_ref_default_cm, None)}
 
-                # Identify the QC bit for the test.
-                try:
-                    ind = snwd_qc_test_names.index(qc_test_name)
-                except ValueError:
-                    # Try backward compatible option "depth_precip_ratio".
-                    qc_test_name = 'depth_precip_ratio'
-                    ind = snwd_qc_test_names.index(qc_test_name)
-
-                qc_bit = snwd_qc_test_bits[ind]
-                if snwdc_qc_test_names[ind] != qc_test_name:
-                    print('ERROR: inconsistent qc_test_names data in ' +
-                          'QC database.',
-                          file=sys.stderr)
-                    qcdb.close()
-                    exit(1)
-                if snwdc_qc_test_bits[ind] != snwd_qc_test_bits[ind]:
-                    print('ERROR: inconsistent qc_test_bits data in ' +
-                          'QC database.',
-                          file=sys.stderr)
-                    qcdb.close()
-                    exit(1)
-
-                if not qcdb_snwd_qc_chkd[qcdb_si, qcdb_ti] & (1 << qc_bit):
-
-                    # Test has not been performed for this observation.
-
-                    # Indices for locating this station:
-                    # 1. wdb_snwd_si    = the station index in
-                    #                     wdb_snwd_val_cm
-                    # 2. qcdb_si        = the station index in the QC database
-                    #                     which is covered by these arrays:
-                    #                     qcdb_prev_snwd_qc_flag
-                    #                     qcdb_snwd_qc_chkd
-                    #                     qcdb_snwd_qc_flag
-                    # 3. wdb_prev_snwd_si = the station index in
-                    #                     prev_sd and wdb_prev_snwd_obj_id
-                    # 4. wdb_snwd_prcp_si    = the station index in wdb_snwd_prcp_val_mm
-
-                    prev_snwd_ti = num_hrs_prev_snwd - num_hrs_prcp
-
-                    site_prev_snwd_val_cm = \
-                        wdb_prev_snwd_val_cm[wdb_prev_snwd_si, prev_snwd_ti:]
-
-                    site_prev_snwd_qc = \
-                        qcdb_prev_snwd_qc_flag[qcdb_si, prev_snwd_ti:]
-
-                    site_prcp_val_mm = wdb_snwd_prcp_val_mm[wdb_snwd_prcp_si]
-
-                    flag, ref_ind = \
-                        qc_durre_snwd_prcp_ratio(site_snwd_val_cm,
-                                                 site_prev_snwd_val_cm,
-                                                 site_prev_snwd_qc,
-                                                 site_prcp_val_mm)
-
-                    if flag:
- 
-                        if args.verbose:
-                            print('INFO: flagging snow depth change ' +
-                                  '{} '.
-                                  format(site_prev_snwd_val_cm[ref_ind]) +
-                                  'to {} '.format(site_snwd_val_cm) +
-                                  'at station {} '.
-                                  format(site_snwd_station_id) +
-                                  '({}) '.format(site_snwd_obj_id) +
-                                  '("{}").'.format(qc_test_name))
-
-                        # Turn on the QC bit for this test.
-                        qcdb_snwd_qc_flag[qcdb_si, qcdb_ti] = \
-                            qcdb_snwd_qc_flag[qcdb_si, qcdb_ti] | (1 << qc_bit)
-
-                        if flag_sd_change_prcp_low_value:
-
-                            # Flag previous value as well if that time fits
-                            # into the database.
-                            ref_ind_db = qcdb_ti - num_hrs_prev_snwd + ref_ind
-                            if ref_ind_db >= 0:
-                                ref_datetime = \
-                                    num2date(qcdb_var_time[0] + ref_ind_db,
-                                             units=qcdb_var_time_units,
-                                             only_use_cftime_datetimes=False)
-                                if args.verbose:
-                                    print('INFO: also flagging ' +
-                                          'observation {} at {}.'.
-                                          format(site_prev_snwd_val_cm[ref_ind],
-                                                 ref_datetime))
-                                # First make sure the previous value is not
-                                # flagged.
-                                if qcdb_snwd_qc_flag[qcdb_si, ref_ind_db] & \
-                                   (1 << qc_bit) != 0:
-                                    print('ERROR: (PROGRAMMING) ' +
-                                          'reference value was ' +
-                                          'previously flagged and should ' +
-                                          'not have been used.',
-                                          file=sys.stderr)
-                                    qcdb.close()
-                                    sys.exit(1)
-                                # Flag the previous value.
-                                qcdb_snwd_qc_flag[qcdb_si, ref_ind_db] = \
-                                    qcdb_snwd_qc_flag[qcdb_si,ref_ind_db] | \
-                                    (1 << qc_bit)
-                                # Identify the previous value as having been
-                                # through this check, even though this is
-                                # only indirectly the case. Most likely it has
-                                # already been tested, and passed, but now is
-                                # associated with the later problematic report.
-                                qcdb_snwd_qc_chkd[qcdb_si, ref_ind_db] = \
-                                    qcdb_snwd_qc_chkd[qcdb_si, ref_ind_db] \
-                                    | (1 << qc_bit)
-
-                        num_flagged_sd_pr_cons_this_time += 1
-                        num_flagged_sd_pr_cons += 1
-
-                    if flag is not None:
-
-                        # Turn on the QC checked bit for this test, regardless
-                        # of whether the observation was flagged.
-                        qcdb_snwd_qc_chkd[qcdb_si, qcdb_ti] = \
-                            qcdb_snwd_qc_chkd[qcdb_si, qcdb_ti] | (1 << qc_bit)
-
-                else:
-
-                    # Test has already been performed.
-                    flag_value = qcdb_snwd_qc_flag[qcdb_si, qcdb_ti] & \
-                                 (1 << qc_bit)
-                    if flag_value == 0:
-                        flag_str = 'not flagged'
-                    else:
-                        flag_str = 'flagged'
-                    if args.verbose:
-                        print('INFO: check "{}" '.format(qc_test_name) +
-                              'already done for site {} ({}) '.
-                              format(site_snwd_station_id,
-                                     site_snwd_obj_id) +
-                              'value {} ({})'.
-                              format(site_snwd_val_cm, flag_str))
-
-            #######################################################
-            # Perform spatial snow-temperature consistency check. #
-            #######################################################
-
-            qc_test_name = 'spatial_temperature_consistency'
-
-            num_prev_tair_neighbors = len(nhood_ind[wdb_snwd_si])
-
-            if wdb_prev_snwd_si is not None and \
-               num_prev_tair_neighbors >= min_tair_neighbors:
-
-                # Previous snow depth data and neighborhood air temperature
-                # data are available.
-                # Identify the QC bit for the test.
-                ind = snwd_qc_test_names.index(qc_test_name)
-                qc_bit = snwd_qc_test_bits[ind]
-                if snwdc_qc_test_names[ind] != qc_test_name:
-                    print('ERROR: inconsistent qc_test_names data in ' +
-                          'QC database.',
-                          file=sys.stderr)
-                    qcdb.close()
-                    exit(1)
-                if snwdc_qc_test_bits[ind] != snwd_qc_test_bits[ind]:
-                    print('ERROR: inconsistent qc_test_bits data in ' +
-                          'QC database.',
-                          file=sys.stderr)
-                    qcdb.close()
-                    exit(1)
-
-                if not qcdb_snwd_qc_chkd[qcdb_si, qcdb_ti] & (1 << qc_bit):
-
-                    # Test has not been performed for this observation.
-
-                    # Indices for locating this station:
-                    # 1. wdb_snwd_si    = the station index in
-                    #                     wdb_snwd_val_cm
-                    # 2. qcdb_si        = the station index in the QC database
-                    #                     which is covered by these arrays:
-                    #                     qcdb_prev_snwd_qc_flag
-                    #                     qcdb_snwd_qc_chkd
-                    #                     qcdb_snwd_qc_flag
-                    # 3. wdb_prev_snwd_si = the station index in
-                    #                       prev_sd and wdb_prev_snwd_obj_id
-                    # 4. wdb_prev_tair_si = the station index in
-                    #                       wdb_prev_tair
-   
-                    prev_snwd_ti = num_hrs_prev_snwd - num_hrs_prev_tair
-
-                    site_prev_snwd_val_cm = \
-                        wdb_prev_snwd_val_cm[wdb_prev_snwd_si, prev_snwd_ti:]
-
-                    site_prev_snwd_qc = \
-                        qcdb_prev_snwd_qc_flag[qcdb_si, prev_snwd_ti:]
-
-                    # Find the minimum neighborhood air temperature from the
-                    # current + preceding num_hrs_prev_tair hours.
-                    #nhood_tair_min = []
-                    nhood_tair_deg_c = np.ma.empty([num_prev_tair_neighbors,
-                                                    num_hrs_prev_tair + 1])
-                    for nc in range(0, num_prev_tair_neighbors):
-                        ind2 = nhood_ind[wdb_snwd_si][nc]
-                        nhood_tair_deg_c[nc,:] = wdb_prev_tair_val[ind2,:]
-
-                    flag, ref_ind = \
-                        qc_durre_snwd_tair_spatial(site_snwd_val_cm,
-                                                   site_prev_snwd_val_cm,
-                                                   site_prev_snwd_qc,
-                                                   nhood_tair_deg_c)
-
-                    if flag:
-
-                        if args.verbose:
-                            print('INFO: flagging snow depth change ' +
-                                  '{} '.format(site_prev_snwd_val_cm[ref_ind]) +
-                                  'to {} '.format(site_snwd_val_cm) +
-                                  'at station {} '.
-                                  format(site_snwd_station_id) +
-                                  '({}) '.format(site_snwd_obj_id) +
-                                  '("{}").'.format(qc_test_name))
-
-                        # Turn on the QC bit for this test.
-                        qcdb_snwd_qc_flag[qcdb_si, qcdb_ti] = \
-                            qcdb_snwd_qc_flag[qcdb_si, qcdb_ti] | (1 << qc_bit)
-
-                        if flag_sd_change_tair_low_value:
-
-                            # Flag previous value as well if that time fits
-                            # into the database.
-                            ref_ind_db = qcdb_ti - num_hrs_prev_tair + ref_ind
-                            if ref_ind_db >= 0:
-                                ref_datetime = \
-                                    num2date(qcdb_var_time[0] + ref_ind_db,
-                                             units=qcdb_var_time_units,
-                                             only_use_cftime_datetimes=False)
-                                if args.verbose:
-                                    print('INFO: also flagging ' +
-                                          'observation {} at {}.'.
-                                          format(site_prev_snwd_val_cm[ref_ind],
-                                                 ref_datetime))
-                                # First make sure the previous value is not
-                                # flagged.
-                                if qcdb_snwd_qc_flag[qcdb_si, ref_ind_db] & \
-                                   (1 << qc_bit) != 0:
-                                    print('ERROR: (PROGRAMMING) ' +
-                                          'reference value was ' +
-                                          'previously flagged and should ' +
-                                          'not have been used.',
-                                          file=sys.stderr)
-                                    qcdb.close()
-                                    sys.exit(1)
-                                # Flag the previous value.
-                                qcdb_snwd_qc_flag[qcdb_si, ref_ind_db] = \
-                                    qcdb_snwd_qc_flag[qcdb_si,ref_ind_db] | \
-                                    (1 << qc_bit)
-                                # Identify the previous value as having been
-                                # through this check, even though this is
-                                # only indirectly the case. Most likely it has
-                                # already been tested, and passed, but now is
-                                # associated with the later problematic report.
-                                qcdb_snwd_qc_chkd[qcdb_si, ref_ind_db] = \
-                                    qcdb_snwd_qc_chkd[qcdb_si, ref_ind_db] \
-                                    | (1 << qc_bit)
-
-                        num_flagged_sd_at_spatial_cons_this_time += 1
-                        num_flagged_sd_at_spatial_cons += 1
-
-                    if flag is not None:
-
-                        # Turn on the QC checked bit for this test, regardless
-                        # of whether the observation was flagged.
-                        qcdb_snwd_qc_chkd[qcdb_si, qcdb_ti] = \
-                            qcdb_snwd_qc_chkd[qcdb_si, qcdb_ti] | (1 << qc_bit)
-
-                else:
-
-                    # Test has already been performed.
-                    flag_value = qcdb_snwd_qc_flag[qcdb_si, qcdb_ti] & \
-                                 (1 << qc_bit)
-                    if flag_value == 0:
-                        flag_str = 'not flagged'
-                    else:
-                        flag_str = 'flagged'
-                    if args.verbose:
-                        print('INFO: check "{}" '.format(qc_test_name) +
-                              'already done for site {} ({}) '.
-                              format(site_snwd_station_id,
-                                     site_snwd_obj_id) +
-                              'value {} ({})'.
-                              format(site_snwd_val_cm, flag_str))
+        if args.verbose:
+            print('Performing snow depth QC for {}'.format(obs_datetime))
 
+        snwd_qc_in, snwd_qc_available = \
+            snwd_qc_pipeline.gather(snwd_qc_builders)
+        num_flagged_snwd_this_time = \
+            snwd_qc_pipeline.run(snwd_qc_in,
+                                 snwd_qc_available,
+                                 qcdb_si_all,
+                                 qcdb_ti,
+                                 snwd_qc_bit,
+                                 qcdb_snwd_qc_flag,
+                                 qcdb_snwd_qc_chkd,
+                                 station_id=wdb_snwd_station_id,
+                                 values=wdb_snwd_val_cm,
+                                 verbose=args.verbose,
+                                 pool=qc_workers)
+        if num_flagged_snwd_this_time is None:
+            qcdb.close()
+            sys.exit(1)
+        for counter, num_flagged in num_flagged_snwd_this_time.items():
+            num_flagged_snwd[counter] += num_flagged
+
+        if debug_station_id is not None:
+            for wdb_snwd_si in \
+                np.flatnonzero(np.asarray(wdb_snwd_station_id) ==
+                               debug_station_id):
+                qcdb_si = qcdb_si_all[wdb_snwd_si]
+                print('***** snow depth {} at {} ({}): '.
+                      format(wdb_snwd_val_cm[wdb_snwd_si],
+                             wdb_snwd_station_id[wdb_snwd_si],
+                             wdb_snwd_obj_id[wdb_snwd_si]) +
+                      'QC flag {}, QC checked {}.'.
+                      format(qcdb_snwd_qc_flag[qcdb_si, qcdb_ti],
+                             qcdb_snwd_qc_chkd[qcdb_si, qcdb_ti]))
 
         #####################
         # SNOW DEPTH QC END #
@@ -3516,86 +1592,51 @@ def main():
         ########################################
 
 
-        # Get snow depth and other observations used for snow depth QC.
-
-
         # Get all SWE data for this datetime.
-        t1 = dt.datetime.utcnow()
-        wdb_swe = wdb0.get_swe_obs(obs_datetime,
-                                   obs_datetime,
-                                   scratch_dir=args.pkl_dir,
-                                   verbose=args.verbose)
-        t2 = dt.datetime.utcnow()
-        elapsed_time = t2 - t1
+        wdb_swe = wdb_hour['swe']
         if args.verbose:
             print('INFO: found {} SWE reports.'.
                   format(wdb_swe['num_stations']))
-            print('INFO: query ran in {} seconds.'.
-                  format(elapsed_time.total_seconds()))
 
-        # Previous SWE data is needed for multiple tests.
-        # - World record increase exceedance check uses 24 hours.
-        # - Streak check uses 15 days.
-        # - Gap check uses 15 days.
-        # - Precipitation consistency checks use 24 hours.
-        num_hrs_prev_swe = max(num_hrs_wre,
-                               num_hrs_streak,
-                               num_hrs_gap,
-                               # num_hrs_prev_tair,
-                               # num_hrs_snowfall,
-                               num_hrs_prcp)
+        # Add any new stations reporting SWE to the QC database.
+        num_new = add_new_stations(qcdb,
+                                   wdb_swe['station_obj_id'],
+                                   qcdb_index,
+                                   qcdb_station_vars,
+                                   wdb_col_list,
+                                   [qcdb_snwd_qc_chkd,
+                                    qcdb_snwd_qc_flag,
+                                    qcdb_swe_qc_chkd,
+                                    qcdb_swe_qc_flag],
+                                   verbose=(args.verbose and
+                                            qcdb_num_stations_start > 0))
+        if num_new > 0:
+            qcdb_num_stations += num_new
+            num_stations_added += num_new
+            num_stations_added_this_time += num_new
+            if qcdb_num_stations_start and args.verbose:
+                print('INFO: QC database now includes {} stations.'.
+                      format(qcdb_num_stations))
 
         if args.check_climatology:
 
-            # Get SNODAS SWE climatology data for the current time.
-            wdb_swe_clim_med_mm = \
-                snodas_clim.at_loc(swe_clim_dir,
-                                   obs_datetime,
-                                   wdb_swe['station_lon'],
-                                   wdb_swe['station_lat'],
-                                   element='swe',
-                                   metric='median',
-                                   sampling='neighbor')
-            wdb_swe_clim_max_mm = \
-                snodas_clim.at_loc(swe_clim_dir,
-                                   obs_datetime,
-                                   wdb_swe['station_lon'],
-                                   wdb_swe['station_lat'],
-                                   element='swe',
-                                   metric='max',
-                                   sampling='neighbor')
-            wdb_swe_clim_iqr_mm = \
-                snodas_clim.at_loc(swe_clim_dir,
-                                   obs_datetime,
-                                   wdb_swe['station_lon'],
-                                   wdb_swe['station_lat'],
-                                   element='swe',
-                                   metric='iqr',
-                                   sampling='neighbor')
+            # SNODAS SWE climatology data for the current time.
+            wdb_swe_clim_med_mm = wdb_hour['swe_clim']['median']
+            wdb_swe_clim_max_mm = wdb_hour['swe_clim']['max']
+            wdb_swe_clim_iqr_mm = wdb_hour['swe_clim']['iqr']
 
 
         # Get previous num_hrs_prev_swe hours of swe data.
-        t1 = dt.datetime.utcnow()
-        wdb_prev_swe = \
-            wdb0.get_prev_swe_obs(obs_datetime,		
-                                  num_hrs_prev_swe,
-                                  scratch_dir=args.pkl_dir,
-                                  verbose=args.verbose)
-        t2 = dt.datetime.utcnow()
-        elapsed_time = t2 - t1
-
+        wdb_prev_swe = wdb_hour['prev_swe']
         if args.verbose:
             print('INFO: found {} '.
                   format(wdb_prev_swe['values_mm'].count()) +
                   'preceding swe reports ' +
                   'from {} stations.'.format(wdb_prev_swe['num_stations']))
-            print('INFO: query ran in {} seconds.'.
-                  format(elapsed_time.total_seconds()))
 
-        # Extract previous swe values and station object identifiers,
-        # for convenience (shorter variable names).
+        # Extract previous swe values, for convenience (shorter variable
+        # names).
         wdb_prev_swe_val_mm = wdb_prev_swe['values_mm']
-        wdb_prev_swe_obj_id = wdb_prev_swe['station_obj_id']
 
         # Get previous num_hrs_prev_swe hours of swe QC data.
         t1 = obs_datetime - dt.timedelta(hours=num_hrs_prev_swe)
@@ -3641,1025 +1682,90 @@ def main():
 
 
         # Get precipitation data associated with SWE observations.
-        t1 = dt.datetime.utcnow()
-        wdb_swe_prcp = \
-            wdb0.get_swe_prcp_obs(obs_datetime,
-                                  num_hrs_prcp,
-                                  scratch_dir=args.pkl_dir,
-                                  verbose=args.verbose)
-        t2 = dt.datetime.utcnow()
-        elapsed_time = t2 - t1
+        wdb_swe_prcp = wdb_hour['swe_prcp']
         if args.verbose:
             print('INFO: found {} precipitation reports.'.
                   format(wdb_swe_prcp['num_stations']))
-            print('INFO: query ran in {} seconds.'.
-                  format(elapsed_time.total_seconds()))
 
-        # Extract precipitation values and station object identifiers, for
-        # convenience (shorter variable names).
+        # Extract precipitation values, for convenience (shorter variable
+        # names).
         wdb_swe_prcp_val_mm = wdb_swe_prcp['values_mm']
-        wdb_swe_prcp_obj_id = wdb_swe_prcp['station_obj_id']
-
-        # Initialize counters for the current time.
-        # num_stations_added_this_time = 0
-        num_flagged_swe_wr_this_time = 0
-        num_flagged_swe_change_wr_this_time = 0
-        num_flagged_swe_streak_this_time = 0
-        num_flagged_swe_gap_this_time = 0
-        num_flagged_swe_pr_cons_this_time = 0
 
         # Rename wdb_swe values for convenience.
         wdb_swe_obj_id = wdb_swe['station_obj_id']
         wdb_swe_station_id = wdb_swe['station_id']
         wdb_swe_val_mm = wdb_swe['values_mm'][:,0]
 
-        if args.verbose:
-            print('Performing SWE QC for {}'.format(obs_datetime))
-
-        ####################################################
-        # Loop over all reports for the current date/time. #
-        ####################################################
-
-        for wdb_swe_si in range(0, wdb_swe['num_stations']):
-
-            # Extract values of wdb_swe values for this station.
-            site_swe_obj_id = wdb_swe_obj_id[wdb_swe_si]
-            site_swe_station_id = wdb_swe_station_id[wdb_swe_si]
-            site_swe_val_mm = wdb_swe_val_mm[wdb_swe_si]
-
-            if args.check_climatology:
-                site_swe_clim_med_mm = wdb_swe_clim_med_mm[wdb_swe_si]
-                site_swe_clim_max_mm = wdb_swe_clim_max_mm[wdb_swe_si]
-                site_swe_clim_iqr_mm = wdb_swe_clim_iqr_mm[wdb_swe_si]
-
-            # Locate station index in QC database.
-            qcdb_si = np.where(qcdb_obj_id_var[:] == site_swe_obj_id)
-
-            debug_this_station = False
-            if debug_station_id is not None and \
-               site_swe_station_id == debug_station_id:
-                debug_this_station = True
-
-            if len(qcdb_si[0]) == 0:
-
-                # New station - get its metadata.
-
-                # Open the web database.
-                conn_string = "host='wdb0.dmz.nohrsc.noaa.gov' " + \
-                              "dbname='web_data'"
-                conn = psycopg2.connect(conn_string)
-                conn.set_client_encoding("utf-8")
-                cursor = conn.cursor()
-
-                # Read metadata for the current station.
-                sql_cmd = "SELECT " + wdb_col_list_str + " " + \
-                          "FROM point.allstation " + \
-                          "WHERE obj_identifier = {};". \
-                          format(site_swe_obj_id)
-                cursor.execute(sql_cmd)
-                wdb_station_meta = cursor.fetchall()
-                cursor.close()
-                conn.close()
-                if len(wdb_station_meta) != 1:
-                    print('ERROR: found {} matches in SQL statement ' +
-                          'for station object ID {}; expecting 1.'.
-                          format(len(wdb_station_meta), site_swe_obj_id),
-                          file=sys.stderr)
-                    qcdb.close()
-                    exit(1)
-                wdb_station_meta = wdb_station_meta[0]
-
-                # For all station variables append or confirm/update data.
-                for ind, qcdb_station_var in enumerate(qcdb_station_vars):
-                    allstation_column_name = wdb_col_list[ind]
-
-                    if isinstance(wdb_station_meta[ind], dt.datetime):
-                        # Format as "YYYY-MM-DD HH:MM:SS"
-                        if not qcdb_station_var.dtype is np.str:
-                            print('ERROR: NetCDF variable {}'.
-                                  format(qcdb_station_var.name) +
-                                  'must be of "str" type.',
-                                  file=sys.stderr)
-                            qcdb.close()
-                            exit(1)
-                        wdb_allstation_column_data = \
-                            wdb_station_meta[ind].strftime('%Y-%m-%d %H:%M:%S')
-                    else:
-                        wdb_allstation_column_data = wdb_station_meta[ind]
-                        if isinstance(wdb_allstation_column_data, str):
-                            wdb_allstation_column_data = \
-                                wdb_allstation_column_data.strip()
-
-                    if allstation_column_name == 'station_id':
-                        if len(qcdb_si[0]) == 0:
-                            # This is a new station.
-                            if qcdb_num_stations_start > 0 and args.verbose:
-                                print('INFO: adding station "{}".'.
-                                      format(wdb_allstation_column_data))
-
-                    if len(qcdb_si[0]) == 0:
-                        # Station (si) object ID not in QC database.
-                        # Append. THIS ADDS 1 TO THE STATION DIMENSION.
-                        # if ind == 0:
-                        #     print(qcdb.dimensions['station'].size)
-                        qcdb_station_var[qcdb_num_stations] = \
-                            wdb_allstation_column_data
-                        # if ind == 0:
-                        #     print(qcdb.dimensions['station'].size)
-
-                # Metadata was appended above. Now QC data needs to
-                # be appended as well.
-                qcdb_si = qcdb_num_stations
-                qcdb_station_is_new = True
-                qcdb_num_stations += 1
-                num_stations_added += 1
-                num_stations_added_this_time += 1
-                if qcdb_num_stations_start and args.verbose:
-                    print('INFO: QC database now includes {} stations.'.
-                          format(qcdb_num_stations))
-                # Initialize qc variables to 0 for this (new) station.
-                qcdb_snwd_qc_chkd[qcdb_si,:] = 0
-                qcdb_snwd_qc_flag[qcdb_si,:] = 0
-                qcdb_swe_qc_chkd[qcdb_si,:] = 0
-                qcdb_swe_qc_flag[qcdb_si,:] = 0
-
-                # Add artificial qc data to qcdb_prev_swe_qc_flag for
-                # the new station.
-                # ??? Should we also generate/expand ???
-                # ??? qcdb_prev_snwd_qc_flag here    ???
-                #     Pretty sure we do not need to.
-                new_row = np.ma.masked_array(np.array([[0] *
-                                                       num_hrs_prev_swe]))
-                if qcdb_prev_swe_qc_flag.shape[0] == 0:
-                    qcdb_prev_swe_qc_flag = new_row
-                else:
-                    qcdb_prev_swe_qc_flag = \
-                        np.ma.concatenate([qcdb_prev_swe_qc_flag, new_row],
-                                          axis=0)
-                new_row = None
-
-            else:                  
-
-                qcdb_si = qcdb_si[0][0]
-                qcdb_station_is_new = False
-
-            ########################################################
-            # Locate station index relative to all data needed for #
-            # performing QC tests.                                 #
-            ########################################################
-
-            # Locate station index in previous swe data.
-            # TODO: fix this brute force method. Maybe try the index method
-            # with a try/except arrangement.
-            wdb_prev_swe_si = []
-            for ind, val in enumerate(wdb_prev_swe_obj_id):
-                if val == site_swe_obj_id:
-                    wdb_prev_swe_si.append(ind)
-
-            if len(wdb_prev_swe_si) != 0:
-                # The object ID for this station was found in the
-                # preceding swe data.
-                if len(wdb_prev_swe_si) > 1:
-                    print('ERROR: multiple matches for station ' +
-                          'object ID {} '.format(site_swe_obj_id) +
-                          'in preceding swe data.',
-                          file=sys.stderr)
-                    qcdb.close()
-                    exit(1)
-                wdb_prev_swe_si = wdb_prev_swe_si[0]
-            else:
-                wdb_prev_swe_si = None
-
-
-            # Locate station index in precipitation data.
-            wdb_swe_prcp_si = []
-            for ind, val in enumerate(wdb_swe_prcp_obj_id):
-                if val == site_swe_obj_id:
-                    wdb_swe_prcp_si.append(ind)
-
-            if len(wdb_swe_prcp_si) != 0:
-                # The object ID for this station was found in the
-                # precipitation data.
-                if len(wdb_swe_prcp_si) > 1:
-                    print('ERROR: multiple matches for station ' +
-                          'object ID {} '.format(site_prcp_obj_id) +
-                          'in precipitation data.',
-                          file=sys.stderr)
-                    qcdb.close()
-                    exit(1)
-                wdb_swe_prcp_si = wdb_swe_prcp_si[0]
-            else:
-                wdb_swe_prcp_si = None
-
-
-            ####################################################
-            # Perform SWE QC tests on the current observation. #
-            ####################################################
-
-            # Get QC test names and bits for the QC flag and the "QC checked"
-            # flag.
-            swe_qc_test_names = qcdb_swe_qc_flag. \
-                                getncattr('qc_test_names')
-            swe_qc_test_bits = qcdb_swe_qc_flag. \
-                               getncattr('qc_test_bits')
-            swec_qc_test_names = qcdb_swe_qc_chkd. \
-                                 getncattr('qc_test_names')
-            swec_qc_test_bits = qcdb_swe_qc_chkd. \
-                                getncattr('qc_test_bits')
-
-
-            ##################################################
-            # Perform the SWE world record exceedance check. #
-            ##################################################
-
-            # Identify the QC bit for the test.
-            qc_test_name = 'world_record_exceedance'
-            ind = swe_qc_test_names.index(qc_test_name)
-            qc_bit = swe_qc_test_bits[ind]
-            if swe_qc_test_names[ind] != qc_test_name:
-                print('ERROR: inconsistent qc_test_names data in ' +
-                      'QC database.',
-                      file=sys.stderr)
-                qcdb.close()
-                exit(1)
-            if swec_qc_test_bits[ind] != swe_qc_test_bits[ind]:
-                print('ERROR: inconsistent qc_test_bits data in ' +
-                      'QC database.',
-                      file=sys.stderr)
-                qcdb.close()
-                exit(1)
-
-            if not qcdb_swe_qc_chkd[qcdb_si, qcdb_ti] & (1 << qc_bit):
-
-                if qc_durre_swe_wre(site_swe_val_mm):
-                    # Value has been flagged.
-                    if args.verbose:
-                        print('INFO: flagging SWE value {} '.
-                              format(site_swe_val_mm) +
-                              'at station {} '.format(site_swe_station_id) +
-                              '({}) '.format(site_swe_obj_id) +
-                              '("{}").'.format(qc_test_name))
-
-                    # Turn on the QC bit for this test.
-                    qcdb_swe_qc_flag[qcdb_si, qcdb_ti] = \
-                        qcdb_swe_qc_flag[qcdb_si, qcdb_ti] \
-                        | (1 << qc_bit)
-
-                    num_flagged_swe_wr_this_time += 1
-                    num_flagged_swe_wr += 1
-
-                # Turn on the QC checked bit for this test, regardless of
-                # whether the observation was flagged.
-                qcdb_swe_qc_chkd[qcdb_si, qcdb_ti] = \
-                    qcdb_swe_qc_chkd[qcdb_si, qcdb_ti] \
-                    | (1 << qc_bit)
-
-            ############################################################
-            # Perform world record exceedance check for change in SWE. #
-            ############################################################
-
-            qc_test_name = 'world_record_increase_exceedance'
-            if debug_this_station:
-                print('***** Debugging swe "{}" test for value {} at {} ({}).'.
-                      format(qc_test_name,
-                             site_swe_val_mm,
-                             site_swe_station_id,
-                             site_swe_obj_id))
-
-            if wdb_prev_swe_si is not None:
-
-                # Preceding SWE data is available, making this test possible.
-
-                # Identify the QC bit for the test.
-                ind = swe_qc_test_names.index(qc_test_name)
-                qc_bit = swe_qc_test_bits[ind]
-                if swec_qc_test_names[ind] != qc_test_name:
-                    print('ERROR: inconsistent qc_test_names data in ' +
-                          'QC database.',
-                          file=sys.stderr)
-                    qcdb.close()
-                    exit(1)
-                if swec_qc_test_bits[ind] != swe_qc_test_bits[ind]:
-                    print('ERROR: inconsistent qc_test_bits data in ' +
-                          'QC database.',
-                          file=sys.stderr)
-                    qcdb.close()
-                    exit(1)
-
-                if debug_this_station:
-                    print('***** have previous data.')
-
-                if not qcdb_swe_qc_chkd[qcdb_si, qcdb_ti] & (1 << qc_bit):
-
-                    # Test has not been performed for this observation.
-
-                    # Note that there are three indices for locating this
-                    # station:
-                    # 1. wdb_swe_si    = the station index in
-                    #                    wdb_swe_val_mm
-                    # 2. qcdb_si        = the station index in the QC database
-                    #                     which is covered by these arrays:
-                    #                     qcdb_prev_swe_qc_flag
-                    #                     qcdb_swe_qc_chkd
-                    #                     qcdb_swe_qc_flag
-                    # 3. wdb_prev_swe_si = the station index in
-                    #                      prev_swe and wdb_prev_swe_obj_id
-
-                    prev_swe_ti = num_hrs_prev_swe - num_hrs_wre
-
-                    site_prev_swe_val_mm = \
-                        wdb_prev_swe_val_mm[wdb_prev_swe_si, prev_swe_ti:]
-
-                    site_prev_swe_qc = \
-                        qcdb_prev_swe_qc_flag[qcdb_si, prev_swe_ti:]
-
-                    flag, ref_ind = \
-                        qc_durre_swe_change_wre(site_swe_val_mm, 	#def 2
-                                                 site_prev_swe_val_mm,
-                                                 site_prev_swe_qc)
-
-                    if debug_this_station:
-                        print('***** values: {} {}'.
-                              format(site_prev_swe_val_mm, site_swe_val_mm))
-                        print('***** flag: {}'.format(flag))
-                        xxx = input()
-
-                    if flag:
-
-                        if args.verbose:
-                            print('INFO: flagging SWE change ' + 
-                                  '{} '.
-                                  format(site_prev_swe_val_mm[ref_ind]) +
-                                  'to {} '.format(site_swe_val_mm) +
-                                  'at station {} '.
-                                  format(site_swe_station_id) +
-                                  '({}) '.format(site_swe_obj_id) +
-                                  '("{}").'.format(qc_test_name))
-
-                        # Turn on the QC bit for this test.
-                        qcdb_swe_qc_flag[qcdb_si, qcdb_ti] = \
-                            qcdb_swe_qc_flag[qcdb_si, qcdb_ti] | (1 << qc_bit)
-
-                        if flag_swe_change_wre_low_value:
-
-                            # Flag previous (low) value as well if that time
-                            # fits into the database.
-                            ref_ind_db = qcdb_ti - num_hrs_wre + ref_ind
-                            if ref_ind_db >= 0:
-                                ref_datetime = \
-                                    num2date(qcdb_var_time[0] + ref_ind_db,
-                                             units=qcdb_var_time_units,
-                                             only_use_cftime_datetimes=False)
-                                if args.verbose:
-                                    print('INFO: also flagging low-valued ' +
-                                          'observation {} at {}.'.
-                                          format(site_prev_swe_val_mm[ref_ind],
-                                                 ref_datetime))
-                                # First make sure the previous value is
-                                # not flagged.
-                                if qcdb_swe_qc_flag[qcdb_si, ref_ind_db] & \
-                                   (1 << qc_bit) != 0:
-                                    print('ERROR: (PROGRAMMING) ' +
-                                          'reference value was ' +
-                                          'previously flagged and ' +
-                                          'should not have been used.',
-                                          file=sys.stderr)
-                                    qcdb.close()
-                                    sys.exit(1)
-                                # Flag the previous value.
-                                qcdb_swe_qc_flag[qcdb_si, ref_ind_db] = \
-                                    qcdb_swe_qc_flag[qcdb_si,ref_ind_db] | \
-                                    (1 << qc_bit)
-                                # Identify the previous value as having been
-                                # through this check, even though this is
-                                # only indirectly the case. Most likely it has
-                                # already been tested, and passed, but now is
-                                # associated with the later problematic report.
-                                qcdb_swe_qc_chkd[qcdb_si, ref_ind_db] = \
-                                    qcdb_swe_qc_chkd[qcdb_si, ref_ind_db] | \
-                                    (1 << qc_bit)
-
-                        # Increment flagged-value counters.
-                        num_flagged_swe_change_wr_this_time += 1
-                        num_flagged_swe_change_wr += 1
-
-                    if flag is not None:
-
-                        # Turn on the QC checked bit for this test, regardless
-                        # of whether the observation was flagged.
-                        qcdb_swe_qc_chkd[qcdb_si, qcdb_ti] = \
-                            qcdb_swe_qc_chkd[qcdb_si, qcdb_ti] | (1 << qc_bit)
-
-                else:
-
-                    if debug_this_station:
-                        print('***** SWE increase WRE test done')
-
-                    # Test has already been performed.
-                    flag_value = qcdb_swe_qc_flag[qcdb_si, qcdb_ti] & \
-                                 (1 << qc_bit)
-                    if flag_value == 0:
-                        flag_str = 'not flagged'
-                    else:
-                        flag_str = 'flagged'
-                    if args.verbose:
-                        print('INFO: check "{}" '.format(qc_test_name) +
-                              'already done for site {} ({}) '.
-                              format(site_swe_station_id,
-                                     site_swe_obj_id) +
-                              'value {} ({})'.
-                              format(site_swe_val_mm, flag_str))
-
-            #################################
-            # Perform streak check for SWE. #
-            #################################
-
-            qc_test_name = 'streak'
-            if wdb_prev_swe_si is not None:
-
-                # Preceding SWE data is available, making this test possible.
-
-                # Identify the QC bit for the test.
-                ind = swe_qc_test_names.index(qc_test_name)
-                qc_bit = swe_qc_test_bits[ind]
-                if swec_qc_test_names[ind] != qc_test_name:
-                    print('ERROR: inconsistent qc_test_names data in ' +
-                          'QC database.',
-                          file=sys.stderr)
-                    qcdb.close()
-                    exit(1)
-                if swec_qc_test_bits[ind] != swe_qc_test_bits[ind]:
-                    print('ERROR: inconsistent qc_test_bits data in ' +
-                          'QC database.',
-                          file=sys.stderr)
-                    qcdb.close()
-                    exit(1)
-
-                if not qcdb_swe_qc_chkd[qcdb_si, qcdb_ti] & (1 << qc_bit):
-
-                    # Test has not been performed for this observation.
-
-                    prev_swe_ti = num_hrs_prev_swe - num_hrs_streak
-
-                    site_prev_swe_val_mm = \
-                        wdb_prev_swe_val_mm[wdb_prev_swe_si, prev_swe_ti:]
-
-                    site_prev_swe_qc = \
-                        qcdb_prev_swe_qc_flag[qcdb_si, prev_swe_ti:]
-
-                    flag = qc_durre_swe_streak(site_swe_val_mm,
-                                               site_prev_swe_val_mm,
-                                               site_prev_swe_qc)
-
-                    if flag:
-
-                        if args.verbose:
-                            print('INFO: flagging SWE data ' +
-                                  'for "{}" check '.format(qc_test_name) +
-                                  'at station {} '.format(site_swe_station_id) +
-                                  '({}).'.format(site_swe_obj_id))
-
-                        # Turn on the QC bit for this test.
-                        qcdb_swe_qc_flag[qcdb_si, qcdb_ti] = \
-                            qcdb_swe_qc_flag[qcdb_si, qcdb_ti] | (1 << qc_bit)
-
-                        # TODO:
-                        # Flag previous values as well?
-
-                        num_flagged_swe_streak_this_time += 1
-                        num_flagged_swe_streak += 1
-
-                    if flag is not None:
-
-                        # Turn on the QC checked bit for this test, regardless
-                        # of whether the observation was flagged.
-                        qcdb_swe_qc_chkd[qcdb_si, qcdb_ti] = \
-                            qcdb_swe_qc_chkd[qcdb_si, qcdb_ti] | (1 << qc_bit)
-
-                else:
-
-                    # Test has already been performed.
-                    flag_value = qcdb_swe_qc_flag[qcdb_si, qcdb_ti] & \
-                                 (1 << qc_bit)
-                    if flag_value == 0:
-                        flag_str = 'not flagged'
-                    else:
-                        flag_str = 'flagged'
-                    if args.verbose:
-                        print('INFO: check "{}" already done for site {} ({}) '.
-                              format(qc_test_name,
-                                     site_swe_station_id,
-                                     site_swe_obj_id) +
-                              'value {} ({})'.
-                              format(site_swe_val_mm, flag_str))
-
-
-            ##############################
-            # Perform gap check for SWE. #
-            ##############################
-
-            qc_test_name = 'gap'
-            if debug_this_station:
-                print('***** Debugging SWE "{}" test for value {} at {} ({}).'.
-                      format(qc_test_name,
-                             site_swe_val_mm,
-                             site_swe_station_id,
-                             site_swe_obj_id))
-            if wdb_prev_swe_si is not None:
-
-                # Preceding SWE data is available, making this test possible.
-
-                # Identify the QC bit for the test.
-                ind = swe_qc_test_names.index(qc_test_name)
-                qc_bit = swe_qc_test_bits[ind]
-                if swec_qc_test_names[ind] != qc_test_name:
-                    print('ERROR: inconsistent qc_test_names data in ' +
-                          'QC database.',
-                          file=sys.stderr)
-                    qcdb.close()
-                    exit(1)
-                if swec_qc_test_bits[ind] != swe_qc_test_bits[ind]:
-                    print('ERROR: inconsistent qc_test_bits data in ' +
-                          'QC database.',
-                          file=sys.stderr)
-                    qcdb.close()
-                    exit(1)
-
-                if not qcdb_swe_qc_chkd[qcdb_si, qcdb_ti] & (1 << qc_bit):
-
-                    # Test has not been performed for this observation.
-
-                    prev_swe_ti = num_hrs_prev_swe - num_hrs_gap
-
-                    site_prev_swe_val_mm = \
-                        wdb_prev_swe_val_mm[wdb_prev_swe_si, prev_swe_ti:]
-
-                    site_prev_swe_qc = \
-                        qcdb_prev_swe_qc_flag[qcdb_si, prev_swe_ti:]
-
-                    station_time_series = \
-                        np.ma.append(site_prev_swe_val_mm, site_swe_val_mm)
-
-                    if args.check_climatology:
-
-                        swe_ref_ceiling_mm = site_swe_clim_max_mm + \
-                                             site_swe_clim_iqr_mm
-
-                        swe_ref_default_mm = site_swe_clim_med_mm
-
-                        ts_flag_ind, ref_obs = \
-                            qc_durre_swe_gap(site_swe_val_mm,
-                                             site_prev_swe_val_mm,
-                                             site_prev_swe_qc,
-                                             ref_ceiling_mm=
-                                             swe_ref_ceiling_mm,
-                                             ref_default_mm=
-                                             swe_ref_default_mm,
-                                             verbose=args.verbose)
-
-                    else:
-
-                        ts_flag_ind, ref_obs = \
-                            qc_durre_swe_gap(site_swe_val_mm,
-                                             site_prev_swe_val_mm,
-                                             site_prev_swe_qc,
-                                             verbose=args.verbose)
-
-                    if ts_flag_ind is None:
-                        print('ERROR: SWE gap check failed ' +
-                              'for station {} '.format(site_swe_station_id) +
-                              '({}).'.format(site_swe_obj_id))
-                        qcdb.close()
-                        sys.exit(1)
-
-                    for ind, ts_ind in enumerate(ts_flag_ind):
-
-                        # Identify time index of observation in database.
-                        ts_ind_db = qcdb_ti - num_hrs_gap + ts_ind
-
-                        if debug_this_station:
-                            flagged_obs_datetime = \
-                                num2date(qcdb_var_time[0] + ts_ind_db,
-                                         units=qcdb_var_time_units,
-                                         only_use_cftime_datetimes=False)
-                            print('***** SWE gap test flags {} '.
-                                  format(station_time_series[ts_ind]) +
-                                  'at {}, '.format(flagged_obs_datetime) +
-                                  'reference {}'.format(ref_obs[ind]))
-                            if ts_ind_db < 0:
-                                print('***** (does not fit in QC database)')
-                            else:
-                                print('***** (fits in QC database)')
-
-                        if ts_ind_db >= 0:
-
-                            # Observation fits in time frame of database.
-                            flagged_obs_datetime = \
-                                num2date(qcdb_var_time[0] + ts_ind_db,
-                                         units=qcdb_var_time_units,
-                                         only_use_cftime_datetimes=False)
-
-                            if args.verbose:
-                                print('INFO: flagging SWE data ' +
-                                      'for "gap" check ' +
-                                      'at station {} '.
-                                      format(site_swe_station_id) +
-                                      '({}), '.
-                                      format(site_swe_obj_id) +
-                                      'value {}, '.
-                                      format(station_time_series[ts_ind]) +
-                                      'time {}.'.
-                                      format(flagged_obs_datetime))
-
-                            # Make sure the value is not flagged.
-                            if qcdb_swe_qc_flag[qcdb_si, ts_ind_db] & \
-                               (1 << qc_bit) != 0:
-                                print('ERROR: (PROGRAMMING) ' +
-                                      'reference value was ' +
-                                      'previously flagged and should ' +
-                                      'not have been used.',
-                                      file=sys.stderr)
-                                qcdb.close()
-                                sys.exit(1)
-
-                            if debug_this_station and \
-                               ts_ind_db != qcdb_ti:
-                                print('***** this is a "previous" value:')
-                                print('***** qc_chkd = {}'.
-                                      format(qcdb_swe_qc_chkd[qcdb_si,
-                                                              ts_ind_db] &
-                                             (1 << qc_bit)))
-                                print('***** qc_flag = {}'.
-                                      format(qcdb_swe_qc_flag[qcdb_si,
-                                                              ts_ind_db] &
-                                             (1 << qc_bit)))
-
-                            # Turn on the QC bit for this value.
-                            qcdb_swe_qc_flag[qcdb_si, ts_ind_db] = \
-                                qcdb_swe_qc_flag[qcdb_si,ts_ind_db] | \
-                                (1 << qc_bit)
-                            
-                            # Identify the previous value as having been
-                            # through this check, even though this is
-                            # only indirectly the case. Most likely it has
-                            # already been tested, and passed, but in the
-                            # current context it is being flagged.
-                            # if debug_this_station:
-                            #     print('***** qc_checked future-before: ' +
-                            #           '{}, {}'.
-                            #           format(ts_ind_db,
-                            #                  qcdb_swe_qc_chkd[qcdb_si,
-                            #                                    ts_ind_db] & \
-                            #                  (1 << qc_bit)))
-                            qcdb_swe_qc_chkd[qcdb_si, ts_ind_db] = \
-                                qcdb_swe_qc_chkd[qcdb_si, ts_ind_db] \
-                                | (1 << qc_bit)
-                            # if debug_this_station:
-                            #     print('***** qc_checked future-after: {}'.
-                            #           format(qcdb_swe_qc_chkd[qcdb_si,
-                            #                                    ts_ind_db] & \
-                            #                  (1 << qc_bit)))
-
-                            num_flagged_swe_gap_this_time += 1
-                            num_flagged_swe_gap += 1
-
-                    # Turn on the QC checked bit for this test, regardless of
-                    # whether the observation was flagged.
-                    # if debug_this_station:
-                    #     print('***** qc_checked before: {}, {}'.
-                    #           format(qcdb_ti,
-                    #                  qcdb_swe_qc_chkd[qcdb_si, qcdb_ti] & \
-                    #                  (1 << qc_bit)))
-                    qcdb_swe_qc_chkd[qcdb_si, qcdb_ti] = \
-                        qcdb_swe_qc_chkd[qcdb_si, qcdb_ti] \
-                        | (1 << qc_bit)
-                    # if debug_this_station:
-                    #     print('***** qc_checked after: {}'.
-                    #           format(qcdb_swe_qc_chkd[qcdb_si, qcdb_ti] & \
-                    #                  (1 << qc_bit)))
-
-                else:
-
-                    # Test has already been performed.
-                    flag_value = qcdb_swe_qc_flag[qcdb_si, qcdb_ti] \
-                             & (1 << qc_bit)
-                    if flag_value == 0:
-                        flag_str = 'not flagged'
-                    else:
-                        flag_str = 'flagged'
-                    if args.verbose:
-                        print('INFO: check "{}" '.format(qc_test_name) +
-                              'already done for site {} ({}) '.
-                              format(site_swe_station_id,
-                                     site_swe_obj_id) +
-                              'value {} ({})'.
-                              format(site_swe_val_mm, flag_str))
-
-            ################################################
-            # Perform precipitation-SWE consistency check. #
-            ################################################
-
-            # This is an adaptation of the test described in Durre (2010)
-            # Table 3 (internal and temporal consistency checks) as
-            # "SNWD increase with 0 PRCP".
-
-            qc_test_name = 'precip_consistency'
-
-            if wdb_swe_prcp_si is not None and \
-               wdb_prev_swe_si is not None:
-
-                # Previous swe data is available, making this test
-                # possible.
-
-                # Identify the QC bit for the test.
-                ind = swe_qc_test_names.index(qc_test_name)
-                qc_bit = swe_qc_test_bits[ind]
-                if swec_qc_test_names[ind] != qc_test_name:
-                    print('ERROR: inconsistent qc_test_names data in ' +
-                          'QC database.',
-                          file=sys.stderr)
-                    qcdb.close()
-                    exit(1)
-                if swec_qc_test_bits[ind] != swe_qc_test_bits[ind]:
-                    print('ERROR: inconsistent qc_test_bits data in ' +
-                          'QC database.',
-                          file=sys.stderr)
-                    qcdb.close()
-                    exit(1)
-
-                if not qcdb_swe_qc_chkd[qcdb_si, qcdb_ti] & (1 << qc_bit):
-
-                    # Test has not been performed for this observation.
-
-                    # Indices for locating this station:
-                    # 1. wdb_swe_si      = the station index in
-                    #                      wdb_swe_val_mm
-                    # 2. qcdb_si         = the station index in the QC database
-                    #                      which is covered by these arrays:
-                    #                      qcdb_prev_swe_qc_flag
-                    #                      qcdb_swe_qc_chkd
-                    #                      qcdb_swe_qc_flag
-                    # 3. wdb_prev_swe_si = the station index in
-                    #                      prev_swe and wdb_prev_swe_obj_id
-                    # 4. wdb_swe_prcp_si = the station index in wdb_prcp_val_mm
-
-                    prev_swe_ti = num_hrs_prev_swe - num_hrs_prcp
-
-                    site_prev_swe_val_mm = \
-                        wdb_prev_swe_val_mm[wdb_prev_swe_si, prev_swe_ti:]
-
-                    site_prev_swe_qc = \
-                        qcdb_prev_swe_qc_flag[qcdb_si, prev_swe_ti:]
-
-                    site_prcp_val_mm = wdb_swe_prcp_val_mm[wdb_swe_prcp_si]
-                    if not np.isscalar(site_prcp_val_mm):
-                        print('---')
-                        print(type(wdb_swe_prcp_val_mm))
-                        print(type(site_prcp_val_mm))
-                        print(type(wdb_swe_prcp_si))
-                        qcdb.close()
-                        sys.exit(1)
-
-                    flag, ref_ind = \
-                        qc_durre_swe_prcp(site_swe_val_mm,
-                                          site_prev_swe_val_mm,
-                                          site_prev_swe_qc,
-                                          site_prcp_val_mm)
-
-                    if flag:
-
-                        if args.verbose:
-                            print('INFO: flagging SWE change ' +
-                                  '{} '.
-                                  format(site_prev_swe_val_mm[ref_ind]) +
-                                  'to {} '.format(site_swe_val_mm) +
-                                  'at station {} '.
-                                  format(site_swe_station_id) +
-                                  '({}) '.format(site_swe_obj_id) +
-                                  '("{}").'.format(qc_test_name))
-
-                        # Turn on the QC bit for this test.
-                        qcdb_swe_qc_flag[qcdb_si, qcdb_ti] = \
-                            qcdb_swe_qc_flag[qcdb_si, qcdb_ti] | (1 << qc_bit)
-
-                        if flag_swe_change_prcp_low_value:
-
-                            # Flag previous value as well if that time fits
-                            # into the database.
-                            ref_ind_db = qcdb_ti - num_hrs_prev_swe + ref_ind
-                            if ref_ind_db >= 0:
-                                ref_datetime = \
-                                    num2date(qcdb_var_time[0] + ref_ind_db,
-                                             units=qcdb_var_time_units,
-                                             only_use_cftime_datetimes=False)
-                                if args.verbose:
-                                    print('INFO: also flagging ' +
-                                          'observation {} at {}.'.
-                                          format(site_prev_swe_val_mm[ref_ind],
-                                                 ref_datetime))
-                                # First make sure the previous value is not
-                                # flagged.
-                                if qcdb_swe_qc_flag[qcdb_si, ref_ind_db] & \
-                                   (1 << qc_bit) != 0:
-                                    print('ERROR: (PROGRAMMING) ' +
-                                          'reference value was ' +
-                                          'previously flagged and should ' +
-                                          'not have been used.',
-                                          file=sys.stderr)
-                                    qcdb.close()
-                                    sys.exit(1)
-                                # Flag the previous value.
-                                qcdb_swe_qc_flag[qcdb_si, ref_ind_db] = \
-                                    qcdb_swe_qc_flag[qcdb_si,ref_ind_db] | \
-                                    (1 << qc_bit)
-                                # Identify the previous value as having been
-                                # through this check, even though this is
-                                # only indirectly the case. Most likely it has
-                                # already been tested, and passed, but now is
-                                # associated with the later problematic report.
-                                qcdb_swe_qc_chkd[qcdb_si, ref_ind_db] = \
-                                    qcdb_swe_qc_chkd[qcdb_si, ref_ind_db] \
-                                    | (1 << qc_bit)
-
-                        num_flagged_swe_pr_cons_this_time += 1
-                        num_flagged_swe_pr_cons += 1
-
-                    if flag is not None:
-
-                        # Turn on the QC checked bit for this test, regardless
-                        # of whether the observation was flagged.
-                        qcdb_swe_qc_chkd[qcdb_si, qcdb_ti] = \
-                            qcdb_swe_qc_chkd[qcdb_si, qcdb_ti] | (1 << qc_bit)
-
-                else:
-
-                    # Test has already been performed.
-                    flag_value = qcdb_swe_qc_flag[qcdb_si, qcdb_ti] & \
-                                 (1 << qc_bit)
-                    if flag_value == 0:
-                        flag_str = 'not flagged'
-                    else:
-                        flag_str = 'flagged'
-                    if args.verbose:
-                        print('INFO: check "{}" already done for site {} ({}) '.
-                              format(qc_test_name,
-                                     site_swe_station_id,
-                                     site_swe_obj_id) +
-                              'value {} ({})'.
-                              format(site_swe_val_mm, flag_str))
-
-            ######################################################
-            # Perform precipitation-SWE ratio consistency check. #
-            ######################################################
-
-            # This is an adaptation of the test described in Durre (2010)
-            # Table 3 (internal and temporal consistency checks) as
-            # "SNWD/PRCP ratio".
-
-            qc_test_name = 'precip_ratio'
-
-            if wdb_swe_prcp_si is not None and \
-               wdb_prev_swe_si is not None:
+        # Locate all SWE reporting stations in the QC database and in the
+        # data needed for performing QC tests.
+        qcdb_si_all = qcdb_index.lookup(wdb_swe_obj_id)
+        if np.any(qcdb_si_all < 0):
+            # New stations were added above.
+            print('ERROR: (programming) station object ID(s) ' +
+                  '{} not found in QC database.'.
+                  format(np.asarray(wdb_swe_obj_id)[qcdb_si_all < 0]),
+                  file=sys.stderr)
+            qcdb.close()
+            exit(1)
+        wdb_prev_swe_si_all = wdb_hour['swe_si']['prev_swe']
+        wdb_swe_prcp_si_all = wdb_hour['swe_si']['swe_prcp']
 
-                # Previous swe data is available, making this test
-                # possible.
+        if args.check_climatology:
+            swe_ref_ceiling_mm = wdb_swe_clim_max_mm + wdb_swe_clim_iqr_mm
+            swe_ref_default_mm = wdb_swe_clim_med_mm
+        else:
+            swe_ref_ceiling_mm = None
+            swe_ref_default_mm = None
+
+        # Inputs for SWE QC tests, with rows aligned with wdb_swe_val_mm.
+        swe_qc_builders = {
+            'value': lambda: (wdb_swe_val_mm, None),
+            'prev': lambda: (qc_durre_batch.take_rows(wdb_prev_swe_val_mm,
+                                                      wdb_prev_swe_si_all),
+                             wdb_prev_swe_si_all >= 0),
+            'prev_qc': lambda: (qc_durre_batch.take_rows(
+                                    qcdb_prev_swe_qc_flag, qcdb_si_all),
+                                None),
+            'prcp': lambda: (qc_durre_batch.take_rows(wdb_swe_prcp_val_mm,
+                                                      wdb_swe_prcp_si_all),
+                             wdb_swe_prcp_si_all >= 0),
+            'ref_ceiling': lambda: (swe_ref_ceiling_mm, None),
+            'ref_default': lambda: (swe_ref_default_mm, None)}
 
-                # Identify the QC bit for the test.
-                try:
-                    ind = swe_qc_test_names.index(qc_test_name)
-                except ValueError:
-                    # Try backward compatible option "depth_precip_ratio".
-                    qc_test_name = 'depth_precip_ratio'
-                    ind = swe_qc_test_names.index(qc_test_name)
-
-                qc_bit = swe_qc_test_bits[ind]
-                if swec_qc_test_names[ind] != qc_test_name:
-                    print('ERROR: inconsistent qc_test_names data in ' +
-                          'QC database.',
-                          file=sys.stderr)
-                    qcdb.close()
-                    exit(1)
-                if swec_qc_test_bits[ind] != swe_qc_test_bits[ind]:
-                    print('ERROR: inconsistent qc_test_bits data in ' +
-                          'QC database.',
-                          file=sys.stderr)
-                    qcdb.close()
-                    exit(1)
-
-                if not qcdb_swe_qc_chkd[qcdb_si, qcdb_ti] & (1 << qc_bit):
-
-                    # Test has not been performed for this observation.
-
-                    # Indices for locating this station:
-                    # 1. wdb_swe_si    = the station index in
-                    #                     wdb_swe_val_mm
-                    # 2. qcdb_si        = the station index in the QC database
-                    #                     which is covered by these arrays:
-                    #                     qcdb_prev_swe_qc_flag
-                    #                     qcdb_swe_qc_chkd
-                    #                     qcdb_swe_qc_flag
-                    # 3. wdb_prev_swe_si = the station index in
-                    #                     prev_swe and wdb_prev_swe_obj_id
-                    # 4. wdb_swe_prcp_si    = the station index in wdb_swe_prcp_val_mm
-
-                    prev_swe_ti = num_hrs_prev_swe - num_hrs_prcp
-
-                    site_prev_swe_val_mm = \
-                        wdb_prev_swe_val_mm[wdb_prev_swe_si, prev_swe_ti:]
-
-                    site_prev_swe_qc = \
-                        qcdb_prev_swe_qc_flag[qcdb_si, prev_swe_ti:]
-
-                    site_prcp_val_mm = wdb_swe_prcp_val_mm[wdb_swe_prcp_si]
-
-                    flag, ref_ind = \
-                        qc_durre_swe_prcp_ratio(site_swe_val_mm,
-                                                 site_prev_swe_val_mm,
-                                                 site_prev_swe_qc,
-                                                 site_prcp_val_mm)
-
-                    if flag:
- 
-                        if args.verbose:
-                            print('INFO: flagging SWE change ' +
-                                  '{} '.
-                                  format(site_prev_swe_val_mm[ref_ind]) +
-                                  'to {} '.format(site_swe_val_mm) +
-                                  'at station {} '.
-                                  format(site_swe_station_id) +
-                                  '({}) '.format(site_swe_obj_id) +
-                                  '("{}").'.format(qc_test_name))
-
-                        # Turn on the QC bit for this test.
-                        qcdb_swe_qc_flag[qcdb_si, qcdb_ti] = \
-                            qcdb_swe_qc_flag[qcdb_si, qcdb_ti] | (1 << qc_bit)
-
-                        if flag_swe_change_prcp_low_value:
-
-                            # Flag previous value as well if that time fits
-                            # into the database.
-                            ref_ind_db = qcdb_ti - num_hrs_prev_swe + ref_ind
-                            if ref_ind_db >= 0:
-                                ref_datetime = \
-                                    num2date(qcdb_var_time[0] + ref_ind_db,
-                                             units=qcdb_var_time_units,
-                                             only_use_cftime_datetimes=False)
-                                if args.verbose:
-                                    print('INFO: also flagging ' +
-                                          'observation {} at {}.'.
-                                          format(site_prev_swe_val_mm[ref_ind],
-                                                 ref_datetime))
-                                # First make sure the previous value is not
-                                # flagged.
-                                if qcdb_swe_qc_flag[qcdb_si, ref_ind_db] & \
-                                   (1 << qc_bit) != 0:
-                                    print('ERROR: (PROGRAMMING) ' +
-                                          'reference value was ' +
-                                          'previously flagged and should ' +
-                                          'not have been used.',
-                                          file=sys.stderr)
-                                    qcdb.close()
-                                    sys.exit(1)
-                                # Flag the previous value.
-                                qcdb_swe_qc_flag[qcdb_si, ref_ind_db] = \
-                                    qcdb_swe_qc_flag[qcdb_si,ref_ind_db] | \
-                                    (1 << qc_bit)
-                                # Identify the previous value as having been
-                                # through this check, even though this is
-                                # only indirectly the case. Most likely it has
-                                # already been tested, and passed, but now is
-                                # associated with the later problematic report.
-                                qcdb_swe_qc_chkd[qcdb_si, ref_ind_db] = \
-                                    qcdb_swe_qc_chkd[qcdb_si, ref_ind_db] \
-                                    | (1 << qc_bit)
-
-                        num_flagged_swe_pr_cons_this_time += 1
-                        num_flagged_swe_pr_cons += 1
-
-                    if flag is not None:
-
-                        # Turn on the QC checked bit for this test, regardless
-                        # of whether the observation was flagged.
-                        qcdb_swe_qc_chkd[qcdb_si, qcdb_ti] = \
-                            qcdb_swe_qc_chkd[qcdb_si, qcdb_ti] | (1 << qc_bit)
-
-                else:
-
-                    # Test has already been performed.
-                    flag_value = qcdb_swe_qc_flag[qcdb_si, qcdb_ti] & \
-                                 (1 << qc_bit)
-                    if flag_value == 0:
-                        flag_str = 'not flagged'
-                    else:
-                        flag_str = 'flagged'
-                    if args.verbose:
-                        print('INFO: check "{}" already done for site {} ({}) '.
-                              format(qc_test_name,
-                                     site_swe_station_id,
-                                     site_swe_obj_id) +
-                              'value {} ({})'.
-                              format(site_swe_val_mm, flag_str))
+        if args.verbose:
+            print('Performing SWE QC for {}'.format(obs_datetime))
 
+        swe_qc_in, swe_qc_available = swe_qc_pipeline.gather(swe_qc_builders)
+        num_flagged_swe_this_time = \
+            swe_qc_pipeline.run(swe_qc_in,
+                                swe_qc_available,
+                                qcdb_si_all,
+                                qcdb_ti,
+                                swe_qc_bit,
+                                qcdb_swe_qc_flag,
+                                qcdb_swe_qc_chkd,
+                                station_id=wdb_swe_station_id,
+                                values=wdb_swe_val_mm,
+                                verbose=args.verbose,
+                                pool=qc_workers)
+        if num_flagged_swe_this_time is None:
+            qcdb.close()
+            sys.exit(1)
+        for counter, num_flagged in num_flagged_swe_this_time.items():
+            num_flagged_swe[counter] += num_flagged
+
+        if debug_station_id is not None:
+            for wdb_swe_si in \
+                np.flatnonzero(np.asarray(wdb_swe_station_id) ==
+                               debug_station_id):
+                qcdb_si = qcdb_si_all[wdb_swe_si]
+                print('***** SWE {} at {} ({}): '.
+                      format(wdb_swe_val_mm[wdb_swe_si],
+                             wdb_swe_station_id[wdb_swe_si],
+                             wdb_swe_obj_id[wdb_swe_si]) +
+                      'QC flag {}, QC checked {}.'.
+                      format(qcdb_swe_qc_flag[qcdb_si, qcdb_ti],
+                             qcdb_swe_qc_chkd[qcdb_si, qcdb_ti]))
 
         ######################################
         # SNOW WATER EQUIVALENT (SWE) QC END #
@@ -4674,31 +1780,26 @@ def main():
         if args.verbose:
             print('INFO: added {} '.format(num_stations_added_this_time) +
                   'stations to the database at {}.'.format(obs_datetime))
-            print('INFO: flagged {} '.format(num_flagged_sd_wr_this_time) +
-                  'snow depth obs. at {} '.format(obs_datetime) +
-                  'for world record exceedance.')
-            print('INFO: flagged {} '.
-                  format(num_flagged_sd_change_wr_this_time) +
-                  'snow depth obs. at {} '.format(obs_datetime) +
-                  'for world record change exceedance.')
-            print('INFO: flagged {} '.format(num_flagged_sd_streak_this_time) +
-                  'snow depth obs. at {} '.format(obs_datetime) +
-                  'for streak.')
-            print('INFO: flagged {} '.format(num_flagged_sd_gap_this_time) +
-                  'snow depth obs. at {} '.format(obs_datetime) +
-                  'for gap.')
-            print('INFO: flagged {} '.
-                  format(num_flagged_sd_at_cons_this_time) +
-                  'snow depth obs. at {} '.format(obs_datetime) +
-                  'for snow depth/air temperature consistency.')
-            print('INFO: flagged {} '.
-                  format(num_flagged_sd_sf_cons_this_time) +
-                  'snow depth obs. at {} '.format(obs_datetime) +
-                  'for snow depth/snowfall consistency.')
-            print('INFO: flagged {} '.
-                  format(num_flagged_sd_pr_cons_this_time) +
-                  'snow depth obs. at {} '.format(obs_datetime) +
-                  'for snow depth/precipitation consistency.')
+            for counter, num_flagged in num_flagged_snwd_this_time.items():
+                print('INFO: flagged {} '.format(num_flagged) +
+                      'snow depth obs. at {} '.format(obs_datetime) +
+                      'for "{}".'.format(counter))
+            for counter, num_flagged in num_flagged_swe_this_time.items():
+                print('INFO: flagged {} '.format(num_flagged) +
+                      'SWE obs. at {} '.format(obs_datetime) +
+                      'for "{}".'.format(counter))
+
+        # Write QC flags modified for the current time (for the current
+        # hour and any earlier hours that were flagged) to the database.
+        num_cols_written = 0
+        for qcdb_qc_var in [qcdb_snwd_qc_chkd,
+                            qcdb_snwd_qc_flag,
+                            qcdb_swe_qc_chkd,
+                            qcdb_swe_qc_flag]:
+            num_cols_written += qcdb_qc_var.flush()
+        if args.verbose:
+            print('INFO: wrote {} '.format(num_cols_written) +
+                  'QC flag columns for {}.'.format(obs_datetime))
 
         # Update the "last_datetime_updated" attribute.
         # NOTE: Possibly only do this if the obs_datetime is earlier than the
@@ -4710,7 +1811,8 @@ def main():
                               obs_datetime.strftime('%Y-%m-%d %H:%M:%S UTC'))
         num_hrs_updated += 1
 
-        if num_hrs_updated % database_commit_period == 0:
+        if num_hrs_updated % database_commit_period == 0 or \
+           num_hrs_updated == args.lead_in_hours:
 
             # Close the temporary database copy.
             qcdb.close()
@@ -4729,6 +1831,20 @@ def main():
                       format(obs_datetime.strftime('%Y-%m-%d %H:%M:%S UTC')) +
                       'to {}'.format(args.database_path))
 
+            if num_hrs_updated == args.lead_in_hours:
+                lead_in_database_path = args.database_path + '.lead_in'
+                try:
+                    shutil.copy(args.database_path, lead_in_database_path)
+                except:
+                    print('ERROR: Failed to copy {} '.
+                          format(args.database_path) +
+                          'to {}.'.format(lead_in_database_path),
+                          file=sys.stderr)
+                    sys.exit(1)
+                if args.verbose:
+                    print('INFO: Kept database after lead-in hours ' +
+                          'as {}.'.format(lead_in_database_path))
+
             # Create a new copy of the QC database.
             temp_database_path = station_qc_db_copy(args.database_path,
                                                     verbose=args.verbose)
@@ -4742,6 +1858,24 @@ def main():
                       file=sys.stderr)
                 exit(1)
 
+            # Variables from the previous copy are no longer valid.
+            qcdb_var_time = qcdb.variables['time']
+            qcdb_snwd_qc_flag = FlagBuffer(qcdb.variables['snow_depth_qc'])
+            qcdb_snwd_qc_chkd = \
+                FlagBuffer(qcdb.variables['snow_depth_qc_checked'])
+            qcdb_swe_qc_flag = FlagBuffer(qcdb.variables['swe_qc'])
+            qcdb_swe_qc_chkd = FlagBuffer(qcdb.variables['swe_qc_checked'])
+            snwd_qc_bit = get_qc_test_bits(qcdb_snwd_qc_flag,
+                                           qcdb_snwd_qc_chkd)
+            swe_qc_bit = get_qc_test_bits(qcdb_swe_qc_flag, qcdb_swe_qc_chkd)
+            if snwd_qc_bit is None or swe_qc_bit is None:
+                qcdb.close()
+                sys.exit(1)
+            qcdb_station_vars = [qcdb.variables[var_name]
+                                 for var_name in qcdb_station_var_names]
+            qcdb_obj_id_var = qcdb.variables[qcdb_obj_id_var_name]
+            qcdb_index = StationIndex(qcdb_obj_id_var[:])
+
             just_committed = True
 
         else:
@@ -4752,6 +1886,10 @@ def main():
             if num_hrs_updated >= args.max_update_hours:
                 break
 
+    wdb_prefetch.close()
+    if qc_workers is not None:
+        qc_workers.close()
+
         # - For all snow depth obs:
         #   - Fetch station metadata from wdb0
         #   - If obj_id of obs is not in qcdb:
@@ -4762,23 +1900,12 @@ def main():
     if args.verbose:
         print('INFO: added {} '.format(num_stations_added_this_time) +
               'stations to the database.')
-        print('INFO: flagged {} snow depth obs. for world record exceedance.'.
-          format(num_flagged_sd_wr))
-        print('INFO: flagged {} snow depth changes for world record exceedance.'.
-              format(num_flagged_sd_change_wr))
-        print('INFO: flagged {} snow depth obs. for streak.'.
-              format(num_flagged_sd_streak))
-        print('INFO: flagged {} snow depth obs. for gap.'.
-              format(num_flagged_sd_gap))
-        print('INFO: flagged {} snow depth obs.'.
-              format(num_flagged_sd_at_cons) +
-              'for snow depth/air temp. consistency.')
-        print('INFO: flagged {} snow depth obs.'.
-              format(num_flagged_sd_sf_cons) +
-              'for snow depth/snowfall consistency.')
-        print('INFO: flagged {} snow depth obs.'.
-              format(num_flagged_sd_pr_cons) +
-              'for snow depth/precipitation consistency.')
+        for counter, num_flagged in num_flagged_snwd.items():
+            print('INFO: flagged {} snow depth obs. for "{}".'.
+                  format(num_flagged, counter))
+        for counter, num_flagged in num_flagged_swe.items():
+            print('INFO: flagged {} SWE obs. for "{}".'.
+                  format(num_flagged, counter))
 
     # if args.check_climatology:
     #     for i, id in enumerate(sd_gap_station_id):
@@ -0,0 +1,493 @@
+#!/usr/bin/python3
+
+import argparse
+import os
+import datetime as dt
+import sys
+import time
+import json
+import shutil
+import platform
+import resource
+import tempfile
+import threading
+import subprocess
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'lib'))
+import wdb0
+import wdb0_pool
+import wdb0_profile
+import wdb0_fixtures
+
+"""
+Benchmark wdb0 observation queries against a local fixture database
+(see make_wdb0_fixtures.py).
+
+Each benchmark calls one wdb0 function end to end, for each number of
+fixture stations, window length and cache mode requested, and measures
+elapsed time, observations returned per second, peak resident memory and
+the time spent in each phase (see wdb0_profile). Results are appended to
+a JSON-lines history file, one record per case, and compared with the
+most recent earlier record of the same case on the same host.
+"""
+
+# Benchmarks: name, function called with (end_datetime, window_hours,
+# scratch_dir), and whether the window length applies (functions that
+# take a fixed accumulation period are run once per station count).
+BENCHMARKS = [
+    ('get_snow_depth_obs',
+     lambda end, hours, scratch:
+     wdb0.get_snow_depth_obs(end - dt.timedelta(hours=hours - 1), end,
+                             scratch_dir=scratch),
+     True),
+    ('get_swe_obs',
+     lambda end, hours, scratch:
+     wdb0.get_swe_obs(end - dt.timedelta(hours=hours - 1), end,
+                      scratch_dir=scratch),
+     True),
+    ('get_swe_obs_df',
+     lambda end, hours, scratch:
+     wdb0.get_swe_obs_df(end - dt.timedelta(hours=hours - 1), end,
+                         scratch_dir=scratch),
+     True),
+    ('get_air_temp_obs',
+     lambda end, hours, scratch:
+     wdb0.get_air_temp_obs(end - dt.timedelta(hours=hours - 1), end,
+                           scratch_dir=scratch,
+                           use_window=False),
+     True),
+    ('get_prev_snow_depth_obs',
+     lambda end, hours, scratch:
+     wdb0.get_prev_snow_depth_obs(end, hours, scratch_dir=scratch),
+     True),
+    ('get_prev_swe_obs',
+     lambda end, hours, scratch:
+     wdb0.get_prev_swe_obs(end, hours, scratch_dir=scratch),
+     True),
+    ('get_prev_air_temp_obs',
+     lambda end, hours, scratch:
+     wdb0.get_prev_air_temp_obs(end, hours, scratch_dir=scratch),
+     True),
+    ('get_prv_air_temp_obs',
+     lambda end, hours, scratch:
+     wdb0.get_prv_air_temp_obs(end, hours, scratch_dir=scratch),
+     True),
+    ('get_snwd_snfl_obs',
+     lambda end, hours, scratch:
+     wdb0.get_snwd_snfl_obs(end, 24, scratch_dir=scratch),
+     False),
+    ('get_snwd_prcp_obs',
+     lambda end, hours, scratch:
+     wdb0.get_snwd_prcp_obs(end, 24, scratch_dir=scratch),
+     False),
+    ('get_swe_prcp_obs',
+     lambda end, hours, scratch:
+     wdb0.get_swe_prcp_obs(end, 24, scratch_dir=scratch),
+     False),
+    ('get_element_obs_df_copy',
+     lambda end, hours, scratch:
+     wdb0.get_element_obs_df('snow_depth',
+                             end - dt.timedelta(hours=hours - 1), end,
+                             engine='copy'),
+     True),
+    ('get_element_obs_df_cursor',
+     lambda end, hours, scratch:
+     wdb0.get_element_obs_df('snow_depth',
+                             end - dt.timedelta(hours=hours - 1), end,
+                             engine='cursor'),
+     True)]
+
+# Cache modes: no scratch directory, an empty one for every call, or one
+# filled by an earlier call.
+CACHE_MODES = ['none', 'cold', 'warm']
+
+
+class PeakRSS(object):
+
+    """
+    Context manager sampling the resident set size of this process in a
+    background thread, to find its peak while the context is active.
+    """
+
+    def __init__(self, interval_seconds=0.005):
+        self.interval_seconds = interval_seconds
+        self.peak_bytes = 0
+        self._page_size = os.sysconf('SC_PAGE_SIZE')
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _rss_bytes(self):
+        try:
+            with open('/proc/self/statm') as file_obj:
+                return int(file_obj.read().split()[1]) * self._page_size
+        except (OSError, IndexError, ValueError):
+            # Lifetime peak, in kilobytes on Linux.
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak_bytes = max(self.peak_bytes, self._rss_bytes())
+            self._stop.wait(self.interval_seconds)
+
+    def __enter__(self):
+        self.peak_bytes = self._rss_bytes()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        self._thread.join()
+        self.peak_bytes = max(self.peak_bytes, self._rss_bytes())
+        return False
+
+
+def count_obs(result):
+    """
+    Count the observations returned by a wdb0 function: rows of a
+    DataFrame, or unmasked values of the masked arrays in a dictionary.
+    """
+    if isinstance(result, pd.DataFrame):
+        return(len(result))
+    if isinstance(result, dict):
+        return(int(sum(np.ma.count(value) for value in result.values()
+                       if isinstance(value, np.ma.MaskedArray))))
+    return(0)
+
+
+def run_case(function, end_datetime, window_hours, cache_mode, repeats,
+             scratch_root):
+    """
+    Run one benchmark case repeats times and summarize the results.
+    """
+
+    warm_dir = None
+    if cache_mode == 'warm':
+        warm_dir = tempfile.mkdtemp(dir=scratch_root)
+        function(end_datetime, window_hours, warm_dir)
+
+    seconds = []
+    phases = []
+    peak_bytes = []
+    num_obs = 0
+    for repeat in range(repeats):
+        scratch_dir = warm_dir
+        if cache_mode == 'cold':
+            scratch_dir = tempfile.mkdtemp(dir=scratch_root)
+        with PeakRSS() as rss, wdb0_profile.PhaseRecorder() as recorder:
+            t1 = time.perf_counter()
+            result = function(end_datetime, window_hours, scratch_dir)
+            seconds.append(time.perf_counter() - t1)
+        num_obs = count_obs(result)
+        result = None
+        phases.append(recorder.seconds)
+        peak_bytes.append(rss.peak_bytes)
+        if cache_mode == 'cold':
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    if warm_dir is not None:
+        shutil.rmtree(warm_dir, ignore_errors=True)
+
+    median_seconds = float(np.median(seconds))
+    return({'seconds': seconds,
+            'median_seconds': median_seconds,
+            'num_obs': num_obs,
+            'obs_per_second': num_obs / median_seconds
+                              if median_seconds > 0 else None,
+            'peak_rss_mb': max(peak_bytes) / 2.0 ** 20,
+            'phases': {name: float(np.median([phase.get(name, 0.0)
+                                              for phase in phases]))
+                       for name in wdb0_profile.PHASES}})
+
+
+def case_key(record):
+    """
+    Identify the benchmark case of a history record.
+    """
+    return((record['host'],
+            record['benchmark'],
+            record['num_stations'],
+            record['window_hours'],
+            record['cache_mode']))
+
+
+def read_history(history_path):
+    """
+    Read the records of a history file, most recent last.
+    """
+    if not os.path.exists(history_path):
+        return([])
+    records = []
+    with open(history_path) as file_obj:
+        for line in file_obj:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    return(records)
+
+
+def git_commit():
+    """
+    Get the commit of the working tree, if it is a git repository.
+    """
+    try:
+        return(subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       cwd=os.path.dirname(__file__),
+                                       stderr=subprocess.DEVNULL).
+               decode().strip())
+    except (OSError, subprocess.CalledProcessError):
+        return(None)
+
+
+def parse_int_list(list_str):
+    """
+    Convert a comma-separated string to a list of integers.
+    """
+    return([int(item) for item in list_str.split(',')])
+
+
+def parse_args():
+    """
+    Parse command line arguments.
+    """
+    help_message = 'Benchmark wdb0 observation queries against a local ' + \
+                   'fixture database.'
+    default_history = os.path.join(os.getcwd(), 'wdb0_bench_history.jsonl')
+    parser = argparse.ArgumentParser(description=help_message)
+    parser.add_argument('end_date',
+                        type=str,
+                        metavar='end',
+                        help='Last hour of benchmark windows, YYYYMMDDHH.')
+    parser.add_argument('-n', '--num_stations',
+                        type=str,
+                        metavar='list',
+                        nargs='?',
+                        default='1000,10000,50000',
+                        help='Set a comma-separated list of fixture ' + \
+                             'station counts; default="1000,10000,50000".')
+    parser.add_argument('-w', '--window_hours',
+                        type=str,
+                        metavar='list',
+                        nargs='?',
+                        default='24,168,720',
+                        help='Set a comma-separated list of window ' + \
+                             'lengths (hours); default="24,168,720".')
+    parser.add_argument('-c', '--cache_modes',
+                        type=str,
+                        metavar='list',
+                        nargs='?',
+                        default='none',
+                        help='Set a comma-separated list of cache modes ' + \
+                             '({}); default="none".'.
+                             format(', '.join(CACHE_MODES)))
+    parser.add_argument('-b', '--benchmarks',
+                        type=str,
+                        metavar='list',
+                        nargs='?',
+                        help='Set a comma-separated list of benchmarks ' + \
+                             'to run; default=all.')
+    parser.add_argument('-r', '--repeats',
+                        type=int,
+                        metavar='#',
+                        nargs='?',
+                        default=3,
+                        help='Set the number of calls per case; default=3.')
+    parser.add_argument('-s', '--seed',
+                        type=int,
+                        metavar='seed',
+                        nargs='?',
+                        default=0,
+                        help='Set the fixture random seed; default=0.')
+    parser.add_argument('-l', '--no_load',
+                        action='store_true',
+                        help='Use the fixtures already in the database ' + \
+                             'rather than loading them (for a single ' + \
+                             'station count).')
+    parser.add_argument('-d', '--wdb0_dsn',
+                        type=str,
+                        metavar='dsn',
+                        nargs='?',
+                        default=wdb0_pool.get_dsn(),
+                        help='Set the connection string for the ' + \
+                             'fixture database; ' + \
+                             'default="{}".'.format(wdb0_pool.get_dsn()))
+    parser.add_argument('-o', '--history_path',
+                        type=str,
+                        metavar='file',
+                        nargs='?',
+                        default=default_history,
+                        help='Set the JSON-lines file results are ' + \
+                             'appended to; default={}.'.
+                             format(default_history))
+    parser.add_argument('-t', '--tolerance',
+                        type=float,
+                        metavar='fraction',
+                        nargs='?',
+                        default=0.2,
+                        help='Set the slowdown relative to the previous ' + \
+                             'run reported as a regression; default=0.2.')
+    parser.add_argument('-f', '--fail_on_regression',
+                        action='store_true',
+                        help='Exit with status 2 if any case regressed.')
+    parser.add_argument('-v', '--verbose',
+                        action='store_true',
+                        help='Provide verbose output.')
+    args = parser.parse_args()
+    return(args)
+
+
+def main():
+    """
+    Benchmark wdb0 observation queries against a local fixture database.
+    """
+
+    # Read command line arguments.
+    args = parse_args()
+    if args is None:
+        print('ERROR: Failed to parse command line.', file=sys.stderr)
+        exit(1)
+
+    try:
+        end_datetime = dt.datetime.strptime(args.end_date, '%Y%m%d%H')
+    except ValueError:
+        print('ERROR: End date must be given as YYYYMMDDHH.',
+              file=sys.stderr)
+        exit(1)
+
+    if args.wdb0_dsn == wdb0_pool.DEFAULT_DSN:
+        print('ERROR: Refusing to benchmark against the operational ' +
+              'database; give a DSN with -d or WDB0_DSN.',
+              file=sys.stderr)
+        exit(1)
+    wdb0_pool.set_dsn(args.wdb0_dsn)
+
+    station_counts = parse_int_list(args.num_stations)
+    window_hours_list = parse_int_list(args.window_hours)
+    cache_modes = args.cache_modes.split(',')
+    for cache_mode in cache_modes:
+        if cache_mode not in CACHE_MODES:
+            print('ERROR: unknown cache mode "{}".'.format(cache_mode),
+                  file=sys.stderr)
+            exit(1)
+    benchmarks = BENCHMARKS
+    if args.benchmarks is not None:
+        names = args.benchmarks.split(',')
+        benchmarks = [benchmark for benchmark in BENCHMARKS
+                      if benchmark[0] in names]
+        if len(benchmarks) != len(names):
+            print('ERROR: unknown benchmark in "{}".'.
+                  format(args.benchmarks),
+                  file=sys.stderr)
+            exit(1)
+    if args.no_load and len(station_counts) > 1:
+        print('ERROR: Only one station count may be given with -l.',
+              file=sys.stderr)
+        exit(1)
+
+    # Windows reach back at most this far, including the previous hours
+    # read by get_prev_* functions.
+    load_begin_datetime = end_datetime - \
+        dt.timedelta(hours=2 * max(window_hours_list + [24]))
+
+    previous = {}
+    for record in read_history(args.history_path):
+        previous[case_key(record)] = record
+
+    run_info = {'run_time': dt.datetime.utcnow().
+                            strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'commit': git_commit(),
+                'host': platform.node(),
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'pandas': pd.__version__,
+                'seed': args.seed,
+                'end_datetime': end_datetime.strftime('%Y-%m-%d %H:%M:%S'),
+                'fetch_tiles': wdb0.get_fetch_tiles()}
+
+    scratch_root = tempfile.mkdtemp(prefix='wdb0_bench_')
+    num_regressions = 0
+
+    try:
+        for num_stations in station_counts:
+
+            if not args.no_load:
+                generator = wdb0_fixtures.FixtureGenerator(num_stations,
+                                                           seed=args.seed)
+                wdb0_pool.close_all()
+                wdb0_fixtures.load_fixtures(generator,
+                                            load_begin_datetime,
+                                            end_datetime,
+                                            dsn=args.wdb0_dsn,
+                                            drop_existing=True,
+                                            verbose=args.verbose)
+                # Forget statements prepared against the old tables and
+                # station metadata read from them.
+                wdb0_pool.close_all()
+                wdb0.get_station_table().refresh()
+
+            for name, function, uses_window in benchmarks:
+                for window_hours in (window_hours_list if uses_window
+                                     else [None]):
+                    for cache_mode in cache_modes:
+                        result = run_case(function,
+                                          end_datetime,
+                                          window_hours or 24,
+                                          cache_mode,
+                                          args.repeats,
+                                          scratch_root)
+                        record = dict(run_info)
+                        record.update({'benchmark': name,
+                                       'num_stations': num_stations,
+                                       'window_hours': window_hours,
+                                       'cache_mode': cache_mode})
+                        record.update(result)
+
+                        print('INFO: {} '.format(name) +
+                              '{} stations '.format(num_stations) +
+                              '{} hours '.format(window_hours) +
+                              'cache {}: '.format(cache_mode) +
+                              '{:.3f} s, '.format(record['median_seconds']) +
+                              '{} obs, '.format(record['num_obs']) +
+                              '{:.0f} obs/s, '.
+                              format(record['obs_per_second'] or 0.0) +
+                              'peak RSS {:.0f} MB'.
+                              format(record['peak_rss_mb']))
+                        if args.verbose:
+                            print('INFO: phases ' +
+                                  ', '.join(['{} {:.3f} s'.format(phase,
+                                                                  seconds)
+                                             for phase, seconds in
+                                             record['phases'].items()
+                                             if seconds > 0.0]))
+
+                        prev_record = previous.get(case_key(record))
+                        if prev_record is not None and \
+                           record['median_seconds'] > \
+                           prev_record['median_seconds'] * \
+                           (1.0 + args.tolerance):
+                            num_regressions += 1
+                            print('WARNING: {} regressed from '.format(name) +
+                                  '{:.3f} s '.
+                                  format(prev_record['median_seconds']) +
+                                  '(commit {}) '.
+                                  format(prev_record['commit']) +
+                                  'to {:.3f} s.'.
+                                  format(record['median_seconds']),
+                                  file=sys.stderr)
+
+                        with open(args.history_path, 'a') as file_obj:
+                            file_obj.write(json.dumps(record) + '\n')
+    finally:
+        shutil.rmtree(scratch_root, ignore_errors=True)
+
+    if num_regressions > 0:
+        print('WARNING: {} case(s) regressed.'.format(num_regressions),
+              file=sys.stderr)
+        if args.fail_on_regression:
+            exit(2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/python3
+
+import argparse
+import os
+import datetime as dt
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'lib'))
+import wdb0_pool
+import wdb0_fixtures
+
+
+def parse_args():
+    """
+    Parse command line arguments.
+    """
+    help_message = 'Load synthetic stations and observations into a ' + \
+                   'local stand-in for the NOHRSC web database.'
+    parser = argparse.ArgumentParser(description=help_message)
+    parser.add_argument('begin_date',
+                        type=str,
+                        metavar='begin',
+                        help='First date of observations, YYYYMMDD[HH].')
+    parser.add_argument('end_date',
+                        type=str,
+                        metavar='end',
+                        help='Last date of observations, YYYYMMDD[HH].')
+    parser.add_argument('-n', '--num_stations',
+                        type=int,
+                        metavar='# of stations',
+                        nargs='?',
+                        default=50000,
+                        help='Set the number of stations; default=50000.')
+    parser.add_argument('-s', '--seed',
+                        type=int,
+                        metavar='seed',
+                        nargs='?',
+                        default=0,
+                        help='Set the random seed; default=0.')
+    parser.add_argument('-o', '--outlier_fraction',
+                        type=float,
+                        metavar='fraction',
+                        nargs='?',
+                        default=0.001,
+                        help='Set the fraction of observations given ' + \
+                             'gross errors; default=0.001.')
+    parser.add_argument('-e', '--elements',
+                        type=str,
+                        metavar='list',
+                        nargs='?',
+                        default=','.join(wdb0_fixtures.OBS_TABLES.keys()),
+                        help='Set a comma-separated list of elements ' + \
+                             'to load; default="{}".'.
+                             format(','.join(wdb0_fixtures.OBS_TABLES.keys())))
+    parser.add_argument('-d', '--wdb0_dsn',
+                        type=str,
+                        metavar='dsn',
+                        nargs='?',
+                        default=wdb0_pool.get_dsn(),
+                        help='Set the connection string for the ' + \
+                             'database to load; ' + \
+                             'default="{}".'.format(wdb0_pool.get_dsn()))
+    parser.add_argument('-r', '--replace',
+                        action='store_true',
+                        help='Drop and recreate existing tables.')
+    parser.add_argument('-v', '--verbose',
+                        action='store_true',
+                        help='Provide verbose output.')
+    args = parser.parse_args()
+    return(args)
+
+
+def parse_date(date_str):
+    """
+    Convert a YYYYMMDD or YYYYMMDDHH string to a datetime.
+    """
+    if len(date_str) == 8:
+        return(dt.datetime.strptime(date_str, '%Y%m%d'))
+    return(dt.datetime.strptime(date_str, '%Y%m%d%H'))
+
+
+def main():
+    """
+    Load synthetic stations and observations into a local stand-in for
+    the NOHRSC web database.
+    """
+
+    # Read command line arguments.
+    args = parse_args()
+    if args is None:
+        print('ERROR: Failed to parse command line.', file=sys.stderr)
+        exit(1)
+
+    try:
+        begin_datetime = parse_date(args.begin_date)
+        end_datetime = parse_date(args.end_date)
+    except ValueError:
+        print('ERROR: Dates must be given as YYYYMMDD or YYYYMMDDHH.',
+              file=sys.stderr)
+        exit(1)
+    if end_datetime < begin_datetime:
+        print('ERROR: End date precedes begin date.', file=sys.stderr)
+        exit(1)
+
+    if args.wdb0_dsn == wdb0_pool.DEFAULT_DSN:
+        print('ERROR: Refusing to load synthetic data into the ' +
+              'operational database; give a DSN with -d or WDB0_DSN.',
+              file=sys.stderr)
+        exit(1)
+
+    generator = wdb0_fixtures.FixtureGenerator(
+        args.num_stations,
+        seed=args.seed,
+        outlier_fraction=args.outlier_fraction)
+
+    t1 = time.time()
+    num_rows = wdb0_fixtures.load_fixtures(generator,
+                                           begin_datetime,
+                                           end_datetime,
+                                           elements=args.elements.split(','),
+                                           dsn=args.wdb0_dsn,
+                                           drop_existing=args.replace,
+                                           verbose=args.verbose)
+    if num_rows is None:
+        exit(1)
+
+    print('INFO: loaded {} stations and {} observations in {} seconds.'.
+          format(args.num_stations, num_rows, round(time.time() - t1, 1)))
+
+
+if __name__ == '__main__':
+    main()
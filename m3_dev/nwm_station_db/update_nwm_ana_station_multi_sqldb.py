@@ -31,6 +31,7 @@ import getpass
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'lib'))
 import nwm_da_time as ndt
+import wdb0_pool
 sys.path.append(os.path.join(os.path.dirname(__file__), 'lib'))
 import nwm_da_sqlite_db as nds_db
 
@@ -1980,7 +1981,8 @@ def update_nwm_db_allstation(db_file,
 
     # Open the web database.
     #web_conn_string = "host='wdb0' dbname='web_data'"
-    web_conn_string = "host='wdb0.dmz.nohrsc.noaa.gov' dbname='web_data'"
+    # Honors WDB0_DSN, e.g. to use a local stand-in (see wdb0_fixtures).
+    web_conn_string = wdb0_pool.get_dsn()
     web_conn = psycopg2.connect(web_conn_string)
     web_conn.set_client_encoding("utf-8")
     web_cursor = web_conn.cursor()